@@ -1,6 +1,6 @@
 import logging
 
-from flask import Blueprint, app, current_app, render_template, abort, request, redirect, url_for, flash, jsonify, session, send_from_directory
+from flask import Blueprint, app, current_app, render_template, abort, request, redirect, url_for, flash, jsonify, session, send_from_directory, Response, stream_with_context
 
 from flask_login import login_required, current_user, login_user
 
@@ -24,7 +24,7 @@ from sqlalchemy.orm import joinedload
 
 from sqlalchemy.exc import IntegrityError
 
-import os, json, csv, re, string, random
+import os, json, re, string, random
 
 from sqlalchemy import func
 
@@ -36,15 +36,19 @@ from services.grading_calculation_engine import GradingCalculationEngine
 
 from services.semester_grading_service import SemesterGradingService
 
+from services.image_pipeline import ImagePipeline, ImageRejected
+
+from services.quiz_interchange import QuizImportError, QuizInterchange
+
 from utils.promotion import promote_student
 
 from utils.backup import generate_quiz_csv_backup, backup_students_to_csv
 
-from utils.helpers import get_programme_choices, get_level_choices, get_course_choices
+from utils.helpers import get_programme_choices, get_level_choices, get_course_choices, username_base
 
-from utils.serializers import (serialize_admin, serialize_submission, serialize_user, serialize_student, serialize_quiz, serialize_question, serialize_option, serialize_submission)
+from utils.catalog_cache import academic_years, all_courses
 
-from utils.receipts import generate_receipt
+from utils.serializers import (serialize_admin, serialize_submission, serialize_user, serialize_student, serialize_quiz, serialize_question, serialize_option, serialize_submission)
 
 from utils.index_generator import generate_index_number
 
@@ -1056,6 +1060,95 @@ def past_releases():
     return render_template('admin/past_releases.html', releases=releases)
 
 
+# ============================================================
+# CLASS-WIDE RESULT SLIP / TRANSCRIPT EXPORT
+# ============================================================
+
+@admin_bp.route('/results/batch-export', methods=['GET', 'POST'])
+@login_required
+@require_academic_admin
+def batch_export_results():
+    """Start a class-wide export (POST) or show the export form (GET)."""
+    from services.batch_export_service import BatchExportService
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        try:
+            job_id = BatchExportService.start_job(
+                kind=data.get('kind', 'result_slip'),
+                programme_name=data.get('programme'),
+                programme_level=data.get('level'),
+                academic_year=data.get('academic_year') or None,
+                semester=data.get('semester') or None,
+                requested_by=current_user.username
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('admin.batch_export_status', job_id=job_id)
+        }), 202
+
+    classes = db.session.query(
+        StudentProfile.current_programme, StudentProfile.programme_level
+    ).distinct().order_by(
+        StudentProfile.current_programme, StudentProfile.programme_level
+    ).all()
+    periods = db.session.query(
+        StudentCourseGrade.academic_year, StudentCourseGrade.semester
+    ).distinct().order_by(
+        StudentCourseGrade.academic_year.desc(), StudentCourseGrade.semester
+    ).all()
+
+    return render_template('admin/batch_export.html', classes=classes, periods=periods)
+
+
+@admin_bp.route('/results/batch-export/<job_id>')
+@login_required
+@require_academic_admin
+def batch_export_status(job_id):
+    """Progress of a batch export job (polled by the export page)."""
+    from services.batch_export_service import BatchExportService
+
+    job = BatchExportService.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'done': job['done'],
+        'total': job['total'],
+        'error': job['error'],
+        'download_url': (
+            url_for('admin.batch_export_download', job_id=job_id)
+            if job['status'] == 'completed' else None
+        )
+    })
+
+
+@admin_bp.route('/results/batch-export/<job_id>/download')
+@login_required
+@require_academic_admin
+def batch_export_download(job_id):
+    """Stream the finished ZIP from disk."""
+    from flask import send_file
+    from services.batch_export_service import BatchExportService
+
+    job = BatchExportService.get_job(job_id)
+    if not job or job['status'] != 'completed' or not job['path'] or not os.path.exists(job['path']):
+        abort(404)
+
+    return send_file(
+        job['path'],
+        as_attachment=True,
+        download_name=job['filename'],
+        mimetype='application/zip'
+    )
+
+
 @admin_bp.route('/vetting/results/<int:release_id>')
 
 @login_required
@@ -1600,17 +1693,13 @@ def register_continuing_student():
 
         if picture and picture.filename:
 
-            filename = secure_filename(picture.filename)
-
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-
-            picture_path = os.path.join(current_app.config['PROFILE_PICS_FOLDER'], unique_filename)
+            try:
 
-            os.makedirs(current_app.config['PROFILE_PICS_FOLDER'], exist_ok=True)
+                profile_picture = ImagePipeline.ingest(picture.stream)
 
-            picture.save(picture_path)
+            except ImageRejected as e:
 
-            profile_picture = unique_filename
+                flash(f"Profile picture not saved: {e}", "warning")
 
 
 
@@ -2264,17 +2353,13 @@ def register_user():
 
     if picture and picture.filename:
 
-        filename = secure_filename(picture.filename)
-
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-
-        path = os.path.join(current_app.config['PROFILE_PICS_FOLDER'], unique_filename)
+        try:
 
-        os.makedirs(current_app.config['PROFILE_PICS_FOLDER'], exist_ok=True)
+            profile_picture = ImagePipeline.ingest(picture.stream)
 
-        picture.save(path)
+        except ImageRejected as e:
 
-        profile_picture = unique_filename
+            flash(f"Profile picture not saved: {e}", "warning")
 
 
 
@@ -2832,14 +2917,6 @@ from models import User
 
 
 
-def clean(n):
-
-    """Remove non-alphabetic characters and convert to lowercase"""
-
-    return re.sub(r'[^a-zA-Z]', '', (n or '')).lower().strip()
-
-
-
 def generate_unique_username(first_name, middle_name, last_name, role):
 
     """
@@ -2890,77 +2967,7 @@ def generate_unique_username(first_name, middle_name, last_name, role):
 
     
 
-    # Clean all name parts
-
-    first = clean(first_name)
-
-    middle = clean(middle_name)
-
-    last = clean(last_name)
-
-    
-
-    # ✅ FIX: Handle name shifting if first name is empty
-
-    if not first and middle:
-
-        # If first name missing but middle exists → shift middle to first
-
-        first = middle
-
-        middle = ''
-
-    
-
-    # Validate we have minimum required names
-
-    if not first or not last:
-
-        raise ValueError("First name and last name are required")
-
-    
-
-    # ✅ BUILD USERNAME: [F initial][M initial]Last name (in full)
-
-    # Start with first initial
-
-    base = first[0]  # Just the initial of first name
-
-    
-
-    # Add middle initial if exists
-
-    if middle:
-
-        base += middle[0]  # Just the initial of middle name
-
-    
-
-    # Add FULL last name (not just initial)
-
-    base += last  # Full last name, NOT just last[0]
-
-    
-
-    # ✅ DOMAIN MAPPING (each role gets its own domain)
-
-    domain_map = {
-
-        'student': 'st.vtiu.edu.gh',
-
-        'teacher': 'tch.vtiu.edu.gh',
-
-        'finance_admin': 'finance.vtiu.edu.gh',
-
-        'academic_admin': 'academic.vtiu.edu.gh',
-
-        'admissions_admin': 'admissions.vtiu.edu.gh',
-
-        'superadmin': 'admin.vtiu.edu.gh',  # Only superadmin uses admin.vtiu.edu.gh
-
-    }
-
-    domain = domain_map.get(role.lower(), 'vtiu.edu.gh')
+    base, domain = username_base(first_name, middle_name, last_name, role)
 
     
 
@@ -3292,48 +3299,6 @@ def edit_record(model, record_id):
 
 
 
-def generate_quiz_backup_file(quiz_data, questions_data, backup_dir='quiz_backups'):
-
-    os.makedirs(backup_dir, exist_ok=True)
-
-
-
-    filename_base = f"{quiz_data['title'].replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-
-
-
-    json_path = os.path.join(backup_dir, f"{filename_base}.json")
-
-    with open(json_path, 'w', encoding='utf-8') as f:
-
-        json.dump({'quiz': quiz_data, 'questions': questions_data}, f, indent=4)
-
-
-
-    csv_path = os.path.join(backup_dir, f"{filename_base}.csv")
-
-    with open(csv_path, mode='w', newline='', encoding='utf-8') as csv_file:
-
-        writer = csv.writer(csv_file)
-
-        writer.writerow(['Question', 'Option', 'Is Correct'])
-
-
-
-        for question in questions_data:
-
-            q_text = question['text']
-
-            for opt in question['options']:
-
-                writer.writerow([q_text, opt['text'], 'TRUE' if opt['is_correct'] else 'FALSE'])
-
-
-
-    return json_path  # or return both paths if needed
-
-
-
 @admin_bp.route('/add_quiz', methods=['GET', 'POST'])
 
 @login_required
@@ -4020,115 +3985,107 @@ def delete_quiz(quiz_id):
 
 def restore_quiz():
 
-    check_admin_access()
-
-    if request.method == 'POST':
-
-        file = request.files.get('backup_file')
+    """Import a quiz (or a question bank into an existing quiz) from a .json/.csv quiz file."""
 
-        if not file or not file.filename.endswith('.json'):
+    check_admin_access()
 
-            flash("Please upload a valid JSON backup file.", "danger")
+    quizzes = Quiz.query.order_by(Quiz.start_datetime.desc()).all()
 
-            return redirect(request.url)
+    report = None
 
 
 
-        try:
-
-            data = json.load(file)
+    if request.method == 'POST':
 
-            quiz_data = data.get('quiz')
+        file = request.files.get('backup_file')
 
-            questions_data = data.get('questions', [])
+        if not file or not file.filename:
 
+            flash("Please choose a quiz file to upload.", "danger")
 
+            return redirect(request.url)
 
-            # Prevent duplicate
 
-            if Quiz.query.filter_by(title=quiz_data['title'], assigned_class=quiz_data['assigned_class']).first():
 
-                flash("A quiz with this title already exists.", "danger")
+        quiz_id = request.form.get('quiz_id', type=int)
 
-                return redirect(request.url)
+        target = Quiz.query.get_or_404(quiz_id) if quiz_id else None
 
+        dry_run = bool(request.form.get('dry_run'))
 
 
-            course = Course.query.filter_by(name=quiz_data['course_name']).first()
 
-            if not course:
+        try:
 
-                flash("Course from backup does not exist.", "danger")
+            document = QuizInterchange.load(file.filename, file.stream)
 
-                return redirect(request.url)
+            report = QuizInterchange.import_document(document, quiz=target, dry_run=dry_run)
 
+        except QuizImportError as e:
 
+            flash(str(e), "danger")
 
-            quiz = Quiz(
+            return render_template("admin/restore_quiz.html", quizzes=quizzes, errors=e.errors), 400
 
-                course_id=course.id,
+        except Exception as e:
 
-                course_name=quiz_data['course_name'],
+            current_app.logger.exception(f"Error restoring quiz: {e}")
 
-                title=quiz_data['title'],
+            flash(f"Error restoring quiz: {e}", "danger")
 
-                assigned_class=quiz_data['assigned_class'],
+            return redirect(request.url)
 
-                start_datetime=datetime.fromisoformat(quiz_data['start_datetime']),
 
-                end_datetime=datetime.fromisoformat(quiz_data['end_datetime']),
 
-                duration_minutes=int(quiz_data['duration_minutes']),
+        if not dry_run:
 
-                attempts_allowed=int(quiz_data['attempts_allowed']),
+            flash(f"Imported {report['questions']} questions into '{report['title']}'.", "success")
 
-                content_file=quiz_data.get('content_file')
+            return redirect(url_for('admin.manage_quizzes'))
 
-            )
+        flash("Dry run passed: the file is valid and nothing was saved.", "info")
 
-            db.session.add(quiz)
 
-            db.session.flush()
 
+    return render_template("admin/restore_quiz.html", quizzes=quizzes, report=report)
 
 
-            for q in questions_data:
 
-                blanks = re.findall(r'_{3,}', q['text'])
 
-                q_type = 'fill_in' if blanks else q.get('question_type', 'mcq')
 
-                question = Question(quiz_id=quiz.id, text=q['text'], question_type=q_type)
+@admin_bp.route('/quizzes/<int:quiz_id>/export')
 
-                db.session.add(question)
-
-                db.session.flush()
+@login_required
 
-                for opt in q.get('options', []):
+def export_quiz(quiz_id):
 
-                    db.session.add(Option(question_id=question.id, text=opt['text'], is_correct=opt['is_correct']))
+    """Download a quiz in the interchange format (?format=json|csv)."""
 
+    check_admin_access()
 
+    quiz = Quiz.query.get_or_404(quiz_id)
 
-            db.session.commit()
+    fmt = request.args.get('format', 'json')
 
-            flash("Quiz restored successfully from backup.", "success")
+    if fmt not in ('json', 'csv'):
 
-            return redirect(url_for('admin.manage_quizzes'))
+        abort(400)
 
 
 
-        except Exception as e:
+    document = QuizInterchange.export_quiz(quiz)
 
-            db.session.rollback()
+    body = QuizInterchange.to_json(document) if fmt == 'json' else QuizInterchange.to_csv(document)
 
-            flash(f"Error restoring quiz: {e}", "danger")
+    return Response(
 
-            return redirect(request.url)
+        body,
 
+        mimetype='application/json' if fmt == 'json' else 'text/csv',
 
+        headers={'Content-Disposition': f'attachment; filename="{QuizInterchange.filename(document, fmt)}"'}
 
-    return render_template("admin/restore_quiz.html")
+    )
 
 
 
@@ -5463,13 +5420,9 @@ def calculate_yearly_gpa(student_id, academic_year):
 
     
 
-    This replaces the old calculate_student_score() which:
-
-    ✗ Used quiz submissions (wrong metric)
+    Delegates to PromotionService.yearly_gpas(), which computes the
 
-    ✗ Had broken query
-
-    ✗ Wasn't reliable
+    credit-weighted GPA in SQL. Use that directly for many students.
 
     
 
@@ -5487,81 +5440,11 @@ def calculate_yearly_gpa(student_id, academic_year):
 
     """
 
-    
-
-    # Get all FINALIZED course grades for the year (both semesters).
-
-    # If the model has `is_finalized`, use it; otherwise treat non-NULL `final_score` as finalized.
-
-    if hasattr(StudentCourseGrade, 'is_finalized'):
-
-        grades = StudentCourseGrade.query.filter(
-
-            StudentCourseGrade.student_id == student_id,
-
-            StudentCourseGrade.academic_year == academic_year,
-
-            StudentCourseGrade.is_finalized == True
-
-        ).all()
-
-    else:
-
-        grades = StudentCourseGrade.query.filter(
-
-            StudentCourseGrade.student_id == student_id,
-
-            StudentCourseGrade.academic_year == academic_year,
-
-            StudentCourseGrade.final_score != None
-
-        ).all()
-
-    
-
-    if not grades:
-
-        return 0.0
-
-    
-
-    # Grade point mapping
-
-    grade_points = {
-
-        'A': 4.0, 'A-': 3.7,
-
-        'B+': 3.3, 'B': 3.0, 'B-': 2.7,
-
-        'C+': 2.3, 'C': 2.0, 'C-': 1.7,
-
-        'D+': 1.3, 'D': 1.0, 'F': 0.0
-
-    }
-
-    
-
-    total_points = 0
-
-    total_credits = 0
-
-    
-
-    for grade in grades:
-
-        points = grade_points.get(grade.grade_letter, 0)
-
-        credit_hours = grade.course.credit_hours if grade.course else 3
-
-        total_points += points * credit_hours
-
-        total_credits += credit_hours
+    from services.promotion_service import PromotionService
 
     
 
-    return round(total_points / total_credits, 2) if total_credits > 0 else 0.0
-
-
+    return PromotionService.yearly_gpas([student_id], academic_year).get(student_id, 0.0)
 
 
 
@@ -5579,7 +5462,7 @@ def get_promotion_candidates(academic_year, filters=None):
 
         filters: Dict with optional keys:
 
-            - programmes: list of programme codes
+            - programmes: list of programme names
 
             - levels: list of level strings
 
@@ -5595,15 +5478,21 @@ def get_promotion_candidates(academic_year, filters=None):
 
     """
 
+    from services.promotion_service import PromotionService
+
     
 
     filters = filters or {}
 
     
 
-    # Start with all students
+    # Start with all active students (names joined in the same query)
+
+    query = db.session.query(StudentProfile, User).join(
 
-    query = StudentProfile.query.filter_by(academic_status='Active')
+        User, User.user_id == StudentProfile.user_id
+
+    ).filter(StudentProfile.academic_status == 'Active')
 
     
 
@@ -5611,7 +5500,7 @@ def get_promotion_candidates(academic_year, filters=None):
 
     if filters.get('programmes'):
 
-        query = query.filter(StudentProfile.programme_code.in_(filters['programmes']))
+        query = query.filter(StudentProfile.current_programme.in_(filters['programmes']))
 
     
 
@@ -5621,17 +5510,21 @@ def get_promotion_candidates(academic_year, filters=None):
 
     
 
-    students = query.all()
+    rows = query.all()
 
     
 
-    candidates = []
+    # Yearly GPA for every candidate in one grouped query
 
-    for student in students:
+    gpas = PromotionService.yearly_gpas([student.user_id for student, _ in rows], academic_year)
 
-        # Calculate yearly GPA
+    
+
+    candidates = []
 
-        gpa = calculate_yearly_gpa(student.user_id, academic_year)
+    for student, user in rows:
+
+        gpa = gpas.get(student.user_id, 0.0)
 
         
 
@@ -5643,23 +5536,19 @@ def get_promotion_candidates(academic_year, filters=None):
 
         
 
-        user = User.query.filter_by(user_id=student.user_id).first()
-
-        
-
         candidates.append({
 
             'student_id': student.user_id,
 
-            'name': user.full_name if user else 'Unknown',
+            'name': user.full_name,
 
-            'programme': student.programme_name,
+            'programme': student.current_programme,
 
             'level': student.programme_level,
 
             'gpa': gpa,
 
-            'vetting_status': student.vetting_status or 'pending'
+            'vetting_status': getattr(student, 'vetting_status', None) or 'pending'
 
         })
 
@@ -5669,8 +5558,6 @@ def get_promotion_candidates(academic_year, filters=None):
 
 
 
-
-
 # =====================================================
 
 # API ENDPOINTS FOR AJAX CALLS
@@ -5821,7 +5708,23 @@ def api_reject_promotion():
 
 def api_bulk_promote_students():
 
-    """Promote multiple approved students"""
+    """
+
+    Promote multiple approved students.
+
+    
+
+    JSON body:
+
+    - student_ids: list of student user IDs
+
+    - academic_year: year the promotion GPA is computed for
+
+    - dry_run: if true, return the promotion plan without saving
+
+    """
+
+    from services.promotion_service import PromotionService
 
     
 
@@ -5831,6 +5734,8 @@ def api_bulk_promote_students():
 
     academic_year = data.get('academic_year')
 
+    dry_run = bool(data.get('dry_run'))
+
     
 
     if not academic_year:
@@ -5839,123 +5744,192 @@ def api_bulk_promote_students():
 
     
 
-    promoted = 0
+    try:
+
+        result = PromotionService.promote(
+
+            student_ids, academic_year,
+
+            promoted_by=current_user.id,
+
+            dry_run=dry_run
+
+        )
+
+        
+
+        if not dry_run:
+
+            db.session.commit()
+
+            flash(f"Successfully promoted {result['promoted']} students", "success")
+
+        
+
+        return jsonify({
+
+            'success': True,
 
-    errors = []
+            'dry_run': dry_run,
+
+            'promoted': result['promoted'],
+
+            'plan': result['promotions'],
+
+            'errors': result['errors']
+
+        })
 
     
 
+    except Exception as e:
+
+        db.session.rollback()
+
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+
+@admin_bp.route('/admin/backups', methods=['POST'])
+
+@login_required
+
+def create_backup_set():
+
+    """Queue a (full or incremental) table backup set for the job worker (returns 202)."""
+
+    from services.job_queue import JobQueue
+
+    from utils.backup import BackupError, check_backup_options
+
+    if not isinstance(current_user, Admin) or not current_user.is_superadmin:
+
+        abort(403)
+
+
+
+    data = request.get_json(silent=True) or request.form
+
     try:
 
-        for student_id in student_ids:
+        since = datetime.fromisoformat(data['since']).isoformat() if data.get('since') else None
 
-            student = StudentProfile.query.filter_by(user_id=student_id).first()
+        tables = data.get('tables') or None
 
-            
+        if isinstance(tables, str):
 
-            if not student:
+            tables = [t.strip() for t in tables.split(',') if t.strip()]
 
-                errors.append({'student_id': student_id, 'error': 'Not found'})
+        fmt = data.get('format', 'jsonl')
 
-                continue
+        compression = data.get('compression') or None
 
-            
+        check_backup_options(tables, fmt, compression)
 
-            if student.vetting_status != 'approved':
+    except (BackupError, ValueError) as e:
 
-                errors.append({'student_id': student_id, 'error': 'Not approved'})
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-                continue
 
-            
 
-            # Get yearly GPA
+    # A full backup outlasts the request timeout; it runs in the job worker
+    job_id = JobQueue.enqueue('table_backup', {
 
-            gpa = calculate_yearly_gpa(student_id, academic_year)
+        'tables': tables,
 
-            
+        'since': since,
 
-            # Advance to next level
+        'format': fmt,
 
-            current_level = int(student.programme_level or 100)
+        'compression': compression,
 
-            new_level = current_level + 100
+    }, requested_by=current_user.username)
 
-            
+    return jsonify({
 
-            # Update student
+        'success': True,
 
-            student.programme_level = str(new_level)
+        'job_id': job_id,
 
-            student.academic_status = 'Active'
+        'status_url': url_for('admin.backup_set_status', job_id=job_id)
 
-            student.vetting_status = 'promoted'
+    }), 202
 
-            
 
-            # Create audit record
 
-            promotion = StudentPromotion(
+@admin_bp.route('/admin/backups/<job_id>')
 
-                student_id=student_id,
+@login_required
 
-                from_level=str(current_level),
+def backup_set_status(job_id):
 
-                to_level=str(new_level),
+    """Progress of a queued backup; once completed, its manifest and file links."""
 
-                gpa=gpa,
+    from services.job_queue import JobQueue
 
-                academic_status='Active',
+    if not isinstance(current_user, Admin) or not current_user.is_superadmin:
 
-                academic_year=academic_year,
+        abort(403)
 
-                promoted_by=current_user.id,
 
-                promoted_at=datetime.utcnow()
 
-            )
+    job = JobQueue.get(job_id, kind='table_backup')
 
-            
+    if not job:
 
-            db.session.add(promotion)
+        return jsonify({'success': False, 'error': 'Backup job not found'}), 404
 
-            promoted += 1
 
-        
 
-        db.session.commit()
+    response = {
 
-        
+        'success': True,
 
-        flash(f"Successfully promoted {promoted} students", "success")
+        'status': job['status'],
 
-        return jsonify({
+        'done': job['done'],
 
-            'success': True,
+        'total': job['total'],
 
-            'promoted': promoted,
+        'error': job['error'],
 
-            'errors': errors
+    }
 
-        })
+    if job['status'] == 'completed':
 
-    
+        set_name = job['progress']['set']
 
-    except Exception as e:
+        manifest = job['progress']['manifest']
 
-        db.session.rollback()
+        files = [f"{set_name}/{entry['file']}" for entry in manifest['files']] + [f"{set_name}/manifest.json"]
 
-        return jsonify({'success': False, 'error': str(e)}), 400
+        response.update(
+
+            set=set_name,
+
+            manifest=manifest,
+
+            downloads=[url_for('admin.download_backup', filename=f) for f in files]
+
+        )
+
+    return jsonify(response)
 
-    
 
 
+@admin_bp.route('/admin/download-backup/<path:filename>')
 
-@admin_bp.route('/admin/download-backup/<filename>')
+@login_required
 
 def download_backup(filename):
 
-    return send_from_directory(directory='backups', path=filename, as_attachment=True)
+    # Backups hold every column, password hashes included
+
+    if not isinstance(current_user, Admin) or not current_user.is_superadmin:
+
+        abort(403)
+
+    return send_from_directory(directory=current_app.config['BACKUP_FOLDER'], path=filename, as_attachment=True)
 
 
 
@@ -6481,7 +6455,7 @@ def manage_courses():
 
     semesters = db.session.query(Course.semester).distinct().order_by(Course.semester).all()
 
-    years = db.session.query(Course.academic_year).distinct().order_by(Course.academic_year.desc()).all()
+    years = academic_years(descending=True)
 
 
 
@@ -6497,7 +6471,7 @@ def manage_courses():
 
         semesters=[s[0] for s in semesters if s[0]],
 
-        years=[y[0] for y in years if y[0]],
+        years=list(years),
 
         selected_programme=programme_filter,
 
@@ -6559,7 +6533,9 @@ def add_programme_course():
 
             credit_hours=form.credit_hours.data,
 
-            is_mandatory=form.is_mandatory.data
+            is_mandatory=form.is_mandatory.data,
+
+            capacity=form.capacity.data
 
         )
 
@@ -6813,7 +6789,7 @@ def manage_timetable():
 
 
 
-    courses = Course.query.all()
+    courses = all_courses()
 
     programmes = get_programme_choices()
 
@@ -6961,7 +6937,7 @@ def edit_timetable_entry(entry_id):
 
     entry = TimetableEntry.query.get_or_404(entry_id)
 
-    courses = Course.query.all()
+    courses = all_courses()
 
     programmes = get_programme_choices()
 
@@ -7939,6 +7915,8 @@ from sqlalchemy.exc import IntegrityError
 @login_required
 def approve_payment(txn_id):
     """Approve a fee payment and update student balance (robust tertiary version)."""
+    from utils.receipts import generate_receipt  # ReportLab is only loaded when a receipt is issued
+
     txn = StudentFeeTransaction.query.get_or_404(txn_id)
 
     if getattr(txn, 'is_approved', False):
@@ -8498,11 +8476,20 @@ def manage_admissions():
         'rejected': Application.query.filter_by(status='rejected').count()
     }
 
+    # Programmes offered to submitted applicants (batch approval filter)
+    programme_col = func.coalesce(Application.admitted_programme, Application.first_choice)
+    programmes = [
+        p for (p,) in db.session.query(programme_col)
+        .filter(Application.status == 'submitted', programme_col.isnot(None))
+        .distinct().order_by(programme_col)
+    ]
+
     return render_template(
         'admin/manage_admissions.html',
         applications=applications,
         status=status,
-        stats=stats
+        stats=stats,
+        programmes=programmes
     )
 
 
@@ -8571,10 +8558,10 @@ def update_application_status(app_id, new_status):
 
             photo_doc = next((doc for doc in application.documents if doc.document_type.lower() == 'photo'), None)
 
-            # Use uploaded photo filename if exists, else default filename
-            # Store only the filename (templates expect just the filename)
+            # Use uploaded photo if exists, else default filename
+            # Store the name relative to PROFILE_PICS_FOLDER (sharded for pipeline photos)
             if photo_doc:
-                profile_picture_filename = os.path.basename(photo_doc.file_path)
+                profile_picture_filename = ImagePipeline.from_static_path(photo_doc.file_path)
             else:
                 profile_picture_filename = 'default_avatar.png'
             profile_picture_path = profile_picture_filename
@@ -8593,6 +8580,7 @@ def update_application_status(app_id, new_status):
             new_user.set_password(temp_password)
             db.session.add(new_user)
             db.session.flush()
+            application.created_user_id = new_user.id
 
             # -------- CREATE STUDENT PROFILE (TERTIARY) --------
             # Map application's first_choice to tertiary programme
@@ -8682,7 +8670,9 @@ def update_application_status(app_id, new_status):
                     }
 
             # Send credentials with fees info
-            send_approval_credentials_email(application, username, student_id, temp_password, fees_info)
+            if send_approval_credentials_email(application, username, student_id, temp_password, fees_info):
+                application.credentials_sent_at = datetime.utcnow()
+                db.session.commit()
 
         # ================= REJECTED =================
         elif new_status == 'rejected':
@@ -8699,6 +8689,7 @@ def update_application_status(app_id, new_status):
                     if profile:
                         db.session.delete(profile)
                     db.session.delete(user)
+                    application.created_user_id = None
 
             db.session.commit()
             flash("Application rejected and student account removed.", "info")
@@ -8716,6 +8707,62 @@ def update_application_status(app_id, new_status):
     return redirect(url_for('admin.manage_admissions'))
 
 
+@admin_bp.route('/admissions/batch-approve', methods=['POST'])
+@login_required
+@require_admissions_admin
+def batch_approve_applications():
+    """Start a batch approval over filtered/selected applications (returns 202)."""
+    from services.admissions_batch_service import AdmissionsBatchService
+
+    data = request.get_json(silent=True) or request.form
+    statuses = data.get('statuses') or ['submitted']
+    application_ids = data.get('application_ids') or None
+    if isinstance(statuses, str):
+        statuses = [s for s in statuses.split(',') if s]
+    if isinstance(application_ids, str):
+        application_ids = [i for i in application_ids.split(',') if i.strip()]
+
+    try:
+        job_id = AdmissionsBatchService.start_job(
+            statuses=statuses,
+            programme=data.get('programme') or None,
+            application_ids=application_ids,
+            base_url=request.host_url,
+            requested_by=current_user.username
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('admin.batch_approve_status', job_id=job_id)
+    }), 202
+
+
+@admin_bp.route('/admissions/batch-approve/<job_id>')
+@login_required
+@require_admissions_admin
+def batch_approve_status(job_id):
+    """Progress and per-applicant results of a batch approval; ?since=<next> for new results only."""
+    from services.admissions_batch_service import AdmissionsBatchService
+
+    job = AdmissionsBatchService.get_job(job_id, since=request.args.get('since', 0, type=int))
+    if not job:
+        return jsonify({'success': False, 'error': 'Batch approval job not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'total': job['total'],
+        'processed': job['processed'],
+        'counts': job['counts'],
+        'error': job['error'],
+        'results': job['results'],
+        'next': job['next'],
+    })
+
+
 def assign_fees_to_student_tertiary(user, student_profile):
     """
     Assign fees to a newly admitted tertiary student.
@@ -8789,7 +8836,11 @@ def generate_admission_letter(application, student_user):
 
 
 @admin_bp.route('/vouchers', methods=['GET', 'POST'])
+@login_required
+@require_admissions_admin
 def manage_vouchers():
+    from services.voucher_service import VoucherService
+
     if request.method == 'POST':
         try:
             count = int(request.form.get('count', 1))
@@ -8805,21 +8856,93 @@ def manage_vouchers():
         else:
             amount = float(current_app.config.get('VOUCHER_DEFAULT_AMOUNT', 50.0))
 
-        vouchers = []
-        for _ in range(max(1, count)):
-            pin = f"{random.randint(100000, 999999)}"
-            serial = f"{random.randint(10000000, 99999999)}"
-            v = AdmissionVoucher(pin=pin, serial=serial, amount=amount)
-            db.session.add(v)
-            vouchers.append(v)
+        try:
+            batch, created = VoucherService.mint(count, amount)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.manage_vouchers'))
+
+        flash(f'Generated {created} voucher(s) in batch {batch}.', 'success')
+        return redirect(url_for('admin.manage_vouchers', batch=batch))
+
+    # Paginated listing; filters use the voucher indexes
+    state = request.args.get('state', '')
+    batch = request.args.get('batch', '').strip()
+    q = request.args.get('q', '').strip()
+
+    query = AdmissionVoucher.query
+    if state == 'unsold':
+        query = query.filter(AdmissionVoucher.is_used.is_(False), AdmissionVoucher.purchaser_email.is_(None))
+    elif state == 'sold':
+        query = query.filter(AdmissionVoucher.is_used.is_(False), AdmissionVoucher.purchaser_email.isnot(None))
+    elif state == 'used':
+        query = query.filter(AdmissionVoucher.is_used.is_(True))
+    if batch:
+        query = query.filter(AdmissionVoucher.batch == batch)
+    if q:
+        query = query.filter(
+            (AdmissionVoucher.pin == q) | (AdmissionVoucher.serial == q.upper())
+            | (AdmissionVoucher.purchaser_email == q)
+        )
 
-        db.session.commit()
-        flash(f'Generated {len(vouchers)} voucher(s).', 'success')
-        return redirect(url_for('admin.manage_vouchers'))
+    pagination = query.order_by(AdmissionVoucher.created_at.desc(), AdmissionVoucher.id.desc()).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=current_app.config.get('VOUCHERS_PER_PAGE', 50),
+        error_out=False
+    )
 
-    # Fetch all vouchers with related applicant info
-    vouchers = AdmissionVoucher.query.order_by(AdmissionVoucher.created_at.desc()).all()
-    return render_template('admin/vouchers.html', vouchers=vouchers)
+    batches = db.session.query(
+        AdmissionVoucher.batch,
+        func.count(AdmissionVoucher.id),
+        func.min(AdmissionVoucher.created_at),
+        func.min(AdmissionVoucher.amount)
+    ).filter(
+        AdmissionVoucher.batch.isnot(None)
+    ).group_by(AdmissionVoucher.batch).order_by(func.min(AdmissionVoucher.created_at).desc()).limit(10).all()
+
+    return render_template(
+        'admin/vouchers.html',
+        vouchers=pagination.items,
+        pagination=pagination,
+        batches=batches,
+        state=state,
+        batch=batch,
+        q=q
+    )
+
+
+@admin_bp.route('/vouchers/export/<batch>.csv')
+@login_required
+@require_admissions_admin
+def export_vouchers_csv(batch):
+    """Stream a minting batch as CSV."""
+    from services.voucher_service import VoucherService
+
+    return Response(
+        stream_with_context(VoucherService.iter_csv(batch)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=vouchers_{batch}.csv'}
+    )
+
+
+@admin_bp.route('/vouchers/export/<batch>.pdf')
+@login_required
+@require_admissions_admin
+def export_vouchers_pdf(batch):
+    """Printable sheet of voucher cards for a minting batch."""
+    from flask import send_file
+    from services.voucher_service import VoucherService
+
+    # Large batches spill to disk instead of holding the PDF in memory
+    out = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+    VoucherService.write_sheet(batch, out)
+    out.seek(0)
+    return send_file(
+        out,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'vouchers_{batch}.pdf'
+    )
 
 
 @admin_bp.route('/vouchers/create', methods=['GET', 'POST'])
@@ -8830,6 +8953,40 @@ def create_voucher():
     return render_template('admin/create_voucher.html')
 
 
+@admin_bp.route('/system/metrics', methods=['GET', 'POST'])
+@login_required
+@require_superadmin
+def system_metrics():
+    """Sampled per-endpoint timings and SQL stats; POST resets the counters"""
+    from utils.instrumentation import instrumentation
+    if request.method == 'POST':
+        instrumentation.reset()
+    return jsonify(instrumentation.snapshot())
+
+
+@admin_bp.route('/system/db-pool', methods=['GET', 'POST'])
+@login_required
+@require_superadmin
+def system_db_pool():
+    """Connection pool occupancy and checkout waits; POST resets the counters"""
+    from utils.db_pool import pool_metrics
+    if request.method == 'POST':
+        pool_metrics.reset()
+    return jsonify(pool_metrics.snapshot())
+
+
+@admin_bp.route('/system/memory-snapshot', methods=['POST'])
+@login_required
+@require_superadmin
+def system_memory_snapshot():
+    """Start tracemalloc, report top allocations, or stop tracing (?stop=1)"""
+    from utils.instrumentation import memory_snapshot
+    return jsonify(memory_snapshot(
+        limit=request.args.get('limit', 10, type=int),
+        stop=request.args.get('stop') == '1'
+    ))
+
+
 @admin_bp.route('/logout')
 @login_required
 def logout():
@@ -3,6 +3,7 @@ from flask import url_for
 from utils.extensions import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from services.image_pipeline import ImagePipeline
 
 class Applicant(db.Model, UserMixin):
     __tablename__ = 'applicant'
@@ -108,6 +109,10 @@ class Application(db.Model):
     admitted_semester = db.Column(db.String(10))
     admission_letter_generated = db.Column(db.Boolean, default=False)
     acceptance_letter_generated = db.Column(db.Boolean, default=False)
+    credentials_sent_at = db.Column(db.DateTime)  # NULL = login email still owed (see created_user_id)
+    # The student account this application's approval created; credentials
+    # are only ever (re-)issued to it, never to an account that existed before
+    created_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
 
     # -------------------
     # Relationships
@@ -127,7 +132,9 @@ class Application(db.Model):
         # Look for photo document in related documents
         for doc in self.documents:
             if doc.document_type == 'photo' and doc.file_path:
-                url = url_for('static', filename=doc.file_path)
+                # Card-sized derivative rather than the stored full size
+                stored = ImagePipeline.from_static_path(doc.file_path)
+                url = url_for('static', filename=ImagePipeline.static_path(stored, 'card'))
                 print(f"DEBUG: Found photo document, URL: {url}")
                 return url
         
@@ -148,6 +155,11 @@ class ApplicationDocument(db.Model):
 
 class AdmissionVoucher(db.Model):
     __tablename__ = 'admission_voucher'
+    __table_args__ = (
+        # Purchase takes the oldest unsold voucher; the admin list pages by date
+        db.Index('ix_admission_voucher_unsold', 'is_used', 'purchaser_email', 'created_at'),
+        db.Index('ix_admission_voucher_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     pin = db.Column(db.String(20), unique=True, nullable=False)
     serial = db.Column(db.String(20), unique=True, nullable=False)
@@ -158,6 +170,7 @@ class AdmissionVoucher(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     valid_until = db.Column(db.DateTime, nullable=True)
     purchaser_email = db.Column(db.String(120), nullable=True)
+    batch = db.Column(db.String(32), nullable=True, index=True)  # minting run, for sheet exports
 
     def mark_as_used(self, applicant_id):
         """Mark voucher as used by this applicant"""
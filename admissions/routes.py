@@ -2,7 +2,7 @@ from datetime import datetime
 from functools import wraps
 import json
 import logging
-import os, random, string
+import os, random
 from flask import (Blueprint, current_app, render_template, redirect, request, url_for, flash, session, make_response)
 from models import ProgrammeFeeStructure
 from utils.email import send_email, send_application_completed_email, send_email_verification
@@ -10,9 +10,10 @@ from utils.security import verify_email_code
 from flask_login import login_user
 from flask_mail import Message
 from werkzeug.utils import secure_filename
-from PIL import Image
 from utils.extensions import db
 from .models import AdmissionVoucher, Applicant, Application, ApplicationDocument, ApplicationPayment, ApplicationResult
+from services.image_pipeline import ImagePipeline, ImageRejected
+from services.voucher_service import VoucherService
 from .forms import (ApplicantRegistrationForm, ApplicantLoginForm, PersonalInfoForm, GuardianForm, ProgrammeChoiceForm, EducationForm, ExamInfoForm, ExamResultForm, PassportUploadForm, DeclarationForm, PurchaseVoucherForm, VoucherAuthenticationForm)
 from datetime import datetime, timedelta
 
@@ -225,10 +226,7 @@ def voucher_authentication():
     form = VoucherAuthenticationForm()
 
     if form.validate_on_submit():
-        pin = form.voucher_pin.data.strip()
-        serial = form.serial_number.data.strip()
-
-        voucher = AdmissionVoucher.query.filter_by(pin=pin, serial=serial).first()
+        voucher = VoucherService.lookup(form.voucher_pin.data, form.serial_number.data)
         if not voucher:
             flash("Invalid voucher PIN or Serial Number.", "danger")
             return redirect(url_for('admissions.voucher_authentication'))
@@ -285,10 +283,7 @@ def voucher_validate():
         return redirect(url_for('admissions.login'))
 
     if request.method == 'POST':
-        pin = request.form.get('pin')
-        serial = request.form.get('serial')
-
-        voucher = AdmissionVoucher.query.filter_by(pin=pin, serial=serial).first()
+        voucher = VoucherService.lookup(request.form.get('pin'), request.form.get('serial'))
         if not voucher:
             flash('Invalid voucher credentials.', 'danger')
             return redirect(url_for('admissions.voucher_validate'))
@@ -332,16 +327,15 @@ def purchase_voucher():
                 # Use pre-generated voucher
                 voucher.amount = amount  # update amount if needed
                 voucher.purchaser_email = email
-                pin = voucher.pin  # Voucher PIN (8 digits)
-                serial = voucher.serial  # Voucher serial (6 chars)
+                pin = voucher.pin
+                serial = voucher.serial
             else:
-                # 2️⃣ Generate a new voucher
-                pin = ''.join(random.choices(string.digits, k=8))  # Voucher PIN
-                serial = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))  # Voucher serial
+                # 2️⃣ Generate a new voucher (collision-checked random codes)
+                pin, serial = VoucherService.new_codes(1)[0]
 
                 voucher = AdmissionVoucher(
-                    pin=pin,  # 8-digit PIN
-                    serial=serial,  # 6-character serial
+                    pin=pin,
+                    serial=serial,
                     amount=amount,  # Voucher amount
                     purchaser_email=email,
                     valid_until=datetime.utcnow() + timedelta(days=180),  # 6 months validity
@@ -680,11 +674,6 @@ def exam_results():
     return render_template('admissions/exam_results.html', form=form, application=application)
 
 
-from PIL import Image
-from werkzeug.utils import secure_filename
-
-from PIL import Image
-from werkzeug.utils import secure_filename
 import colorsys
 import os
 
@@ -695,31 +684,23 @@ def passport_upload():
     error = None
     applicant_id = session['applicant_id']
 
-    # Directory where uploaded images are stored
-    upload_dir = os.path.join(
-        current_app.root_path,
-        'static', 'uploads', 'profile_pictures'
-    )
-    os.makedirs(upload_dir, exist_ok=True)
+    application = Application.query.filter_by(applicant_id=applicant_id).first()
 
-    # Check for existing passport image in folder
-    existing_files = [f for f in os.listdir(upload_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    existing_passport = existing_files[0] if existing_files else None
+    # Current passport comes from the application's documents, not the folder
+    photo_doc = ApplicationDocument.query.filter_by(
+        application_id=application.id,
+        document_type='photo'
+    ).first() if application else None
+    existing_passport = ImagePipeline.static_path(
+        ImagePipeline.from_static_path(photo_doc.file_path)
+    ) if photo_doc and photo_doc.file_path else None
 
     if form.validate_on_submit():
         passport = form.passport.data
-        filename = secure_filename(passport.filename)
-        temp_path = os.path.join(upload_dir, 'temp_' + filename)
-        passport.save(temp_path)
 
-        try:
-            img = Image.open(temp_path)
-            img = img.convert('RGB')
+        def require_white_background(img):
             width, height = img.size
 
-            if width == 0 or height == 0:
-                raise ValueError("Uploaded image is empty")
-
             # Sample pixels at 5x5 grid
             sample_points = [(min(int(width*i/4), width-1), min(int(height*j/4), height-1))
                              for i in range(5) for j in range(5)]
@@ -741,40 +722,32 @@ def passport_upload():
 
             white_count = sum(1 for px in sample_points if is_white_pixel(img.getpixel(px)))
 
-            if white_count / len(sample_points) >= 0.6:
-                # Create unique filename
-                ext = filename.rsplit('.', 1)[1].lower()
-                new_filename = f"applicant_{applicant_id}.{ext}"
-                final_path = os.path.join(upload_dir, new_filename)
-                os.rename(temp_path, final_path)
-
-                # Save to ApplicationDocument table
-                application = Application.query.filter_by(applicant_id=applicant_id).first()
-
-                # Remove old passport photo record if exists
-                ApplicationDocument.query.filter_by(
-                    application_id=application.id,
-                    document_type='photo'
-                ).delete()
-
-                doc = ApplicationDocument(
-                    application_id=application.id,
-                    document_type='photo',
-                    file_path=f"uploads/profile_pictures/{new_filename}"
-                )
-                db.session.add(doc)
-                db.session.commit()
-
-                return redirect(url_for('admissions.preview'))
-
-            else:
-                error = "Passport photo must have a plain WHITE background."
-                os.remove(temp_path)
+            if white_count / len(sample_points) < 0.6:
+                raise ImageRejected("Passport photo must have a plain WHITE background.")
 
+        try:
+            # Decoded once, normalised and stored as sized derivatives
+            stored_name = ImagePipeline.ingest(passport.stream, check=require_white_background)
+        except ImageRejected as e:
+            error = str(e)
         except Exception as e:
+            current_app.logger.error(f"Passport processing failed for applicant {applicant_id}: {e}")
             error = f"Error processing image: {str(e)}"
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        else:
+            # Replace the old passport photo record (and its files)
+            if photo_doc:
+                ImagePipeline.remove(ImagePipeline.from_static_path(photo_doc.file_path))
+                db.session.delete(photo_doc)
+
+            doc = ApplicationDocument(
+                application_id=application.id,
+                document_type='photo',
+                file_path=ImagePipeline.static_path(stored_name, 'full')
+            )
+            db.session.add(doc)
+            db.session.commit()
+
+            return redirect(url_for('admissions.preview'))
 
     return render_template(
         'admissions/passport.html',
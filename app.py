@@ -3,10 +3,11 @@
 import os
 import logging
 from datetime import datetime
-from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify, send_from_directory, current_app, g
+from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify, current_app, g
 from werkzeug.utils import secure_filename
 import time
 import signal
+import click
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -14,26 +15,33 @@ load_dotenv()
 
 # ===== Extensions & Config =====
 from flask_login import LoginManager, login_required, logout_user, current_user
-from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect, CSRFError, generate_csrf
 from utils.extensions import db, mail, socketio
 from config import Config
 
+# ===== Logging =====
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # ===== Flask App =====
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# True while the `flask` CLI is loading the app (not under gunicorn)
+RUNNING_FROM_CLI = click.get_current_context(silent=True) is not None
+
+# Pool sizing comes from the DB_POOL_* profile (see utils/db_pool.py);
+# `flask run` serves requests, other flask commands get the small cli pool
+from utils.db_pool import apply_pool_profile, pool_metrics
+apply_pool_profile(app, cli=RUNNING_FROM_CLI and click.get_current_context().info_name != 'run')
+
 # Initialize extensions ONCE
 db.init_app(app)
-migrate = Migrate(app, db)
+pool_metrics.init_app(app)
 mail.init_app(app)
 socketio.init_app(app, cors_allowed_origins="*", async_mode='threading')
 csrf = CSRFProtect(app)
 
-# ===== Logging =====
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # ===== Configuration =====
 # Check if we're in production (Render deployment)
 IS_PRODUCTION = bool(
@@ -48,7 +56,6 @@ logger.info(f"🌍 Environment: {'PRODUCTION (Render)' if IS_PRODUCTION else 'LO
 
 # ===== Memory Management =====
 import gc
-import psutil
 from threading import Thread
 import time
 
@@ -57,6 +64,7 @@ def monitor_memory_usage():
     if not IS_PRODUCTION:
         return  # Only run in production
     
+    import psutil
     process = psutil.Process()
     memory_limit_mb = app.config.get('MEMORY_LIMIT_MB', 512)
     
@@ -72,12 +80,9 @@ def monitor_memory_usage():
                     # Force garbage collection
                     gc.collect()
                     
-                    # Close idle database connections
-                    try:
-                        db.engine.dispose()
-                        logger.info("🗄️ Database connections cleaned up")
-                    except Exception as e:
-                        logger.error(f"Error cleaning up database connections: {e}")
+                    # The pool is bounded by its profile; disposing it would
+                    # only force reconnects on the next requests
+                    logger.info(f"🗄️ DB pool: {db.engine.pool.status()}")
                     
                     memory_after = process.memory_info().rss / 1024 / 1024
                     logger.info(f"✅ Memory after cleanup: {memory_after:.1f}MB")
@@ -100,10 +105,7 @@ if IS_PRODUCTION:
         logger.info("🔧 Memory monitoring temporarily disabled for testing")
         # monitor_memory_usage()
         
-        # Add memory leak detection
-        import tracemalloc
-        tracemalloc.start()
-        logger.info("🔍 Memory leak detection started")
+        # Memory snapshots are on demand now (see utils/instrumentation.py)
         
     except ImportError:
         logger.warning("⚠️ psutil not available - memory monitoring disabled")
@@ -113,75 +115,41 @@ if IS_PRODUCTION:
 # ===== Request Timeout Middleware =====
 @app.before_request
 def before_request():
-    """Monitor request start time and memory usage to prevent timeouts"""
-    g.start_time = time.time()
-    
-    # Check for existing long-running requests
-    elapsed = time.time() - g.start_time
-    if elapsed > 55:  # Kill requests after 55 seconds
-        logger.error(f"⏰ REQUEST TIMEOUT: {request.method} {request.path} after {elapsed:.2f}s - Terminating to prevent worker kill")
-        abort(408, "Request timeout - Please try again")
-    
-    # Log memory usage at start of each request
-    try:
-        import psutil
-        process = psutil.Process()
-        memory_mb = process.memory_info().rss / 1024 / 1024
-        logger.info(f"🔍 Request start: {request.method} {request.path} - Memory: {memory_mb:.1f}MB")
-    except ImportError:
-        pass
+    """Record request start time"""
+    g.start_time = time.perf_counter()
 
 @app.after_request  
 def after_request(response):
     """Check request duration and log slow requests"""
     if hasattr(g, 'start_time'):
-        duration = time.time() - g.start_time
+        duration = time.perf_counter() - g.start_time
         
         # Warn about slow requests
         if duration > 30:  # Warn for requests over 30 seconds
             logger.warning(f"🐌 SLOW REQUEST: {request.method} {request.path} took {duration:.2f}s - This may cause worker timeout!")
         elif duration > 10:  # Log requests taking longer than 10 seconds
             logger.warning(f"🐌 Slow request detected: {request.method} {request.path} took {duration:.2f}s")
-        
-        # Log memory usage at end of request
-        try:
-            import psutil
-            import tracemalloc
-            process = psutil.Process()
-            memory_mb = process.memory_info().rss / 1024 / 1024
-            
-            # Get memory snapshot if tracemalloc is running
-            snapshot_info = ""
-            if tracemalloc.is_tracing():
-                current, peak = tracemalloc.get_traced_memory()
-                snapshot_info = f" - Traced: {current/1024/1024:.1f}MB / {peak/1024/1024:.1f}MB"
-            
-            logger.info(f"✅ Request end: {request.method} {request.path} - Duration: {duration:.2f}s - Memory: {memory_mb:.1f}MB{snapshot_info}")
-            
-            # Log memory snapshots every 10 requests
-            if not hasattr(app, '_request_counter'):
-                app._request_counter = 0
-            app._request_counter += 1
-            
-            if app._request_counter % 10 == 0:
-                if tracemalloc.is_tracing():
-                    snapshot = tracemalloc.take_snapshot()
-                    top_stats = snapshot.statistics('lineno')[:5]
-                    logger.warning(f"🔍 Top 5 memory allocations after {app._request_counter} requests:")
-                    for i, stat in enumerate(top_stats, 1):
-                        logger.warning(f"  {i}. {stat}")
-                        
-        except ImportError:
-            pass
     
     return response
 
+# ===== Instrumentation (sampled timing, SQL stats; off unless enabled) =====
+from utils.instrumentation import instrumentation
+instrumentation.init_app(app)
+
+# ===== Query budgets / N+1 detection (development and tests) =====
+from utils.query_budget import query_budget
+query_budget.init_app(app)
+
+# ===== JSON compression, weak ETags and 304s (see utils/http_cache.py) =====
+from utils.http_cache import response_optimizer
+response_optimizer.init_app(app)
+
 # ===== Helper Function to Initialize Database =====
 def initialize_database():
     """
     Initialize database tables and create SuperAdmin
     This function can be called from multiple places:
-    1. Automatic initialization on app startup (production)
+    1. `flask --app app init-db` (deploy step; on startup only with DB_AUTO_INIT)
     2. Manual initialization via /init-db route
     3. Force initialization via /init-all-tables route
     """
@@ -340,9 +308,77 @@ def initialize_database():
         logger.error(traceback.format_exc())
         return False, error_msg
 
-# ===== Auto-Initialize Database on Startup (Production Only) =====
-if IS_PRODUCTION:
-    logger.info("🚀 Production environment detected - auto-initializing database...")
+# ===== Database Bootstrap CLI =====
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and the SuperAdmin (run once per deploy)."""
+    success, message = initialize_database()
+    if not success:
+        raise click.ClickException(message)
+    click.echo(message)
+
+@app.cli.command('recount-seats')
+def recount_seats_command():
+    """Resync Course.seats_taken from course registrations."""
+    from services.registration_service import RegistrationService
+    changed = RegistrationService.recount_seats()
+    click.echo(f"Seat counters updated for {changed} course(s)")
+
+@app.cli.command('jobs-worker')
+@click.option('--once', is_flag=True, help='Run the queued jobs, then exit.')
+def jobs_worker_command(once):
+    """Run queued background jobs (started by gunicorn.conf.py in production)."""
+    from services.job_queue import JobQueue
+    JobQueue.run_worker(app, once=once)
+
+@app.cli.command('backup')
+@click.option('--table', 'tables', multiple=True, help='Table to include (repeatable; default: all).')
+@click.option('--since', default=None, help='Incremental: only rows changed at/after this ISO timestamp.')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default='jsonl')
+@click.option('--compression', type=click.Choice(['gzip', 'zstd', 'none']), default=None)
+def backup_command(tables, since, fmt, compression):
+    """Write a compressed table backup set with a manifest."""
+    from utils.backup import BackupError, create_backup
+    try:
+        set_dir, manifest = create_backup(
+            backup_dir=app.config['BACKUP_FOLDER'],
+            tables=list(tables) or None,
+            since=datetime.fromisoformat(since) if since else None,
+            fmt=fmt,
+            compression=compression
+        )
+    except (BackupError, ValueError) as e:
+        raise click.ClickException(str(e))
+    total = sum(f['rows'] for f in manifest['files'])
+    click.echo(f"{set_dir}: {len(manifest['files'])} table(s), {total} row(s); next --since {manifest['until']}")
+
+@app.cli.command('restore')
+@click.argument('set_dir')
+@click.option('--table', 'tables', multiple=True, help='Table to restore (repeatable; default: all in the set).')
+@click.option('--chunk-size', type=int, default=None)
+@click.option('--dry-run', is_flag=True, help='Verify checksums and parse every row without writing.')
+def restore_command(set_dir, tables, chunk_size, dry_run):
+    """Verify a backup set and bulk-load it (upserting by primary key)."""
+    from utils.backup import BackupError, restore_backup
+    try:
+        restored = restore_backup(set_dir, tables=list(tables) or None, chunk_size=chunk_size, dry_run=dry_run)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    for table, count in restored.items():
+        click.echo(f"{table}: {count}")
+    click.echo(f"{'Checked' if dry_run else 'Restored'} {sum(restored.values())} row(s)")
+
+# Alembic is only needed for `flask db ...`; importing it costs ~0.2s per boot
+if RUNNING_FROM_CLI:
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
+
+# ===== Auto-Initialize Database on Startup (opt-in) =====
+# Bootstrapping is a deploy step (`flask --app app init-db`, see Procfile /
+# render.yaml). With gunicorn --preload it would also open connections in
+# the master that forked workers then inherit.
+if app.config.get('DB_AUTO_INIT') and not RUNNING_FROM_CLI:
+    logger.info("🚀 DB_AUTO_INIT set - initializing database on startup...")
     with app.app_context():
         success, message = initialize_database()
         if success:
@@ -350,10 +386,10 @@ if IS_PRODUCTION:
             logger.info("🔄 Database recreation triggered after truncate cascade")
         else:
             logger.error(f"⚠️ Auto-initialization failed: {message}")
-            logger.error("💡 You can manually initialize by visiting /init-db")
+            logger.error("💡 Run `flask --app app init-db` or visit /init-db")
+        db.engine.dispose()  # don't hand pooled connections to forked workers
 else:
-    logger.info("🏠 Local development environment - skipping auto-initialization")
-    logger.info("💡 Use /init-db route to initialize database manually")
+    logger.info("💡 Skipping startup DB initialization - use `flask --app app init-db` or /init-db")
 
 # ===== Eventlet Configuration =====
 try:
@@ -371,6 +407,22 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'admin.admin_login'
 
+# Principals are cached briefly across requests (see utils/identity_cache.py)
+from utils.identity_cache import init_identity_cache, load_identity
+init_identity_cache(app)
+
+# Courses, registration window and limits are shared (see utils/catalog_cache.py)
+from utils.catalog_cache import init_catalog_cache
+init_catalog_cache(app)
+
+# Per-class vclass calendar events (see services/calendar_feed_service.py)
+from services.calendar_feed_service import init_calendar_feed
+init_calendar_feed(app)
+
+# Class and exam timetable grids/PDFs (see services/timetable_render_service.py)
+from services.timetable_render_service import init_timetable_render
+init_timetable_render(app)
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -384,12 +436,12 @@ def load_user(user_id):
             # Extract public_id from "admin:public_id" format
             public_id = user_id.split(':', 1)[1]
             from models import Admin
-            return Admin.query.filter_by(public_id=public_id).first()
+            return load_identity(Admin, public_id)
         elif user_id.startswith('user:'):
             # Extract public_id from "user:public_id" format
             public_id = user_id.split(':', 1)[1]
             from models import User
-            return User.query.filter_by(public_id=public_id).first()
+            return load_identity(User, public_id)
         else:
             # Legacy numeric ID support
             from models import User
@@ -655,14 +707,15 @@ app.register_blueprint(admissions_bp, url_prefix='/admissions')
 logger.info("✅ All blueprints registered successfully")
 
 # ===== Static Files =====
+# Fingerprinted URLs, immutable caching and precompressed variants
+# (see utils/static_assets.py)
+from utils.static_assets import static_assets
+static_assets.init_app(app)
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     """Serve static files with proper headers"""
-    try:
-        return send_from_directory('static', filename)
-    except Exception as e:
-        logger.error(f"Static file error: {e}")
-        abort(404)
+    return static_assets.serve(filename)
 
 # ===== Error Handlers =====
 @app.errorhandler(404)
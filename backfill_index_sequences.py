@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Seed index_number_sequence counters from index numbers already issued.
+
+Run once after deploying the sequence-table allocator (and any time index
+numbers were imported outside the app). Counters only move forward.
+"""
+
+import os
+import sys
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models import IndexNumberSequence
+from utils.index_generator import backfill_index_sequences
+
+
+def main():
+    with app.app_context():
+        try:
+            IndexNumberSequence.__table__.create(db.engine, checkfirst=True)
+            counters = backfill_index_sequences()
+        except Exception as e:
+            print(f"❌ Backfill failed: {e}")
+            db.session.rollback()
+            return False
+
+        for (programme_code, year), last_serial in sorted(counters.items()):
+            print(f"  {programme_code}{year}: last serial {last_serial:03d}")
+        print(f"✅ {len(counters)} index number sequences seeded")
+    return True
+
+
+if __name__ == "__main__":
+    print("🔄 Backfilling index number sequences...")
+    if not main():
+        sys.exit(1)
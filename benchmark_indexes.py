@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot-lookup index pack (migration 4df1d6be4fbd).
+
+Seeds the affected tables in a scratch database, runs the lookups the app
+issues most often without the indexes, then again with them, and prints
+query plans and median timings side by side.
+
+Usage:
+    python benchmark_indexes.py                      # temporary SQLite file
+    python benchmark_indexes.py --rows 200000
+    python benchmark_indexes.py --database-url postgresql://.../scratch
+
+Only point --database-url at a scratch database: the benchmark creates,
+fills and finally drops the tables it uses (and the tables they reference
+by foreign key), and refuses to start if any of them already exist.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, func, insert, inspect, select, text
+
+import models  # noqa: F401  (registers the tables on db.metadata)
+from utils.extensions import db
+
+
+INDEX_NAMES = [
+    'ix_conversation_participant_user_public_id',
+    'ix_message_conversation_created',
+    'ix_message_sender_public_id',
+    'ix_notification_recipients_user_read',
+    'ix_student_course_grade_student_term',
+    'ix_student_course_registration_course_term',
+    'ix_quiz_programme',
+    'ix_student_fee_transaction_approved_ts',
+    'ix_student_fee_transaction_pending',
+    'ix_attendance_record_teacher_date',
+]
+
+T = db.metadata.tables
+TABLES = [
+    T['conversation_participant'], T['message'], T['notification_recipients'],
+    T['student_course_grade'], T['student_course_registration'], T['quiz'],
+    T['student_fee_transaction'], T['attendance_record'],
+]
+
+YEARS = ['2023/2024', '2024/2025', '2025/2026']
+PROGRAMMES = ['Nursing', 'Midwifery', 'Public Health', 'Pharmacy', 'Lab Science']
+
+
+def fk_closure(tables):
+    """`tables` plus every table they reference by foreign key, recursively."""
+    closure, pending = [], list(tables)
+    while pending:
+        table = pending.pop()
+        if table not in closure:
+            closure.append(table)
+            pending.extend(fk.column.table for fk in table.foreign_keys)
+    return closure
+
+
+def drop_foreign_keys(conn):
+    """
+    The seeded rows have no parent rows, so drop the benchmark tables'
+    foreign keys where the database enforces them (SQLite does not by
+    default). None of the benchmarked lookups depends on them.
+    """
+    if conn.dialect.name == 'sqlite':
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    drop = 'DROP FOREIGN KEY' if conn.dialect.name == 'mysql' else 'DROP CONSTRAINT'
+    inspector = inspect(conn)
+    for table in TABLES:
+        for fk in inspector.get_foreign_keys(table.name):
+            if fk.get('name'):
+                conn.exec_driver_sql(f"ALTER TABLE {quote(table.name)} {drop} {quote(fk['name'])}")
+
+
+def pack_indexes():
+    return [ix for table in TABLES for ix in table.indexes if ix.name in INDEX_NAMES]
+
+
+def seed(conn, rows, rng):
+    """Fill the benchmark tables with roughly `rows` rows each."""
+    students = max(rows // 20, 50)
+    public_ids = [str(uuid.uuid4()) for _ in range(students)]
+    user_ids = [f"STD{n:05d}" for n in range(students)]
+    conversations = max(rows // 10, 10)
+    now = datetime.utcnow()
+
+    def chunks(make):
+        batch = []
+        for i in range(rows):
+            batch.append(make(i))
+            if len(batch) == 5000:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    plans = [
+        (T['conversation_participant'], lambda i: {
+            'conversation_id': i % conversations,
+            'user_public_id': public_ids[(i // conversations) % students],
+            'user_role': 'student', 'is_group_admin': False, 'can_add_members': False,
+            'can_remove_members': False, 'can_rename_group': False}),
+        (T['message'], lambda i: {
+            'conversation_id': rng.randrange(conversations), 'sender_public_id': rng.choice(public_ids),
+            'sender_role': 'student', 'content': 'hello', 'is_deleted': False,
+            'created_at': now - timedelta(minutes=rng.randrange(500000))}),
+        (T['notification_recipients'], lambda i: {
+            'notification_id': i, 'user_id': rng.choice(user_ids), 'is_read': rng.random() < 0.8}),
+        (T['student_course_grade'], lambda i: {
+            'student_id': i % students, 'course_id': i // students,
+            'academic_year': rng.choice(YEARS), 'semester': rng.choice('12'),
+            'final_score': rng.uniform(40, 100)}),
+        (T['student_course_registration'], lambda i: {
+            'student_id': i % students, 'course_id': rng.randrange(400),
+            'academic_year': rng.choice(YEARS), 'semester': rng.choice('12')}),
+        (T['quiz'], lambda i: {
+            'course_id': rng.randrange(400), 'course_name': 'Course', 'title': f'Quiz {i}',
+            'programme_level': rng.choice(['100', '200', '300', '400']),
+            'programme_name': rng.choice(PROGRAMMES), 'date': date.today(), 'duration_minutes': 30,
+            'start_datetime': now, 'end_datetime': now, 'attempts_allowed': 1}),
+        (T['student_fee_transaction'], lambda i: {
+            'student_id': rng.randrange(students), 'academic_year': rng.choice(YEARS), 'semester': '1',
+            'amount': rng.uniform(100, 2000), 'description': 'Fees',
+            'timestamp': now - timedelta(hours=rng.randrange(20000)), 'is_approved': rng.random() < 0.95}),
+        (T['attendance_record'], lambda i: {
+            'student_id': rng.randrange(students), 'teacher_id': rng.randrange(60),
+            'date': date.today() - timedelta(days=rng.randrange(365)), 'is_present': rng.random() < 0.9}),
+    ]
+    for table, make in plans:
+        for batch in chunks(make):
+            conn.execute(insert(table), batch)
+    return public_ids, user_ids
+
+
+def lookups(public_ids, user_ids):
+    """(label, statement) pairs mirroring the app's hot queries."""
+    cp, msg, nr = T['conversation_participant'], T['message'], T['notification_recipients']
+    scg, scr, quiz = T['student_course_grade'], T['student_course_registration'], T['quiz']
+    fee, att = T['student_fee_transaction'], T['attendance_record']
+    pid, uid = public_ids[7], user_ids[7]
+    since = datetime.utcnow() - timedelta(days=30)
+
+    return [
+        ('my conversations', select(cp.c.conversation_id).where(cp.c.user_public_id == pid)),
+        ('conversation history', select(msg).where(msg.c.conversation_id == 3)
+            .order_by(msg.c.created_at.desc()).limit(50)),
+        ('messages by sender', select(func.count()).select_from(msg).where(msg.c.sender_public_id == pid)),
+        ('unread notifications', select(func.count()).select_from(nr)
+            .where(nr.c.user_id == uid, nr.c.is_read == False)),
+        ('semester grades', select(scg).where(
+            scg.c.student_id == 7, scg.c.academic_year == YEARS[-1], scg.c.semester == '1')),
+        ('class list size', select(func.count()).select_from(scr).where(
+            scr.c.course_id == 11, scr.c.academic_year == YEARS[-1], scr.c.semester == '1')),
+        ('programme quizzes', select(quiz.c.id, quiz.c.title).where(
+            quiz.c.programme_name == 'Nursing', quiz.c.programme_level == '200')),
+        ('monthly revenue', select(func.sum(fee.c.amount)).where(
+            fee.c.is_approved == True, fee.c.timestamp >= since)),
+        ('pending payments', select(fee).where(fee.c.is_approved == False)
+            .order_by(fee.c.timestamp.desc()).limit(50)),
+        ('attendance sheet', select(att).where(att.c.teacher_id == 5, att.c.date == date.today())),
+    ]
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(conn, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+        return " | ".join(r[-1] for r in rows)
+    if conn.dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql(f"EXPLAIN {sql}").all()
+        return " | ".join(r[0].strip() for r in rows[:3])
+    return "(plan not available for this dialect)"
+
+
+def measure(conn, queries, repeats):
+    results = {}
+    for label, stmt in queries:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            conn.execute(stmt).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = (statistics.median(timings), explain(conn, stmt))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    parser.add_argument('--rows', type=int, default=50000, help='Rows per table (default 50000)')
+    parser.add_argument('--repeats', type=int, default=15, help='Timed runs per query (default 15)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url:
+        run(args.database_url, args)
+    else:
+        with tempfile.TemporaryDirectory(prefix='index_bench_') as tmp_dir:
+            run(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}", args)
+
+
+def run(url, args):
+    engine = create_engine(url)
+    tables = fk_closure(TABLES)
+
+    existing = sorted(t.name for t in tables if inspect(engine).has_table(t.name))
+    if existing:
+        engine.dispose()
+        sys.exit(f"❌ Refusing to run: the database already has {', '.join(existing)}. "
+                 "Point --database-url at an empty scratch database.")
+
+    indexes = pack_indexes()
+    rng = random.Random(args.seed)
+
+    try:
+        db.metadata.create_all(engine, tables=tables)
+        with engine.begin() as conn:
+            drop_foreign_keys(conn)
+            for ix in indexes:
+                ix.drop(conn)
+
+        print(f"🌱 Seeding {args.rows} rows per table ({engine.dialect.name})...")
+        with engine.begin() as conn:
+            public_ids, user_ids = seed(conn, args.rows, rng)
+            conn.execute(text("ANALYZE"))
+
+        queries = lookups(public_ids, user_ids)
+        with engine.connect() as conn:
+            before = measure(conn, queries, args.repeats)
+
+        with engine.begin() as conn:
+            for ix in indexes:
+                ix.create(conn)
+            conn.execute(text("ANALYZE"))
+
+        with engine.connect() as conn:
+            after = measure(conn, queries, args.repeats)
+
+        print(f"\n{'query':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        print("-" * 58)
+        for label, _ in queries:
+            b, a = before[label][0], after[label][0]
+            print(f"{label:<24}{b:>12.3f}{a:>12.3f}{(b / a if a else 0):>9.1f}x")
+
+        print("\nPlans (before → after):")
+        for label, _ in queries:
+            print(f"\n  {label}")
+            print(f"    before: {before[label][1]}")
+            print(f"    after:  {after[label][1]}")
+    finally:
+        db.metadata.drop_all(engine, tables=tables, checkfirst=True)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Choose DB pool sizes for a given gunicorn worker/thread layout.
+
+Simulates one worker process: --threads request threads (plus --background
+threads doing non-request work on the same pool) each repeatedly
+check out a connection, run a query, hold the connection for --hold-ms
+(the DB part of a request) and then do --think-ms of non-DB work. Every
+candidate pool size is run for --duration seconds through the same
+engine options the app builds (utils/db_pool.py), and the script prints
+throughput, checkout wait percentiles and timeouts side by side.
+
+The recommendation is the smallest size whose p95 checkout wait is under
+--target-wait-ms and whose total across --workers processes
+(workers x (size + overflow)) fits --max-connections.
+
+Usage:
+    python benchmark_pool.py --threads 4 --background 2
+    python benchmark_pool.py --workers 2 --threads 8 --sizes 2,4,6,8,10 --max-overflow 2
+    python benchmark_pool.py --database-url postgresql://.../scratch --pgbouncer
+
+Without --database-url a temporary SQLite file is used (fine for the
+pooling behaviour, not for database-side latency). Point --database-url at
+a scratch or staging database, never production.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, exc, text
+
+from utils.db_pool import engine_options
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(database_url, options, threads, duration, hold_ms, think_ms):
+    """Hammer one engine; returns a dict of results."""
+    engine = create_engine(database_url, **options)
+    waits, timeouts, done = [], [0], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        local_waits, local_timeouts, local_done = [], 0, 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    local_waits.append((time.perf_counter() - started) * 1000)
+                    conn.execute(text('SELECT 1'))
+                    time.sleep(hold_ms / 1000)
+                local_done += 1
+            except exc.TimeoutError:
+                local_timeouts += 1
+            time.sleep(think_ms / 1000)
+        with lock:
+            waits.extend(local_waits)
+            timeouts[0] += local_timeouts
+            done[0] += local_done
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    engine.dispose()
+
+    return {
+        'requests_per_s': done[0] / duration,
+        'wait_p50_ms': percentile(waits, 50),
+        'wait_p95_ms': percentile(waits, 95),
+        'wait_max_ms': max(waits) if waits else 0.0,
+        'wait_avg_ms': statistics.fmean(waits) if waits else 0.0,
+        'timeouts': timeouts[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='database to benchmark (default: temporary SQLite file)')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn worker processes (default 1)')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker (default 4)')
+    parser.add_argument('--background', type=int, default=1, help='job threads sharing the pool (default 1)')
+    parser.add_argument('--sizes', default='1,2,3,5,8', help='pool sizes to try (default 1,2,3,5,8)')
+    parser.add_argument('--max-overflow', type=int, default=0, help='overflow used for every size (default 0)')
+    parser.add_argument('--pool-timeout', type=float, default=5, help='checkout timeout in seconds (default 5)')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per case (default 5)')
+    parser.add_argument('--hold-ms', type=float, default=20, help='connection held per request (default 20)')
+    parser.add_argument('--think-ms', type=float, default=30, help='non-DB time per request (default 30)')
+    parser.add_argument('--target-wait-ms', type=float, default=10, help='acceptable p95 checkout wait (default 10)')
+    parser.add_argument('--max-connections', type=int, default=97,
+                        help='connections the database allows this app (default 97)')
+    parser.add_argument('--pgbouncer', action='store_true', help='also measure NullPool (PgBouncer mode)')
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix='pool-bench-')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    threads = args.threads + args.background
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    base = {'SQLALCHEMY_DATABASE_URI': database_url}
+
+    print(f"\n{args.workers} worker(s) x {threads} threads "
+          f"({args.threads} request + {args.background} background), "
+          f"hold {args.hold_ms:.0f}ms, think {args.think_ms:.0f}ms, {args.duration:.0f}s per case\n")
+    print(f"{'pool':>10} {'conns':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'timeouts':>9}")
+
+    results = []
+    for size in sizes:
+        _, options = engine_options({
+            **base,
+            'DB_POOL_SIZE': size,
+            'DB_MAX_OVERFLOW': args.max_overflow,
+        }, 'web')
+        options['pool_timeout'] = args.pool_timeout
+        result = run_case(database_url, options, threads, args.duration, args.hold_ms, args.think_ms)
+        total = args.workers * (size + args.max_overflow)
+        results.append((size, total, result))
+        print(f"{size:>10} {total:>6} {result['requests_per_s']:>8.1f} {result['wait_p50_ms']:>8.1f} "
+              f"{result['wait_p95_ms']:>8.1f} {result['wait_max_ms']:>8.1f} {result['timeouts']:>9}")
+
+    if args.pgbouncer:
+        _, options = engine_options({**base, 'DB_PGBOUNCER': True}, 'web')
+        result = run_case(database_url, options, threads, args.duration, args.hold_ms, args.think_ms)
+        print(f"{'NullPool':>10} {'-':>6} {result['requests_per_s']:>8.1f} {result['wait_p50_ms']:>8.1f} "
+              f"{result['wait_p95_ms']:>8.1f} {result['wait_max_ms']:>8.1f} {result['timeouts']:>9}")
+
+    fitting = [
+        (size, total) for size, total, r in results
+        if r['wait_p95_ms'] <= args.target_wait_ms and not r['timeouts'] and total <= args.max_connections
+    ]
+    print()
+    if fitting:
+        size, total = fitting[0]
+        print(f"✅ Recommended: DB_POOL_SIZE={size} DB_MAX_OVERFLOW={args.max_overflow} "
+              f"({total} connections across {args.workers} worker(s))")
+    else:
+        print(f"❌ No size met p95 wait <= {args.target_wait_ms:.0f}ms within {args.max_connections} connections; "
+              f"try larger --sizes, fewer threads or --pgbouncer")
+
+    if tmpdir:
+        try:
+            os.remove(os.path.join(tmpdir, 'bench.db'))
+            os.rmdir(tmpdir)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ from flask_socketio import emit, join_room
 from utils.extensions import db, socketio
 from models import Conversation, ConversationParticipant, Message, MessageReaction, User, Admin, StudentProfile, TeacherProfile
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from utils.http_cache import versioned
 import json
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
@@ -225,8 +228,39 @@ def chat_home():
     
     return render_template('chat.html')
 
+def _conversations_version():
+    """
+    Cheap version token for the conversation list: one aggregate query over
+    the user's conversations, their participants and messages (new, edited
+    or deleted) plus the user's own read markers.
+    """
+    if not is_user_or_admin():
+        return None
+    me = ConversationParticipant.user_public_id == current_user.public_id
+    own = aliased(ConversationParticipant)
+    mine = db.session.query(own.conversation_id).filter(
+        own.user_public_id == current_user.public_id
+    ).scalar_subquery()
+    in_mine = Message.conversation_id.in_(mine)
+
+    def scalar(*columns, where):
+        return db.session.query(*columns).filter(where).scalar_subquery()
+
+    return db.session.query(
+        scalar(func.count(ConversationParticipant.id), where=me),
+        scalar(func.max(ConversationParticipant.last_read_at), where=me),
+        scalar(func.count(ConversationParticipant.id), where=ConversationParticipant.conversation_id.in_(mine)),
+        scalar(func.max(Conversation.updated_at), where=Conversation.id.in_(mine)),
+        scalar(func.count(Message.id), where=in_mine),
+        scalar(func.max(Message.id), where=in_mine),
+        scalar(func.max(Message.edited_at), where=in_mine),
+        scalar(func.max(Message.deleted_at), where=in_mine),
+    ).one()
+
+
 @chat_bp.route('/conversations', methods=['GET'])
 @login_required
+@versioned(_conversations_version)
 def get_conversations():
     """Get all conversations for the current user."""
     if not is_user_or_admin():
@@ -21,16 +21,10 @@ class Config:
         SQLALCHEMY_DATABASE_URI = "sqlite:///instance/lms.db"
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
-    # Aggressive connection pool settings for production (prevent memory issues)
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_size": 3,         # Further reduced from 5
-        "pool_recycle": 120,    # Further reduced from 180 (2 minutes)
-        "pool_pre_ping": True,
-        "max_overflow": 5,       # Further reduced from 10
-        "pool_timeout": 30,     # Add timeout for getting connections
-        "pool_reset_on_return": "commit"  # Reset connections on return
-    }
+
+    # Built from the DB_POOL_* profile below (see utils/db_pool.py); keys
+    # set here override the profile
+    SQLALCHEMY_ENGINE_OPTIONS = {}
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB uploads
 
@@ -49,6 +43,15 @@ class Config:
     # ADMISSIONS
     # ------------------------------------------------------
     VOUCHER_DEFAULT_AMOUNT = 220.0
+    # Batch approval: applications per transaction, password-hashing threads
+    ADMISSIONS_BATCH_CHUNK_SIZE = int(os.environ.get("ADMISSIONS_BATCH_CHUNK_SIZE", 50))
+    ADMISSIONS_BATCH_HASH_WORKERS = int(os.environ.get("ADMISSIONS_BATCH_HASH_WORKERS", 4))
+    # Voucher minting (see services/voucher_service.py)
+    VOUCHER_PIN_LENGTH = int(os.environ.get("VOUCHER_PIN_LENGTH", 10))
+    VOUCHER_SERIAL_LENGTH = int(os.environ.get("VOUCHER_SERIAL_LENGTH", 10))
+    VOUCHER_MINT_CHUNK_SIZE = int(os.environ.get("VOUCHER_MINT_CHUNK_SIZE", 1000))
+    VOUCHER_MAX_PER_REQUEST = int(os.environ.get("VOUCHER_MAX_PER_REQUEST", 20000))
+    VOUCHERS_PER_PAGE = 50
 
     # ------------------------------------------------------
     # FILE UPLOADS
@@ -66,6 +69,191 @@ class Config:
         BASE_DIR, "static", "uploads", "profile_pictures"
     )
 
+    # ------------------------------------------------------
+    # BACKUPS (see utils/backup.py)
+    # ------------------------------------------------------
+    BACKUP_FOLDER = os.path.join(BASE_DIR, "backups")
+    # gzip (stdlib), zstd (needs the zstandard package) or none
+    BACKUP_COMPRESSION = os.environ.get("BACKUP_COMPRESSION", "gzip")
+    # Rows fetched per round trip when exporting, rows per executemany on restore
+    BACKUP_CHUNK_SIZE = int(os.environ.get("BACKUP_CHUNK_SIZE", 1000))
+    BACKUP_RESTORE_CHUNK_SIZE = int(os.environ.get("BACKUP_RESTORE_CHUNK_SIZE", 1000))
+    # Questions per executemany when importing a quiz file (services/quiz_interchange.py)
+    QUIZ_IMPORT_CHUNK_SIZE = int(os.environ.get("QUIZ_IMPORT_CHUNK_SIZE", 500))
+
+    # ------------------------------------------------------
+    # PHOTO INGESTION (see services/image_pipeline.py)
+    # ------------------------------------------------------
+    # Longest edge in pixels of each derivative written for an upload
+    IMAGE_DERIVATIVE_SIZES = {"thumb": 128, "card": 400, "full": 1024}
+    IMAGE_WEBP_QUALITY = int(os.environ.get("IMAGE_WEBP_QUALITY", 80))
+    IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 85))
+    # Refuse uploads above this many pixels before decoding them
+    IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 50_000_000))
+
+    # ------------------------------------------------------
+    # MEDIA DELIVERY (see utils/media.py)
+    # ------------------------------------------------------
+    # "" serves file bodies from the app (sendfile where the server supports
+    # it); "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd) hands them to
+    # the front proxy
+    MEDIA_ACCEL_MODE = os.environ.get("MEDIA_ACCEL_MODE", "").strip().lower()
+    # nginx `internal` location that maps onto MEDIA_ACCEL_ROOT
+    MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+    MEDIA_ACCEL_ROOT = os.environ.get("MEDIA_ACCEL_ROOT", os.path.join(BASE_DIR, "uploads"))
+    # Uploaded materials are stored under unique names, so they cache well
+    MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+    # ------------------------------------------------------
+    # JSON RESPONSES (see utils/http_cache.py)
+    # ------------------------------------------------------
+    # Weak ETags / 304s for JSON GETs and compression of larger bodies
+    RESPONSE_COMPRESSION_ENABLED = os.environ.get("RESPONSE_COMPRESSION_ENABLED", "1") == "1"
+    RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+    RESPONSE_COMPRESSION_LEVEL = int(os.environ.get("RESPONSE_COMPRESSION_LEVEL", 6))
+    # Only used when the optional brotli package is installed
+    RESPONSE_BROTLI_QUALITY = int(os.environ.get("RESPONSE_BROTLI_QUALITY", 5))
+    RESPONSE_COMPRESSION_MIMETYPES = ("application/json",)
+
+    # ------------------------------------------------------
+    # STATIC ASSETS (see utils/static_assets.py)
+    # ------------------------------------------------------
+    # Fingerprint static files at startup and cache them for a year
+    # (always off in debug)
+    STATIC_FINGERPRINT = os.environ.get("STATIC_FINGERPRINT", "1") == "1"
+    # User uploads live under static/ but change at runtime
+    STATIC_FINGERPRINT_EXCLUDE = ("uploads", "payments")
+    # Cache lifetime for anything not fingerprinted
+    STATIC_DEFAULT_MAX_AGE = int(os.environ.get("STATIC_DEFAULT_MAX_AGE", 0))
+    # Generated .gz/.br variants
+    STATIC_COMPRESSED_FOLDER = os.environ.get(
+        "STATIC_COMPRESSED_FOLDER", os.path.join(BASE_DIR, "instance", "static-compressed")
+    )
+
+    # ------------------------------------------------------
+    # VIDEO PREPARATION (see services/video_pipeline.py)
+    # ------------------------------------------------------
+    # Needs ffmpeg on PATH (or FFMPEG_BINARY); silently off without it
+    VIDEO_PIPELINE_ENABLED = os.environ.get("VIDEO_PIPELINE_ENABLED", "1") == "1"
+    FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+    FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+    # Encoder threads per job; jobs run one at a time
+    VIDEO_FFMPEG_THREADS = int(os.environ.get("VIDEO_FFMPEG_THREADS", 1))
+    VIDEO_PIPELINE_TIMEOUT = int(os.environ.get("VIDEO_PIPELINE_TIMEOUT", 3600))
+
+    # ------------------------------------------------------
+    # BACKGROUND JOBS (see services/job_queue.py)
+    # ------------------------------------------------------
+    # Run by `flask jobs-worker`; gunicorn.conf.py starts one next to the
+    # web server unless JOB_WORKER_EMBEDDED=0 (job output folders must be
+    # reachable from both processes)
+    JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 2))
+    # Seconds between progress writes to the job row
+    JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", 2))
+    # A running job without progress for this long is requeued (its worker died)
+    JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", 900))
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+    # Finished jobs and their output files are deleted after this
+    JOB_RETENTION_HOURS = int(os.environ.get("JOB_RETENTION_HOURS", 6))
+
+    # ------------------------------------------------------
+    # BATCH EXPORTS (class-wide result slips / transcripts)
+    # ------------------------------------------------------
+    BATCH_EXPORT_FOLDER = os.path.join(BASE_DIR, "exports")
+    # Render processes forked by the job worker; 0 renders inline
+    BATCH_EXPORT_WORKERS = int(os.environ.get("BATCH_EXPORT_WORKERS", 2))
+    # Students loaded per grades query
+    BATCH_EXPORT_CHUNK_SIZE = int(os.environ.get("BATCH_EXPORT_CHUNK_SIZE", 200))
+
+    # ------------------------------------------------------
+    # ATTENDANCE
+    # ------------------------------------------------------
+    # Students dropping below this percentage get an attendance warning
+    ATTENDANCE_WARNING_THRESHOLD = float(os.environ.get("ATTENDANCE_WARNING_THRESHOLD", 75))
+
+    # ------------------------------------------------------
+    # REQUEST INSTRUMENTATION (see utils/instrumentation.py)
+    # ------------------------------------------------------
+    INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "").lower() in ("1", "true", "yes")
+    # Fraction of requests timed when enabled
+    INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get("INSTRUMENTATION_SAMPLE_RATE", 0.1))
+
+    # ------------------------------------------------------
+    # QUERY BUDGETS / N+1 DETECTION (see utils/query_budget.py)
+    # ------------------------------------------------------
+    QUERY_BUDGET_ENABLED = os.environ.get("QUERY_BUDGET_ENABLED", "").lower() in ("1", "true", "yes")
+    # Fail the request instead of logging when a budget is exceeded (tests)
+    QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "").lower() in ("1", "true", "yes")
+    QUERY_BUDGET_DEFAULT = int(os.environ.get("QUERY_BUDGET_DEFAULT", 50))
+    # Per-endpoint overrides, e.g. {'chat.get_conversations': 10}
+    QUERY_BUDGETS = {}
+    # Same statement shape this many times in one request is reported as N+1
+    QUERY_NPLUSONE_THRESHOLD = int(os.environ.get("QUERY_NPLUSONE_THRESHOLD", 5))
+
+    # ------------------------------------------------------
+    # DATABASE POOL (see utils/db_pool.py)
+    # ------------------------------------------------------
+    # web | worker | cli; empty picks cli under the flask CLI, web otherwise
+    DB_POOL_PROFILE = os.environ.get("DB_POOL_PROFILE", "")
+    # Per-value overrides of the profile (empty keeps the profile default).
+    # Size with benchmark_pool.py; workers x (size + overflow) must fit
+    # the database's max_connections
+    DB_POOL_SIZE = os.environ.get("DB_POOL_SIZE", "")
+    DB_MAX_OVERFLOW = os.environ.get("DB_MAX_OVERFLOW", "")
+    DB_POOL_TIMEOUT = os.environ.get("DB_POOL_TIMEOUT", "")
+    DB_POOL_RECYCLE = os.environ.get("DB_POOL_RECYCLE", "")
+    # Behind PgBouncer in transaction mode: NullPool, no prepared statements
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")
+    # Log checkouts that waited longer than this
+    DB_POOL_SLOW_CHECKOUT_MS = int(os.environ.get("DB_POOL_SLOW_CHECKOUT_MS", 500))
+
+    # ------------------------------------------------------
+    # STARTUP
+    # ------------------------------------------------------
+    # Create tables / SuperAdmin while importing the app. Off by default:
+    # bootstrap is a deploy step (`flask --app app init-db`)
+    DB_AUTO_INIT = os.environ.get("DB_AUTO_INIT", "").lower() in ("1", "true", "yes")
+
+    # ------------------------------------------------------
+    # IDENTITY CACHE (see utils/identity_cache.py)
+    # ------------------------------------------------------
+    # Seconds a logged-in principal is reused without a query; 0 disables
+    IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 60))
+
+    # ------------------------------------------------------
+    # COURSE CATALOG CACHE (see utils/catalog_cache.py)
+    # ------------------------------------------------------
+    # Upper bound in seconds on staleness for course/limit edits made by
+    # other processes (edits in this process invalidate at once); 0 disables
+    CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", 300))
+
+    # ------------------------------------------------------
+    # VCLASS CALENDAR FEED (see services/calendar_feed_service.py)
+    # ------------------------------------------------------
+    # Per-class event snapshots are dropped on quiz/assignment/calendar
+    # commits; the TTL bounds staleness for edits from other processes
+    CALENDAR_FEED_TTL = int(os.environ.get("CALENDAR_FEED_TTL", 600))
+    # Range served when the client sends no end, and the widest allowed
+    CALENDAR_FEED_DEFAULT_DAYS = int(os.environ.get("CALENDAR_FEED_DEFAULT_DAYS", 220))
+    CALENDAR_FEED_MAX_DAYS = int(os.environ.get("CALENDAR_FEED_MAX_DAYS", 400))
+
+    # ------------------------------------------------------
+    # TIMETABLE RENDERING (see services/timetable_render_service.py)
+    # ------------------------------------------------------
+    # Grids, exam layouts and PDFs are dropped on timetable commits; the TTL
+    # bounds staleness for edits from other processes
+    TIMETABLE_RENDER_TTL = int(os.environ.get("TIMETABLE_RENDER_TTL", 900))
+    # Rendered class and exam timetable PDFs kept in memory (LRU)
+    TIMETABLE_PDF_CACHE_SIZE = int(os.environ.get("TIMETABLE_PDF_CACHE_SIZE", 256))
+
+    # ------------------------------------------------------
+    # PAYMENT RECEIPTS (see services/receipt_service.py)
+    # ------------------------------------------------------
+    # Finance batches (receipt_batch jobs, written to BATCH_EXPORT_FOLDER):
+    # widest date range and transactions loaded per query
+    RECEIPT_BATCH_MAX_DAYS = int(os.environ.get("RECEIPT_BATCH_MAX_DAYS", 31))
+    RECEIPT_BATCH_CHUNK_SIZE = int(os.environ.get("RECEIPT_BATCH_CHUNK_SIZE", 200))
+
     # ------------------------------------------------------
     # EMAIL CONFIGURATION (BREVO HTTPS API)
     # ------------------------------------------------------
@@ -3,15 +3,17 @@ FINANCE ADMIN DASHBOARD ROUTE
 Displays financial data: payments, fees, student balances
 """
 
-from flask import Blueprint, render_template, request, jsonify, abort, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, abort, flash, redirect, url_for, send_file
 from flask_login import login_required, current_user
 from models import Admin, StudentFeeBalance, StudentFeeTransaction, ProgrammeFeeStructure, StudentProfile, User, AcademicYear, TeacherProfile
 from utils.extensions import db
 from functools import wraps
+from utils.http_cache import versioned
 from datetime import datetime, timedelta
 from admissions.forms import CERTIFICATE_PROGRAMMES, DIPLOMA_PROGRAMMES, STUDY_FORMATS
 import logging
 import json
+import os
 from werkzeug.security import generate_password_hash
 
 logger = logging.getLogger(__name__)
@@ -738,13 +740,106 @@ def reports():
         abort(500)
 
 
+@finance_bp.route('/receipts/batch', methods=['POST'])
+@login_required
+@require_finance_admin
+def receipt_batch():
+    """
+    Queue the receipts of every approved payment in a date range, as one PDF
+    or a ZIP, for the job worker (returns 202).
+
+    Params: start, end (YYYY-MM-DD, default today), format (pdf|zip)
+    """
+    from services.receipt_service import ReceiptService
+
+    data = request.get_json(silent=True) or request.form
+    try:
+        today = datetime.utcnow().date()
+        start = datetime.strptime(data['start'], '%Y-%m-%d').date() if data.get('start') else today
+        end = datetime.strptime(data['end'], '%Y-%m-%d').date() if data.get('end') else start
+        job_id = ReceiptService.start_batch(
+            start, end, data.get('format', 'pdf'), requested_by=current_user.username
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('finance.receipt_batch_status', job_id=job_id)
+    }), 202
+
+
+@finance_bp.route('/receipts/batch/<job_id>')
+@login_required
+@require_finance_admin
+def receipt_batch_status(job_id):
+    """Progress of a receipt batch job (polled by the reports page)."""
+    from services.receipt_service import ReceiptService
+
+    job = ReceiptService.get_batch(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Receipt batch not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'done': job['done'],
+        'total': job['total'],
+        'error': job['error'],
+        'download_url': (
+            url_for('finance.receipt_batch_download', job_id=job_id)
+            if job['status'] == 'completed' else None
+        )
+    })
+
+
+@finance_bp.route('/receipts/batch/<job_id>/download')
+@login_required
+@require_finance_admin
+def receipt_batch_download(job_id):
+    """Stream the finished batch from disk."""
+    from services.receipt_service import ReceiptService
+
+    job = ReceiptService.get_batch(job_id)
+    if not job or job['status'] != 'completed' or not job['path'] or not os.path.exists(job['path']):
+        abort(404)
+
+    return send_file(
+        job['path'],
+        as_attachment=True,
+        download_name=job['filename'],
+        mimetype='application/pdf' if job['params'].get('format') == 'pdf' else 'application/zip'
+    )
+
+
 # ============================================================
 # API ENDPOINTS FOR REPORT DATA
 # ============================================================
 
+def _reports_version():
+    """
+    Version token for the report APIs: transaction and balance aggregates
+    plus today's date (reports are relative to "today").
+    """
+    txn = db.session.query(
+        db.func.count(StudentFeeTransaction.id),
+        db.func.max(StudentFeeTransaction.id),
+        db.func.sum(db.case((StudentFeeTransaction.is_approved == True, 1), else_=0)),
+        db.func.sum(StudentFeeTransaction.amount),
+    ).one()
+    balances = db.session.query(
+        db.func.count(StudentFeeBalance.id),
+        db.func.sum(StudentFeeBalance.amount_due),
+        db.func.sum(StudentFeeBalance.amount_paid),
+    ).one()
+    return (datetime.utcnow().date(), tuple(txn), tuple(balances))
+
+
 @finance_bp.route('/api/reports/daily', methods=['GET'])
 @login_required
 @require_finance_admin
+@versioned(_reports_version)
 def api_daily_report():
     """API endpoint for daily report data"""
     try:
@@ -775,6 +870,7 @@ def api_daily_report():
 @finance_bp.route('/api/reports/weekly', methods=['GET'])
 @login_required
 @require_finance_admin
+@versioned(_reports_version)
 def api_weekly_report():
     """API endpoint for weekly report data"""
     try:
@@ -803,6 +899,7 @@ def api_weekly_report():
 @finance_bp.route('/api/reports/monthly', methods=['GET'])
 @login_required
 @require_finance_admin
+@versioned(_reports_version)
 def api_monthly_report():
     """API endpoint for monthly report data"""
     try:
@@ -830,6 +927,7 @@ def api_monthly_report():
 @finance_bp.route('/api/reports/transactions', methods=['GET'])
 @login_required
 @require_finance_admin
+@versioned(_reports_version)
 def api_transactions():
     """API endpoint for transactions data"""
     try:
@@ -505,6 +505,7 @@ class CourseForm(FlaskForm):
     credit_hours = IntegerField('Credit Hours', validators=[DataRequired()])
     academic_year = StringField('Academic Year', validators=[DataRequired()])
     is_mandatory = BooleanField('Mandatory?')
+    capacity = IntegerField('Seat Capacity', validators=[Optional(), NumberRange(min=1)])
     submit = SubmitField('Save Course')
 
 class CourseLimitForm(FlaskForm):
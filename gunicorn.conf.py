@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+"""
+Gunicorn hooks (loaded automatically from the working directory).
+
+Command-line flags in Procfile / render.yaml still set the server options;
+this file only keeps a `flask jobs-worker` process (services/job_queue.py)
+running beside the web server. It is started by the master, so it lives
+through web worker recycles (--max-requests) and shares the web server's
+disk, which job outputs (export ZIPs, backups) are written to.
+
+Set JOB_WORKER_EMBEDDED=0 when the worker runs as its own process instead.
+"""
+
+import os
+import subprocess
+import sys
+
+_job_worker = None
+
+
+def _embedded():
+    return os.environ.get("JOB_WORKER_EMBEDDED", "1") == "1"
+
+
+def _start_job_worker(server):
+    global _job_worker
+    env = dict(os.environ, DB_POOL_PROFILE=os.environ.get("DB_POOL_PROFILE") or "worker")
+    _job_worker = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "jobs-worker"],
+        cwd=server.cfg.chdir, env=env
+    )
+    server.log.info("Started job worker (pid %s)", _job_worker.pid)
+
+
+def when_ready(server):
+    if _embedded():
+        _start_job_worker(server)
+
+
+def pre_fork(server, worker):
+    # Runs on every web worker (re)start: bring the job worker back if it exited
+    if _embedded() and _job_worker is not None and _job_worker.poll() is not None:
+        server.log.warning("Job worker exited with %s; restarting", _job_worker.returncode)
+        _start_job_worker(server)
+
+
+def on_exit(server):
+    if _job_worker is not None and _job_worker.poll() is None:
+        _job_worker.terminate()
+        try:
+            _job_worker.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            _job_worker.kill()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Load test for course registration at window-open.
+
+Seeds --students students and a class of --courses courses (the first
+--capped of them limited to --capacity seats), then releases every student
+at once (a threading.Event gate stands in for the registration window opening).
+Each student registers for all courses through RegistrationService.apply().
+In a second wave registered students drop courses (half of them freeing a
+capped seat) while the students who were shut out retry for the freed
+seats, exercising the add/remove diff under contention.
+
+Checks, exiting with status 1 if any fails:
+
+  * no course has more registrations than capacity
+  * every Course.seats_taken equals its registration count
+  * no student holds a partial registration from a failed attempt
+  * p95 latency per wave stays under --max-p95-ms
+
+Usage:
+    python loadtest_registration.py
+    python loadtest_registration.py --students 400 --threads 32 --capacity 50
+    python loadtest_registration.py --database-url postgresql://.../scratch
+
+Without --database-url a temporary SQLite file is used (SQLite serialises
+writers, so it proves correctness but not Postgres row-lock latency). Point
+--database-url at a scratch database, never production: the tables are
+created and the seeded rows are deleted afterwards.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import func, insert, select
+
+from benchmark_pool import percentile
+from models import Course, CourseLimit, StudentCourseRegistration, User
+from services.registration_service import RegistrationError, RegistrationService
+from utils.db_pool import engine_options
+from utils.extensions import db
+
+YEAR = 'LT/2099'
+SEMESTER = 'First'
+PROGRAMME = 'Load Test Programme'
+
+
+def make_app(database_url, pool_size):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    _, options = engine_options({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'DB_POOL_SIZE': pool_size,
+        'DB_MAX_OVERFLOW': 0,
+        'DB_POOL_TIMEOUT': 60,
+    }, 'web')
+    if database_url.startswith('sqlite'):
+        # Let writers wait for the database lock instead of failing
+        options['connect_args'] = {'timeout': 60, 'check_same_thread': False}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+    return app
+
+
+def seed(args):
+    tables = [User.__table__, Course.__table__, CourseLimit.__table__, StudentCourseRegistration.__table__]
+    db.metadata.create_all(db.engine, tables=tables)
+    cleanup()
+
+    db.session.execute(insert(User), [
+        {
+            'user_id': f"LT{i:05d}", 'username': f"lt{i}@loadtest.invalid",
+            'first_name': 'Load', 'last_name': f"Student{i}", 'role': 'student',
+            'password_hash': 'x',
+        }
+        for i in range(args.students)
+    ])
+    db.session.execute(insert(Course), [
+        {
+            'name': f"Load Test Course {i}", 'code': f"LT{i:03d}", 'programme_name': PROGRAMME,
+            'programme_level': '100', 'semester': SEMESTER, 'academic_year': YEAR,
+            'credit_hours': 3, 'is_mandatory': False,
+            'capacity': args.capacity if i < args.capped else None, 'seats_taken': 0,
+        }
+        for i in range(args.courses)
+    ])
+    db.session.commit()
+
+    students = list(db.session.scalars(select(User.id).where(User.user_id.like('LT%')).order_by(User.id)))
+    courses = {c.id: c for c in Course.query.filter_by(academic_year=YEAR)}
+    for course in courses.values():
+        db.session.expunge(course)
+    return students, courses
+
+
+def cleanup():
+    course_ids = select(Course.id).where(Course.academic_year == YEAR)
+    StudentCourseRegistration.query.filter(StudentCourseRegistration.course_id.in_(course_ids)).delete(
+        synchronize_session=False)
+    Course.query.filter_by(academic_year=YEAR).delete()
+    User.query.filter(User.user_id.like('LT%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def run_wave(app, students, selection_for, courses, threads):
+    """All students submit at once; returns (latencies_ms, outcomes)."""
+    window_open = threading.Event()
+    latencies, outcomes = [], {'ok': 0, 'full': 0, 'conflict': 0, 'error': 0}
+    lock = threading.Lock()
+
+    def submit(student_id):
+        with app.app_context():
+            window_open.wait()
+            started = time.perf_counter()
+            try:
+                RegistrationService.apply(student_id, YEAR, SEMESTER, selection_for(student_id), offered=courses)
+                outcome = 'ok'
+            except RegistrationError as e:
+                outcome = 'full' if e.full_courses else 'conflict'
+            except Exception as e:
+                print(f"  ! student {student_id}: {e}")
+                outcome = 'error'
+            finally:
+                db.session.remove()
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(submit, s) for s in students]
+        time.sleep(0.2)  # let every thread reach the gate
+        window_open.set()
+        for future in futures:
+            future.result()
+    return latencies, outcomes
+
+
+def report(name, latencies, outcomes, wall):
+    p95 = percentile(latencies, 95)
+    print(f"{name:>8}: {len(latencies)} submissions in {wall:.2f}s  "
+          f"p50 {percentile(latencies, 50):.1f}ms  p95 {p95:.1f}ms  max {max(latencies):.1f}ms  "
+          f"mean {statistics.fmean(latencies):.1f}ms  {outcomes}")
+    return p95
+
+
+def verify(students, courses, valid_selections):
+    """Returns a list of failure messages."""
+    failures = []
+    counts = dict(db.session.execute(
+        select(StudentCourseRegistration.course_id, func.count())
+        .where(StudentCourseRegistration.course_id.in_(courses))
+        .group_by(StudentCourseRegistration.course_id)
+    ).all())
+
+    for course in Course.query.filter(Course.id.in_(courses)).order_by(Course.id):
+        taken = counts.get(course.id, 0)
+        cap = course.capacity if course.capacity is not None else '∞'
+        print(f"  {course.code}: capacity {cap:>4}  registrations {taken:>4}  seats_taken {course.seats_taken:>4}")
+        if course.capacity is not None and taken > course.capacity:
+            failures.append(f"{course.code} overbooked: {taken} > {course.capacity}")
+        if course.seats_taken != taken:
+            failures.append(f"{course.code} counter drift: seats_taken {course.seats_taken} != {taken}")
+
+    # All-or-nothing: each student holds exactly one of the selections they
+    # submitted (or nothing), never part of one
+    per_student = {}
+    for student_id, course_id in db.session.execute(
+        select(StudentCourseRegistration.student_id, StudentCourseRegistration.course_id)
+        .where(StudentCourseRegistration.course_id.in_(courses))
+    ):
+        per_student.setdefault(student_id, set()).add(course_id)
+    partial = [s for s in students if per_student.get(s, set()) not in valid_selections]
+    if partial:
+        failures.append(f"{len(partial)} student(s) hold a partial registration")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='scratch database (default: temporary SQLite file)')
+    parser.add_argument('--students', type=int, default=200, help='students submitting (default 200)')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent submissions (default 16)')
+    parser.add_argument('--courses', type=int, default=6, help='courses in the class (default 6)')
+    parser.add_argument('--capped', type=int, default=2, help='courses with a seat limit (default 2)')
+    parser.add_argument('--capacity', type=int, default=40, help='seats per capped course (default 40)')
+    parser.add_argument('--max-p95-ms', type=float, default=1000, help='p95 latency target per wave (default 1000)')
+    parser.add_argument('--keep', action='store_true', help='keep the seeded rows')
+    args = parser.parse_args()
+    if not 1 <= args.capped < args.courses:
+        parser.error('--capped must be at least 1 and leave at least one uncapped course')
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix='reg-loadtest-')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'loadtest.db')}"
+
+    app = make_app(database_url, args.threads)
+    failed = False
+    with app.app_context():
+        students, courses = seed(args)
+        all_ids = sorted(courses)
+        capped = sorted(cid for cid, c in courses.items() if c.capacity is not None)
+        uncapped = sorted(cid for cid, c in courses.items() if c.capacity is None)
+
+        # Wave 2: registered students drop an uncapped course, every other
+        # one also giving up a seat in the first capped course; students shut
+        # out in wave 1 retry for just that course, racing for the freed seats
+        keep_capped = [c for c in all_ids if c != uncapped[0]]
+        drop_capped = [c for c in keep_capped if c != capped[0]]
+        retry = [capped[0]] + uncapped[1:]
+        valid_selections = [set(), set(all_ids), set(keep_capped), set(drop_capped), set(retry)]
+        print(f"\n{len(students)} students, {args.threads} threads, {len(courses)} courses "
+              f"({args.capped} capped at {args.capacity} seats)\n")
+
+        try:
+            # Wave 1: window opens, everyone wants everything
+            started = time.perf_counter()
+            lat, out = run_wave(app, students, lambda s: all_ids, courses, args.threads)
+            p95_open = report('open', lat, out, time.perf_counter() - started)
+
+            registered = set(db.session.scalars(
+                select(StudentCourseRegistration.student_id).distinct()
+                .where(StudentCourseRegistration.course_id.in_(all_ids))
+            ))
+            wave2, i = {}, 0
+            for student_id in students:
+                if student_id in registered:
+                    wave2[student_id] = drop_capped if i % 2 == 0 else keep_capped
+                    i += 1
+                else:
+                    wave2[student_id] = retry
+
+            started = time.perf_counter()
+            lat, out = run_wave(app, students, wave2.get, courses, args.threads)
+            p95_change = report('change', lat, out, time.perf_counter() - started)
+
+            print()
+            failures = verify(students, courses, valid_selections)
+            for name, p95 in (('open', p95_open), ('change', p95_change)):
+                if p95 > args.max_p95_ms:
+                    failures.append(f"{name} wave p95 {p95:.0f}ms over target {args.max_p95_ms:.0f}ms")
+
+            print()
+            for failure in failures:
+                print(f"❌ {failure}")
+            if not failures:
+                print("✅ No overbooking, counters consistent, latency within target")
+            failed = bool(failures)
+        finally:
+            if not args.keep:
+                cleanup()
+        db.engine.dispose()
+
+    if tmpdir:
+        try:
+            os.remove(os.path.join(tmpdir, 'loadtest.db'))
+            os.rmdir(tmpdir)
+        except OSError:
+            pass
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Add indexes for hot lookup columns
+
+Revision ID: 4df1d6be4fbd
+Revises: 6fad53d0af2b
+Create Date: 2026-10-19 14:03:27.540118
+
+user.public_id and admin.public_id (load_user) are already covered by
+their unique constraints, so they are not indexed again here.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4df1d6be4fbd'
+down_revision = '6fad53d0af2b'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_conversation_participant_user_public_id', 'conversation_participant', ['user_public_id']),
+    ('ix_message_conversation_created', 'message', ['conversation_id', 'created_at']),
+    ('ix_message_sender_public_id', 'message', ['sender_public_id']),
+    ('ix_notification_recipients_user_read', 'notification_recipients', ['user_id', 'is_read']),
+    ('ix_student_course_grade_student_term', 'student_course_grade', ['student_id', 'academic_year', 'semester']),
+    ('ix_student_course_registration_course_term', 'student_course_registration', ['course_id', 'academic_year', 'semester']),
+    ('ix_quiz_programme', 'quiz', ['programme_name', 'programme_level']),
+    ('ix_student_fee_transaction_approved_ts', 'student_fee_transaction', ['is_approved', 'timestamp']),
+    ('ix_attendance_record_teacher_date', 'attendance_record', ['teacher_id', 'date']),
+]
+
+
+def upgrade():
+    # Databases bootstrapped with db.create_all() may already have these
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+    # Pending-approval queue: only unapproved rows are indexed
+    op.create_index(
+        'ix_student_fee_transaction_pending', 'student_fee_transaction', ['timestamp'],
+        unique=False, if_not_exists=True,
+        postgresql_where=sa.text('is_approved = false'),
+        sqlite_where=sa.text('is_approved = 0'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_student_fee_transaction_pending', table_name='student_fee_transaction', if_exists=True)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
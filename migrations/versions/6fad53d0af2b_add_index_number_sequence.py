@@ -0,0 +1,53 @@
+"""Add index_number_sequence counter table
+
+Revision ID: 6fad53d0af2b
+Revises: 0528bde5114b
+Create Date: 2026-10-19 09:12:41.118203
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6fad53d0af2b'
+down_revision = '0528bde5114b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sequence = op.create_table(
+        'index_number_sequence',
+        sa.Column('programme_code', sa.String(length=2), nullable=False),
+        sa.Column('year', sa.String(length=2), nullable=False),
+        sa.Column('last_serial', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('programme_code', 'year')
+    )
+
+    # Seed counters from index numbers already issued (PPYYSSS)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT index_number FROM student_profile "
+        "WHERE index_number IS NOT NULL AND length(index_number) = 7"
+    ))
+    counters = {}
+    for (index_number,) in rows:
+        if not index_number.isdigit():
+            continue
+        key = (index_number[0:2], index_number[2:4])
+        counters[key] = max(counters.get(key, 0), int(index_number[4:7]))
+
+    if counters:
+        now = datetime.utcnow()
+        op.bulk_insert(sequence, [
+            {'programme_code': code, 'year': year, 'last_serial': serial, 'updated_at': now}
+            for (code, year), serial in counters.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('index_number_sequence')
@@ -0,0 +1,34 @@
+"""Add video preparation columns to course_material
+
+Revision ID: 9c1e5a7b3d20
+Revises: 4df1d6be4fbd
+Create Date: 2026-10-19 16:41:09.402518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1e5a7b3d20'
+down_revision = '4df1d6be4fbd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course_material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('video_status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('video_renditions', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('poster_filename', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('video_error', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('video_processed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('course_material', schema=None) as batch_op:
+        batch_op.drop_column('video_processed_at')
+        batch_op.drop_column('video_error')
+        batch_op.drop_column('poster_filename')
+        batch_op.drop_column('video_renditions')
+        batch_op.drop_column('video_status')
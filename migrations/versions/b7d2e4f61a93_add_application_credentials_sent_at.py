@@ -0,0 +1,40 @@
+"""Add credentials_sent_at to application
+
+Revision ID: b7d2e4f61a93
+Revises: 9c1e5a7b3d20
+Create Date: 2026-10-19 18:02:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f61a93'
+down_revision = '9c1e5a7b3d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('credentials_sent_at', sa.DateTime(), nullable=True))
+
+    # Applications approved before this column existed already had their
+    # credentials emailed; only NULL on an approved row means "pending"
+    application = sa.table(
+        'application',
+        sa.column('status', sa.String),
+        sa.column('submitted_at', sa.DateTime),
+        sa.column('credentials_sent_at', sa.DateTime),
+    )
+    op.execute(
+        application.update()
+        .where(application.c.status == 'approved')
+        .values(credentials_sent_at=sa.func.coalesce(application.c.submitted_at, sa.func.current_timestamp()))
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.drop_column('credentials_sent_at')
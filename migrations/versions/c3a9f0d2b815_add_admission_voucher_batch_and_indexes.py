@@ -0,0 +1,32 @@
+"""Add admission_voucher batch column and lookup indexes
+
+Revision ID: c3a9f0d2b815
+Revises: b7d2e4f61a93
+Create Date: 2026-10-19 19:14:05.562190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9f0d2b815'
+down_revision = 'b7d2e4f61a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('admission_voucher', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('batch', sa.String(length=32), nullable=True))
+        batch_op.create_index(batch_op.f('ix_admission_voucher_batch'), ['batch'], unique=False)
+        batch_op.create_index('ix_admission_voucher_unsold', ['is_used', 'purchaser_email', 'created_at'], unique=False)
+        batch_op.create_index('ix_admission_voucher_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('admission_voucher', schema=None) as batch_op:
+        batch_op.drop_index('ix_admission_voucher_created_at')
+        batch_op.drop_index('ix_admission_voucher_unsold')
+        batch_op.drop_index(batch_op.f('ix_admission_voucher_batch'))
+        batch_op.drop_column('batch')
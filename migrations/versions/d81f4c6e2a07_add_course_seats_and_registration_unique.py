@@ -0,0 +1,57 @@
+"""Add course seat capacity/counter and unique course registrations
+
+Revision ID: d81f4c6e2a07
+Revises: c3a9f0d2b815
+Create Date: 2026-10-19 20:03:31.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4c6e2a07'
+down_revision = 'c3a9f0d2b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('seats_taken', sa.Integer(), nullable=False, server_default='0'))
+
+    # Drop duplicate registrations (keep the oldest) before the unique constraint
+    op.execute("""
+        DELETE FROM student_course_registration
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id
+                FROM student_course_registration
+                GROUP BY student_id, course_id, academic_year, semester
+            ) AS keep
+        )
+    """)
+
+    with op.batch_alter_table('student_course_registration', schema=None) as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_student_course_registration',
+            ['student_id', 'course_id', 'academic_year', 'semester']
+        )
+
+    # Seed the seat counters from existing registrations
+    op.execute("""
+        UPDATE course SET seats_taken = (
+            SELECT COUNT(*) FROM student_course_registration r
+            WHERE r.course_id = course.id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('student_course_registration', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_student_course_registration', type_='unique')
+
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_column('seats_taken')
+        batch_op.drop_column('capacity')
@@ -0,0 +1,32 @@
+"""Add created_user_id to application
+
+Revision ID: f2c8d5a1b764
+Revises: e4b7a2c9d153
+Create Date: 2026-10-19 22:51:06.207931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d5a1b764'
+down_revision = 'e4b7a2c9d153'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not backfilled: for existing approvals it is unknown whether the
+    # account predates the application, so batch runs leave them alone
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_application_created_user_id', 'user', ['created_user_id'], ['id'], ondelete='SET NULL'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('application', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_application_created_user_id', type_='foreignkey')
+        batch_op.drop_column('created_user_id')
@@ -28,6 +28,8 @@ from sqlalchemy.ext.hybrid import hybrid_property
 
 from utils.extensions import db
 
+from services.image_pipeline import ImagePipeline
+
 
 
 
@@ -646,7 +648,24 @@ class Admin(db.Model, UserMixin):
 
             filename = self.profile_picture.replace('static/', '').replace('uploads/profile_pictures/', '')
 
-            return url_for('static', filename=f'uploads/profile_pictures/{filename}')
+            return url_for('static', filename=ImagePipeline.static_path(filename, 'card'))
+
+        return url_for('static', filename='img/default_profile.png')
+
+
+    @property
+
+    def profile_thumbnail_url(self) -> str:
+
+        """Thumbnail-sized profile picture (navigation bars, lists)"""
+
+        from flask import url_for
+
+        if self.profile_picture:
+
+            filename = self.profile_picture.replace('static/', '').replace('uploads/profile_pictures/', '')
+
+            return url_for('static', filename=ImagePipeline.static_path(filename, 'thumb'))
 
         return url_for('static', filename='img/default_profile.png')
 
@@ -1438,9 +1457,9 @@ class User(db.Model, UserMixin):   # <-- add UserMixin here
 
     # PROFILE PICTURE URL
 
-    @property
+    def profile_picture_variant_url(self, size='card'):
 
-    def profile_picture_url(self):
+        """URL of a derivative size (thumb / card / full) of the profile picture"""
 
         if self.profile_picture:
 
@@ -1452,12 +1471,28 @@ class User(db.Model, UserMixin):   # <-- add UserMixin here
 
             filename = filename.strip('/')
 
-            return url_for('static', filename='uploads/profile_pictures/' + filename)
+            return url_for('static', filename=ImagePipeline.static_path(filename, size))
 
         return url_for('static', filename='img/default_profile.png')
 
 
 
+    @property
+
+    def profile_picture_url(self):
+
+        return self.profile_picture_variant_url('card')
+
+
+
+    @property
+
+    def profile_thumbnail_url(self):
+
+        return self.profile_picture_variant_url('thumb')
+
+
+
     # UNIQUE ID
 
     @property
@@ -1818,7 +1853,76 @@ class StudentProfile(db.Model):
 
         return None
 
-    
+
+
+class IndexNumberSequence(db.Model):
+
+    """
+
+    Last issued index-number serial per (programme_code, year).
+
+    Allocation increments `last_serial` atomically (UPDATE ... RETURNING or a
+
+    row lock), so concurrent approvals never receive the same serial.
+
+    See utils/index_generator.py.
+
+    """
+
+    __tablename__ = 'index_number_sequence'
+
+    programme_code = db.Column(db.String(2), primary_key=True)
+
+    year = db.Column(db.String(2), primary_key=True)
+
+    last_serial = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+
+    def __repr__(self):
+
+        return f"<IndexNumberSequence {self.programme_code}{self.year}: {self.last_serial}>"
+
+
+
+class BackgroundJob(db.Model):
+    """
+    A long-running job (batch export, batch approval, ...) run by the job
+    worker process rather than a web request. Status and progress live
+    here so they survive web worker restarts; see services/job_queue.py.
+    """
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / completed / failed
+    params = db.Column(db.Text, nullable=True)    # JSON
+    progress = db.Column(db.Text, nullable=True)  # JSON, kind-specific
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    # Output file (deleted with the job) and its download name
+    path = db.Column(db.String(500), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    requested_by = db.Column(db.String(120), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # The worker claims the oldest queued job of any kind
+        db.Index('ix_background_job_status_created', 'status', 'created_at'),
+        db.Index('ix_background_job_kind_status', 'kind', 'status'),
+    )
+
+    def __repr__(self):
+        return f"<BackgroundJob {self.id} {self.kind} {self.status}>"
+
+
 
 class TeacherProfile(db.Model):
 
@@ -1970,6 +2074,24 @@ class StudentFeeTransaction(db.Model):
 
     reviewer = db.relationship('Admin', backref='approved_payments', foreign_keys=[reviewed_by_admin_id])
 
+
+
+    __table_args__ = (
+
+        # Revenue reports filter approved payments by date
+
+        db.Index('ix_student_fee_transaction_approved_ts', 'is_approved', 'timestamp'),
+
+        # Pending-approval queue (partial where the database supports it)
+
+        db.Index('ix_student_fee_transaction_pending', 'timestamp',
+
+                 postgresql_where=db.text('is_approved = false'),
+
+                 sqlite_where=db.text('is_approved = 0')),
+
+    )
+
         
 
 class StudentFeeBalance(db.Model):
@@ -2112,6 +2234,14 @@ class Quiz(db.Model):
 
 
 
+    __table_args__ = (
+
+        db.Index('ix_quiz_programme', 'programme_name', 'programme_level'),
+
+    )
+
+
+
     @property
 
     def max_score(self):
@@ -2680,6 +2810,10 @@ class StudentCourseGrade(db.Model):
 
                           name='uq_student_course_grade'),
 
+        # Semester result / transcript lookups (no course_id in the filter)
+
+        db.Index('ix_student_course_grade_student_term', 'student_id', 'academic_year', 'semester'),
+
     )
 
     
@@ -2718,7 +2852,40 @@ class CourseMaterial(db.Model):
 
 
 
-from sqlalchemy.sql import func
+    # Video preparation (services/video_pipeline.py); NULL for non-video files
+
+    video_status = db.Column(db.String(20), nullable=True)   # pending / processing / ready / failed
+
+    # JSON list of {"label", "height", "bitrate", "filename"}, best quality first
+
+    video_renditions = db.Column(db.Text, nullable=True)
+
+    poster_filename = db.Column(db.String(200), nullable=True)
+
+    video_error = db.Column(db.Text, nullable=True)
+
+    video_processed_at = db.Column(db.DateTime, nullable=True)
+
+
+
+    @property
+
+    def renditions(self):
+
+        """Prepared renditions as a list of dicts (empty until the pipeline has run)."""
+
+        if not self.video_renditions:
+
+            return []
+
+        try:
+
+            return json.loads(self.video_renditions)
+
+        except (TypeError, ValueError):
+
+            return []
+
 
 
 
@@ -2735,15 +2902,15 @@ class Course(db.Model):
     is_mandatory = db.Column(db.Boolean, default=False)
     registration_start = db.Column(db.DateTime)
     registration_end = db.Column(db.DateTime)
+    # Seat limit (NULL = unlimited); seats_taken is kept by RegistrationService
+    capacity = db.Column(db.Integer, nullable=True)
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @classmethod
     def get_registration_window(cls):
-        """Return a tuple (start, end) of the global registration window."""
-        result = db.session.query(
-            func.min(cls.registration_start),
-            func.max(cls.registration_end)
-        ).one()
-        return result  # (start_datetime, end_datetime)
+        """Return a tuple (start, end) of the global registration window (cached, see utils/catalog_cache.py)."""
+        from utils.catalog_cache import registration_window
+        return registration_window()  # (start_datetime, end_datetime)
 
     @classmethod
     def set_registration_window(cls, start_dt, end_dt):
@@ -2777,6 +2944,14 @@ class StudentCourseRegistration(db.Model):
     course = db.relationship('Course', backref='registrations')
     student = db.relationship('User', backref='registered_courses')
 
+    __table_args__ = (
+        # Class lists and capacity counts per course and term
+        db.Index('ix_student_course_registration_course_term', 'course_id', 'academic_year', 'semester'),
+        # A double submit cannot register (and count) the same course twice
+        db.UniqueConstraint('student_id', 'course_id', 'academic_year', 'semester',
+                            name='uq_student_course_registration'),
+    )
+
 
 class SemesterResultRelease(db.Model):
     """Track when results are released/locked for a semester"""
@@ -2900,6 +3075,10 @@ class AttendanceRecord(db.Model):
     teacher = db.relationship('TeacherProfile')
     course = db.relationship('Course')
 
+    __table_args__ = (
+        db.Index('ix_attendance_record_teacher_date', 'teacher_id', 'date'),
+    )
+
 
 class AcademicCalendar(db.Model):
 
@@ -3322,6 +3501,16 @@ class NotificationRecipient(db.Model):
 
 
 
+    __table_args__ = (
+
+        # Unread badge counts and inbox listing
+
+        db.Index('ix_notification_recipients_user_read', 'user_id', 'is_read'),
+
+    )
+
+
+
 class NotificationPreference(db.Model):
 
     """User notification preferences and settings"""
@@ -3538,7 +3727,15 @@ class ConversationParticipant(db.Model):
 
 
 
-    __table_args__ = (db.UniqueConstraint("conversation_id", "user_public_id", "user_role", name="uq_conv_user_role_pub"),)
+    __table_args__ = (
+
+        db.UniqueConstraint("conversation_id", "user_public_id", "user_role", name="uq_conv_user_role_pub"),
+
+        # "my conversations" lookups filter on the participant alone
+
+        db.Index("ix_conversation_participant_user_public_id", "user_public_id"),
+
+    )
 
 
 
@@ -3588,6 +3785,18 @@ class Message(db.Model):
 
 
 
+    __table_args__ = (
+
+        # Conversation history / last message, newest first
+
+        db.Index("ix_message_conversation_created", "conversation_id", "created_at"),
+
+        db.Index("ix_message_sender_public_id", "sender_public_id"),
+
+    )
+
+
+
     def to_dict(self):
 
         sender_name = None
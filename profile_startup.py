@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup profile for `import app` (what every gunicorn boot pays).
+
+Imports the app in fresh interpreters, prints the median wall time and the
+slowest imports from `python -X importtime`, and checks the boot targets:
+
+  * `import app` finishes within --max-boot-ms (median of --runs)
+  * none of the LAZY_MODULES (PDF/image/QR libraries, browsers, Alembic,
+    psutil) is imported at boot; they load on first use
+
+Exits with status 1 if a target is missed, so it can gate CI or a deploy.
+
+Usage:
+    python profile_startup.py
+    python profile_startup.py --runs 5 --top 30 --max-boot-ms 1200
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Must not be imported by `import app`
+LAZY_MODULES = [
+    'reportlab', 'PIL', 'qrcode', 'fpdf', 'playwright', 'imgkit',
+    'alembic', 'flask_migrate', 'psutil',
+]
+
+DEFAULT_MAX_BOOT_MS = 1500
+
+TIMED_IMPORT = (
+    "import time; t0 = time.perf_counter(); import app; "
+    "print(round((time.perf_counter() - t0) * 1000, 1))"
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def child_env():
+    env = dict(os.environ)
+    # Profile the boot itself, not a database bootstrap
+    env['DB_AUTO_INIT'] = '0'
+    return env
+
+
+def boot_times(runs):
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', TIMED_IMPORT],
+            cwd=PROJECT_DIR, env=child_env(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            sys.exit(f"import app failed:\n{result.stderr[-2000:]}")
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def import_profile():
+    """[(module, self_us, cumulative_us, depth)] from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=PROJECT_DIR, env=child_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters to time (default 3)')
+    parser.add_argument('--top', type=int, default=20, help='slowest imports to list (default 20)')
+    parser.add_argument('--max-boot-ms', type=float, default=DEFAULT_MAX_BOOT_MS,
+                        help=f'boot time target in ms (default {DEFAULT_MAX_BOOT_MS})')
+    args = parser.parse_args()
+
+    rows = import_profile()
+    imported = {module for module, _, _, _ in rows}
+
+    print("\nSlowest top-level imports (cumulative, -X importtime):")
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)
+    for module, _, cumulative_us, _ in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+    print("\nSlowest modules (self time):")
+    for module, self_us, _, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {module}")
+
+    times = boot_times(args.runs)
+    median = statistics.median(times)
+    print(f"\nimport app: median {median:.0f} ms over {len(times)} runs "
+          f"({', '.join(f'{t:.0f}' for t in times)}); target {args.max_boot_ms:.0f} ms")
+
+    eager = [name for name in LAZY_MODULES if name in imported]
+    failed = False
+    if median > args.max_boot_ms:
+        print(f"❌ Boot time over target by {median - args.max_boot_ms:.0f} ms")
+        failed = True
+    if eager:
+        print(f"❌ Imported at boot but should load on first use: {', '.join(eager)}")
+        failed = True
+    if not failed:
+        print("✅ Startup targets met")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
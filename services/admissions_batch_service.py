@@ -0,0 +1,676 @@
+# services/admissions_batch_service.py
+"""
+Batch approval of admission applications.
+
+Approving one application at a time costs a dozen queries, a password hash
+and a synchronous Brevo call per applicant; an intake of several hundred
+took the admissions office an afternoon of clicking. A batch job approves a
+filtered set of applications in chunks instead:
+
+  * usernames, student IDs and index numbers for a chunk are allocated
+    together (one uniqueness query per kind, one counter reservation per
+    programme via generate_index_numbers)
+  * users, profiles and fee balances are written with bulk INSERTs and the
+    chunk is committed as one transaction
+  * a delivery thread issues the credentials of each committed chunk
+    (temporary passwords hashed in a small thread pool, outside the GIL)
+    and emails them while the next chunk is being approved
+
+Application.created_user_id records the account an approval created and
+Application.credentials_sent_at is set only once its email is delivered,
+so an approved application with created_user_id set and
+credentials_sent_at NULL means "credentials still owed". Those rows are
+the outbox: the delivery queue only carries application ids, and a fresh
+temporary password is generated at delivery time, so nothing is lost when
+the worker stops. Jobs are therefore idempotent and resumable; re-running
+the same filter (or the job worker retrying the job) picks up owed
+credentials alongside anything not yet approved. Accounts an application
+did not create (an applicant who already has a student or staff account)
+are never modified.
+
+Jobs run in the job worker process (services/job_queue.py). Per-applicant
+results are stored on the job and read incrementally through
+`AdmissionsBatchService.get_job(job_id, since=n)`.
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.security import generate_password_hash
+
+from admissions.models import Application
+from models import Admin, ProgrammeFeeStructure, StudentFeeBalance, StudentProfile, User, db
+from services.image_pipeline import ImagePipeline
+from services.job_queue import JobQueue
+from utils.helpers import username_base
+from utils.index_generator import generate_index_numbers
+
+logger = logging.getLogger(__name__)
+
+
+# Attempts per chunk when a concurrent approval takes a username/ID first
+CHUNK_RETRIES = 3
+
+STUDENT_ID_PREFIX = 'STD'
+
+# Password hash of a batch-created account until its credentials are
+# issued; never matches any password
+UNISSUED_PASSWORD = '!'
+
+COUNTS = ('approved', 'resent', 'skipped', 'failed', 'emailed', 'email_failed')
+
+
+class AdmissionsBatchService:
+    """
+    Chunked, bulk-insert approval of applications with queued credential emails.
+    """
+
+    STATUSES = ('submitted', 'draft', 'rejected')
+
+    # ------------------------------------------------------------------
+    # SELECTION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def candidate_query(statuses=('submitted',), programme=None, application_ids=None):
+        """
+        Applications a batch would touch: those in `statuses` plus approved
+        ones whose account was created by the approval and whose
+        credentials email is still owed.
+        """
+        query = Application.query.filter(or_(
+            Application.status.in_(statuses),
+            (Application.status == 'approved')
+            & Application.created_user_id.isnot(None)
+            & Application.credentials_sent_at.is_(None)
+        ))
+        if programme:
+            query = query.filter(
+                func.coalesce(Application.admitted_programme, Application.first_choice) == programme
+            )
+        if application_ids:
+            query = query.filter(Application.id.in_(application_ids))
+        return query
+
+    @staticmethod
+    def iter_chunks(filters, chunk_size):
+        """Yield lists of candidate ids in ascending id order (keyset pagination)."""
+        last_id = 0
+        while True:
+            ids = [
+                row.id for row in
+                AdmissionsBatchService.candidate_query(**filters)
+                .with_entities(Application.id)
+                .filter(Application.id > last_id)
+                .order_by(Application.id)
+                .limit(chunk_size)
+            ]
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    @staticmethod
+    def _load(application_ids):
+        return (
+            Application.query
+            .options(joinedload(Application.applicant), selectinload(Application.documents))
+            .filter(Application.id.in_(application_ids))
+            .order_by(Application.id)
+            .all()
+        )
+
+    # ------------------------------------------------------------------
+    # BULK ALLOCATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def allocate_usernames(names):
+        """
+        Unique usernames for [(first, middle_initials, last)] (None where the
+        name is unusable). One query per table covers the whole list.
+        """
+        bases = []
+        for first, middle, last in names:
+            try:
+                bases.append(username_base(first, middle, last, 'student'))
+            except ValueError:
+                bases.append(None)
+
+        patterns = {f"{base}%@{domain}" for base, domain in filter(None, bases)}
+        taken = set()
+        if patterns:
+            for model in (User, Admin):
+                taken.update(
+                    name for (name,) in db.session.query(model.username)
+                    .filter(or_(*[model.username.like(p) for p in patterns]))
+                )
+
+        usernames = []
+        for parts in bases:
+            if parts is None:
+                usernames.append(None)
+                continue
+            base, domain = parts
+            counter = 0
+            while True:
+                suffix = str(counter) if counter else ''
+                username = f"{base}{suffix}@{domain}"
+                if username not in taken:
+                    break
+                counter += 1
+            taken.add(username)
+            usernames.append(username)
+        return usernames
+
+    @staticmethod
+    def allocate_student_ids(count):
+        """
+        `count` free student IDs following the existing STDnnn numbering
+        (student count + 1, skipping IDs already in use).
+        """
+        if count < 1:
+            return []
+        next_number = User.query.filter_by(role='student').count() + 1
+        allocated = []
+        while len(allocated) < count:
+            window = [
+                f"{STUDENT_ID_PREFIX}{n:03d}"
+                for n in range(next_number, next_number + (count - len(allocated)) * 2)
+            ]
+            used = {
+                user_id for (user_id,) in
+                db.session.query(User.user_id).filter(User.user_id.in_(window))
+            }
+            for candidate in window:
+                if candidate not in used and len(allocated) < count:
+                    allocated.append(candidate)
+            next_number += len(window)
+        return allocated
+
+    @staticmethod
+    def fee_structures(programmes):
+        """{(programme, study_format): [ProgrammeFeeStructure]} at level 100."""
+        grouped = defaultdict(list)
+        if programmes:
+            for structure in ProgrammeFeeStructure.query.filter(
+                ProgrammeFeeStructure.programme_name.in_(programmes),
+                ProgrammeFeeStructure.programme_level == '100'
+            ):
+                grouped[(structure.programme_name, structure.study_format)].append(structure)
+        return grouped
+
+    @staticmethod
+    def fees_info(programme, structures):
+        """The fees section of the credentials email (same shape as single approval)."""
+        fees = []
+        for structure in structures:
+            items = structure.items_list if hasattr(structure, 'items_list') else []
+            if items:
+                for item in items:
+                    fees.append({
+                        'description': item.get('name', item.get('description', 'Fee')),
+                        'amount': item.get('amount', 0)
+                    })
+            elif structure.description != 'Default':
+                fees.append({'description': structure.description, 'amount': structure.amount})
+        return {'programme_name': programme, 'fees': fees} if fees else None
+
+    # ------------------------------------------------------------------
+    # APPROVAL
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def approve_chunk(application_ids):
+        """
+        Approve one chunk in a single transaction.
+
+        Returns (results, owed): a result dict per application and the ids
+        of applications whose credentials should be issued once the
+        transaction has committed.
+        """
+        applications = AdmissionsBatchService._load(application_ids)
+        now = datetime.utcnow()
+        today = now.date()
+
+        emails_by_app = {
+            app.id: app.email or (app.applicant.email if app.applicant else None)
+            for app in applications
+        }
+        existing = {
+            user.email: user for user in
+            User.query.filter(User.email.in_([e for e in emails_by_app.values() if e]))
+        }
+        created = {
+            user.id: user for user in
+            User.query.options(joinedload(User.student_profile))
+            .filter(User.id.in_([app.created_user_id for app in applications if app.created_user_id]))
+        }
+
+        results, owed = [], []
+        resend, create = [], []
+        seen_emails = set()
+
+        for app in applications:
+            email = emails_by_app[app.id]
+            result = {
+                'application_id': app.id,
+                'name': app.full_name,
+                'email': email,
+                'status': None,
+                'message': None,
+            }
+            results.append(result)
+
+            if app.status == 'approved':
+                # Only ever the account this application's approval created
+                user = created.get(app.created_user_id)
+                if user is None:
+                    result.update(status='skipped', message='The account created for this application no longer exists')
+                else:
+                    resend.append((app, result, user))
+            elif not email:
+                result.update(status='failed', message='Applicant email missing')
+            elif email in seen_emails:
+                result.update(status='skipped', message='Duplicate email in this batch')
+            elif email in existing:
+                result.update(status='skipped', message='An account already exists for this email')
+            else:
+                create.append((app, result, email))
+            if email:
+                seen_emails.add(email)
+
+        # -------- Allocation for new accounts --------
+        names = [
+            (app.first_name or '', ''.join(w[0] for w in (app.other_names or '').split()), app.surname or '')
+            for app, _, _ in create
+        ]
+        usernames = AdmissionsBatchService.allocate_usernames(names)
+
+        planned = []
+        for (app, result, email), username in zip(create, usernames):
+            if username is None:
+                result.update(status='failed', message='First name and surname are required')
+            else:
+                planned.append((app, result, email, username))
+
+        by_programme = defaultdict(list)
+        for entry in planned:
+            app = entry[0]
+            by_programme[app.admitted_programme or app.first_choice].append(entry)
+
+        index_numbers = {}
+        for programme, entries in by_programme.items():
+            try:
+                numbers = generate_index_numbers(programme, len(entries), admission_date=today)
+            except ValueError as e:
+                for _, result, _, _ in entries:
+                    result.update(status='failed', message=str(e))
+                continue
+            for (app, _, _, _), number in zip(entries, numbers):
+                index_numbers[app.id] = number
+        planned = [entry for entry in planned if entry[0].id in index_numbers]
+
+        student_ids = AdmissionsBatchService.allocate_student_ids(len(planned))
+        structures = AdmissionsBatchService.fee_structures(
+            {app.admitted_programme or app.first_choice for app, _, _, _ in planned}
+        )
+
+        # -------- Bulk inserts --------
+        user_rows, profile_rows, balance_rows = [], [], []
+        for i, (app, result, email, username) in enumerate(planned):
+            programme = app.admitted_programme or app.first_choice
+            study_format = app.admitted_stream or 'Regular'
+            academic_year = app.admitted_academic_year or f"{now.year}/{now.year + 1}"
+            semester = app.admitted_semester or '1'
+            student_id = student_ids[i]
+
+            photo = next((d for d in app.documents if (d.document_type or '').lower() == 'photo'), None)
+            user_rows.append({
+                'user_id': student_id,
+                'username': username,
+                'email': email,
+                'first_name': app.first_name,
+                'middle_name': app.other_names,
+                'last_name': app.surname,
+                'role': 'student',
+                'password_hash': UNISSUED_PASSWORD,
+                'profile_picture': ImagePipeline.from_static_path(photo.file_path) if photo else 'default_avatar.png',
+            })
+            profile_rows.append({
+                'user_id': student_id,
+                'dob': app.dob,
+                'gender': app.gender,
+                'nationality': app.nationality,
+                'address': app.postal_address,
+                'phone': app.phone,
+                'email': email,
+                'guardian_name': app.guardian_name,
+                'guardian_relation': app.guardian_relation,
+                'guardian_phone': app.guardian_phone,
+                'guardian_email': app.guardian_email,
+                'guardian_address': app.guardian_address,
+                'current_programme': programme,
+                'programme_level': 100,
+                'study_format': study_format,
+                'index_number': index_numbers[app.id],
+                'academic_status': 'Active',
+                'admission_date': today,
+                'academic_year': academic_year,
+                'semester': semester,
+            })
+
+            fee_structs = structures.get((programme, study_format), [])
+            for structure in fee_structs:
+                balance_rows.append({
+                    'student_id': student_id,
+                    'fee_structure_id': structure.id,
+                    'programme_name': programme,
+                    'programme_level': '100',
+                    'study_format': study_format,
+                    'academic_year': academic_year,
+                    'semester': semester,
+                    'amount_due': structure.amount,
+                    'amount_paid': 0.0,
+                    'is_paid': False,
+                })
+
+            app.status = 'approved'
+            result.update(
+                status='approved', username=username, student_id=student_id,
+                index_number=index_numbers[app.id], fees_assigned=bool(fee_structs),
+                email_status='queued'
+            )
+
+        if user_rows:
+            db.session.execute(insert(User), user_rows)
+            db.session.execute(insert(StudentProfile), profile_rows)
+            user_pks = dict(
+                db.session.query(User.user_id, User.id).filter(User.user_id.in_(student_ids))
+            )
+            for i, (app, _, _, _) in enumerate(planned):
+                app.created_user_id = user_pks[student_ids[i]]
+                owed.append(app.id)
+        if balance_rows:
+            db.session.execute(insert(StudentFeeBalance), balance_rows)
+
+        # -------- Approved earlier, credentials still owed --------
+        for app, result, user in resend:
+            profile = user.student_profile
+            result.update(
+                status='resent', username=user.username, student_id=user.user_id,
+                index_number=profile.index_number if profile else None,
+                message='Credentials re-issued with a new temporary password',
+                email_status='queued'
+            )
+            owed.append(app.id)
+
+        db.session.commit()
+        return results, owed
+
+    @staticmethod
+    def issue_credentials(application_ids, hasher):
+        """
+        Give the accounts created for these applications a fresh temporary
+        password and return the credential emails to send.
+
+        Only applications still owed credentials are touched. The plain
+        passwords exist only in the returned list, so an email that is never
+        sent leaves the application owed and the next run issues a new one.
+        """
+        rows = (
+            db.session.query(Application, User)
+            .join(User, User.id == Application.created_user_id)
+            .options(joinedload(User.student_profile))
+            .filter(
+                Application.id.in_(application_ids),
+                Application.status == 'approved',
+                Application.credentials_sent_at.is_(None)
+            )
+            .order_by(Application.id)
+            .all()
+        )
+        passwords = [uuid.uuid4().hex[:8] for _ in rows]
+        hashes = list(hasher.map(generate_password_hash, passwords))
+        structures = AdmissionsBatchService.fee_structures(
+            {user.student_profile.current_programme for _, user in rows if user.student_profile}
+        )
+
+        emails = []
+        for (application, user), password, password_hash in zip(rows, passwords, hashes):
+            user.password_hash = password_hash
+            profile = user.student_profile
+            fee_structs = structures.get((profile.current_programme, profile.study_format), []) if profile else []
+            emails.append({
+                'application_id': application.id,
+                'username': user.username,
+                'student_id': user.user_id,
+                'temp_password': password,
+                'fees_info': AdmissionsBatchService.fees_info(
+                    profile.current_programme if profile else None, fee_structs
+                ),
+            })
+        db.session.commit()
+        return emails
+
+    # ------------------------------------------------------------------
+    # BACKGROUND JOBS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def start_job(statuses=('submitted',), programme=None, application_ids=None,
+                  base_url=None, requested_by=None):
+        """
+        Queue a batch approval for the job worker and return its job id.
+
+        `base_url` (the admin's request.host_url) is used to build the login
+        link in credential emails outside of a request.
+
+        Raises:
+            ValueError: On an invalid status or while another batch is queued or running
+        """
+        statuses = list(statuses or ('submitted',))
+        invalid = [s for s in statuses if s not in AdmissionsBatchService.STATUSES]
+        if invalid:
+            raise ValueError(f"Cannot batch-approve applications with status: {', '.join(invalid)}")
+
+        # Two jobs over overlapping filters would both issue owed credentials
+        if JobQueue.active('admissions_approval'):
+            raise ValueError("A batch approval is already running; wait for it to finish")
+
+        return JobQueue.enqueue('admissions_approval', {
+            'filters': {
+                'statuses': statuses,
+                'programme': programme or None,
+                'application_ids': [int(i) for i in application_ids] if application_ids else None,
+            },
+            'base_url': base_url,
+        }, requested_by=requested_by)
+
+    @staticmethod
+    def get_job(job_id, since=0):
+        """
+        Return the job's status with the results from index `since` on, or
+        None. `next` is the cursor for the following call.
+        """
+        job = JobQueue.get(job_id, kind='admissions_approval')
+        if not job:
+            return None
+        progress = job['progress']
+        results = progress.get('results', [])
+        since = max(0, int(since or 0))
+        status = job['status']
+        if status == 'running' and progress.get('phase'):
+            status = progress['phase']
+        return {
+            'id': job['id'],
+            'filters': job['params'].get('filters'),
+            'requested_by': job['requested_by'],
+            'status': status,
+            'total': job['total'],
+            'processed': len(results),
+            'counts': progress.get('counts') or dict.fromkeys(COUNTS, 0),
+            'results': results[since:],
+            'next': len(results),
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at'],
+        }
+
+    @staticmethod
+    def run_job(app, job):
+        """
+        Job worker handler: approve every candidate, then wait for the
+        delivery thread to send the owed credentials.
+
+        An interrupted job starts its results afresh when retried; what it
+        already committed is not redone (approved applications are only
+        picked up again while their credentials are owed).
+        """
+        filters = job['params']['filters']
+        chunk_size = app.config.get('ADMISSIONS_BATCH_CHUNK_SIZE', 50)
+        hash_workers = max(1, app.config.get('ADMISSIONS_BATCH_HASH_WORKERS', 4))
+
+        state = {
+            'phase': 'running',
+            'counts': dict.fromkeys(COUNTS, 0),
+            'results': [],
+            'positions': {},
+        }
+        lock = threading.Lock()
+        report = JobQueue.reporter(job['id'])
+
+        def save(force=False):
+            with lock:
+                report(force=force, done=len(state['results']), progress={
+                    k: v for k, v in state.items() if k != 'positions'
+                })
+
+        outbox = queue.Queue()
+        stop = threading.Event()
+        mailer = threading.Thread(
+            target=AdmissionsBatchService._deliver,
+            args=(app, job['params'].get('base_url'), outbox, state, lock, save, hash_workers, stop),
+            daemon=True
+        )
+
+        total = AdmissionsBatchService.candidate_query(**filters).count()
+        JobQueue.update(job['id'], total=total, done=0)
+        mailer.start()
+        started = time.time()
+        try:
+            for ids in AdmissionsBatchService.iter_chunks(filters, chunk_size):
+                results, owed = AdmissionsBatchService._approve_with_retry(ids)
+                with lock:
+                    for result in results:
+                        state['positions'][result['application_id']] = len(state['results'])
+                        state['results'].append(result)
+                        state['counts'][result['status']] += 1
+                save()
+                if owed:
+                    outbox.put(owed)
+
+            with lock:
+                state['phase'] = 'sending'
+            save(force=True)
+        except Exception:
+            # Accounts committed so far stay; their credentials still go out
+            db.session.rollback()
+            raise
+        except BaseException:
+            # Worker stopping: leave the rest owed for the retry
+            stop.set()
+            raise
+        finally:
+            outbox.put(None)
+            mailer.join()
+            save(force=True)
+
+        counts = state['counts']
+        logger.info(
+            f"🎓 Batch approval {job['id']} finished in {time.time() - started:.1f}s: "
+            f"{counts['approved']} approved, {counts['resent']} re-sent, "
+            f"{counts['skipped']} skipped, {counts['failed']} failed, "
+            f"{counts['emailed']} emailed"
+        )
+        return {'done': len(state['results'])}
+
+    @staticmethod
+    def _approve_with_retry(ids):
+        """
+        approve_chunk(), retried when a concurrent single approval claimed a
+        username, student ID or email between allocation and commit.
+        """
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                return AdmissionsBatchService.approve_chunk(ids)
+            except IntegrityError as e:
+                db.session.rollback()
+                if attempt == CHUNK_RETRIES:
+                    raise
+                logger.warning(f"⚠️ Batch approval chunk conflicted (attempt {attempt}), retrying: {e.orig}")
+
+    @staticmethod
+    def _mark_email(state, application_id, sent):
+        position = state['positions'].get(application_id)
+        if position is not None:
+            state['results'][position]['email_status'] = 'sent' if sent else 'failed'
+        state['counts']['emailed' if sent else 'email_failed'] += 1
+
+    @staticmethod
+    def _deliver(app, base_url, outbox, state, lock, save, hash_workers, stop):
+        """
+        Issue and send credentials for queued chunks of application ids;
+        stamps credentials_sent_at on success.
+        """
+        from utils.email import send_approval_credentials_email
+
+        # url_for(_external=True) in the email needs a request context
+        with app.test_request_context(base_url=base_url or None):
+            try:
+                with ThreadPoolExecutor(max_workers=hash_workers) as hasher:
+                    while True:
+                        ids = outbox.get()
+                        if ids is None or stop.is_set():
+                            return
+                        try:
+                            emails = AdmissionsBatchService.issue_credentials(ids, hasher)
+                        except Exception as e:
+                            db.session.rollback()
+                            logger.error(f"Issuing credentials for applications {ids} failed: {e}")
+                            with lock:
+                                for application_id in ids:
+                                    AdmissionsBatchService._mark_email(state, application_id, False)
+                            save()
+                            continue
+
+                        for email in emails:
+                            if stop.is_set():
+                                return
+                            sent = False
+                            try:
+                                application = db.session.get(Application, email['application_id'])
+                                sent = bool(send_approval_credentials_email(
+                                    application, email['username'], email['student_id'],
+                                    email['temp_password'], email['fees_info']
+                                ))
+                                if sent:
+                                    application.credentials_sent_at = datetime.utcnow()
+                                    db.session.commit()
+                            except Exception as e:
+                                db.session.rollback()
+                                logger.error(f"Credentials email for application {email['application_id']} failed: {e}")
+                            with lock:
+                                AdmissionsBatchService._mark_email(state, email['application_id'], sent)
+                            save()
+            finally:
+                db.session.remove()
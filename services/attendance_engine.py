@@ -0,0 +1,199 @@
+"""
+ATTENDANCE ENGINE
+=================
+Location: services/attendance_engine.py
+
+Builds the student × date attendance matrix for the teacher attendance
+views from a single query, keeps each student's row as a compact bytearray,
+and raises attendance warnings when a student drops below the threshold.
+"""
+
+import logging
+
+from flask import current_app
+from sqlalchemy import case, func, select
+
+from models import AttendanceRecord, StudentProfile, User, db
+from utils.notification_engine import notify_attendance_warning
+
+logger = logging.getLogger(__name__)
+
+
+# Cell values in a matrix row
+UNMARKED = 0
+ABSENT = 1
+PRESENT = 2
+
+CSV_MARKS = {UNMARKED: '', ABSENT: 'A', PRESENT: 'P'}
+
+
+class AttendanceMatrix:
+    """
+    Attendance for a set of students over a set of dates.
+
+    students: list of dicts (id, full_name, programme, level) in display order
+    dates:    sorted list of dates that have at least one record
+    cells:    {student_id: bytearray(len(dates))} of UNMARKED/ABSENT/PRESENT
+    percentages: {student_id: present / recorded * 100}
+    """
+
+    def __init__(self, students, dates, cells):
+        self.students = students
+        self.dates = dates
+        self.cells = cells
+        self.percentages = {}
+        for student in students:
+            row = cells[student['id']]
+            recorded = len(row) - row.count(UNMARKED)
+            present = row.count(PRESENT)
+            student['present'] = present
+            student['recorded'] = recorded
+            self.percentages[student['id']] = (
+                round(present / recorded * 100, 1) if recorded else None
+            )
+
+    def rows(self):
+        """Yield (student, row) pairs in display order."""
+        for student in self.students:
+            yield student, self.cells[student['id']]
+
+    def records(self, on_date=None):
+        """Marked cells as flat records, ordered by date then student."""
+        for col, day in enumerate(self.dates):
+            if on_date and day != on_date:
+                continue
+            for student, row in self.rows():
+                if row[col] != UNMARKED:
+                    yield {
+                        'date': day,
+                        'programme': student['programme'],
+                        'level': student['level'],
+                        'full_name': student['full_name'],
+                        'is_present': row[col] == PRESENT
+                    }
+
+    def below(self, threshold):
+        """Students whose attendance is under threshold percent."""
+        return [
+            s for s in self.students
+            if self.percentages[s['id']] is not None and self.percentages[s['id']] < threshold
+        ]
+
+    def csv_rows(self):
+        """Header plus one row per student, P/A per date and the percentage."""
+        yield (['Student', 'Programme', 'Level']
+               + [d.isoformat() for d in self.dates]
+               + ['Present', 'Recorded', 'Attendance %'])
+        for student, row in self.rows():
+            pct = self.percentages[student['id']]
+            yield ([student['full_name'], student['programme'], student['level']]
+                   + [CSV_MARKS[v] for v in row]
+                   + [student['present'], student['recorded'], '' if pct is None else pct])
+
+
+class AttendanceEngine:
+    """
+    Attendance matrices and low-attendance warnings.
+    """
+
+    @staticmethod
+    def matrix(teacher_id, programme=None, level=None):
+        """
+        Build the attendance matrix for a teacher's records in one query.
+
+        Args:
+            teacher_id: TeacherProfile.id
+            programme: Optional programme filter
+            level: Optional programme level filter
+
+        Returns:
+            AttendanceMatrix
+        """
+        stmt = (
+            select(
+                AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.is_present,
+                User.first_name, User.middle_name, User.last_name,
+                StudentProfile.current_programme, StudentProfile.programme_level
+            )
+            .join(User, User.id == AttendanceRecord.student_id)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .where(AttendanceRecord.teacher_id == teacher_id)
+        )
+        if level:
+            stmt = stmt.where(StudentProfile.programme_level == int(level))
+        if programme:
+            stmt = stmt.where(StudentProfile.current_programme == programme)
+        stmt = stmt.order_by(User.last_name, User.first_name, AttendanceRecord.student_id,
+                             AttendanceRecord.date, AttendanceRecord.id)
+
+        rows = db.session.execute(stmt).all()
+
+        dates = sorted({r.date for r in rows})
+        date_index = {d: i for i, d in enumerate(dates)}
+
+        students = []
+        cells = {}
+        for r in rows:
+            row = cells.get(r.student_id)
+            if row is None:
+                row = cells[r.student_id] = bytearray(len(dates))
+                students.append({
+                    'id': r.student_id,
+                    'full_name': " ".join(filter(None, [r.first_name, r.middle_name, r.last_name])),
+                    'programme': r.current_programme,
+                    'level': r.programme_level
+                })
+            # Later records for the same day win
+            row[date_index[r.date]] = PRESENT if r.is_present else ABSENT
+
+        return AttendanceMatrix(students, dates, cells)
+
+    @staticmethod
+    def percentages(student_ids):
+        """
+        Overall attendance per student across all teachers, in one grouped query.
+
+        Returns:
+            {User.id: (User.user_id, percentage)}
+        """
+        if not student_ids:
+            return {}
+        present = func.sum(case((AttendanceRecord.is_present == True, 1), else_=0))
+        rows = db.session.execute(
+            select(User.id, User.user_id, present, func.count(AttendanceRecord.id))
+            .join(AttendanceRecord, AttendanceRecord.student_id == User.id)
+            .where(User.id.in_(student_ids))
+            .group_by(User.id, User.user_id)
+        ).all()
+        return {
+            uid: (user_id, round(float(p or 0) / total * 100, 1))
+            for uid, user_id, p, total in rows if total
+        }
+
+    @staticmethod
+    def warn_low_attendance(student_ids, before, threshold=None):
+        """
+        Send attendance warnings to students who just dropped below threshold.
+
+        Args:
+            student_ids: User.id values whose attendance changed
+            before: percentages() snapshot taken before the change
+            threshold: Percentage; defaults to ATTENDANCE_WARNING_THRESHOLD
+
+        Returns:
+            Number of warnings sent
+        """
+        if threshold is None:
+            threshold = current_app.config.get('ATTENDANCE_WARNING_THRESHOLD', 75)
+
+        sent = 0
+        for uid, (user_id, pct) in AttendanceEngine.percentages(student_ids).items():
+            previous = before.get(uid)
+            if pct >= threshold or (previous and previous[1] < threshold):
+                continue
+            try:
+                if notify_attendance_warning(user_id, pct):
+                    sent += 1
+            except Exception as e:
+                logger.error(f"Attendance warning failed for {user_id}: {e}")
+        return sent
@@ -0,0 +1,301 @@
+# services/batch_export_service.py
+"""
+Class-wide export of semester result slips and full transcripts.
+
+Registry staff pick a programme/level and get one ZIP with a PDF per
+student. Grades for the class are loaded in bulk (one grades query per
+chunk of students instead of several queries per student), documents are
+rendered in a small process pool, and each PDF is written straight into a
+ZIP on disk so memory stays flat no matter how large the class is.
+
+Exports run in the job worker process (services/job_queue.py), so they
+survive web worker restarts; progress is polled through
+`BatchExportService.get_job()` and the finished ZIP stays on disk until
+the job expires.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from sqlalchemy.orm import joinedload
+
+from models import (
+    StudentCourseGrade, StudentProfile, User, SemesterResultRelease, db
+)
+from services.job_queue import JobQueue
+from services.result_builder import ResultBuilder
+from services.transcript_service import TranscriptService
+from utils.result_documents import render_document
+
+logger = logging.getLogger(__name__)
+
+
+class BatchExportService:
+    """
+    Bulk loading, parallel rendering and ZIP packaging of result documents.
+    """
+
+    KINDS = ('result_slip', 'transcript')
+
+    # ------------------------------------------------------------------
+    # BULK LOADING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def class_students(programme_name, programme_level):
+        """
+        Return [(User, StudentProfile)] for a programme/level, ordered by index number.
+        """
+        return (
+            db.session.query(User, StudentProfile)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .filter(
+                StudentProfile.current_programme == programme_name,
+                StudentProfile.programme_level == int(programme_level)
+            )
+            .order_by(StudentProfile.index_number, User.user_id)
+            .all()
+        )
+
+    @staticmethod
+    def iter_payloads(kind, programme_name, programme_level,
+                      academic_year=None, semester=None, chunk_size=200):
+        """
+        Yield plain-dict render payloads for every student in the class.
+
+        Students are processed in chunks; each chunk costs one grades query
+        (with courses joined) and one assessment-scheme query.
+        """
+        if kind not in BatchExportService.KINDS:
+            raise ValueError(f"Unknown export kind: {kind}")
+        if kind == 'result_slip' and not (academic_year and semester):
+            raise ValueError("academic_year and semester are required for result slips")
+
+        students = BatchExportService.class_students(programme_name, programme_level)
+
+        released = {
+            (r.academic_year, r.semester)
+            for r in SemesterResultRelease.query.filter_by(is_released=True).all()
+        }
+
+        for start in range(0, len(students), chunk_size):
+            chunk = students[start:start + chunk_size]
+            grades_by_student = BatchExportService._load_grades(
+                [user.id for user, _ in chunk], academic_year, semester, kind
+            )
+            schemes = ResultBuilder.assessment_schemes_for(
+                g.course_id
+                for grades in grades_by_student.values()
+                for g in grades
+            )
+
+            for user, profile in chunk:
+                grades = grades_by_student.get(user.id, [])
+                student = {
+                    'name': user.full_name,
+                    'student_id': user.user_id,
+                    'programme': profile.current_programme,
+                    'level': profile.programme_level,
+                    'index_number': profile.index_number,
+                }
+
+                if kind == 'result_slip':
+                    result = ResultBuilder.build_semester(
+                        grades, academic_year, semester,
+                        (academic_year, semester) in released, schemes
+                    )
+                    yield {'student': student, 'result': result}
+                else:
+                    transcript = TranscriptService.build_full_transcript(
+                        user, grades, schemes=schemes, released_semesters=released
+                    )
+                    yield {
+                        'student': student,
+                        'transcript': BatchExportService._plain_transcript(transcript),
+                    }
+
+            # Drop ORM state for the finished chunk before loading the next one
+            db.session.expunge_all()
+
+    @staticmethod
+    def _load_grades(student_ids, academic_year, semester, kind):
+        """Load grades (with courses) for many students in one query."""
+        query = (
+            StudentCourseGrade.query
+            .options(joinedload(StudentCourseGrade.course))
+            .filter(StudentCourseGrade.student_id.in_(student_ids))
+        )
+        if kind == 'result_slip':
+            query = query.filter(
+                StudentCourseGrade.academic_year == academic_year,
+                StudentCourseGrade.semester == semester
+            )
+
+        # Same finalization rule as ResultBuilder / GradingCalculationEngine
+        if hasattr(StudentCourseGrade, 'is_finalized'):
+            query = query.filter(StudentCourseGrade.is_finalized == True)
+        elif kind == 'result_slip':
+            query = query.filter(StudentCourseGrade.final_score != None)
+
+        query = query.order_by(
+            StudentCourseGrade.student_id,
+            StudentCourseGrade.academic_year,
+            StudentCourseGrade.semester
+        )
+
+        grades_by_student = {}
+        for grade in query.all():
+            grades_by_student.setdefault(grade.student_id, []).append(grade)
+        return grades_by_student
+
+    @staticmethod
+    def _plain_transcript(transcript):
+        """Strip ORM objects from TranscriptService output so it can be pickled cheaply."""
+        fields = ('course_code', 'course_name', 'credit_hours', 'final_score', 'grade_letter')
+        semesters = []
+        for key in sorted(transcript['all_semesters'].keys()):
+            sem = transcript['all_semesters'][key]
+            semesters.append({
+                'academic_year': sem['academic_year'],
+                'semester': sem['semester'],
+                'gpa': sem['gpa'],
+                'courses': [{f: c[f] for f in fields} for c in sem['courses']],
+            })
+        return {
+            'semesters': semesters,
+            'cumulative_gpa': transcript['cumulative_gpa'],
+            'cumulative_weighted_gpa': transcript['cumulative_weighted_gpa'],
+            'total_credit_hours_attempted': transcript['total_credit_hours_attempted'],
+            'total_credit_hours_earned': transcript['total_credit_hours_earned'],
+        }
+
+    # ------------------------------------------------------------------
+    # RENDERING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def render_documents(kind, payloads, workers=0):
+        """
+        Render payloads to (filename, pdf_bytes), in parallel when workers > 0.
+
+        At most `workers * 2` documents are in flight at any time, so memory
+        use is bounded by the window rather than the class size. Output order
+        is not guaranteed.
+        """
+        if workers <= 0:
+            for payload in payloads:
+                yield render_document(kind, payload)
+            return
+
+        window = workers * 2
+        # Workers only run ReportLab on plain dicts. Forking avoids
+        # re-importing the app in each worker and is safe from the
+        # single-threaded job worker (never fork a threaded web worker);
+        # the children never touch the inherited DB connections.
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = set()
+            for payload in payloads:
+                pending.add(pool.submit(render_document, kind, payload))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
+
+    @staticmethod
+    def write_zip(kind, payloads, zip_path, workers=0, on_progress=None):
+        """
+        Render every payload and write the PDFs into `zip_path`.
+
+        Returns:
+            int: Number of documents written
+        """
+        count = 0
+        used_names = set()
+        with ZipFile(zip_path, 'w', compression=ZIP_DEFLATED) as archive:
+            for filename, pdf_bytes in BatchExportService.render_documents(kind, payloads, workers):
+                name = filename
+                suffix = 1
+                while name in used_names:
+                    base, ext = os.path.splitext(filename)
+                    name = f"{base}_{suffix}{ext}"
+                    suffix += 1
+                used_names.add(name)
+
+                archive.writestr(name, pdf_bytes)
+                count += 1
+                if on_progress:
+                    on_progress(count)
+        return count
+
+    # ------------------------------------------------------------------
+    # BACKGROUND JOBS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def start_job(kind, programme_name, programme_level,
+                  academic_year=None, semester=None, requested_by=None):
+        """
+        Queue an export for the job worker and return its job id.
+
+        Raises:
+            ValueError: On invalid kind or missing semester for result slips
+        """
+        if kind not in BatchExportService.KINDS:
+            raise ValueError(f"Unknown export kind: {kind}")
+        if kind == 'result_slip' and not (academic_year and semester):
+            raise ValueError("academic_year and semester are required for result slips")
+
+        return JobQueue.enqueue('batch_export', {
+            'kind': kind,
+            'programme': programme_name,
+            'level': programme_level,
+            'academic_year': academic_year,
+            'semester': semester,
+        }, requested_by=requested_by)
+
+    @staticmethod
+    def get_job(job_id):
+        """Return the export job's status dict (see JobQueue.get), or None."""
+        return JobQueue.get(job_id, kind='batch_export')
+
+    @staticmethod
+    def run_job(app, job):
+        """
+        Job worker handler: render the class into BATCH_EXPORT_FOLDER/<job id>.zip.
+
+        Re-running after an interruption simply rewrites the ZIP.
+        """
+        params = job['params']
+        export_dir = app.config['BATCH_EXPORT_FOLDER']
+        workers = app.config.get('BATCH_EXPORT_WORKERS', 0)
+        chunk_size = app.config.get('BATCH_EXPORT_CHUNK_SIZE', 200)
+
+        os.makedirs(export_dir, exist_ok=True)
+        total = len(BatchExportService.class_students(params['programme'], params['level']))
+        JobQueue.update(job['id'], total=total, done=0)
+
+        label = params['kind'] if params['kind'] == 'transcript' else (
+            f"results_{params['academic_year']}_S{params['semester']}"
+        )
+        filename = (
+            f"{params['programme']}_L{params['level']}_{label}.zip"
+            .replace('/', '-').replace(' ', '_')
+        )
+        zip_path = os.path.join(export_dir, f"{job['id']}.zip")
+
+        payloads = BatchExportService.iter_payloads(
+            params['kind'], params['programme'], params['level'],
+            params['academic_year'], params['semester'], chunk_size=chunk_size
+        )
+        report = JobQueue.reporter(job['id'])
+        count = BatchExportService.write_zip(
+            params['kind'], payloads, zip_path, workers=workers,
+            on_progress=lambda n: report(done=n)
+        )
+        return {'done': count, 'path': zip_path, 'filename': filename}
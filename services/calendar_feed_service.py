@@ -0,0 +1,361 @@
+# services/calendar_feed_service.py
+"""
+Materialized calendar feed for the virtual classroom.
+
+The vclass dashboard used to rebuild the whole calendar on every visit:
+every quiz, assignment and material of the class, the full AcademicCalendar
+table, the registration window split into days and the semester
+backgrounds, all serialised into the page. Now:
+
+  * the class's events are built once per (programme, level) into a
+    FeedSnapshot and kept in process memory; any committed change to
+    Quiz, Assignment, AcademicCalendar or AcademicYear drops every
+    snapshot, and a registration-window change is picked up through the
+    course catalog version (utils/catalog_cache.py, utils/versioned_cache.py)
+  * the calendar loads its events from a JSON endpoint for the visible
+    date range only, with an ETag derived from the snapshot version
+  * the same events can be exported as an iCalendar (.ics) file
+
+Quiz status (Upcoming / Ongoing / Due) depends on the clock, so it is
+applied when events are served, not when they are built.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import url_for
+
+from models import AcademicCalendar, AcademicYear, Assignment, Quiz
+from utils.catalog_cache import catalog_changes, registration_window
+from utils.versioned_cache import ChangeVersion, VersionedStore
+
+logger = logging.getLogger(__name__)
+
+
+FeedEvent = namedtuple('FeedEvent', [
+    'uid', 'kind', 'title', 'start', 'end', 'all_day', 'url', 'color',
+    'course', 'description', 'display',
+])
+
+ACADEMIC_COLORS = {
+    'Vacation': '#e67e22',
+    'Midterm': '#9b59b6',
+    'Exam': '#2980b9',
+    'Holiday': '#c0392b',
+    'Other': '#95a5a6'
+}
+
+QUIZ_COLORS = {'Upcoming': '#0d6efd', 'Ongoing': '#ffc107', 'Due': '#dc3545'}
+
+# Models whose committed changes invalidate every feed
+FEED_MODELS = (Quiz, Assignment, AcademicCalendar, AcademicYear)
+
+
+class FeedSnapshot:
+    """Events, quizzes and assignments of one class, as of `version`."""
+
+    def __init__(self, version, events, quizzes, assignments):
+        self.version = version
+        self.events = sorted(events, key=lambda e: _as_datetime(e.start))
+        self.quizzes = quizzes
+        self.assignments = assignments
+
+    def quiz_phase(self, now):
+        """Number of quiz start/end times already passed (changes with any quiz status)."""
+        return sum(
+            (q['start'] <= now) + (q['end'] < now)
+            for q in self.quizzes
+        )
+
+
+_changes = ChangeVersion('calendar_feed', FEED_MODELS, depends_on=(catalog_changes(),))
+_feeds = VersionedStore(_changes, 'CALENDAR_FEED_TTL', 600)  # (programme, level) -> FeedSnapshot
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def quiz_status(start, end, now):
+    if start <= now <= end:
+        return 'Ongoing'
+    if now > end:
+        return 'Due'
+    return 'Upcoming'
+
+
+class CalendarFeedService:
+    """
+    Per-class calendar events: cached build, windowed JSON, iCalendar export.
+    """
+
+    # ------------------------------------------------------------------
+    # SNAPSHOTS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def feed(programme_name, programme_level):
+        """The FeedSnapshot for a class, built on first use or after a change."""
+        key = (programme_name, str(programme_level))
+        return _feeds.get(key, lambda version: CalendarFeedService._build(key, version))
+
+    @staticmethod
+    def _build(key, version):
+        programme_name, programme_level = key
+        events, quizzes, assignments = [], [], []
+
+        for q in Quiz.query.filter(
+            Quiz.programme_name == programme_name,
+            Quiz.programme_level == programme_level
+        ).order_by(Quiz.start_datetime):
+            quizzes.append({
+                'id': q.id,
+                'title': q.title,
+                'course_name': q.course_name,
+                'start': q.start_datetime,
+                'end': q.end_datetime,
+                'duration': q.duration_minutes,
+            })
+            events.append(FeedEvent(
+                uid=f"quiz-{q.id}", kind='Quiz', title=q.title,
+                start=q.start_datetime, end=q.end_datetime, all_day=False,
+                url=url_for('vclass.quiz_instructions', quiz_id=q.id), color=None,
+                course=q.course_name, description='', display=None,
+            ))
+
+        for a in Assignment.query.filter(
+            Assignment.programme_name == programme_name,
+            Assignment.programme_level == programme_level
+        ).order_by(Assignment.due_date):
+            assignments.append({
+                'id': a.id,
+                'title': a.title,
+                'course_name': a.course_name,
+                'description': a.description,
+                'instructions': a.instructions,
+                'due_date': a.due_date.isoformat(),
+                'filename': a.filename,
+                'original_name': a.original_name
+            })
+            events.append(FeedEvent(
+                uid=f"assignment-{a.id}", kind='Assignment', title=f"{a.title} [Due]",
+                start=a.due_date, end=a.due_date, all_day=False,
+                url=url_for('vclass.download_assignment', filename=a.filename), color='#198754',
+                course=a.course_name, description=a.instructions or '', display=None,
+            ))
+
+        # Course Registration Period (one all-day block per day)
+        registration_start, registration_end = registration_window()
+        if registration_start and registration_end:
+            day, final = registration_start.date(), registration_end.date()
+            while day <= final:
+                events.append(FeedEvent(
+                    uid=f"registration-{day.isoformat()}", kind='Deadline', title='Course Registration Period',
+                    start=day, end=day + timedelta(days=1), all_day=True, url=None, color='#dc3545',
+                    course='', description='Course registration is available during this window.',
+                    display=None,
+                ))
+                day += timedelta(days=1)
+
+        for ev in AcademicCalendar.query.order_by(AcademicCalendar.date):
+            events.append(FeedEvent(
+                uid=f"academic-{ev.id}", kind=ev.break_type, title=ev.label,
+                start=ev.date, end=None, all_day=True, url=None,
+                color=ACADEMIC_COLORS.get(ev.break_type, '#7f8c8d'),
+                course='', description='', display=None,
+            ))
+
+        # Semester backgrounds
+        academic_year = AcademicYear.query.first()
+        if academic_year:
+            for n, start, end, color in (
+                (1, academic_year.semester_1_start, academic_year.semester_1_end, '#d1e7dd'),
+                (2, academic_year.semester_2_start, academic_year.semester_2_end, '#f8d7da'),
+            ):
+                events.append(FeedEvent(
+                    uid=f"semester-{academic_year.id}-{n}", kind='Semester', title=f"Semester {n}",
+                    start=start, end=end + timedelta(days=1), all_day=True, url=None, color=color,
+                    course='', description='', display='background',
+                ))
+
+        logger.debug(f"📅 Built calendar feed for {programme_name} L{programme_level}: {len(events)} event(s)")
+        return FeedSnapshot(version, events, quizzes, assignments)
+
+    # ------------------------------------------------------------------
+    # JSON (FullCalendar event objects)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def window(snapshot, start=None, end=None):
+        """Events overlapping [start, end) (either bound may be None)."""
+        selected = []
+        for ev in snapshot.events:
+            ev_start = _as_datetime(ev.start)
+            ev_end = _as_datetime(ev.end) if ev.end else ev_start
+            if end is not None and ev_start >= end:
+                break
+            if start is not None and ev_end < start:
+                continue
+            selected.append(ev)
+        return selected
+
+    @staticmethod
+    def to_fullcalendar(ev, now):
+        """A FullCalendar event object for a FeedEvent."""
+        if ev.display == 'background':
+            return {
+                'start': ev.start.isoformat(),
+                'end': ev.end.isoformat(),
+                'display': 'background',
+                'color': ev.color,
+                'title': ev.title
+            }
+
+        title, color, status = ev.title, ev.color, 'Academic'
+        if ev.kind == 'Quiz':
+            status = quiz_status(ev.start, ev.end, now)
+            title, color = f"{ev.title} [{status}]", QUIZ_COLORS[status]
+        elif ev.kind == 'Assignment':
+            status = 'Due'
+        elif ev.kind == 'Deadline':
+            status = 'Open'
+
+        data = {
+            'id': ev.uid,
+            'title': title,
+            'start': ev.start.isoformat(),
+            'color': color,
+            'extendedProps': {
+                'type': ev.kind,
+                'status': status,
+                'course': ev.course,
+                'description': ev.description
+            }
+        }
+        if ev.end:
+            data['end'] = ev.end.isoformat()
+        if ev.all_day and ev.end:
+            data['allDay'] = True
+        if ev.url:
+            data['url'] = ev.url
+        return data
+
+    @staticmethod
+    def dashboard_lists(snapshot, now):
+        """Quiz and assignment lists in the shape the dashboard template expects."""
+        quizzes = [{
+            'id': q['id'],
+            'title': q['title'],
+            'course_name': q['course_name'],
+            'start_datetime': q['start'].isoformat(),
+            'end_datetime': q['end'].isoformat(),
+            'duration': q['duration'],
+            'is_active': q['start'] <= now <= q['end']
+        } for q in snapshot.quizzes]
+        return quizzes, snapshot.assignments
+
+    # ------------------------------------------------------------------
+    # ICALENDAR
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def to_ics(snapshot, name, base_url):
+        """RFC 5545 text for every event except semester backgrounds."""
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        host = base_url.split('//', 1)[-1].split('/', 1)[0] or 'vclass'
+        lines = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//VTIU//Virtual Classroom//EN',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f"X-WR-CALNAME:{_ics_text(name)}",
+        ]
+
+        registration_days = []
+        for ev in snapshot.events:
+            if ev.display == 'background':
+                continue
+            if ev.kind == 'Deadline':
+                # Export the registration window as one event, not one per day
+                registration_days.append(ev)
+                continue
+            lines += _vevent(ev, ev.start, ev.end, stamp, host, base_url)
+
+        if registration_days:
+            first, last = registration_days[0], registration_days[-1]
+            lines += _vevent(first._replace(uid='registration'), first.start, last.end, stamp, host, base_url)
+
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+# ============================================================
+# ICALENDAR HELPERS
+# ============================================================
+
+def _ics_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_when(prop, value, all_day):
+    if all_day:
+        return f"{prop};VALUE=DATE:{value.strftime('%Y%m%d')}"
+    # Stored datetimes are UTC
+    return f"{prop}:{value.strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def _vevent(ev, start, end, stamp, host, base_url):
+    all_day = ev.all_day or (isinstance(start, date) and not isinstance(start, datetime))
+    if all_day and end is None:
+        end = start + timedelta(days=1)
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{ev.uid}@{host}",
+        f"DTSTAMP:{stamp}",
+        _ics_when('DTSTART', start, all_day),
+    ]
+    if end is not None and end != start:
+        lines.append(_ics_when('DTEND', end, all_day))
+    summary = f"{ev.course}: {ev.title}" if ev.course else ev.title
+    lines += [f"SUMMARY:{_ics_text(summary)}", f"CATEGORIES:{_ics_text(ev.kind)}"]
+    if ev.description:
+        lines.append(f"DESCRIPTION:{_ics_text(ev.description)}")
+    if ev.url:
+        lines.append(f"URL:{base_url.rstrip('/')}{ev.url}")
+    lines.append('END:VEVENT')
+    return lines
+
+
+def _fold(line):
+    """Fold content lines at 75 octets (continuation lines start with a space)."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts, current = [], b''
+    for char in line:
+        encoded = char.encode('utf-8')
+        if len(current) + len(encoded) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += encoded
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+# ============================================================
+# INVALIDATION HOOKS
+# ============================================================
+
+def invalidate_feeds():
+    _changes.bump()
+
+
+def init_calendar_feed(app):
+    """Register the invalidation hooks (call once at startup)."""
+    _changes.register()
+    logger.info(f"📅 Calendar feed cache enabled (TTL {app.config.get('CALENDAR_FEED_TTL', 600)}s)")
@@ -0,0 +1,228 @@
+# services/image_pipeline.py
+"""
+Ingestion of passport and profile photos.
+
+Phone uploads are multi-megabyte JPEGs with EXIF orientation and metadata
+(including GPS). Serving them as-is made the ID card, chat and dashboards
+download (or base64-embed) the original on every view. ingest() decodes an
+upload once and writes small derivatives instead:
+
+  * the JPEG is decoded at reduced scale (`Image.draft`), so a 12MP photo
+    never materialises at full resolution
+  * EXIF orientation is applied and all metadata is dropped
+  * each size in IMAGE_DERIVATIVE_SIZES (thumb, card, full) is written as
+    WebP and as a JPEG fallback (for renderers without WebP support)
+
+Files live under PROFILE_PICS_FOLDER in a sharded layout,
+`ab/cd/<token>_<size>.<ext>`, so no directory grows unbounded. The stored
+name (User.profile_picture, ApplicationDocument.file_path) is the "full"
+WebP variant relative to that folder; `variant()` maps it to another size
+or format. Older, non-pipeline filenames are passed through unchanged.
+"""
+
+import logging
+import os
+import re
+import uuid
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SIZES = {'thumb': 128, 'card': 400, 'full': 1024}
+
+# Prefix of ApplicationDocument.file_path (relative to /static)
+STATIC_PREFIX = 'uploads/profile_pictures/'
+
+_MANAGED = re.compile(r'^(?P<shard>[0-9a-f]{2}/[0-9a-f]{2})/(?P<token>[0-9a-f]{32})_(?P<size>[a-z]+)\.(?P<ext>webp|jpg)$')
+
+
+class ImageRejected(ValueError):
+    """The upload is not a usable photo (message is shown to the user)."""
+
+
+class ImagePipeline:
+    """
+    Decode-once photo ingestion with sized WebP/JPEG derivatives.
+    """
+
+    # ------------------------------------------------------------------
+    # CONFIGURATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def folder(app=None):
+        app = app or current_app
+        return app.config['PROFILE_PICS_FOLDER']
+
+    @staticmethod
+    def sizes(app=None):
+        app = app or current_app
+        return app.config.get('IMAGE_DERIVATIVE_SIZES') or DEFAULT_SIZES
+
+    @staticmethod
+    def formats(app=None):
+        """[(ext, PIL format, save options)]; WebP first when Pillow has it."""
+        from PIL import features
+
+        app = app or current_app
+        jpeg = ('jpg', 'JPEG', {
+            'quality': int(app.config.get('IMAGE_JPEG_QUALITY', 85)),
+            'optimize': True,
+            'progressive': True,
+        })
+        if not features.check('webp'):
+            return [jpeg]
+        webp = ('webp', 'WEBP', {
+            'quality': int(app.config.get('IMAGE_WEBP_QUALITY', 80)),
+            'method': 4,
+        })
+        return [webp, jpeg]
+
+    # ------------------------------------------------------------------
+    # NAMES
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def is_managed(name):
+        return bool(name and _MANAGED.match(name))
+
+    @staticmethod
+    def variant(name, size='card', ext=None):
+        """Name of another size/format of a stored photo (legacy names pass through)."""
+        match = _MANAGED.match(name or '')
+        if not match:
+            return name
+        return f"{match['shard']}/{match['token']}_{size}.{ext or match['ext']}"
+
+    @staticmethod
+    def static_path(name, size='card', ext=None):
+        """Path under /static, for url_for('static', filename=...)."""
+        return STATIC_PREFIX + ImagePipeline.variant(name, size, ext)
+
+    @staticmethod
+    def from_static_path(file_path):
+        """Inverse of static_path(): ApplicationDocument.file_path -> stored name."""
+        file_path = (file_path or '').replace('\\', '/')
+        if file_path.startswith('static/'):
+            file_path = file_path[len('static/'):]
+        if file_path.startswith(STATIC_PREFIX):
+            file_path = file_path[len(STATIC_PREFIX):]
+        return file_path
+
+    # ------------------------------------------------------------------
+    # INGESTION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def decode(stream, max_size, max_pixels=None):
+        """
+        Open an upload as an upright RGB image no larger than `max_size`.
+
+        JPEGs are decoded at the smallest DCT scale that still covers
+        `max_size`; metadata is not carried over.
+        """
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        try:
+            img = Image.open(stream)
+        except Image.DecompressionBombError:
+            raise ImageRejected("Image dimensions are too large")
+        except (UnidentifiedImageError, OSError):
+            raise ImageRejected("The file is not a supported image (use JPEG, PNG or WebP).")
+
+        width, height = img.size
+        if not width or not height:
+            raise ImageRejected("Uploaded image is empty")
+        if max_pixels and width * height > max_pixels:
+            raise ImageRejected("Image dimensions are too large")
+
+        try:
+            # EXIF orientation swaps width and height for rotated photos
+            img.draft('RGB', (max_size, max_size))
+            img = ImageOps.exif_transpose(img)
+
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel('A'))
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            if max(img.size) > max_size:
+                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        except Image.DecompressionBombError:
+            raise ImageRejected("Image dimensions are too large")
+        except OSError:
+            # Truncated or corrupt pixel data only surfaces once decoding starts
+            raise ImageRejected("The image file is damaged and could not be read.")
+        return img
+
+    @staticmethod
+    def ingest(stream, check=None, app=None):
+        """
+        Decode `stream` and write all derivatives. Returns the stored name.
+
+        `check(img)` may raise ImageRejected to refuse the photo (e.g. the
+        passport background rule); nothing is written in that case.
+        """
+        from PIL import Image
+
+        app = app or current_app
+        sizes = sorted(ImagePipeline.sizes(app).items(), key=lambda kv: kv[1], reverse=True)
+        formats = ImagePipeline.formats(app)
+
+        img = ImagePipeline.decode(stream, sizes[0][1], app.config.get('IMAGE_MAX_PIXELS'))
+        if check:
+            check(img)
+
+        token = uuid.uuid4().hex
+        shard = f"{token[:2]}/{token[2:4]}"
+        target_dir = os.path.join(ImagePipeline.folder(app), shard)
+        os.makedirs(target_dir, exist_ok=True)
+
+        written = []
+        try:
+            # Largest first; each smaller size is reduced from the previous one
+            current = img
+            for size_name, max_size in sizes:
+                if max(current.size) > max_size:
+                    current = current.copy()
+                    current.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                for ext, pil_format, options in formats:
+                    path = os.path.join(target_dir, f"{token}_{size_name}.{ext}")
+                    tmp = f"{path}.tmp"
+                    current.save(tmp, pil_format, **options)
+                    os.replace(tmp, path)
+                    written.append(path)
+        except Exception:
+            for path in written:
+                ImagePipeline._unlink(path)
+            raise
+
+        name = f"{shard}/{token}_full.{formats[0][0]}"
+        logger.info(f"🖼️ Stored photo {name} ({img.size[0]}x{img.size[1]}, {len(written)} files)")
+        return name
+
+    # ------------------------------------------------------------------
+    # CLEANUP
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def remove(name, app=None):
+        """Delete every derivative of a stored photo (legacy names are left alone)."""
+        if not ImagePipeline.is_managed(name):
+            return
+        app = app or current_app
+        folder = ImagePipeline.folder(app)
+        for size_name in ImagePipeline.sizes(app):
+            for ext in ('webp', 'jpg'):
+                ImagePipeline._unlink(os.path.join(folder, ImagePipeline.variant(name, size_name, ext)))
@@ -0,0 +1,335 @@
+# services/job_queue.py
+"""
+Persistent queue for long-running jobs.
+
+Batch exports and similar work used to run on daemon threads inside the
+web worker, which gunicorn recycles every few dozen requests
+(--max-requests), dropping running jobs and their results. Jobs are now
+BackgroundJob rows:
+
+  * the web process only enqueues a row and reads it back for progress
+  * `flask jobs-worker` (started next to gunicorn by gunicorn.conf.py, or
+    run as its own process where storage is shared) claims queued jobs one
+    at a time with a conditional UPDATE and runs the handler for the kind
+  * handlers report progress on the row; output files are written to disk
+    and recorded in `path`, so a finished job can be downloaded after any
+    number of web worker restarts
+  * a job whose worker died (no heartbeat for JOB_STALE_AFTER seconds) is
+    queued again, up to JOB_MAX_ATTEMPTS claims; handlers must therefore be
+    safe to re-run. A worker stopped with SIGTERM puts its job back at once.
+
+Finished jobs (and their files) are removed after JOB_RETENTION_HOURS.
+"""
+
+import importlib
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from models import BackgroundJob, db
+
+logger = logging.getLogger(__name__)
+
+
+# kind -> "module:Class.method" called as handler(app, job); resolved lazily
+# so the web process never imports the heavier job modules
+HANDLERS = {
+    'batch_export': 'services.batch_export_service:BatchExportService.run_job',
+    'admissions_approval': 'services.admissions_batch_service:AdmissionsBatchService.run_job',
+    'table_backup': 'utils.backup:run_backup_job',
+    'video_prepare': 'services.video_pipeline:VideoPipeline.run_job',
+    'receipt_batch': 'services.receipt_service:ReceiptService.run_batch_job',
+}
+
+ACTIVE = ('queued', 'running')
+
+# How often an idle worker looks for expired jobs to delete
+PRUNE_EVERY = 600
+
+
+def _json(value):
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+def _loads(value):
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+
+
+class JobQueue:
+    """
+    Enqueue, claim, track and run BackgroundJob rows.
+    """
+
+    # ------------------------------------------------------------------
+    # WEB SIDE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def enqueue(kind, params=None, requested_by=None):
+        """
+        Queue a job and return its id.
+
+        Raises:
+            ValueError: Unknown kind
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = BackgroundJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status='queued',
+            params=_json(params or {}),
+            total=0,
+            done=0,
+            attempts=0,
+            requested_by=requested_by,
+            created_at=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+        logger.info(f"🗂️ Queued {kind} job {job.id}")
+        return job.id
+
+    @staticmethod
+    def active(kind):
+        """Whether a job of `kind` is queued or running."""
+        return db.session.query(BackgroundJob.id).filter(
+            BackgroundJob.kind == kind, BackgroundJob.status.in_(ACTIVE)
+        ).first() is not None
+
+    @staticmethod
+    def get(job_id, kind=None):
+        """
+        A dict snapshot of the job (params/progress decoded), or None.
+
+        Read on its own connection, so it is current even inside a
+        long-running transaction.
+        """
+        table = BackgroundJob.__table__
+        statement = select(table).where(table.c.id == str(job_id))
+        if kind:
+            statement = statement.where(table.c.kind == kind)
+        with db.engine.connect() as conn:
+            row = conn.execute(statement).mappings().first()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['params'] = _loads(job['params'])
+        job['progress'] = _loads(job['progress'])
+        for field in ('created_at', 'started_at', 'heartbeat_at', 'finished_at'):
+            if job[field] is not None:
+                job[field] = job[field].isoformat()
+        return job
+
+    # ------------------------------------------------------------------
+    # PROGRESS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def update(job_id, **fields):
+        """
+        Write fields to the job row (and refresh its heartbeat).
+
+        Runs in its own short transaction, independent of db.session, so
+        reporting progress never commits or expires the handler's work.
+        """
+        table = BackgroundJob.__table__
+        values = {name: _json(value) for name, value in fields.items()}
+        values['heartbeat_at'] = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id == job_id).values(**values))
+
+    @staticmethod
+    def reporter(job_id, interval=None):
+        """
+        A report(**fields) callable that writes at most once per `interval`
+        seconds (JOB_PROGRESS_INTERVAL); report(force=True, ...) always writes.
+        """
+        if interval is None:
+            interval = current_app.config.get('JOB_PROGRESS_INTERVAL', 2)
+        last = [0.0]
+
+        def report(force=False, **fields):
+            now = time.monotonic()
+            if force or now - last[0] >= interval:
+                JobQueue.update(job_id, **fields)
+                last[0] = now
+
+        return report
+
+    @staticmethod
+    @contextmanager
+    def keepalive(job_id, interval=None):
+        """
+        Refresh the job's heartbeat from a background thread while the block
+        runs, for handlers that wait on work they cannot report progress for.
+        """
+        if interval is None:
+            interval = current_app.config.get('JOB_STALE_AFTER', 900) / 3
+        app = current_app._get_current_object()
+        stop = threading.Event()
+
+        def beat():
+            with app.app_context():
+                while not stop.wait(interval):
+                    try:
+                        JobQueue.update(job_id)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Heartbeat for job {job_id} failed: {e}")
+
+        thread = threading.Thread(target=beat, daemon=True, name=f'job-heartbeat-{job_id}')
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    # ------------------------------------------------------------------
+    # WORKER SIDE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def claim():
+        """Mark the oldest queued job running and return its snapshot, or None."""
+        table = BackgroundJob.__table__
+        while True:
+            with db.engine.begin() as conn:
+                job_id = conn.execute(
+                    select(table.c.id)
+                    .where(table.c.status == 'queued')
+                    .order_by(table.c.created_at)
+                    .limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                now = datetime.utcnow()
+                claimed = conn.execute(
+                    update(table)
+                    .where(table.c.id == job_id, table.c.status == 'queued')
+                    .values(status='running', started_at=now, heartbeat_at=now,
+                            attempts=table.c.attempts + 1, error=None)
+                ).rowcount == 1
+            # Another worker took it between the select and the update: try the next one
+            if claimed:
+                return JobQueue.get(job_id)
+
+    @staticmethod
+    def requeue_stale(stale_after, max_attempts):
+        """
+        Put running jobs without a heartbeat for `stale_after` seconds back in
+        the queue, or fail them once they have used up `max_attempts`.
+        """
+        table = BackgroundJob.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        stale = (table.c.status == 'running') & (table.c.heartbeat_at < cutoff)
+        with db.engine.begin() as conn:
+            failed = conn.execute(
+                update(table)
+                .where(stale, table.c.attempts >= max_attempts)
+                .values(status='failed', error='The job worker stopped responding',
+                        finished_at=datetime.utcnow())
+            ).rowcount
+            requeued = conn.execute(
+                update(table).where(stale).values(status='queued')
+            ).rowcount
+        if failed or requeued:
+            logger.warning(f"⚠️ Stale jobs: {requeued} requeued, {failed} failed")
+
+    @staticmethod
+    def prune(max_age_hours):
+        """Delete finished jobs older than `max_age_hours` and their output files."""
+        cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+        expired = BackgroundJob.query.filter(
+            BackgroundJob.status.in_(('completed', 'failed')),
+            BackgroundJob.finished_at < cutoff
+        ).all()
+        for job in expired:
+            if job.path and os.path.exists(job.path):
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+            db.session.delete(job)
+        db.session.commit()
+        return len(expired)
+
+    @staticmethod
+    def handler(kind):
+        module_name, attribute = HANDLERS[kind].split(':')
+        target = importlib.import_module(module_name)
+        for name in attribute.split('.'):
+            target = getattr(target, name)
+        return target
+
+    @staticmethod
+    def run(app, job):
+        """Run one claimed job to completion (or failure)."""
+        started = time.time()
+        try:
+            result = JobQueue.handler(job['kind'])(app, job) or {}
+            JobQueue.update(job['id'], status='completed', finished_at=datetime.utcnow(), **result)
+            logger.info(f"✅ {job['kind']} job {job['id']} finished in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"{job['kind']} job {job['id']} failed: {e}", exc_info=True)
+            db.session.rollback()
+            JobQueue.update(job['id'], status='failed', error=str(e), finished_at=datetime.utcnow())
+        except BaseException:
+            # Worker shutting down: hand the job back without using up an attempt
+            db.session.rollback()
+            table = BackgroundJob.__table__
+            JobQueue.update(job['id'], status='queued', attempts=table.c.attempts - 1)
+            logger.warning(f"⚠️ {job['kind']} job {job['id']} interrupted; requeued")
+            raise
+        finally:
+            db.session.remove()
+
+    @staticmethod
+    def run_worker(app, once=False):
+        """
+        Claim and run jobs until stopped (or, with `once`, until the queue is empty).
+        """
+        poll_interval = app.config.get('JOB_POLL_INTERVAL', 2)
+        stale_after = app.config.get('JOB_STALE_AFTER', 900)
+        max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+        retention = app.config.get('JOB_RETENTION_HOURS', 6)
+
+        # SIGTERM (deploys, gunicorn shutdown) unwinds like Ctrl-C so the
+        # running job is requeued instead of waiting out JOB_STALE_AFTER
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        logger.info(f"🛠️ Job worker started (pid {os.getpid()})")
+        last_prune = 0.0
+        with app.app_context():
+            while True:
+                JobQueue.requeue_stale(stale_after, max_attempts)
+                job = JobQueue.claim()
+                if job:
+                    JobQueue.run(app, job)
+                    continue
+                if once:
+                    return
+                if time.monotonic() - last_prune > PRUNE_EVERY:
+                    removed = JobQueue.prune(retention)
+                    if removed:
+                        logger.info(f"🧹 Removed {removed} expired job(s)")
+                    last_prune = time.monotonic()
+                db.session.remove()
+                time.sleep(poll_interval)
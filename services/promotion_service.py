@@ -0,0 +1,224 @@
+# services/promotion_service.py
+"""
+Bulk student promotion pipeline.
+
+Promoting a level used to cost several queries per student (profile lookup,
+grade query, lazy course loads). This service does the whole batch in a
+fixed number of statements:
+
+  1. one query for the candidates' profiles and names
+  2. one grouped aggregate for every candidate's yearly GPA
+  3. one UPDATE that moves every approved student to the next level
+  4. one executemany INSERT for the StudentPromotion audit rows
+
+`promote(..., dry_run=True)` stops after step 2 and returns the plan.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, update
+
+from models import (
+    Course, StudentCourseGrade, StudentProfile, StudentPromotion, User, db
+)
+from utils.promotion import LEVEL_PROGRESSION, get_next_level
+
+
+# Same letter → point mapping used by calculate_yearly_gpa
+GRADE_POINTS = {
+    'A': 4.0, 'A-': 3.7,
+    'B+': 3.3, 'B': 3.0, 'B-': 2.7,
+    'C+': 2.3, 'C': 2.0, 'C-': 1.7,
+    'D+': 1.3, 'D': 1.0, 'F': 0.0
+}
+
+
+class PromotionService:
+    """
+    Computes yearly GPAs and applies level transitions for many students at once.
+    """
+
+    @staticmethod
+    def yearly_gpas(user_ids, academic_year):
+        """
+        Credit-weighted yearly GPA for many students in one grouped query.
+
+        Args:
+            user_ids: Iterable of User.user_id strings (e.g. "STD001")
+            academic_year: Academic year string
+
+        Returns:
+            dict mapping user_id -> GPA (students without grades are omitted)
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+
+        points = case(GRADE_POINTS, value=StudentCourseGrade.grade_letter, else_=0.0)
+        credits = func.coalesce(Course.credit_hours, 3)
+
+        query = (
+            db.session.query(
+                User.user_id,
+                func.sum(points * credits),
+                func.sum(credits)
+            )
+            .join(StudentCourseGrade, StudentCourseGrade.student_id == User.id)
+            .outerjoin(Course, Course.id == StudentCourseGrade.course_id)
+            .filter(
+                User.user_id.in_(user_ids),
+                StudentCourseGrade.academic_year == academic_year
+            )
+        )
+
+        # Only finalized grades count (same rule as the grading engine)
+        if hasattr(StudentCourseGrade, 'is_finalized'):
+            query = query.filter(StudentCourseGrade.is_finalized == True)
+        else:
+            query = query.filter(StudentCourseGrade.final_score != None)
+
+        gpas = {}
+        for user_id, total_points, total_credits in query.group_by(User.user_id):
+            gpas[user_id] = (
+                round(float(total_points) / float(total_credits), 2)
+                if total_credits else 0.0
+            )
+        return gpas
+
+    @staticmethod
+    def plan(user_ids, academic_year):
+        """
+        Build the promotion plan without changing anything.
+
+        Returns:
+            dict with:
+                - promotions: list of {student_id, name, programme, from_level,
+                  to_level, gpa, academic_status}
+                - errors: list of {student_id, error}
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+
+        rows = (
+            db.session.query(StudentProfile, User.first_name, User.middle_name, User.last_name)
+            .join(User, User.user_id == StudentProfile.user_id)
+            .filter(StudentProfile.user_id.in_(user_ids))
+            .all()
+        ) if user_ids else []
+        profiles = {row[0].user_id: row for row in rows}
+
+        gpas = PromotionService.yearly_gpas(profiles.keys(), academic_year)
+
+        promotions = []
+        errors = []
+        for user_id in user_ids:
+            row = profiles.get(user_id)
+            if not row:
+                errors.append({'student_id': user_id, 'error': 'Not found'})
+                continue
+
+            profile, first_name, middle_name, last_name = row
+
+            if hasattr(StudentProfile, 'vetting_status') and profile.vetting_status != 'approved':
+                errors.append({'student_id': user_id, 'error': 'Not approved'})
+                continue
+
+            current_level = int(profile.programme_level or LEVEL_PROGRESSION[0])
+            next_level = get_next_level(current_level)
+            if next_level is None and current_level not in LEVEL_PROGRESSION:
+                errors.append({'student_id': user_id, 'error': f'Unknown level {current_level}'})
+                continue
+
+            promotions.append({
+                'student_id': user_id,
+                'name': " ".join(n for n in (first_name, middle_name, last_name) if n),
+                'programme': profile.current_programme,
+                'from_level': current_level,
+                'to_level': next_level or current_level,
+                'gpa': gpas.get(user_id, 0.0),
+                'academic_status': 'Active' if next_level else 'Graduated',
+            })
+
+        return {'promotions': promotions, 'errors': errors}
+
+    @staticmethod
+    def promote(user_ids, academic_year, promoted_by, dry_run=False):
+        """
+        Promote students to their next level.
+
+        Args:
+            user_ids: User.user_id strings of the students to promote
+            academic_year: Academic year the GPA is computed for
+            promoted_by: ID recorded on the StudentPromotion audit rows
+            dry_run: Return the plan without writing anything
+
+        Returns:
+            dict with 'promoted' (count), 'promotions', 'errors', 'dry_run'.
+            The caller commits.
+        """
+        result = PromotionService.plan(user_ids, academic_year)
+        promotions = result['promotions']
+
+        if dry_run or not promotions:
+            return {'promoted': 0, 'dry_run': dry_run, **result}
+
+        level_map = {
+            level: get_next_level(level) or level for level in LEVEL_PROGRESSION
+        }
+        final_level = LEVEL_PROGRESSION[-1]
+
+        values = {
+            'last_level_completed': StudentProfile.programme_level,
+            'programme_level': case(
+                level_map, value=StudentProfile.programme_level,
+                else_=StudentProfile.programme_level
+            ),
+            'academic_status': case(
+                {final_level: 'Graduated'}, value=StudentProfile.programme_level,
+                else_='Active'
+            ),
+        }
+        if hasattr(StudentProfile, 'vetting_status'):
+            values['vetting_status'] = 'promoted'
+
+        # Only rows still at the level the plan saw are moved, so a
+        # concurrent promotion cannot push a student up twice.
+        by_level = {}
+        for p in promotions:
+            by_level.setdefault(p['from_level'], []).append(p['student_id'])
+        level_guard = db.or_(*[
+            db.and_(
+                StudentProfile.programme_level == level,
+                StudentProfile.user_id.in_(ids)
+            )
+            for level, ids in by_level.items()
+        ])
+
+        updated = db.session.execute(
+            update(StudentProfile).where(level_guard).values(**values),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+        if updated != len(promotions):
+            db.session.rollback()
+            raise RuntimeError(
+                f"Promotion aborted: expected {len(promotions)} students, "
+                f"{updated} matched (records changed during promotion)"
+            )
+
+        now = datetime.utcnow()
+        db.session.execute(insert(StudentPromotion), [
+            {
+                'student_id': p['student_id'],
+                'from_level': str(p['from_level']),
+                'to_level': str(p['to_level']),
+                'gpa': p['gpa'],
+                'academic_status': p['academic_status'],
+                'academic_year': academic_year,
+                'promoted_by': promoted_by,
+                'promoted_at': now,
+                'created_at': now,
+            }
+            for p in promotions
+        ])
+
+        return {'promoted': len(promotions), 'dry_run': False, **result}
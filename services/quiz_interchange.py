@@ -0,0 +1,556 @@
+# services/quiz_interchange.py
+"""
+Quiz export, validation and bulk import.
+
+Quizzes travel in a versioned interchange format, as JSON or CSV:
+
+    {
+      "format": "quiz-interchange",
+      "version": 2,
+      "exported_at": "2026-10-19T08:00:00",
+      "quiz": {"title", "course_name", "programme_name", "programme_level",
+               "date", "start_datetime", "end_datetime",
+               "duration_minutes", "attempts_allowed"},
+      "questions": [
+        {"text", "question_type", "points",
+         "options": [{"text", "is_correct"}]}
+      ]
+    }
+
+The CSV form is a question bank a teacher can edit in a spreadsheet: a
+`#quiz-interchange,2` row, optional `#<field>,<value>` rows carrying the
+quiz fields above, then one row per option under CSV_COLUMNS. A question
+without options (subjective with no rubric) is a single row with an empty
+option. Version 1 files - the old `{"quiz", "questions"}` JSON backups and
+the flat `Question, Option, Is Correct` CSVs - are still read; their types
+are inferred as before and every question is worth one point.
+
+A document is validated in full before anything is written, and every
+problem is reported with its question (and option) number. The import
+then inserts questions and options in chunks with one executemany each,
+reading the new ids back with RETURNING, and sets `correct_option_id` on
+the MCQs with a single bulk UPDATE; a bank of thousands of questions is a
+handful of statements instead of two flushes per row. A dry run stops
+after validation and reports what would be imported.
+"""
+
+import csv
+import io
+import json
+import logging
+import re
+from collections import Counter
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+
+from models import Course, Option, Question, Quiz
+from utils.extensions import db
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'quiz-interchange'
+FORMAT_VERSION = 2
+
+QUESTION_TYPES = ('mcq', 'true_false', 'fill_in', 'math', 'subjective')
+CSV_COLUMNS = ['question_no', 'question_type', 'points', 'question', 'option', 'is_correct']
+QUIZ_FIELDS = (
+    'title', 'course_name', 'programme_name', 'programme_level', 'date',
+    'start_datetime', 'end_datetime', 'duration_minutes', 'attempts_allowed',
+)
+
+# Option.text is a String(1000)
+MAX_OPTION_LENGTH = 1000
+# Stop collecting after this many problems; the rest are summarised
+MAX_ERRORS = 50
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on', 'x')
+BLANK_RE = re.compile(r'_{3,}')
+
+
+class QuizImportError(ValueError):
+    """The document cannot be imported (messages are shown to the user)."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _is_true(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+class QuizInterchange:
+    """
+    Read, validate, write and import quiz interchange documents.
+    """
+
+    # ------------------------------------------------------------------
+    # EXPORT
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def document(quiz_data, questions_data):
+        """Wrap plain quiz / question dicts in a current-version document."""
+        return {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'exported_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'quiz': {field: _iso(quiz_data.get(field)) for field in QUIZ_FIELDS},
+            'questions': [
+                {
+                    'text': q.get('text', ''),
+                    'question_type': q.get('question_type') or 'mcq',
+                    'points': float(q.get('points') or 1.0),
+                    'options': [
+                        {'text': o.get('text', ''), 'is_correct': bool(o.get('is_correct'))}
+                        for o in q.get('options', [])
+                    ],
+                }
+                for q in questions_data
+            ],
+        }
+
+    @staticmethod
+    def export_quiz(quiz):
+        """The document for a stored quiz (two queries, however many questions)."""
+        questions = db.session.execute(
+            select(Question.id, Question.text, Question.question_type, Question.points)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.id)
+        ).all()
+
+        options = {}
+        for question_id, text, is_correct in db.session.execute(
+            select(Option.question_id, Option.text, Option.is_correct)
+            .join(Question, Option.question_id == Question.id)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Option.question_id, Option.id)
+        ):
+            options.setdefault(question_id, []).append({'text': text, 'is_correct': is_correct})
+
+        quiz_data = {field: getattr(quiz, field, None) for field in QUIZ_FIELDS}
+        return QuizInterchange.document(quiz_data, [
+            {
+                'text': q.text,
+                'question_type': q.question_type,
+                'points': q.points,
+                'options': options.get(q.id, []),
+            }
+            for q in questions
+        ])
+
+    @staticmethod
+    def to_json(document):
+        return json.dumps(document, indent=2, ensure_ascii=False)
+
+    @staticmethod
+    def to_csv(document):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([f'#{FORMAT_NAME}', FORMAT_VERSION])
+        for field in QUIZ_FIELDS:
+            value = (document.get('quiz') or {}).get(field)
+            if value not in (None, ''):
+                writer.writerow([f'#{field}', value])
+        writer.writerow(CSV_COLUMNS)
+        for number, q in enumerate(document['questions'], start=1):
+            points = q.get('points', 1.0)
+            options = q.get('options') or [{'text': '', 'is_correct': False}]
+            for o in options:
+                writer.writerow([
+                    number, q['question_type'], points, q['text'],
+                    o['text'], 'yes' if o.get('is_correct') else 'no',
+                ])
+        return buffer.getvalue()
+
+    @staticmethod
+    def filename(document, fmt):
+        title = (document.get('quiz') or {}).get('title') or 'quiz'
+        stem = re.sub(r'[^A-Za-z0-9_-]+', '_', title).strip('_') or 'quiz'
+        return f"{stem}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+
+    # ------------------------------------------------------------------
+    # PARSING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def load(filename, stream):
+        """
+        Parse an uploaded .json or .csv file into a document.
+
+        Raises:
+            QuizImportError: On an unsupported extension or unreadable content
+        """
+        name = (filename or '').lower()
+        try:
+            raw = stream.read()
+            text = raw.decode('utf-8-sig') if isinstance(raw, bytes) else raw
+        except UnicodeDecodeError:
+            raise QuizImportError("The file is not UTF-8 text.")
+
+        if name.endswith('.json'):
+            try:
+                document = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise QuizImportError(f"Invalid JSON: {e}")
+            if not isinstance(document, dict):
+                raise QuizImportError("The JSON file must contain an object.")
+            return document
+        if name.endswith('.csv'):
+            return QuizInterchange.parse_csv(text)
+        raise QuizImportError("Please upload a .json or .csv quiz file.")
+
+    @staticmethod
+    def parse_csv(text):
+        """CSV text (current or version 1 layout) -> document."""
+        rows = [row for row in csv.reader(io.StringIO(text))]
+        meta, version, body = {}, 1, []
+        for index, row in enumerate(rows):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            first = row[0].strip()
+            if first.startswith('#'):
+                key = first[1:].strip()
+                value = row[1].strip() if len(row) > 1 else ''
+                if key == FORMAT_NAME:
+                    version = int(value) if value.isdigit() else 0
+                elif key in QUIZ_FIELDS:
+                    meta[key] = value
+                continue
+            body = rows[index:]
+            break
+
+        # A hand-made bank may start straight at the header row
+        if version == 1 and body and body[0] and body[0][0].strip().lower() == CSV_COLUMNS[0]:
+            version = FORMAT_VERSION
+        if version == FORMAT_VERSION:
+            return QuizInterchange._parse_csv_rows(body, meta)
+        if version != 1:
+            raise QuizImportError(f"Unsupported quiz file version in CSV: {version}")
+        return QuizInterchange._parse_legacy_csv(rows)
+
+    @staticmethod
+    def _parse_csv_rows(rows, meta):
+        if not rows:
+            raise QuizImportError("The CSV file has no question rows.")
+        header = [cell.strip().lower() for cell in rows[0]]
+        missing = [column for column in CSV_COLUMNS if column not in header]
+        if missing:
+            raise QuizImportError(f"CSV header is missing: {', '.join(missing)}")
+        col = {column: header.index(column) for column in CSV_COLUMNS}
+
+        questions, by_number = [], {}
+        for line, row in enumerate(rows[1:], start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            row = row + [''] * (len(header) - len(row))
+            number = row[col['question_no']].strip()
+            question = by_number.get(number)
+            if question is None:
+                question = {
+                    'text': row[col['question']].strip(),
+                    'question_type': row[col['question_type']].strip().lower(),
+                    'points': row[col['points']].strip() or 1.0,
+                    'options': [],
+                    'line': line,
+                }
+                by_number[number] = question
+                questions.append(question)
+            option = row[col['option']].strip()
+            if option:
+                question['options'].append({'text': option, 'is_correct': _is_true(row[col['is_correct']])})
+
+        return {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'quiz': meta or None, 'questions': questions}
+
+    @staticmethod
+    def _parse_legacy_csv(rows):
+        """Flat `Question, Option, Is Correct` rows (optionally after a metadata block)."""
+        start = next(
+            (i for i, row in enumerate(rows) if row and row[0].strip().lower() == 'question'),
+            None
+        )
+        if start is None:
+            raise QuizImportError(
+                "Unrecognised CSV layout. Expected the columns: " + ', '.join(CSV_COLUMNS)
+            )
+
+        questions = []
+        for row in rows[start + 1:]:
+            if len(row) < 2 or not row[0].strip():
+                continue
+            text = row[0].strip()
+            if not questions or questions[-1]['text'] != text:
+                questions.append({'text': text, 'options': []})
+            if row[1].strip():
+                questions[-1]['options'].append({
+                    'text': row[1].strip(),
+                    'is_correct': _is_true(row[2] if len(row) > 2 else ''),
+                })
+        return {'quiz': None, 'questions': questions}
+
+    # ------------------------------------------------------------------
+    # VALIDATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def validate(document, need_quiz=True):
+        """
+        Check a document and return (quiz_fields, questions) ready to insert.
+
+        Args:
+            need_quiz: Whether quiz fields are required (False when the
+                questions are imported into an existing quiz)
+
+        Raises:
+            QuizImportError: With one message per problem found
+        """
+        errors = []
+        version = document.get('version', 1) if document.get('format') == FORMAT_NAME else 1
+        if document.get('format') not in (None, FORMAT_NAME):
+            raise QuizImportError(f"Not a quiz file (format: {document.get('format')}).")
+        if version not in (1, FORMAT_VERSION):
+            raise QuizImportError(f"Unsupported quiz file version: {version}")
+
+        quiz_fields = None
+        if need_quiz:
+            quiz_fields = QuizInterchange._validate_quiz(document.get('quiz'), errors)
+
+        raw_questions = document.get('questions')
+        if not isinstance(raw_questions, list) or not raw_questions:
+            errors.append("The file contains no questions.")
+            raw_questions = []
+
+        questions = []
+        for number, raw in enumerate(raw_questions, start=1):
+            if len(errors) >= MAX_ERRORS:
+                break
+            label = f"Question {number}"
+            if isinstance(raw, dict) and raw.get('line'):
+                label += f" (line {raw['line']})"
+            question = QuizInterchange._validate_question(raw, version, label, errors)
+            if question is not None:
+                questions.append(question)
+
+        if errors:
+            shown = errors[:MAX_ERRORS]
+            if len(errors) >= MAX_ERRORS:
+                shown.append("Further problems were not checked.")
+            raise QuizImportError(f"{len(errors)} problem(s) found in the quiz file.", shown)
+        return quiz_fields, questions
+
+    @staticmethod
+    def _validate_quiz(raw, errors):
+        if not isinstance(raw, dict):
+            errors.append("Quiz details (title, course, schedule) are missing; choose a quiz to import into.")
+            return None
+
+        fields = {}
+        for field in ('title', 'course_name'):
+            value = str(raw.get(field) or '').strip()
+            if not value:
+                errors.append(f"Quiz {field.replace('_', ' ')} is required.")
+            fields[field] = value
+
+        # Version 1 backups still carry the pre-programme `assigned_class`
+        level = raw.get('programme_level') or raw.get('assigned_class')
+        if not level:
+            errors.append("Quiz programme level is required.")
+        fields['programme_level'] = str(level or '').strip()
+        fields['programme_name'] = str(raw.get('programme_name') or '').strip() or None
+
+        for field in ('start_datetime', 'end_datetime'):
+            try:
+                fields[field] = datetime.fromisoformat(str(raw.get(field) or ''))
+            except ValueError:
+                errors.append(f"Quiz {field.replace('_', ' ')} must be an ISO date-time.")
+                fields[field] = None
+        if fields['start_datetime'] and fields['end_datetime'] and fields['end_datetime'] <= fields['start_datetime']:
+            errors.append("Quiz end date-time must be after its start.")
+
+        try:
+            fields['date'] = date.fromisoformat(str(raw['date'])[:10]) if raw.get('date') else (
+                fields['start_datetime'].date() if fields['start_datetime'] else None
+            )
+        except ValueError:
+            errors.append("Quiz date must be an ISO date.")
+            fields['date'] = None
+
+        for field, default in (('duration_minutes', None), ('attempts_allowed', 1)):
+            value = raw.get(field, default)
+            try:
+                fields[field] = int(value)
+                if fields[field] <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f"Quiz {field.replace('_', ' ')} must be a positive whole number.")
+        return fields
+
+    @staticmethod
+    def _validate_question(raw, version, label, errors):
+        if not isinstance(raw, dict):
+            errors.append(f"{label}: not a question object.")
+            return None
+
+        text = str(raw.get('text') or '').strip()
+        if not text:
+            errors.append(f"{label}: question text is empty.")
+
+        if version == 1:
+            q_type = 'fill_in' if BLANK_RE.search(text) else (raw.get('question_type') or 'mcq')
+        else:
+            q_type = str(raw.get('question_type') or '').strip().lower()
+        if q_type not in QUESTION_TYPES:
+            errors.append(f"{label}: unknown question type '{q_type}' (expected one of {', '.join(QUESTION_TYPES)}).")
+
+        try:
+            points = float(raw.get('points') or 1.0)
+            if points <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f"{label}: points must be a positive number.")
+            points = None
+
+        options = []
+        raw_options = raw.get('options') or []
+        if not isinstance(raw_options, list):
+            errors.append(f"{label}: options must be a list.")
+            raw_options = []
+        for o_number, option in enumerate(raw_options, start=1):
+            o_text = str((option or {}).get('text') or '').strip() if isinstance(option, dict) else ''
+            if not o_text:
+                errors.append(f"{label}, option {o_number}: option text is empty.")
+                continue
+            if len(o_text) > MAX_OPTION_LENGTH:
+                errors.append(f"{label}, option {o_number}: longer than {MAX_OPTION_LENGTH} characters.")
+                continue
+            options.append({'text': o_text, 'is_correct': _is_true(option.get('is_correct'))})
+
+        correct = sum(1 for o in options if o['is_correct'])
+        if q_type == 'mcq':
+            if len(options) < 2:
+                errors.append(f"{label}: a multiple-choice question needs at least two options.")
+            elif not correct:
+                errors.append(f"{label}: no option is marked correct.")
+        elif q_type == 'true_false':
+            if len(options) != 2 or correct != 1:
+                errors.append(f"{label}: a true/false question needs two options, exactly one correct.")
+        elif q_type in ('fill_in', 'math'):
+            if not options:
+                errors.append(f"{label}: at least one accepted answer is required.")
+            # Every listed answer is an accepted answer
+            options = [{'text': o['text'], 'is_correct': True} for o in options]
+
+        return {'text': text, 'question_type': q_type, 'points': points, 'options': options}
+
+    # ------------------------------------------------------------------
+    # IMPORT
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def import_document(document, quiz=None, dry_run=False):
+        """
+        Validate a document and import its questions, creating the quiz
+        from its details unless `quiz` is given.
+
+        Returns:
+            dict: quiz_id (None on a dry run that would create the quiz),
+            title, questions, options, by_type, dry_run
+
+        Raises:
+            QuizImportError: On any validation problem, a missing course or
+                a quiz that already exists; nothing is written
+        """
+        quiz_fields, questions = QuizInterchange.validate(document, need_quiz=quiz is None)
+
+        course = None
+        if quiz is None:
+            course = Course.query.filter_by(name=quiz_fields['course_name']).first()
+            if course is None:
+                raise QuizImportError(f"Course '{quiz_fields['course_name']}' does not exist.")
+            duplicate = Quiz.query.filter_by(
+                title=quiz_fields['title'],
+                programme_name=quiz_fields['programme_name'],
+                programme_level=quiz_fields['programme_level'],
+            ).first()
+            if duplicate is not None:
+                raise QuizImportError(f"A quiz titled '{quiz_fields['title']}' already exists for this class.")
+
+        summary = {
+            'quiz_id': quiz.id if quiz is not None else None,
+            'title': quiz.title if quiz is not None else quiz_fields['title'],
+            'questions': len(questions),
+            'options': sum(len(q['options']) for q in questions),
+            'by_type': dict(Counter(q['question_type'] for q in questions)),
+            'dry_run': dry_run,
+        }
+        if dry_run:
+            return summary
+
+        try:
+            if quiz is None:
+                quiz = Quiz(course_id=course.id, **quiz_fields)
+                db.session.add(quiz)
+                db.session.flush()
+            QuizInterchange.insert_questions(quiz.id, questions)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        summary['quiz_id'] = quiz.id
+        logger.info(f"Imported {summary['questions']} questions / {summary['options']} options into quiz {quiz.id}")
+        return summary
+
+    @staticmethod
+    def insert_questions(quiz_id, questions, chunk_size=None):
+        """
+        Bulk-insert validated questions and their options (caller commits).
+
+        Each chunk is one executemany for the questions and one for their
+        options, with the generated ids read back in parameter order.
+        """
+        chunk_size = chunk_size or current_app.config.get('QUIZ_IMPORT_CHUNK_SIZE', 500)
+        for offset in range(0, len(questions), chunk_size):
+            chunk = questions[offset:offset + chunk_size]
+
+            question_ids = db.session.scalars(
+                insert(Question).returning(Question.id, sort_by_parameter_order=True),
+                [
+                    {'quiz_id': quiz_id, 'text': q['text'], 'question_type': q['question_type'], 'points': q['points']}
+                    for q in chunk
+                ]
+            ).all()
+
+            option_rows, is_mcq = [], {}
+            for question_id, q in zip(question_ids, chunk):
+                is_mcq[question_id] = q['question_type'] == 'mcq'
+                option_rows.extend(
+                    {'question_id': question_id, 'text': o['text'], 'is_correct': o['is_correct']}
+                    for o in q['options']
+                )
+            if not option_rows:
+                continue
+
+            correct = {}
+            for option_id, question_id, is_correct in db.session.execute(
+                insert(Option).returning(
+                    Option.id, Option.question_id, Option.is_correct, sort_by_parameter_order=True
+                ),
+                option_rows
+            ):
+                if is_correct and is_mcq[question_id]:
+                    correct.setdefault(question_id, option_id)
+
+            if correct:
+                db.session.execute(
+                    update(Question),
+                    [{'id': question_id, 'correct_option_id': option_id} for question_id, option_id in correct.items()]
+                )
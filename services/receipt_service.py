@@ -0,0 +1,204 @@
+# services/receipt_service.py
+"""
+Receipt delivery for students and finance.
+
+A receipt is issued once, when its payment is approved (generate_receipt
+writes RECEIPT_FOLDER/receipt_<id>.pdf), and that stored file is what a
+download serves. Only when the file is missing (ephemeral disk, payments
+approved before receipts were stored) is it rendered again, with the fee
+summary as of the transaction, and stored for next time.
+
+End-of-day batches cover every approved transaction in a date range,
+either as one PDF with a page per receipt or as a ZIP with a PDF each.
+They run as `receipt_batch` jobs (services/job_queue.py): the job worker
+writes BATCH_EXPORT_FOLDER/<job id>.pdf|zip and finance downloads it once
+the job completes. ZIP batches copy the stored receipts and render only
+the missing ones.
+"""
+
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from models import StudentFeeTransaction, User
+from services.job_queue import JobQueue
+from utils.extensions import db
+from utils.receipts import generate_receipt, load_payloads, receipt_path, render_receipt, render_receipts
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptService:
+    """
+    Stored single receipts and date-range receipt batches.
+    """
+
+    FORMATS = ('pdf', 'zip')
+
+    # ------------------------------------------------------------------
+    # SINGLE RECEIPTS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def receipt_file(transaction):
+        """
+        Return (filename, path) of the stored receipt for an approved
+        transaction, re-issuing it first if the file is missing.
+        """
+        path = receipt_path(transaction.id)
+        if not os.path.exists(path):
+            logger.info(f"🧾 Receipt for transaction {transaction.id} missing; re-issuing")
+            generate_receipt(transaction, transaction.student)
+        return os.path.basename(path), path
+
+    # ------------------------------------------------------------------
+    # BATCHES
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def approved_ids(start_date, end_date):
+        """Ids of approved transactions timestamped on [start_date, end_date] (inclusive days)."""
+        rows = db.session.query(StudentFeeTransaction.id).filter(
+            StudentFeeTransaction.is_approved == True,
+            StudentFeeTransaction.timestamp >= datetime.combine(start_date, time.min),
+            StudentFeeTransaction.timestamp < datetime.combine(end_date + timedelta(days=1), time.min)
+        ).order_by(StudentFeeTransaction.timestamp, StudentFeeTransaction.id)
+        return [row.id for row in rows]
+
+    @staticmethod
+    def iter_payloads(ids, chunk_size=200):
+        """Yield payloads for transaction ids, loading transactions and totals one chunk at a time."""
+        for offset in range(0, len(ids), chunk_size):
+            chunk = ids[offset:offset + chunk_size]
+            transactions = (
+                StudentFeeTransaction.query
+                .options(joinedload(StudentFeeTransaction.student).joinedload(User.student_profile))
+                .filter(StudentFeeTransaction.id.in_(chunk))
+                .all()
+            )
+            by_id = {t.id: t for t in transactions}
+            for payload in load_payloads([by_id[i] for i in chunk if i in by_id]):
+                yield payload
+
+    @staticmethod
+    def check_range(start_date, end_date):
+        """
+        Raises:
+            ValueError: On a reversed range or one wider than RECEIPT_BATCH_MAX_DAYS
+        """
+        if end_date < start_date:
+            raise ValueError("End date is before start date")
+        max_days = current_app.config.get('RECEIPT_BATCH_MAX_DAYS', 31)
+        if (end_date - start_date).days + 1 > max_days:
+            raise ValueError(f"A receipt batch covers at most {max_days} days")
+
+    @staticmethod
+    def start_batch(start_date, end_date, fmt, requested_by=None):
+        """
+        Queue a receipt batch job and return its id.
+
+        Raises:
+            ValueError: On an unknown format, a bad range or a range without approved payments
+        """
+        if fmt not in ReceiptService.FORMATS:
+            raise ValueError(f"Unknown batch format: {fmt}")
+        ReceiptService.check_range(start_date, end_date)
+        if not ReceiptService.approved_ids(start_date, end_date):
+            raise ValueError("No approved payments in that date range")
+
+        return JobQueue.enqueue('receipt_batch', {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'format': fmt,
+        }, requested_by=requested_by)
+
+    @staticmethod
+    def get_batch(job_id):
+        """Return the batch job's status dict (see JobQueue.get), or None."""
+        return JobQueue.get(job_id, kind='receipt_batch')
+
+    @staticmethod
+    def run_batch_job(app, job):
+        """
+        Job worker handler: write the batch to BATCH_EXPORT_FOLDER/<job id>.<format>.
+
+        Re-running after an interruption simply rewrites the file.
+        """
+        params = job['params']
+        start = date.fromisoformat(params['start'])
+        end = date.fromisoformat(params['end'])
+        fmt = params['format']
+
+        ids = ReceiptService.approved_ids(start, end)
+        JobQueue.update(job['id'], total=len(ids), done=0)
+
+        export_dir = app.config['BATCH_EXPORT_FOLDER']
+        os.makedirs(export_dir, exist_ok=True)
+        path = os.path.join(export_dir, f"{job['id']}.{fmt}")
+
+        report = JobQueue.reporter(job['id'])
+        try:
+            with open(path, 'wb') as out:
+                count = ReceiptService.write_batch(fmt, ids, out, on_progress=lambda n: report(done=n))
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        logger.info(f"🧾 Receipt batch {start}..{end}: {count} receipt(s) as {fmt}")
+        label = start.isoformat() if start == end else f"{start.isoformat()}_{end.isoformat()}"
+        return {'done': count, 'path': path, 'filename': f"receipts_{label}.{fmt}"}
+
+    @staticmethod
+    def write_batch(fmt, ids, out, on_progress=None):
+        """
+        Write the receipts of transaction ids (see approved_ids) to the file-like `out`.
+
+        Args:
+            on_progress: Optional callable given the number of receipts written so far
+
+        Returns:
+            int: Number of receipts written
+
+        Raises:
+            ValueError: On an unknown format
+        """
+        if fmt not in ReceiptService.FORMATS:
+            raise ValueError(f"Unknown batch format: {fmt}")
+
+        chunk_size = current_app.config.get('RECEIPT_BATCH_CHUNK_SIZE', 200)
+        progress = on_progress or (lambda n: None)
+
+        if fmt == 'pdf':
+            def counted(payloads):
+                for n, payload in enumerate(payloads, 1):
+                    yield payload
+                    progress(n)
+
+            # One document: fonts are embedded (and subset) once for the whole batch
+            return render_receipts(counted(ReceiptService.iter_payloads(ids, chunk_size)), out=out)
+
+        count = 0
+        with ZipFile(out, 'w', compression=ZIP_DEFLATED) as archive:
+            for offset in range(0, len(ids), chunk_size):
+                chunk = ids[offset:offset + chunk_size]
+                missing = [i for i in chunk if not os.path.exists(receipt_path(i))]
+                rendered = {
+                    payload['transaction_id']: render_receipt(payload)
+                    for payload in ReceiptService.iter_payloads(missing, chunk_size)
+                }
+                for txn_id in chunk:
+                    if txn_id in rendered:
+                        archive.writestr(*rendered[txn_id])
+                    elif txn_id not in missing:
+                        path = receipt_path(txn_id)
+                        archive.write(path, os.path.basename(path))
+                    else:
+                        continue
+                    count += 1
+                progress(count)
+        return count
@@ -0,0 +1,212 @@
+# services/registration_service.py
+"""
+Course registration: diff-based, single-transaction, capacity-aware.
+
+Registration used to delete all of a student's rows for the term, commit,
+and insert the new selection one row at a time. A crash in between left the
+student unregistered, and nothing stopped a course from being overbooked
+when the window opened and hundreds of students submitted at once.
+
+`RegistrationService.apply()` instead:
+
+  * compares the submitted selection with what is registered and only
+    deletes removed courses / inserts added ones, all in one transaction
+  * claims a seat per added course with a conditional UPDATE
+    (`seats_taken = seats_taken + 1 WHERE seats_taken < capacity`); the
+    UPDATE row-locks the course until commit, so concurrent claims on the
+    last seat serialise and exactly one succeeds. Seats are released only
+    for registration rows this transaction actually deleted.
+  * touches course rows in ascending id order, so two students' claims
+    cannot deadlock
+  * relies on uq_student_course_registration to reject a double submit
+
+If any added course is full, nothing is changed and RegistrationError lists
+the full courses.
+"""
+
+import logging
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import Course, StudentCourseRegistration, db
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationError(ValueError):
+    """The selection cannot be registered (message is shown to the student)."""
+
+    def __init__(self, message, full_courses=None):
+        super().__init__(message)
+        self.full_courses = full_courses or []
+
+
+class RegistrationService:
+    """
+    Apply a student's course selection for a term.
+    """
+
+    # ------------------------------------------------------------------
+    # QUERIES
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def registered_ids(student_id, academic_year, semester):
+        return set(db.session.scalars(
+            select(StudentCourseRegistration.course_id).where(
+                StudentCourseRegistration.student_id == student_id,
+                StudentCourseRegistration.academic_year == academic_year,
+                StudentCourseRegistration.semester == semester,
+            )
+        ))
+
+    # ------------------------------------------------------------------
+    # REGISTRATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def apply(student_id, academic_year, semester, course_ids, offered=None, optional_limit=None):
+        """
+        Make the student's registrations for the term equal to `course_ids`.
+
+        `offered` ({course_id: Course or CourseEntry}) restricts the
+        selection to the class's courses; `optional_limit` caps the
+        non-mandatory ones (see utils.catalog_cache.optional_limit).
+
+        Returns:
+            (added_ids, removed_ids)
+
+        Raises:
+            RegistrationError: Course not offered, limit exceeded, course
+                full, or a concurrent submission by the same student
+        """
+        wanted = set(course_ids)
+
+        if offered is not None:
+            unknown = wanted - set(offered)
+            if unknown:
+                raise RegistrationError("Some selected courses are not offered to your class this term.")
+            if optional_limit is not None:
+                optional = [cid for cid in wanted if not offered[cid].is_mandatory]
+                if len(optional) > optional_limit:
+                    raise RegistrationError(
+                        f"You can register at most {optional_limit} optional course(s) this term."
+                    )
+
+        try:
+            current = RegistrationService.registered_ids(student_id, academic_year, semester)
+            to_add = wanted - current
+            to_remove = current - wanted
+            if not to_add and not to_remove:
+                return set(), set()
+
+            removed = set()
+            if to_remove:
+                removed = RegistrationService._delete(student_id, academic_year, semester, to_remove)
+
+            full = []
+            for course_id in sorted(to_add | removed):
+                if course_id in removed:
+                    db.session.execute(
+                        update(Course)
+                        .where(Course.id == course_id, Course.seats_taken > 0)
+                        .values(seats_taken=Course.seats_taken - 1)
+                        .execution_options(synchronize_session=False)
+                    )
+                elif not RegistrationService._claim_seat(course_id):
+                    full.append(course_id)
+
+            if full:
+                db.session.rollback()
+                names = [
+                    f"{code} - {name}" for code, name in
+                    db.session.execute(select(Course.code, Course.name).where(Course.id.in_(full)))
+                ]
+                raise RegistrationError(f"No seats left in: {', '.join(names)}", full_courses=full)
+
+            if to_add:
+                db.session.execute(insert(StudentCourseRegistration), [
+                    {'student_id': student_id, 'course_id': cid,
+                     'academic_year': academic_year, 'semester': semester}
+                    for cid in sorted(to_add)
+                ])
+
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            raise RegistrationError("Your registration was changed by another submission; please try again.")
+        except RegistrationError:
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+        logger.info(
+            f"📚 Registration for student {student_id} {academic_year} {semester}: "
+            f"+{len(to_add)} -{len(removed)}"
+        )
+        return to_add, removed
+
+    @staticmethod
+    def _claim_seat(course_id):
+        """Conditional UPDATE taking one seat; False when the course is full."""
+        result = db.session.execute(
+            update(Course)
+            .where(
+                Course.id == course_id,
+                (Course.capacity.is_(None)) | (Course.seats_taken < Course.capacity)
+            )
+            .values(seats_taken=Course.seats_taken + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def _delete(student_id, academic_year, semester, course_ids):
+        """Delete registrations; returns the course ids whose row was actually deleted."""
+        table = StudentCourseRegistration.__table__
+        condition = (
+            (table.c.student_id == student_id)
+            & (table.c.academic_year == academic_year)
+            & (table.c.semester == semester)
+            & (table.c.course_id.in_(course_ids))
+        )
+        if db.engine.dialect.delete_returning:
+            return set(db.session.scalars(delete(table).where(condition).returning(table.c.course_id)))
+
+        # No RETURNING: lock the rows first so the delete removes exactly these
+        ids = set(db.session.scalars(select(table.c.course_id).where(condition).with_for_update()))
+        db.session.execute(delete(table).where(condition))
+        return ids
+
+    @staticmethod
+    def release_all(student_id, academic_year, semester):
+        """Drop every registration for the term and free the seats."""
+        return RegistrationService.apply(student_id, academic_year, semester, [])[1]
+
+    # ------------------------------------------------------------------
+    # MAINTENANCE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def recount_seats():
+        """
+        Reset every Course.seats_taken from the registrations table (e.g.
+        after registrations were deleted outside this service).
+
+        Returns the number of courses whose counter changed.
+        """
+        counts = dict(db.session.execute(
+            select(StudentCourseRegistration.course_id, func.count())
+            .group_by(StudentCourseRegistration.course_id)
+        ).all())
+
+        changed = 0
+        for course in Course.query.all():
+            actual = counts.get(course.id, 0)
+            if course.seats_taken != actual:
+                course.seats_taken = actual
+                changed += 1
+        db.session.commit()
+        return changed
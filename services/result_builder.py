@@ -86,16 +86,65 @@ class ResultBuilder:
             ).first() is not None
         )
 
-        # Build results list
+        schemes = ResultBuilder.assessment_schemes_for([g.course_id for g in grades])
+
+        return ResultBuilder.build_semester(
+            grades, academic_year, semester, is_released, schemes
+        )
+
+    @staticmethod
+    def assessment_schemes_for(course_ids):
+        """
+        Load assessment schemes for several courses in one query.
+
+        Args:
+            course_ids: Iterable of Course.id values
+
+        Returns:
+            dict mapping course_id -> CourseAssessmentScheme (first scheme per course)
+        """
         from models import CourseAssessmentScheme
+
+        course_ids = set(course_ids)
+        if not course_ids:
+            return {}
+
+        schemes = {}
+        rows = (
+            CourseAssessmentScheme.query
+            .filter(CourseAssessmentScheme.course_id.in_(course_ids))
+            .order_by(CourseAssessmentScheme.id)
+            .all()
+        )
+        for scheme in rows:
+            schemes.setdefault(scheme.course_id, scheme)
+        return schemes
+
+    @staticmethod
+    def build_semester(grades, academic_year, semester, is_released, schemes):
+        """
+        Assemble the semester result payload from already-loaded grades.
+
+        Shared by `semester()` and the class-wide batch export, which loads
+        grades and schemes for a whole class up front.
+
+        Args:
+            grades: StudentCourseGrade objects for one student and semester
+            academic_year: Academic year
+            semester: Semester
+            is_released: Whether results are released to the student
+            schemes: dict of course_id -> CourseAssessmentScheme
+
+        Returns:
+            dict in the same shape as `semester()`
+        """
         results = []
         total_points = 0.0
         total_credits = 0
         
         for grade in grades:
             course = grade.course
-            # Fetch assessment scheme for this course (to show weights)
-            scheme = CourseAssessmentScheme.query.filter_by(course_id=course.id).first()
+            scheme = schemes.get(course.id)
             
             result_entry = {
                 "course_code": course.code,
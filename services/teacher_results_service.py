@@ -0,0 +1,279 @@
+"""
+TEACHER RESULTS SERVICE
+=======================
+Location: services/teacher_results_service.py
+
+Aggregates quiz, exam and assignment submissions for every course a teacher
+owns. Each assessment type is reduced to one row per (course, student) by a
+GROUP BY in the database, and the three are combined with UNION ALL, so the
+results page costs the same handful of queries whether the teacher has one
+course or ten.
+"""
+
+from sqlalchemy import func, literal, select, union_all
+
+from models import (
+    Assignment, AssignmentSubmission, Course, CourseAssessmentScheme, Exam,
+    ExamQuestion, ExamSubmission, Question, Quiz, StudentQuizSubmission,
+    TeacherCourseAssignment, User, db
+)
+
+
+ASSESSMENT_TYPES = ('Quiz', 'Exam', 'Assignment')
+
+CSV_HEADER = [
+    'Type', 'Course', 'Student', 'Raw Score', 'Max Score',
+    'Weight (%)', 'Weighted Score', 'Submissions', 'Latest Submission'
+]
+
+
+class TeacherResultsService:
+    """
+    Per-(course, student, assessment type) totals for a teacher's courses.
+    """
+
+    @staticmethod
+    def teacher_courses(teacher_id):
+        """Courses assigned to a teacher, in one query."""
+        return (
+            Course.query
+            .filter(Course.id.in_(
+                select(TeacherCourseAssignment.course_id)
+                .where(TeacherCourseAssignment.teacher_id == teacher_id)
+            ))
+            .order_by(Course.name)
+            .all()
+        )
+
+    @staticmethod
+    def schemes(teacher_id, course_ids):
+        """Assessment scheme per course ({course_id: scheme}), first by id wins."""
+        schemes = {}
+        if not course_ids:
+            return schemes
+        rows = (
+            CourseAssessmentScheme.query
+            .filter(
+                CourseAssessmentScheme.course_id.in_(course_ids),
+                CourseAssessmentScheme.teacher_id == teacher_id
+            )
+            .order_by(CourseAssessmentScheme.id)
+            .all()
+        )
+        for scheme in rows:
+            schemes.setdefault(scheme.course_id, scheme)
+        return schemes
+
+    @staticmethod
+    def aggregate(course_ids):
+        """
+        UNION ALL of the three per-type aggregates as a subquery.
+
+        Columns: type, course_id, student_id, raw_score, max_total,
+        latest, submissions. max_total sums the assessment maximum once per
+        submission, matching how the results page has always totalled it.
+        """
+        quiz_max = (
+            select(Question.quiz_id, func.sum(Question.points).label('max_score'))
+            .group_by(Question.quiz_id)
+            .subquery()
+        )
+        exam_max = (
+            select(ExamQuestion.exam_id, func.sum(ExamQuestion.marks).label('max_score'))
+            .group_by(ExamQuestion.exam_id)
+            .subquery()
+        )
+
+        quizzes = (
+            select(
+                literal('Quiz').label('type'),
+                Quiz.course_id.label('course_id'),
+                StudentQuizSubmission.student_id.label('student_id'),
+                func.sum(func.coalesce(StudentQuizSubmission.score, 0)).label('raw_score'),
+                func.sum(func.coalesce(quiz_max.c.max_score, 0)).label('max_total'),
+                func.max(StudentQuizSubmission.submitted_at).label('latest'),
+                func.count(StudentQuizSubmission.id).label('submissions')
+            )
+            .join(Quiz, Quiz.id == StudentQuizSubmission.quiz_id)
+            .outerjoin(quiz_max, quiz_max.c.quiz_id == Quiz.id)
+            .where(Quiz.course_id.in_(course_ids))
+            .group_by(Quiz.course_id, StudentQuizSubmission.student_id)
+        )
+
+        exams = (
+            select(
+                literal('Exam').label('type'),
+                Exam.course_id,
+                ExamSubmission.student_id,
+                func.sum(func.coalesce(ExamSubmission.score, 0)),
+                func.sum(func.coalesce(exam_max.c.max_score, 0)),
+                func.max(ExamSubmission.submitted_at),
+                func.count(ExamSubmission.id)
+            )
+            .join(Exam, Exam.id == ExamSubmission.exam_id)
+            .outerjoin(exam_max, exam_max.c.exam_id == Exam.id)
+            .where(Exam.course_id.in_(course_ids))
+            .group_by(Exam.course_id, ExamSubmission.student_id)
+        )
+
+        # Only scored assignments count
+        assignments = (
+            select(
+                literal('Assignment').label('type'),
+                Assignment.course_id,
+                AssignmentSubmission.student_id,
+                func.sum(AssignmentSubmission.score),
+                func.sum(func.coalesce(Assignment.max_score, 0)),
+                func.max(AssignmentSubmission.submitted_at),
+                func.count(AssignmentSubmission.id)
+            )
+            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+            .where(
+                Assignment.course_id.in_(course_ids),
+                AssignmentSubmission.score != None
+            )
+            .group_by(Assignment.course_id, AssignmentSubmission.student_id)
+        )
+
+        return union_all(quizzes, exams, assignments).subquery('assessment_totals')
+
+    @staticmethod
+    def _filtered(agg, course_id=None, search=None):
+        """Base statement joining the aggregate to student and course."""
+        stmt = (
+            select(agg, User.first_name, User.last_name, Course.name.label('course_name'))
+            .join(User, User.id == agg.c.student_id)
+            .join(Course, Course.id == agg.c.course_id)
+        )
+        if course_id:
+            stmt = stmt.where(agg.c.course_id == course_id)
+        if search:
+            full_name = User.first_name + ' ' + User.last_name
+            stmt = stmt.where(full_name.ilike(f"%{search.strip()}%"))
+        return stmt
+
+    @staticmethod
+    def _result(row, scheme):
+        """Shape one aggregate row into the dict the results template uses."""
+        raw_score = float(row.raw_score or 0)
+        max_total = float(row.max_total or 0)
+
+        if row.type == 'Quiz':
+            weight = scheme.quiz_weight if scheme else None
+            use_weight = bool(scheme)
+        else:
+            weight = (getattr(scheme, f"{row.type.lower()}_weight") or 0.0) if scheme else 0.0
+            use_weight = bool(scheme) and weight > 0
+
+        weighted_score = (raw_score / max_total) * weight if use_weight and max_total else None
+
+        latest = row.latest
+        if latest:
+            try:
+                latest = latest.strftime("%Y-%m-%d %H:%M")
+            except Exception:
+                latest = str(latest)
+
+        return {
+            "type": row.type,
+            "course_id": row.course_id,
+            "course": row.course_name,
+            "student_id": row.student_id,
+            "student": f"{row.first_name} {row.last_name}",
+            "score": raw_score,
+            "raw_score": raw_score,
+            "max_score": max_total,
+            "submissions": row.submissions,
+            "date": latest or "",
+            "weight_percent": weight,
+            "weighted_score": weighted_score
+        }
+
+    @staticmethod
+    def page(teacher_id, course_ids, page=1, per_page=50, course_id=None, search=None):
+        """
+        One page of results, paginated by (course, student) so every
+        assessment type for a student lands on the same page.
+
+        Returns:
+            dict with results, total (course/student pairs), page, per_page, pages
+        """
+        empty = {'results': [], 'total': 0, 'page': 1, 'per_page': per_page, 'pages': 0}
+        if not course_ids:
+            return empty
+
+        agg = TeacherResultsService.aggregate(course_ids)
+        base = TeacherResultsService._filtered(agg, course_id, search)
+
+        pairs = (
+            base.with_only_columns(agg.c.course_id, agg.c.student_id)
+            .group_by(agg.c.course_id, agg.c.student_id,
+                      Course.name, User.last_name, User.first_name)
+        )
+        total = db.session.execute(
+            select(func.count()).select_from(pairs.subquery())
+        ).scalar() or 0
+        if not total:
+            return empty
+
+        pages = (total + per_page - 1) // per_page
+        page = min(max(page, 1), pages)
+
+        page_pairs = db.session.execute(
+            pairs.order_by(Course.name, User.last_name, User.first_name, agg.c.student_id)
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+        ).all()
+        order = {(c, s): i for i, (c, s) in enumerate(page_pairs)}
+
+        rows = db.session.execute(
+            base.where(
+                agg.c.course_id.in_({c for c, _ in page_pairs}),
+                agg.c.student_id.in_({s for _, s in page_pairs})
+            )
+        ).all()
+
+        schemes = TeacherResultsService.schemes(teacher_id, course_ids)
+        results = [
+            TeacherResultsService._result(row, schemes.get(row.course_id))
+            for row in rows
+            if (row.course_id, row.student_id) in order
+        ]
+        results.sort(key=lambda r: (
+            order[(r['course_id'], r['student_id'])], ASSESSMENT_TYPES.index(r['type'])
+        ))
+
+        return {'results': results, 'total': total, 'page': page,
+                'per_page': per_page, 'pages': pages}
+
+    @staticmethod
+    def iter_results(teacher_id, course_ids, course_id=None, search=None, batch_size=500):
+        """Yield every result row, streamed from the database in batches."""
+        if not course_ids:
+            return
+
+        schemes = TeacherResultsService.schemes(teacher_id, course_ids)
+        agg = TeacherResultsService.aggregate(course_ids)
+        stmt = (
+            TeacherResultsService._filtered(agg, course_id, search)
+            .order_by(Course.name, User.last_name, User.first_name, agg.c.student_id, agg.c.type)
+            .execution_options(yield_per=batch_size)
+        )
+        for row in db.session.execute(stmt):
+            yield TeacherResultsService._result(row, schemes.get(row.course_id))
+
+    @staticmethod
+    def csv_row(result):
+        """Flatten a result dict into a CSV row matching CSV_HEADER."""
+        weighted = result['weighted_score']
+        return [
+            result['type'],
+            result['course'],
+            result['student'],
+            f"{result['raw_score']:.2f}",
+            f"{result['max_score']:.2f}",
+            '' if result['weight_percent'] is None else result['weight_percent'],
+            '' if weighted is None else f"{weighted:.2f}",
+            result['submissions'],
+            result['date'],
+        ]
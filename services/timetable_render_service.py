@@ -0,0 +1,585 @@
+# services/timetable_render_service.py
+"""
+Timetable render engine.
+
+Every student of a class downloads the same class timetable, and the exam
+timetable differs between students of a level only in the name, index
+number and QR code. Both downloads used to lay out the grid and draw the
+PDF from scratch, and regenerated the logo-overlaid QR code (with two
+LANCZOS resizes) for every exam block. Now:
+
+  * the slot grid of a class is built once per (programme, level) into a
+    ClassGrid, shared by the HTML view and the PDF
+  * the class timetable PDF is rendered once per (programme, level, day)
+    -- the day changes the highlighted row and the "Generated on" date --
+    and the bytes are kept in an LRU
+  * the exam timetable layout (wrapped fields, block heights, page breaks)
+    is planned once per set of entries and replayed on a canvas with the
+    student's name, index number and QR codes; the finished PDF is kept
+    in the same LRU, keyed by the student's fields
+  * the logo composite pasted on every QR code is resized once per size
+
+Any committed change to TimetableEntry or ExamTimetableEntry bumps the
+version and drops every grid, plan and PDF; course renames come through
+the course catalog version (utils/catalog_cache.py, utils/versioned_cache.py).
+TIMETABLE_RENDER_TTL bounds staleness for edits made by other processes.
+"""
+
+import logging
+import os
+import textwrap
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from models import ExamTimetableEntry, TimetableEntry
+from utils.catalog_cache import catalog_changes, get_course
+from utils.versioned_cache import ChangeVersion, VersionedStore
+
+logger = logging.getLogger(__name__)
+
+
+TIME_SLOTS = [
+    (8*60, 9*60),
+    (9*60, 10*60),
+    (10*60, 10*60+30),
+    (10*60+30, 11*60+30),
+    (11*60+30, 12*60+30),
+    (12*60+30, 13*60),
+    (13*60, 14*60),
+    (14*60, 15*60),
+    (15*60, 16*60),
+    (16*60, 17*60),
+]
+MIN_START = TIME_SLOTS[0][0]
+MAX_END = TIME_SLOTS[-1][1]
+TOTAL_MINUTES = MAX_END - MIN_START
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+BREAKS = [
+    {'title': 'Morning Break', 'start_min': 10*60, 'end_min': 10*60+25, 'letters': ['B', 'R', 'E', 'A', 'K']},
+    {'title': 'Lunch Break', 'start_min': 12*60+30, 'end_min': 12*60+55, 'letters': ['L', 'U', 'N', 'C', 'H']},
+]
+
+LOGO_PATH = 'static/VTIU-LOGO.png'
+
+# Models whose committed changes invalidate every grid, plan and PDF
+TIMETABLE_MODELS = (TimetableEntry, ExamTimetableEntry)
+
+# One PDF cell: text and whether it is a break letter
+GridCell = namedtuple('GridCell', ['text', 'is_break'])
+
+# Plain values only: plans outlive the session the entries were loaded in
+ExamBlock = namedtuple('ExamBlock', [
+    'course', 'date_text', 'time_text', 'room', 'building', 'floor',
+    'course_lines', 'date_lines', 'text_lines', 'block_bottom', 'block_height',
+])
+
+# Exam timetable geometry (letter page, points)
+EXAM_MARGIN = 40
+EXAM_BLOCK_SPACING = 22
+EXAM_CORNER_RADIUS = 8
+EXAM_QR_DISPLAY = 120
+EXAM_QR_GENERATE = EXAM_QR_DISPLAY * 2
+EXAM_LINE_HEIGHT = 16
+EXAM_TOP_PADDING = 20
+EXAM_BOTTOM_PADDING = 16
+EXAM_COL_MARGIN = 14
+EXAM_VALUE_OFFSET = 65
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _pct_from_minutes(start_min, end_min):
+    s = max(start_min, MIN_START)
+    e = min(end_min, MAX_END)
+    if e <= s:
+        return None, None
+    left_pct = ((s - MIN_START) / TOTAL_MINUTES) * 100.0
+    width_pct = ((e - s) / TOTAL_MINUTES) * 100.0
+    return round(left_pct, 3), round(width_pct, 3)
+
+
+class ClassGrid:
+    """The timetable of one class, as of `version`, in HTML and PDF form."""
+
+    def __init__(self, version, programme_name, programme_level, entries):
+        self.version = version
+        self.programme_name = programme_name
+        self.programme_level = programme_level
+        self.empty = not entries
+
+        self.time_ticks = []
+        for start, end in TIME_SLOTS:
+            self.time_ticks.append({
+                'start': start,
+                'end': end,
+                'label': f"{(start//60) % 12 or 12}:{start%60:02d} - {(end//60) % 12 or 12}:{end%60:02d}",
+                'width_pct': round(((end - start) / TOTAL_MINUTES) * 100.0, 4)
+            })
+        self.col_template = ' '.join(f'{slot["width_pct"]}%' for slot in self.time_ticks)
+
+        self.vlines = []
+        cum = MIN_START
+        for start, end in TIME_SLOTS:
+            cum += (end - start)
+            self.vlines.append({
+                'left_pct': round(((cum - MIN_START) / TOTAL_MINUTES) * 100.0, 3),
+                'is_thick': (end % 60) == 0
+            })
+
+        # HTML: positioned blocks per day
+        self.day_blocks = {d: [] for d in DAYS}
+        for e in entries:
+            left_pct, width_pct = _pct_from_minutes(e['start_min'], e['end_min'])
+            if left_pct is None or e['day'] not in self.day_blocks:
+                continue
+            self.day_blocks[e['day']].append({
+                'id': e['id'],
+                'title': e['title'],
+                'start_str': e['start_str'],
+                'end_str': e['end_str'],
+                'left_pct': left_pct,
+                'width_pct': width_pct,
+                'is_break': False
+            })
+        for i, day in enumerate(DAYS):
+            for br in BREAKS:
+                left_pct, width_pct = _pct_from_minutes(br['start_min'], br['end_min'])
+                if left_pct is None:
+                    continue
+                self.day_blocks[day].append({
+                    'id': None,
+                    'title': br['letters'][i],
+                    'start_str': f"{br['start_min']//60:02d}:{br['start_min']%60:02d}",
+                    'end_str': f"{br['end_min']//60:02d}:{br['end_min']%60:02d}",
+                    'left_pct': left_pct,
+                    'width_pct': width_pct,
+                    'is_break': True
+                })
+        for d in DAYS:
+            self.day_blocks[d].sort(key=lambda x: x['left_pct'])
+
+        # PDF: one row per day, one cell per slot (a class fills the slot it starts in)
+        starts = {}
+        for e in entries:
+            starts.setdefault((e['day'], e['start_min']), e['title'])
+        self.rows = []
+        for i, day in enumerate(DAYS):
+            cells = []
+            for start, _ in TIME_SLOTS:
+                title = starts.get((day, start))
+                if title is not None:
+                    cells.append(GridCell(title, False))
+                    continue
+                letter = next(
+                    (br['letters'][i] for br in BREAKS if br['start_min'] <= start < br['end_min']),
+                    None
+                )
+                cells.append(GridCell(letter, True) if letter else GridCell('—', False))
+            self.rows.append((day, cells))
+
+    def template_context(self):
+        """Keyword arguments for student/timetable.html."""
+        return {
+            'time_ticks': self.time_ticks,
+            'day_blocks': self.day_blocks,
+            'vlines': self.vlines,
+            'col_template': self.col_template,
+            'total_minutes': TOTAL_MINUTES,
+        }
+
+
+class ExamPlan:
+    """Page layout of a list of exam entries; nothing in it depends on the student."""
+
+    def __init__(self, version, pages):
+        self.version = version
+        self.pages = pages  # [[ExamBlock, ...], ...]
+
+
+_changes = ChangeVersion('timetable', TIMETABLE_MODELS, depends_on=(catalog_changes(),))
+_grids = VersionedStore(_changes, 'TIMETABLE_RENDER_TTL', 900)  # (programme, level) -> ClassGrid
+_plans = VersionedStore(_changes, 'TIMETABLE_RENDER_TTL', 900)  # tuple of entry ids -> ExamPlan
+_pdfs = VersionedStore(                                          # cache key -> bytes (LRU)
+    _changes, 'TIMETABLE_RENDER_TTL', 900, 'TIMETABLE_PDF_CACHE_SIZE', 256
+)
+
+
+# ============================================================
+# QR CODES
+# ============================================================
+
+@lru_cache(maxsize=16)
+def _logo_composite(logo_path, mtime, qr_size, logo_fraction):
+    """The logo, resized and framed in white, ready to paste on a QR code of qr_size."""
+    from PIL import Image
+
+    logo = Image.open(logo_path).convert("RGBA")
+    logo_size = int(qr_size * logo_fraction)
+    logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
+    logo_bg = Image.new("RGB", (logo_size + 10, logo_size + 10), "white")
+    logo_bg.paste(logo, (5, 5), logo)
+    return logo_bg
+
+
+def generate_logo_qr(data: str,
+                     logo_path: str = None,
+                     final_size: int = 300,
+                     logo_fraction: float = 0.45,
+                     box_size: int = 10,
+                     border: int = 2):
+    """Generate QR code with optional logo overlay (returns a PIL image)."""
+    import qrcode
+    from PIL import Image
+
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=box_size,
+        border=border
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+
+    # QR modules are solid squares: nearest-neighbour keeps them sharp and is far cheaper than LANCZOS
+    if final_size and qr_img.size[0] != final_size:
+        qr_img = qr_img.resize((final_size, final_size), Image.Resampling.NEAREST)
+
+    if logo_path:
+        try:
+            logo_bg = _logo_composite(logo_path, os.path.getmtime(logo_path), qr_img.size[0], logo_fraction)
+            logo_pos = (qr_img.size[0] // 2 - logo_bg.size[0] // 2,
+                        qr_img.size[1] // 2 - logo_bg.size[1] // 2)
+            qr_img.paste(logo_bg, logo_pos)
+        except Exception as e:
+            # If logo loading fails, just return QR code without logo
+            logger.warning(f"⚠️ QR logo overlay skipped: {e}")
+
+    return qr_img
+
+
+class TimetableRenderService:
+    """
+    Cached class timetable grids and PDFs, and exam timetable PDFs.
+    """
+
+    # ------------------------------------------------------------------
+    # CLASS TIMETABLE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def class_grid(programme_name, programme_level):
+        """The ClassGrid of a class, built on first use or after a change."""
+        key = (programme_name, str(programme_level))
+        return _grids.get(key, lambda version: TimetableRenderService._build_grid(key, version))
+
+    @staticmethod
+    def _build_grid(key, version):
+        programme_name, programme_level = key
+        rows = TimetableEntry.query.filter(
+            TimetableEntry.programme_name == programme_name,
+            TimetableEntry.programme_level == programme_level
+        ).order_by(TimetableEntry.day_of_week, TimetableEntry.start_time).all()
+
+        entries = []
+        for e in rows:
+            course = get_course(e.course_id)
+            entries.append({
+                'id': e.id,
+                'day': e.day_of_week,
+                'start_min': _minutes(e.start_time),
+                'end_min': _minutes(e.end_time),
+                'title': course.name if course else 'Class',
+                'start_str': e.start_time.strftime('%I:%M %p'),
+                'end_str': e.end_time.strftime('%I:%M %p'),
+            })
+
+        logger.debug(f"🗓️ Built timetable grid for {programme_name} L{programme_level}: {len(entries)} entr(ies)")
+        return ClassGrid(version, programme_name, programme_level, entries)
+
+    @staticmethod
+    def class_timetable_pdf(grid, today=None):
+        """PDF bytes of a class timetable with today's row highlighted."""
+        today = (today or datetime.now()).date()
+        cache_key = ('class', grid.programme_name, grid.programme_level, grid.version, today)
+        return _pdfs.get(cache_key, lambda version: _render_class_pdf(grid, today))
+
+    # ------------------------------------------------------------------
+    # EXAM TIMETABLE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def exam_timetable_pdf(profile, user, index_number):
+        """
+        PDF bytes of a student's exam timetable, or None when the student
+        has no exam entries.
+        """
+        student = {
+            'name': f"{user.first_name} {user.last_name}",
+            'index_number': index_number,
+            'programme': profile.current_programme or "",
+            'programme_level': profile.programme_level,
+            'academic_year': profile.academic_year or 'Academic Year',
+        }
+        cache_key = ('exam',) + tuple(student.values())
+
+        def render(version):
+            entries = ExamTimetableEntry.query.filter(
+                ((ExamTimetableEntry.student_index == index_number) |
+                 (ExamTimetableEntry.programme_level == str(profile.programme_level)))
+            ).order_by(
+                ExamTimetableEntry.date,
+                ExamTimetableEntry.start_time
+            ).all()
+            if not entries:
+                return None
+            plan = _plans.get(
+                tuple(e.id for e in entries),
+                lambda plan_version: TimetableRenderService._exam_plan(entries, plan_version)
+            )
+            return _render_exam_pdf(plan, student)
+
+        return _pdfs.get(cache_key, render)
+
+    @staticmethod
+    def _exam_plan(entries, version):
+        from reportlab.lib.pagesizes import letter
+        _, height = letter
+
+        pages, blocks = [], []
+        y_top = height - 100
+        for e in entries:
+            date_text = e.date.strftime('%A, %d %B %Y')
+            course_lines = textwrap.wrap(e.course or "", width=20) or [""]
+            date_lines = textwrap.wrap(date_text, width=20)
+
+            # Name, index, programme and level are one line each
+            col1_lines = 4 + len(course_lines)
+            col2_lines = 4 + len(date_lines)
+            text_lines = max(col1_lines, col2_lines)
+            text_block_height = text_lines * EXAM_LINE_HEIGHT + EXAM_TOP_PADDING + EXAM_BOTTOM_PADDING
+            block_height = max(text_block_height, EXAM_QR_DISPLAY + EXAM_TOP_PADDING + EXAM_BOTTOM_PADDING)
+            block_bottom = y_top - block_height
+
+            if block_bottom < 60 and blocks:
+                pages.append(blocks)
+                blocks = []
+                y_top = height - 100
+                block_bottom = y_top - block_height
+
+            blocks.append(ExamBlock(
+                course=e.course,
+                date_text=date_text,
+                time_text=f"{e.start_time.strftime('%H:%M')} - {e.end_time.strftime('%H:%M')}",
+                room=e.room,
+                building=e.building,
+                floor=e.floor,
+                course_lines=course_lines,
+                date_lines=date_lines,
+                text_lines=text_lines,
+                block_bottom=block_bottom,
+                block_height=block_height,
+            ))
+            y_top = block_bottom - EXAM_BLOCK_SPACING
+        pages.append(blocks)
+
+        return ExamPlan(version, pages)
+
+
+# ============================================================
+# RENDERING
+# ============================================================
+
+def _render_class_pdf(grid, today):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    header = ['Day / Time']
+    col_widths = [1.2 * inch]
+    remaining_width = 10.5 * inch - col_widths[0]
+    for start, end in TIME_SLOTS:
+        col_widths.append(remaining_width * ((end - start) / TOTAL_MINUTES))
+        header.append(f"{start//60:02d}:{start%60:02d} - {end//60:02d}:{end%60:02d}")
+
+    styles = getSampleStyleSheet()
+    cell_style = ParagraphStyle(
+        'cell_style',
+        parent=styles['Normal'],
+        alignment=1,  # center
+        fontSize=9,
+        leading=10,
+        wordWrap='CJK'
+    )
+
+    table_style = TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#4A90E2")),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#cccccc")),
+    ])
+
+    data = [header]
+    for i, (day, cells) in enumerate(grid.rows):
+        data.append([day] + [Paragraph(cell.text, cell_style) for cell in cells])
+
+        bg_color = colors.HexColor("#f0f4f8") if i % 2 == 0 else colors.white
+        table_style.add('BACKGROUND', (0,i+1), (-1,i+1), bg_color)
+        if day == today.strftime('%A'):
+            table_style.add('BACKGROUND', (0,i+1), (-1,i+1), colors.HexColor("#FFF4CC"))
+
+        for j, cell in enumerate(cells, start=1):
+            if cell.is_break:
+                table_style.add('BACKGROUND', (j,i+1), (j,i+1), colors.HexColor("#FFD966"))
+                table_style.add('TEXTCOLOR', (j,i+1), (j,i+1), colors.HexColor("#222222"))
+                table_style.add('FONTNAME', (j,i+1), (j,i+1), 'Helvetica-Bold')
+
+    table = Table(data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(table_style)
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        leftMargin=inch/2, rightMargin=inch/2,
+        topMargin=inch/2, bottomMargin=inch/2
+    )
+    doc.build([
+        Paragraph(f"<b>{grid.programme_name} - Level {grid.programme_level} Timetable</b>", styles['Title']),
+        Spacer(1, 12),
+        table,
+        Spacer(1, 12),
+        # Date only: the PDF is cached for the day
+        Paragraph(f"Generated on: {today.strftime('%d %b %Y')}", styles['Normal']),
+    ])
+    return buffer.getvalue()
+
+
+def _exam_page_header(p, width, height, academic_year):
+    from reportlab.lib import colors
+
+    p.setFillColor(colors.HexColor("#1f77b4"))
+    p.rect(0, height-80, width, 80, fill=True, stroke=False)
+    p.setFillColor(colors.white)
+    p.setFont("Helvetica-Bold", 18)
+    p.drawCentredString(width/2, height-48, "END OF SEMESTER EXAMINATION TIMETABLE")
+    p.setFont("Helvetica", 11)
+    p.drawCentredString(width/2, height-68, f"{academic_year}")
+
+
+def _draw_fields(p, x, start_y, fields):
+    from reportlab.lib import colors
+
+    cur_y = start_y
+    for label, lines in fields:
+        p.setFont("Helvetica-Bold", 11)
+        p.setFillColor(colors.HexColor("#1f77b4"))
+        p.drawString(x, cur_y, label)
+        p.setFont("Helvetica", 10)
+        p.setFillColor(colors.black)
+        for subline in lines:
+            p.drawString(x + EXAM_VALUE_OFFSET, cur_y, subline)
+            cur_y -= EXAM_LINE_HEIGHT
+
+
+def _render_exam_pdf(plan, student):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    width, height = letter
+    content_width = width - 2 * EXAM_MARGIN
+    col_width = (content_width - 4 * EXAM_COL_MARGIN - EXAM_QR_DISPLAY) / 2
+    col1_x = EXAM_MARGIN + EXAM_COL_MARGIN + 8
+    col2_x = EXAM_MARGIN + EXAM_COL_MARGIN + col_width + EXAM_COL_MARGIN + 8
+    qr_x = EXAM_MARGIN + content_width - EXAM_COL_MARGIN - EXAM_QR_DISPLAY - 8
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+
+    for page_number, blocks in enumerate(plan.pages):
+        if page_number:
+            p.showPage()
+        _exam_page_header(p, width, height, student['academic_year'])
+
+        for block in blocks:
+            # Block background, left accent bar and border
+            p.setFillColor(colors.HexColor("#f8f9fa"))
+            p.roundRect(EXAM_MARGIN, block.block_bottom, content_width, block.block_height,
+                        EXAM_CORNER_RADIUS, fill=True, stroke=False)
+            p.setFillColor(colors.HexColor("#1f77b4"))
+            p.roundRect(EXAM_MARGIN+10, block.block_bottom+10, 8, block.block_height-20, 4, fill=True, stroke=False)
+            p.setStrokeColor(colors.HexColor("#d0d0d0"))
+            p.setLineWidth(1)
+            p.roundRect(EXAM_MARGIN, block.block_bottom, content_width, block.block_height,
+                        EXAM_CORNER_RADIUS, fill=False, stroke=True)
+
+            # Text columns are vertically centred on the QR code
+            qr_y = block.block_bottom + (block.block_height - EXAM_QR_DISPLAY) / 2
+            centered_start_y = qr_y + EXAM_QR_DISPLAY / 2 + (block.text_lines * EXAM_LINE_HEIGHT / 2)
+
+            _draw_fields(p, col1_x, centered_start_y, [
+                ("Name:", [student['name']]),
+                ("Index #:", [student['index_number']]),
+                ("Programme:", [student['programme']]),
+                ("Course:", block.course_lines),
+                ("Level:", [f"Level {student['programme_level']}"]),
+            ])
+            _draw_fields(p, col2_x, centered_start_y, [
+                ("Time:", [block.time_text]),
+                ("Date:", block.date_lines),
+                ("Room:", [block.room or ""]),
+                ("Building:", [block.building or ""]),
+                ("Floor:", [block.floor or ""]),
+            ])
+
+            qr_data = (
+                f"Student: {student['name']}\n"
+                f"Matric: {student['index_number']}\n"
+                f"Programme: {student['programme']}\n"
+                f"Level: {student['programme_level']}\n"
+                f"Course: {block.course}\n"
+                f"Date: {block.date_text}\n"
+                f"Time: {block.time_text}\n"
+                f"Building: {block.building}\nRoom: {block.room}"
+            )
+            qr_img = generate_logo_qr(qr_data,
+                                      logo_path=LOGO_PATH,
+                                      final_size=EXAM_QR_GENERATE,
+                                      box_size=10,
+                                      border=2)
+            p.drawImage(ImageReader(qr_img), qr_x, qr_y, EXAM_QR_DISPLAY, EXAM_QR_DISPLAY,
+                        preserveAspectRatio=True, mask='auto')
+
+            p.setFont("Helvetica", 8)
+            p.setFillColor(colors.HexColor("#666666"))
+            p.drawCentredString(qr_x + EXAM_QR_DISPLAY/2, qr_y - 8, "Scan for details")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# ============================================================
+# INVALIDATION HOOKS
+# ============================================================
+
+def invalidate_timetables():
+    _changes.bump()
+
+
+def init_timetable_render(app):
+    """Register the invalidation hooks (call once at startup)."""
+    _changes.register()
+    logger.info(f"🗓️ Timetable render cache enabled (TTL {app.config.get('TIMETABLE_RENDER_TTL', 900)}s)")
@@ -145,6 +145,32 @@ class TranscriptService:
         # Get all grades for the student
         all_grades = GradingCalculationEngine.get_student_all_grades(student_id)
         
+        return TranscriptService.build_full_transcript(student, all_grades)
+    
+    @staticmethod
+    def build_full_transcript(student, all_grades, schemes=None, released_semesters=None):
+        """
+        Assemble full transcript data from already-loaded grades.
+        
+        `generate_full_transcript()` delegates here; the class-wide batch
+        export calls it directly with grades, schemes and release flags
+        loaded once for the whole class.
+        
+        Args:
+            student (User): The student
+            all_grades (list): StudentCourseGrade objects with `course` loaded
+            schemes (dict): Optional course_id -> CourseAssessmentScheme
+            released_semesters (set): Optional {(academic_year, semester)} released
+            
+        Returns:
+            dict: Same shape as generate_full_transcript()
+        """
+        if schemes is None:
+            from services.result_builder import ResultBuilder
+            schemes = ResultBuilder.assessment_schemes_for(
+                [g.course_id for g in all_grades]
+            )
+        
         # Group by (academic_year, semester)
         grouped = defaultdict(list)
         for grade in all_grades:
@@ -162,16 +188,15 @@ class TranscriptService:
             if semester_key in seen_semesters:
                 continue  # Skip duplicate semesters
             seen_semesters.add(semester_key)
-            
+
             grades = grouped[(academic_year, semester)]
             semester_gpa = GradingCalculationEngine.calculate_gpa(grades)
             semester_weighted_gpa = GradingCalculationEngine.calculate_weighted_gpa(grades)
             
             total_credits = 0
             for grade in grades:
-                course = Course.query.get(grade.course_id)
-                if course:
-                    total_credits += course.credit_hours
+                if grade.course:
+                    total_credits += grade.course.credit_hours
             
             semesters_summary.append({
                 'academic_year': academic_year,
@@ -193,24 +218,22 @@ class TranscriptService:
         passing_grades = {'A', 'B', 'C', 'D'}  # Assuming D and above pass
         
         for grade in all_grades:
-            course = Course.query.get(grade.course_id)
+            course = grade.course
             if course:
                 total_credit_hours_attempted += course.credit_hours
                 if grade.grade_letter in passing_grades:
                     total_credit_hours_earned += course.credit_hours
         
         # Build detailed semester data with course information and weights
-        from models import CourseAssessmentScheme
         semesters_detailed = {}
         for academic_year, semester in sorted_keys:
             grades = grouped[(academic_year, semester)]
             
             course_details = []
             for grade in grades:
-                course = Course.query.get(grade.course_id)
+                course = grade.course
                 if course:
-                    # Fetch assessment scheme for this course
-                    scheme = CourseAssessmentScheme.query.filter_by(course_id=course.id).first()
+                    scheme = schemes.get(course.id)
                     
                     course_details.append({
                         'course': course,
@@ -231,7 +254,10 @@ class TranscriptService:
                         'exam_weight': scheme.exam_weight if scheme else 60.0
                     })
             
-            is_released = TranscriptService._is_semester_released(academic_year, semester)
+            if released_semesters is None:
+                is_released = TranscriptService._is_semester_released(academic_year, semester)
+            else:
+                is_released = (academic_year, semester) in released_semesters
             
             semesters_detailed[(academic_year, semester)] = {
                 'academic_year': academic_year,
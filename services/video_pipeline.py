@@ -0,0 +1,348 @@
+# services/video_pipeline.py
+"""
+Background preparation of uploaded lecture videos.
+
+Raw uploads are often large, high-bitrate files with the MP4 index (moov
+atom) at the end, so browsers must fetch a lot before playback can start.
+After a teacher uploads a video, this pipeline runs local ffmpeg to produce:
+
+  * a "source" MP4 remuxed with +faststart (re-encoded only when the
+    container/codec cannot simply be copied, e.g. .mov/.avi uploads)
+  * lower-bitrate H.264 renditions (VIDEO_RENDITIONS, skipping any at or
+    above the source height)
+  * a poster thumbnail
+
+Outputs sit next to the upload in MATERIALS_FOLDER and are recorded on
+CourseMaterial (video_status, video_renditions, poster_filename), so the
+player can pick a rendition per request with `choose_rendition()`.
+
+Each upload queues a `video_prepare` job (services/job_queue.py), run by
+the job worker process at low CPU priority, so a transcode survives web
+worker recycles and never competes with the web worker for more than one
+core. A preparation interrupted by a worker restart is picked up again
+by the queue's stale-job handling.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+from datetime import datetime
+
+from models import CourseMaterial, db
+
+logger = logging.getLogger(__name__)
+
+
+VIDEO_TYPES = ('mp4', 'mov', 'avi', 'webm', 'm4v')
+
+# (label, height, video bitrate, audio bitrate)
+DEFAULT_RENDITIONS = (
+    ('720p', 720, '2500k', '128k'),
+    ('480p', 480, '1000k', '96k'),
+    ('360p', 360, '600k', '64k'),
+)
+
+# Effective connection type -> rough usable downlink in Mbps
+_ECT_MBPS = {'slow-2g': 0.05, '2g': 0.25, '3g': 0.7, '4g': 10.0}
+
+
+def _kbps(bitrate):
+    """'2500k' -> 2500"""
+    bitrate = str(bitrate).lower()
+    if bitrate.endswith('m'):
+        return int(float(bitrate[:-1]) * 1000)
+    if bitrate.endswith('k'):
+        return int(float(bitrate[:-1]))
+    return int(bitrate) // 1000
+
+
+class VideoPipeline:
+    """
+    ffmpeg-based preparation of lecture videos and rendition selection.
+    """
+
+    # ------------------------------------------------------------------
+    # CONFIGURATION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def ffmpeg_binary(app):
+        binary = app.config.get('FFMPEG_BINARY') or 'ffmpeg'
+        return shutil.which(binary)
+
+    @staticmethod
+    def enabled(app):
+        return bool(app.config.get('VIDEO_PIPELINE_ENABLED')) and VideoPipeline.ffmpeg_binary(app) is not None
+
+    @staticmethod
+    def initial_status(app, file_type):
+        """video_status for a freshly uploaded material ('pending' or None)."""
+        if (file_type or '').lower() not in VIDEO_TYPES:
+            return None
+        return 'pending' if VideoPipeline.enabled(app) else None
+
+    # ------------------------------------------------------------------
+    # QUEUE
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def enqueue(app, material_ids):
+        """Queue a `video_prepare` job per material."""
+        if not VideoPipeline.enabled(app):
+            return
+        from services.job_queue import JobQueue
+        for material_id in material_ids:
+            JobQueue.enqueue('video_prepare', {'material_id': material_id})
+
+    @staticmethod
+    def run_job(app, job):
+        """JobQueue handler for `video_prepare`."""
+        from services.job_queue import JobQueue
+        # ffmpeg reports nothing while it runs; keep the job's heartbeat
+        # fresh so a long transcode is not mistaken for a dead worker
+        with JobQueue.keepalive(job['id']):
+            VideoPipeline.process(app, job['params']['material_id'])
+        return {'done': 1, 'total': 1}
+
+    # ------------------------------------------------------------------
+    # PROCESSING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def output_name(filename, suffix, ext):
+        stem = os.path.splitext(filename)[0]
+        return f"{stem}__{suffix}.{ext}"
+
+    @staticmethod
+    def process(app, material_id):
+        """Run the full pipeline for one material and record the outcome."""
+        material = db.session.get(CourseMaterial, material_id)
+        if material is None:
+            return
+
+        folder = app.config['MATERIALS_FOLDER']
+        source = os.path.join(folder, material.filename)
+        if not os.path.isfile(source):
+            VideoPipeline._finish(material, 'failed', error='Uploaded file is missing')
+            return
+
+        material.video_status = 'processing'
+        material.video_error = None
+        db.session.commit()
+
+        created = []
+        try:
+            height = VideoPipeline.probe_height(app, source)
+            renditions = []
+
+            name = VideoPipeline.output_name(material.filename, 'source', 'mp4')
+            VideoPipeline.make_faststart(app, source, os.path.join(folder, name))
+            created.append(name)
+            renditions.append({'label': f"{height}p" if height else 'source', 'height': height,
+                               'bitrate': None, 'filename': name})
+
+            for label, target, video_bitrate, audio_bitrate in VideoPipeline.rendition_specs(app):
+                if height and target >= height:
+                    continue
+                name = VideoPipeline.output_name(material.filename, label, 'mp4')
+                VideoPipeline.make_rendition(
+                    app, source, os.path.join(folder, name), target, video_bitrate, audio_bitrate
+                )
+                created.append(name)
+                renditions.append({'label': label, 'height': target,
+                                   'bitrate': _kbps(video_bitrate) + _kbps(audio_bitrate), 'filename': name})
+
+            poster = VideoPipeline.output_name(material.filename, 'poster', 'jpg')
+            if VideoPipeline.make_poster(app, source, os.path.join(folder, poster)):
+                created.append(poster)
+                material.poster_filename = poster
+
+            material.video_renditions = json.dumps(renditions)
+            VideoPipeline._finish(material, 'ready')
+            logger.info(f"🎞️ Prepared {len(renditions)} rendition(s) for material {material_id}")
+
+        except Exception as e:
+            for name in created:
+                VideoPipeline._remove(folder, name)
+            db.session.rollback()
+            material = db.session.get(CourseMaterial, material_id)
+            if material is not None:
+                VideoPipeline._finish(material, 'failed', error=str(e)[:2000])
+            logger.warning(f"⚠️ Video preparation failed for material {material_id}: {e}")
+
+    @staticmethod
+    def _finish(material, status, error=None):
+        material.video_status = status
+        material.video_error = error
+        material.video_processed_at = datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def rendition_specs(app):
+        return app.config.get('VIDEO_RENDITIONS') or DEFAULT_RENDITIONS
+
+    @staticmethod
+    def _run(app, args, timeout=None):
+        """Run ffmpeg/ffprobe at low priority; raises RuntimeError on failure."""
+        command = list(args)
+        if hasattr(os, 'nice') and shutil.which('nice'):
+            command = ['nice', '-n', '15'] + command
+        result = subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            timeout=timeout or app.config.get('VIDEO_PIPELINE_TIMEOUT', 3600),
+        )
+        if result.returncode != 0:
+            tail = result.stderr.decode('utf-8', 'replace').strip().splitlines()[-3:]
+            raise RuntimeError(f"{os.path.basename(args[0])} failed: {' | '.join(tail)}")
+        return result.stdout
+
+    @staticmethod
+    def _ffmpeg(app, *args):
+        threads = str(app.config.get('VIDEO_FFMPEG_THREADS', 1))
+        return [VideoPipeline.ffmpeg_binary(app), '-hide_banner', '-loglevel', 'error', '-y',
+                *args[:-1], '-threads', threads, args[-1]]
+
+    @staticmethod
+    def probe_height(app, source):
+        """Video height in pixels (ffprobe, else ffmpeg's stream banner), or None."""
+        ffprobe = shutil.which(app.config.get('FFPROBE_BINARY') or 'ffprobe')
+        if not ffprobe:
+            # `ffmpeg -i` with no output exits non-zero but prints the streams
+            result = subprocess.run(
+                [VideoPipeline.ffmpeg_binary(app), '-hide_banner', '-i', source],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+            )
+            match = re.search(r"Video:.*?\b(\d{2,5})x(\d{2,5})\b", result.stderr.decode('utf-8', 'replace'))
+            return int(match.group(2)) if match else None
+        out = VideoPipeline._run(app, [
+            ffprobe, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=height', '-of', 'csv=p=0', source,
+        ], timeout=60)
+        value = out.decode().strip().split('\n')[0].strip(',')
+        return int(value) if value.isdigit() else None
+
+    @staticmethod
+    def make_faststart(app, source, target):
+        """Remux with the index up front; re-encode only if copying fails."""
+        try:
+            VideoPipeline._run(app, VideoPipeline._ffmpeg(
+                app, '-i', source, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                '-movflags', '+faststart', target))
+        except RuntimeError:
+            logger.info(f"Stream copy not possible for {os.path.basename(source)}; re-encoding")
+            VideoPipeline._run(app, VideoPipeline._ffmpeg(
+                app, '-i', source, '-map', '0:v:0', '-map', '0:a:0?',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', target))
+
+    @staticmethod
+    def make_rendition(app, source, target, height, video_bitrate, audio_bitrate):
+        kbps = _kbps(video_bitrate)
+        VideoPipeline._run(app, VideoPipeline._ffmpeg(
+            app, '-i', source, '-map', '0:v:0', '-map', '0:a:0?',
+            '-vf', f"scale=-2:{height}",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            '-b:v', video_bitrate, '-maxrate', f"{int(kbps * 1.5)}k", '-bufsize', f"{kbps * 2}k",
+            '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2',
+            '-movflags', '+faststart', target))
+
+    @staticmethod
+    def make_poster(app, source, target):
+        """Grab a frame a few seconds in (or the first frame of short clips)."""
+        for offset in ('3', '0'):
+            try:
+                VideoPipeline._run(app, VideoPipeline._ffmpeg(
+                    app, '-ss', offset, '-i', source, '-frames:v', '1',
+                    '-vf', 'scale=640:-2', '-q:v', '4', target), timeout=120)
+                if os.path.isfile(target) and os.path.getsize(target) > 0:
+                    return True
+            except RuntimeError:
+                continue
+        return False
+
+    # ------------------------------------------------------------------
+    # CLEANUP
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _remove(folder, name):
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+
+    @staticmethod
+    def remove_outputs(app, material):
+        """Delete every file the pipeline produced for a material."""
+        folder = app.config['MATERIALS_FOLDER']
+        for rendition in material.renditions:
+            VideoPipeline._remove(folder, rendition['filename'])
+        if material.poster_filename:
+            VideoPipeline._remove(folder, material.poster_filename)
+
+    # ------------------------------------------------------------------
+    # RENDITION SELECTION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def choose_rendition(renditions, headers, requested=None):
+        """
+        Pick the rendition to play first.
+
+        Order of precedence: an explicit ?quality= choice, then client hints:
+        Save-Data or a 2G effective connection gets the smallest rendition;
+        otherwise the best rendition whose bitrate fits within ~2/3 of the
+        reported Downlink (or ECT estimate) and whose height does not exceed
+        what the viewport can show. Without hints, the best rendition at or
+        below 480p is used as a conservative campus Wi-Fi default.
+        """
+        if not renditions:
+            return None
+
+        if requested:
+            for rendition in renditions:
+                if rendition['label'] == requested:
+                    return rendition
+
+        smallest = renditions[-1]
+        if headers.get('Save-Data', '').lower() == 'on':
+            return smallest
+
+        ect = headers.get('ECT', '').lower()
+        if ect in ('slow-2g', '2g'):
+            return smallest
+
+        downlink = None
+        try:
+            downlink = float(headers.get('Downlink', ''))
+        except ValueError:
+            downlink = _ECT_MBPS.get(ect)
+
+        max_height = None
+        try:
+            width = float(headers.get('Sec-CH-Viewport-Width') or headers.get('Viewport-Width') or 0)
+            dpr = float(headers.get('Sec-CH-DPR') or headers.get('DPR') or 1)
+            if width:
+                max_height = int(width * dpr * 9 / 16)
+        except ValueError:
+            pass
+
+        if downlink is None and max_height is None:
+            downlink = _ECT_MBPS['3g'] * 3
+
+        budget_kbps = downlink * 1000 * 2 / 3 if downlink is not None else None
+        for rendition in renditions:
+            bitrate = rendition.get('bitrate')
+            height = rendition.get('height')
+            if budget_kbps is not None and (bitrate or 0) > budget_kbps:
+                continue
+            if bitrate is None and budget_kbps is not None and budget_kbps < 3000:
+                # Source bitrate unknown; only pick it on a fast link
+                continue
+            if max_height and height and height > max_height * 1.25 and rendition is not smallest:
+                continue
+            return rendition
+        return smallest
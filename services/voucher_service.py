@@ -0,0 +1,252 @@
+# services/voucher_service.py
+"""
+Minting, lookup and export of admission vouchers.
+
+Vouchers used to be generated with `random.randint` one ORM object at a
+time, with nothing but luck keeping pins and serials unique, and the admin
+page rendered every voucher ever created. Minting now:
+
+  * draws PINs (digits) and serials (unambiguous uppercase letters and
+    digits) from `secrets`, so codes cannot be predicted from earlier ones
+  * checks each chunk against itself and the table (one query per column)
+    and redraws collisions before inserting, so the unique indexes never
+    have to reject a voucher
+  * bulk-inserts chunks of VOUCHER_MINT_CHUNK_SIZE, one commit per chunk
+
+Every minting run gets a batch code, so a run can be exported as a CSV
+(streamed) or as a printable PDF sheet of cut-out cards.
+"""
+
+import csv
+import io
+import logging
+import secrets
+import string
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from admissions.models import AdmissionVoucher
+from utils.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+PIN_ALPHABET = string.digits
+# No 0/O, 1/I/L: serials are read off paper and typed in
+SERIAL_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+# Attempts per chunk when a concurrent mint inserts the same code first
+CHUNK_RETRIES = 3
+
+CSV_HEADER = ['PIN', 'Serial', 'Amount', 'Valid Until', 'Batch', 'Created At']
+
+
+class VoucherService:
+    """
+    Collision-free bulk minting and exports of AdmissionVoucher rows.
+    """
+
+    # ------------------------------------------------------------------
+    # CODES
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _code(alphabet, length):
+        return ''.join(secrets.choice(alphabet) for _ in range(length))
+
+    @staticmethod
+    def new_codes(count, app=None):
+        """
+        `count` (pin, serial) pairs, unique among themselves and against
+        existing vouchers. Not reserved: insert them in the same transaction.
+        """
+        app = app or current_app
+        pin_length = int(app.config.get('VOUCHER_PIN_LENGTH', 10))
+        serial_length = int(app.config.get('VOUCHER_SERIAL_LENGTH', 10))
+
+        pins, serials = set(), set()
+        while len(pins) < count:
+            pins.add(VoucherService._code(PIN_ALPHABET, pin_length))
+        while len(serials) < count:
+            serials.add(VoucherService._code(SERIAL_ALPHABET, serial_length))
+
+        # Redraw any code already in the table (rare; loops until clean)
+        while True:
+            taken_pins = {
+                pin for (pin,) in db.session.query(AdmissionVoucher.pin)
+                .filter(AdmissionVoucher.pin.in_(pins))
+            }
+            taken_serials = {
+                serial for (serial,) in db.session.query(AdmissionVoucher.serial)
+                .filter(AdmissionVoucher.serial.in_(serials))
+            }
+            if not taken_pins and not taken_serials:
+                break
+            pins -= taken_pins
+            serials -= taken_serials
+            while len(pins) < count:
+                pins.add(VoucherService._code(PIN_ALPHABET, pin_length))
+            while len(serials) < count:
+                serials.add(VoucherService._code(SERIAL_ALPHABET, serial_length))
+
+        return list(zip(pins, serials))
+
+    @staticmethod
+    def normalise(pin, serial):
+        """Strip user input; serials are stored uppercase."""
+        return (pin or '').strip(), (serial or '').strip().upper()
+
+    @staticmethod
+    def lookup(pin, serial):
+        """Voucher for a pin/serial pair (served by the unique pin index), or None."""
+        pin, serial = VoucherService.normalise(pin, serial)
+        if not pin or not serial:
+            return None
+        return AdmissionVoucher.query.filter_by(pin=pin, serial=serial).first()
+
+    # ------------------------------------------------------------------
+    # MINTING
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def mint(count, amount, valid_until=None, purchaser_email=None):
+        """
+        Create `count` vouchers. Returns (batch, created).
+
+        Raises:
+            ValueError: If count is outside 1..VOUCHER_MAX_PER_REQUEST
+        """
+        maximum = int(current_app.config.get('VOUCHER_MAX_PER_REQUEST', 20000))
+        if count < 1 or count > maximum:
+            raise ValueError(f"Number of vouchers must be between 1 and {maximum}")
+
+        chunk_size = int(current_app.config.get('VOUCHER_MINT_CHUNK_SIZE', 1000))
+        batch = uuid.uuid4().hex[:12]
+        now = datetime.utcnow()
+        created = 0
+
+        while created < count:
+            size = min(chunk_size, count - created)
+            for attempt in range(1, CHUNK_RETRIES + 1):
+                rows = [
+                    {
+                        'pin': pin,
+                        'serial': serial,
+                        'amount': amount,
+                        'is_used': False,
+                        'purchaser_email': purchaser_email,
+                        'valid_until': valid_until,
+                        'created_at': now,
+                        'batch': batch,
+                    }
+                    for pin, serial in VoucherService.new_codes(size)
+                ]
+                try:
+                    db.session.execute(insert(AdmissionVoucher), rows)
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    db.session.rollback()
+                    if attempt == CHUNK_RETRIES:
+                        raise
+                    logger.warning(f"⚠️ Voucher code collision on insert (attempt {attempt}), redrawing chunk")
+            created += size
+
+        logger.info(f"🎟️ Minted {created} voucher(s) in batch {batch}")
+        return batch, created
+
+    # ------------------------------------------------------------------
+    # EXPORTS
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def batch_query(batch):
+        return AdmissionVoucher.query.filter_by(batch=batch).order_by(AdmissionVoucher.id)
+
+    @staticmethod
+    def iter_csv(batch, flush_every=500):
+        """CSV text for a batch, yielded in pieces (for a streamed response)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+
+        rows = (
+            VoucherService.batch_query(batch)
+            .with_entities(
+                AdmissionVoucher.pin, AdmissionVoucher.serial, AdmissionVoucher.amount,
+                AdmissionVoucher.valid_until, AdmissionVoucher.batch, AdmissionVoucher.created_at
+            )
+            .yield_per(flush_every)
+        )
+        for i, (pin, serial, amount, valid_until, batch_code, created_at) in enumerate(rows, 1):
+            writer.writerow([
+                pin, serial, f"{amount:.2f}",
+                valid_until.strftime('%Y-%m-%d') if valid_until else '',
+                batch_code, created_at.strftime('%Y-%m-%d %H:%M') if created_at else '',
+            ])
+            if i % flush_every == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    @staticmethod
+    def write_sheet(batch, out, columns=3, rows=8):
+        """
+        Printable A4 sheet of voucher cards (columns x rows per page) into
+        the binary file object `out`. Returns the number of vouchers drawn.
+        """
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.pdfgen import canvas
+
+        page_width, page_height = A4
+        margin = 10 * mm
+        card_w = (page_width - 2 * margin) / columns
+        card_h = (page_height - 2 * margin) / rows
+        per_page = columns * rows
+
+        pdf = canvas.Canvas(out, pagesize=A4)
+        pdf.setTitle(f"Admission vouchers {batch}")
+
+        count = 0
+        for voucher in VoucherService.batch_query(batch).yield_per(per_page * 4):
+            slot = count % per_page
+            if slot == 0 and count:
+                pdf.showPage()
+            col, row = slot % columns, slot // columns
+            x = margin + col * card_w
+            y = page_height - margin - (row + 1) * card_h
+
+            # Dashed cut lines
+            pdf.setDash(2, 2)
+            pdf.setLineWidth(0.3)
+            pdf.rect(x, y, card_w, card_h)
+            pdf.setDash()
+
+            pdf.setFont('Helvetica-Bold', 7)
+            pdf.drawString(x + 4 * mm, y + card_h - 6 * mm, 'VOCATIONAL & TECHNICAL INSPIRED UNIVERSITY')
+            pdf.setFont('Helvetica', 7)
+            pdf.drawString(x + 4 * mm, y + card_h - 10 * mm, f"Admission Voucher - GHS {voucher.amount:,.2f}")
+
+            pdf.setFont('Helvetica', 7)
+            pdf.drawString(x + 4 * mm, y + card_h - 17 * mm, 'PIN')
+            pdf.drawString(x + 4 * mm, y + card_h - 25 * mm, 'SERIAL')
+            pdf.setFont('Courier-Bold', 11)
+            pdf.drawString(x + 18 * mm, y + card_h - 17 * mm, voucher.pin)
+            pdf.drawString(x + 18 * mm, y + card_h - 25 * mm, voucher.serial)
+
+            if voucher.valid_until:
+                pdf.setFont('Helvetica', 6)
+                pdf.drawString(x + 4 * mm, y + 3 * mm, f"Valid until {voucher.valid_until.strftime('%d %b %Y')}")
+            count += 1
+
+        if not count:
+            pdf.setFont('Helvetica', 10)
+            pdf.drawString(margin, page_height - margin - 10 * mm, f"No vouchers in batch {batch}")
+        pdf.save()
+        return count
@@ -14,12 +14,6 @@ from models import (
 from services.result_builder import ResultBuilder
 from datetime import datetime
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-)
-from reportlab.lib import colors
 
 results_bp = Blueprint('results', __name__, url_prefix='/student/results')
 
@@ -106,6 +100,13 @@ def download_semester_results_pdf(academic_year, semester):
     """
     Download semester results as PDF.
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import (
+        SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    )
     
     if current_user.role != 'student':
         abort(403)
@@ -277,6 +278,13 @@ def download_transcript_pdf():
     """
     Download complete transcript as PDF.
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import (
+        SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    )
     
     if current_user.role != 'student':
         abort(403)
@@ -1,8 +1,8 @@
 import re
 
-from flask import Blueprint, current_app, render_template, abort, redirect, url_for, flash, jsonify, session, send_from_directory, send_file, make_response
+from flask import Blueprint, render_template, abort, redirect, url_for, flash, jsonify, session, send_from_directory, send_file, make_response
 
-import json, os
+import json
 
 from flask import request
 
@@ -12,7 +12,7 @@ from sqlalchemy import func
 
 from werkzeug.utils import safe_join, secure_filename
 
-from models import ExamTimetableEntry, TeacherAssessment, TeacherAssessmentAnswer, TeacherAssessmentPeriod, TeacherAssessmentQuestion, TeacherCourseAssignment, TeacherProfile, db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, Assignment, AssignmentSubmission, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ProgrammeFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Notification, NotificationRecipient, Meeting, StudentAnswer
+from models import TeacherAssessment, TeacherAssessmentAnswer, TeacherAssessmentPeriod, TeacherAssessmentQuestion, TeacherCourseAssignment, TeacherProfile, db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, Assignment, AssignmentSubmission, CourseMaterial, StudentCourseRegistration, Course, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ProgrammeFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Notification, NotificationRecipient, Meeting, StudentAnswer
 
 from datetime import datetime
 
@@ -20,31 +20,9 @@ from forms import CourseRegistrationForm, ChangePasswordForm, StudentLoginForm
 
 from io import BytesIO
 
-from reportlab.lib.pagesizes import A4, landscape, letter
-
-from reportlab.pdfgen import canvas
-
-from reportlab.lib.units import inch
-
-from reportlab.lib import colors
-
-from reportlab.platypus import Table, TableStyle, SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-
-from reportlab.lib.styles import getSampleStyleSheet
-
-from reportlab.platypus import Image as RLImage
-
 import io
 
-from reportlab.lib.utils import ImageReader
-
-import qrcode
-
-from PIL import Image, ImageDraw
-
-import textwrap
-
-from utils.id_card import generate_student_id_card_pdf
+# reportlab, qrcode and PIL are imported inside the PDF/QR views that use them
 
 from utils.result_builder import ResultBuilder
 
@@ -52,6 +30,11 @@ from utils.results_manager import ResultManager
 
 from utils.result_templates import get_template_path
 
+from services.receipt_service import ReceiptService
+from services.registration_service import RegistrationService, RegistrationError
+from services.timetable_render_service import TimetableRenderService
+from utils.catalog_cache import academic_years, courses_for, get_course, optional_limit, registration_window
+
 
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
@@ -148,7 +131,7 @@ def inject_notification_count():
 
     if current_user.is_authenticated:
 
-        from models import NotificationRecipient
+        from utils.identity_cache import unread_notification_count
 
 
 
@@ -156,13 +139,7 @@ def inject_notification_count():
 
             # Regular User (student, teacher)
 
-            unread_count = NotificationRecipient.query.filter_by(
-
-                user_id=current_user.user_id,
-
-                is_read=False
-
-            ).count()
+            unread_count = unread_notification_count(current_user.user_id)
 
 
 
@@ -170,7 +147,7 @@ def inject_notification_count():
 
             # Admin → get all unread notifications
 
-            unread_count = NotificationRecipient.query.filter_by(is_read=False).count()
+            unread_count = unread_notification_count()
 
 
 
@@ -196,7 +173,7 @@ def register_courses():
 
     now = datetime.utcnow()
 
-    start, registration_deadline = Course.get_registration_window()
+    start, registration_deadline = registration_window()
 
 
 
@@ -228,7 +205,7 @@ def register_courses():
 
     # 2️⃣ LOAD ACADEMIC YEARS
 
-    years = db.session.query(Course.academic_year).distinct().order_by(Course.academic_year).all()
+    years = academic_years()
 
     if not years:
 
@@ -238,7 +215,7 @@ def register_courses():
 
 
 
-    form.academic_year.choices = [(y[0], y[0]) for y in years]
+    form.academic_year.choices = [(y, y) for y in years]
 
 
 
@@ -248,7 +225,7 @@ def register_courses():
 
     selected_sem = request.form.get("semester") or form.semester.data or 'First'
 
-    selected_year = request.form.get("academic_year") or form.academic_year.data or years[-1][0]
+    selected_year = request.form.get("academic_year") or form.academic_year.data or years[-1]
 
 
 
@@ -258,19 +235,9 @@ def register_courses():
 
 
 
-    # 4️⃣ FETCH COURSES
-
-    courses = Course.query.filter_by(
+    # 4️⃣ FETCH COURSES (shared catalog snapshot)
 
-        programme_name=programme_name,
-
-        programme_level=programme_level,
-
-        semester=selected_sem,
-
-        academic_year=selected_year
-
-    ).all()
+    courses = courses_for(programme_name, programme_level, selected_sem, selected_year)
 
 
 
@@ -296,7 +263,13 @@ def register_courses():
 
     ).all()
 
-    form.courses.data = [r.course_id for r in registered if not r.course.is_mandatory]
+    form.courses.data = [
+
+        r.course_id for r in registered
+
+        if get_course(r.course_id) and not get_course(r.course_id).is_mandatory
+
+    ]
 
 
 
@@ -326,39 +299,29 @@ def register_courses():
 
 
 
-        # DELETE OLD RECORDS
-
-        StudentCourseRegistration.query.filter_by(
-
-            student_id=student.id,
-
-            semester=selected_sem,
-
-            academic_year=selected_year
-
-        ).delete()
-
-        db.session.commit()
+        # APPLY THE DIFF (one transaction, seats claimed atomically)
 
+        try:
 
+            RegistrationService.apply(
 
-        # SAVE NEW RECORDS
+                student.id, selected_year, selected_sem, final_course_ids,
 
-        for cid in final_course_ids:
+                offered={c.id: c for c in courses},
 
-            db.session.add(StudentCourseRegistration(
+                optional_limit=optional_limit(
 
-                student_id=student.id,
+                    programme_name, programme_level, selected_year, selected_sem
 
-                course_id=cid,
+                )
 
-                semester=selected_sem,
+            )
 
-                academic_year=selected_year
+        except RegistrationError as e:
 
-            ))
+            flash(str(e), "danger")
 
-        db.session.commit()
+            return redirect(url_for("student.register_courses"))
 
 
 
@@ -422,19 +385,9 @@ def reset_registration():
 
 
 
-    # Delete the current registration
+    # Delete the current registration and free its seats
 
-    StudentCourseRegistration.query.filter_by(
-
-        student_id=student.id,
-
-        semester=semester,
-
-        academic_year=year
-
-    ).delete()
-
-    db.session.commit()
+    RegistrationService.release_all(student.id, year, semester)
 
 
 
@@ -928,8 +881,6 @@ from flask_login import login_required, current_user
 
 from math import ceil
 
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-
 
 
 @student_bp.route('/timetable')
@@ -948,259 +899,197 @@ def view_timetable():
 
     profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
 
-    
-
-    # For tertiary, filter by programme level instead of class
-
-    # TimetableEntry.assigned_class now contains level like "100", "200", etc.
-
-    entries = (
-
-        TimetableEntry.query
-
-        .filter_by(programme_level=str(profile.programme_level))
-
-        .order_by(TimetableEntry.day_of_week, TimetableEntry.start_time)
-
-        .all()
-
-    )
-
-
-
-    # === CUSTOM TIME SLOTS ===
-
-    TIME_SLOTS = [
 
-        (8*60, 9*60),
 
-        (9*60, 10*60),
+    # Slot grid is built once per class (services/timetable_render_service.py)
 
-        (10*60, 10*60+30),
+    grid = TimetableRenderService.class_grid(profile.current_programme, profile.programme_level)
 
-        (10*60+30, 11*60+30),
 
-        (11*60+30, 12*60+30),
 
-        (12*60+30, 13*60),
-
-        (13*60, 14*60),
-
-        (14*60, 15*60),
+    return render_template(
 
-        (15*60, 16*60),
+        'student/timetable.html',
 
-        (16*60, 17*60),
+        programme=profile.current_programme,
 
-    ]
+        level=profile.programme_level,
 
+        download_ts=int(datetime.utcnow().timestamp()),
 
+        **grid.template_context()
 
-    # Build header ticks with widths (percent)
+    )
 
-    MIN_START = TIME_SLOTS[0][0]
 
-    MAX_END = TIME_SLOTS[-1][1]
 
-    total_minutes = MAX_END - MIN_START
 
+@student_bp.route('/download_timetable')
 
+@login_required
 
-    time_ticks = []
+def download_timetable():
 
-    for start, end in TIME_SLOTS:
+    """Download timetable as PDF (tertiary version)"""
 
-        width_pct = ((end - start) / total_minutes) * 100.0
+    student_profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
 
-        label = f"{(start//60) % 12 or 12}:{start%60:02d} - {(end//60) % 12 or 12}:{end%60:02d}"
+    if not student_profile:
 
-        time_ticks.append({
+        flash('Student profile not found.', 'danger')
 
-            'start': start,
+        return redirect(url_for('student.view_timetable'))
 
-            'end': end,
 
-            'label': label,
 
-            'width_pct': round(width_pct, 4)
+    programme_level = str(student_profile.programme_level)
 
-        })
+    programme_name = student_profile.current_programme
 
 
 
-    # Build vertical line positions
+    grid = TimetableRenderService.class_grid(programme_name, programme_level)
 
-    cum = MIN_START
+    if grid.empty:
 
-    vlines = []
+        flash('No timetable available to download.', 'warning')
 
-    for start, end in TIME_SLOTS:
+        return redirect(url_for('student.view_timetable'))
 
-        cum += (end - start)
 
-        cum_pct = ((cum - MIN_START) / total_minutes) * 100.0
 
-        is_thick = ((end % 60) == 0)
+    pdf = TimetableRenderService.class_timetable_pdf(grid)
 
-        vlines.append({'left_pct': round(cum_pct, 3), 'is_thick': is_thick})
 
 
+    # TERTIARY FILENAME FORMAT
 
-    # Day blocks
+    filename = f"{programme_name}_Level{programme_level}_timetable.pdf"
 
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    return send_file(
 
-    day_blocks = {d: [] for d in day_order}
+        BytesIO(pdf),
 
+        as_attachment=True,
 
+        download_name=filename,
 
-    # Helper to compute left/width pct
+        mimetype='application/pdf'
 
-    def pct_from_minutes(start_min, end_min):
+    )
 
-        s = max(start_min, MIN_START)
 
-        e = min(end_min, MAX_END)
 
-        if e <= s:
 
-            return None, None
+# Appointment Booking System
 
-        left_pct = ((s - MIN_START) / total_minutes) * 100.0
+from collections import defaultdict
 
-        width_pct = ((e - s) / total_minutes) * 100.0
 
-        return round(left_pct, 3), round(width_pct, 3)
 
+@student_bp.route('/book-appointment', methods=['GET', 'POST'])
 
+@login_required
 
-    # Add classes
+def book_appointment():
 
-    for e in entries:
+    # Only fetch unbooked slots
 
-        s_min = e.start_time.hour*60 + e.start_time.minute
+    available_slots = AppointmentSlot.query.filter_by(is_booked=False).all()
 
-        e_min = e.end_time.hour*60 + e.end_time.minute
 
-        left_pct, width_pct = pct_from_minutes(s_min, e_min)
 
-        if left_pct is None:
+    # Pass slots directly to template
 
-            continue
+    slots = []
 
-        day_blocks[e.day_of_week].append({
+    for slot in available_slots:
 
-            'id': e.id,
+        teacher_user = slot.teacher.user  # Get the related User
 
-            'title': e.course.name if getattr(e, 'course', None) else 'Class',
+        slots.append({
 
-            'start_str': e.start_time.strftime('%I:%M %p'),
+            'id': slot.id,
 
-            'end_str': e.end_time.strftime('%I:%M %p'),
+            'date': slot.date,
 
-            'left_pct': left_pct,
+            'start_time': slot.start_time,
 
-            'width_pct': width_pct,
+            'end_time': slot.end_time,
 
-            'is_break': False
+            'teacher_name': f"{teacher_user.first_name} {teacher_user.last_name}"
 
         })
 
 
 
-    # ========= BREAKS =========
-
-    MORNING_BREAK_LETTERS = ['B', 'R', 'E', 'A', 'K']
-
-    AFTERNOON_BREAK_LETTERS = ['L', 'U', 'N', 'C', 'H']
-
-
-
-    BREAKS = [
-
-        {'title': 'Morning Break', 'start_min': 10*60, 'end_min': 10*60+25, 'letters': MORNING_BREAK_LETTERS},
-
-        {'title': 'Lunch Break', 'start_min': 12*60+30, 'end_min': 12*60+55, 'letters': AFTERNOON_BREAK_LETTERS},
-
-    ]
-
-
-
-    for i, day in enumerate(day_order):
+    if request.method == 'POST':
 
-        for br in BREAKS:
+        slot_id = request.form['slot_id']
 
-            left_pct, width_pct = pct_from_minutes(br['start_min'], br['end_min'])
+        note = request.form.get('note', '')
 
-            if left_pct is None:
+        slot = AppointmentSlot.query.get_or_404(slot_id)
 
-                continue
 
-            day_blocks[day].append({
 
-                'id': None,
+        if slot.is_booked:
 
-                'title': br['letters'][i],
+            flash('Slot already booked.', 'danger')
 
-                'start_str': f"{br['start_min']//60:02d}:{br['start_min']%60:02d}",
+            return redirect(url_for('student.book_appointment'))
 
-                'end_str': f"{br['end_min']//60:02d}:{br['end_min']%60:02d}",
 
-                'left_pct': left_pct,
 
-                'width_pct': width_pct,
+        student_profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
 
-                'is_break': True
+        if not student_profile:
 
-            })
+            flash('Student profile not found.', 'danger')
 
+            return redirect(url_for('student.book_appointment'))
 
 
-    # Sort blocks per day
 
-    for d in day_order:
+        booking = AppointmentBooking(
 
-        day_blocks[d].sort(key=lambda x: x['left_pct'])
+            student_id=student_profile.id,
 
+            slot_id=slot.id,
 
+            note=note
 
-    # CSS grid-template-columns value
+        )
 
-    col_template = ' '.join(f'{slot["width_pct"]}%' for slot in time_ticks)
+        slot.is_booked = True
 
+        db.session.add(booking)
 
+        db.session.add(booking)
 
-    return render_template(
+        db.session.commit()
 
-        'student/timetable.html',
 
-        programme=profile.current_programme,
 
-        level=profile.programme_level,
+        flash('Appointment booked successfully.', 'success')
 
-        time_ticks=time_ticks,
+        return redirect(url_for('student.my_appointments'))
 
-        day_blocks=day_blocks,
 
-        vlines=vlines,
 
-        col_template=col_template,
+    return render_template('student/book_appointment.html', slots=slots)
 
-        total_minutes=total_minutes,
 
-        download_ts=int(datetime.utcnow().timestamp())
 
-    )
+from sqlalchemy.orm import joinedload
 
 
 
-@student_bp.route('/download_timetable')
+@student_bp.route('/my-appointments')
 
 @login_required
 
-def download_timetable():
-
-    """Download timetable as PDF (tertiary version)"""
+def my_appointments():
 
     student_profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
 
@@ -1208,1510 +1097,647 @@ def download_timetable():
 
         flash('Student profile not found.', 'danger')
 
-        return redirect(url_for('student.view_timetable'))
-
+        return redirect(url_for('student.book_appointment'))
 
+    bookings = AppointmentBooking.query \
+        .filter_by(student_id=student_profile.id) \
+        .options(joinedload(AppointmentBooking.slot).joinedload(AppointmentSlot.teacher)) \
+        .all()
 
-    # Use programme level for filtering
+    return render_template('student/my_appointments.html', bookings=bookings)
 
-    programme_level = str(student_profile.programme_level)
 
-    programme_name = student_profile.current_programme
 
+# Fees Management
 
+@student_bp.route('/fees')
 
-    timetable_entries = TimetableEntry.query \
-        .filter_by(assigned_class=programme_level) \
-        .join(Course, TimetableEntry.course_id == Course.id) \
-        .order_by(TimetableEntry.day_of_week, TimetableEntry.start_time) \
-        .all()
+@login_required
 
+def student_fees():
 
+    # Restrict to students
 
-    if not timetable_entries:
+    if current_user.role != 'student':
 
-        flash('No timetable available to download.', 'warning')
+        abort(403)
 
-        return redirect(url_for('student.view_timetable'))
 
 
+    fees = StudentFeeBalance.query.filter_by(
 
-    # === TIME SLOTS ===
+        student_id=current_user.id
 
-    TIME_SLOTS = [
+    ).order_by(StudentFeeBalance.id.desc()).all()
 
-        (8*60, 9*60),
 
-        (9*60, 10*60),
 
-        (10*60, 10*60+30),
+    transactions = StudentFeeTransaction.query.filter_by(
 
-        (10*60+30, 11*60+30),
+        student_id=current_user.id
 
-        (11*60+30, 12*60+30),
+    ).order_by(StudentFeeTransaction.timestamp.desc()).all()
 
-        (12*60+30, 13*60),
 
-        (13*60, 14*60),
 
-        (14*60, 15*60),
+    return render_template(
 
-        (15*60, 16*60),
+        'student/fees.html',
 
-        (16*60, 17*60),
+        fees=fees,
 
-    ]
+        transactions=transactions
 
-    MIN_START = TIME_SLOTS[0][0]
+    )
 
-    MAX_END = TIME_SLOTS[-1][1]
 
-    total_minutes = MAX_END - MIN_START
+@student_bp.route('/pay-fees', methods=['GET', 'POST'])
+@login_required
+def pay_fees():
+    if current_user.role != 'student':
+        abort(403)
 
+    student = current_user
+    profile = StudentProfile.query.filter_by(user_id=student.user_id).first()
 
+    if not profile:
+        flash("Student profile not found.", "danger")
+        return redirect(url_for('main.index'))
 
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    programme = profile.current_programme
+    level = str(int(profile.programme_level)) if profile.programme_level else '100'
+    study_format = profile.study_format or 'Regular'
 
+    year = request.args.get('year') or str(datetime.now().year)
+    semester = request.args.get('semester') or 'First'
 
+    # Get fees
+    fee_structures = ProgrammeFeeStructure.query.filter_by(
+        programme_name=programme,
+        programme_level=level,
+        study_format=study_format,
+        academic_year=year,
+        semester=semester
+    ).all()
 
-    # Break letters
+    total_fee = sum(f.amount for f in fee_structures) if fee_structures else 0.0
+    
+    # Get fee percentage settings
+    from models import FeePercentageSettings
+    fee_settings = FeePercentageSettings.get_active_settings(year)
+    
+    # Calculate base payment requirement
+    if fee_settings:
+        base_payment_required = (fee_settings.base_payment_percentage / 100.0) * total_fee
+        base_payment_deadline = fee_settings.base_payment_deadline
+        allow_installments = fee_settings.allow_installments_after_base
+    else:
+        base_payment_required = total_fee  # Default to full payment if no settings
+        base_payment_deadline = None
+        allow_installments = True
 
-    MORNING_LETTERS = ['B', 'R', 'E', 'A', 'K']
+    # Get approved payments
+    approved_txns = StudentFeeTransaction.query.filter_by(
+        student_id=student.id,
+        academic_year=year,
+        semester=semester,
+        is_approved=True
+    ).all()
+    current_balance = sum(txn.amount for txn in approved_txns)
+    remaining = max(0, total_fee - current_balance)
+    
+    # Check if base payment has been made
+    base_payment_made = current_balance >= base_payment_required
+    
+    # POST: Submit payment
+    if request.method == 'POST':
+        amount = float(request.form.get('amount', 0))
+        
+        # VALIDATION: Base payment requirement
+        if not base_payment_made and amount < base_payment_required:
+            flash(f"Base payment of GHS {base_payment_required:.2f} is required before installments. Current payment: GHS {amount:.2f}", "danger")
+            return redirect(url_for('student.pay_fees', year=year, semester=semester))
+        
+        # VALIDATION: Cannot pay more than remaining
+        if amount > remaining:
+            flash(f"Cannot pay more than GHS {remaining:.2f}", "danger")
+            return redirect(url_for('student.pay_fees', year=year, semester=semester))
 
-    LUNCH_LETTERS = ['L', 'U', 'N', 'C', 'H']
+        if amount <= 0:
+            flash("Amount must be greater than 0", "danger")
+            return redirect(url_for('student.pay_fees', year=year, semester=semester))
 
-    BREAKS = [
-
-        {'start_min': 10*60, 'end_min': 10*60+25, 'letters': MORNING_LETTERS},
-
-        {'start_min': 12*60+30, 'end_min': 12*60+55, 'letters': LUNCH_LETTERS},
-
-    ]
-
-
-
-    # Build header labels & column widths
-
-    header = ['Day / Time']
-
-    col_widths = [1.2 * inch]
-
-    total_width = 10.5 * inch
-
-    remaining_width = total_width - col_widths[0]
-
-
-
-    for start, end in TIME_SLOTS:
-
-        mins = end - start
-
-        width = remaining_width * (mins / total_minutes)
-
-        col_widths.append(width)
-
-        header.append(f"{start//60:02d}:{start%60:02d} - {end//60:02d}:{end%60:02d}")
-
-
-
-    # PDF Paragraph style
-
-    styles = getSampleStyleSheet()
-
-    cell_style = ParagraphStyle(
-
-        'cell_style',
-
-        parent=styles['Normal'],
-
-        alignment=1,  # center
-
-        fontSize=9,
-
-        leading=10,
-
-        wordWrap='CJK'
-
-    )
-
-
-
-    # Build timetable matrix
-
-    timetable_matrix = []
-
-    today_name = datetime.now().strftime('%A')
-
-
-
-    for i, day in enumerate(days):
-
-        row = [day]  # first column is day
-
-        for start, end in TIME_SLOTS:
-
-            match = next(
-
-                (e for e in timetable_entries
-
-                 if e.day_of_week == day and (e.start_time.hour*60 + e.start_time.minute) == start),
-
-                None
-
-            )
-
-            if match:
-
-                row.append(Paragraph(match.course.name, cell_style))
-
-            else:
-
-                # Check breaks
-
-                letter = None
-
-                for br in BREAKS:
-
-                    if start >= br['start_min'] and start < br['end_min']:
-
-                        letter = br['letters'][i]
-
-                        break
-
-                row.append(Paragraph(letter if letter else "—", cell_style))
-
-        timetable_matrix.append(row)
-
-
-
-    data = [header] + timetable_matrix
-
-
-
-    # PDF Generation
-
-    buffer = BytesIO()
-
-    doc = SimpleDocTemplate(
-
-        buffer,
-
-        pagesize=landscape(A4),
-
-        leftMargin=inch/2, rightMargin=inch/2,
-
-        topMargin=inch/2, bottomMargin=inch/2
-
-    )
-
-    elements = []
-
-
-
-    # TERTIARY TITLE FORMAT
-
-    title_text = f"<b>{programme_name} - Level {programme_level} Timetable</b>"
-
-    elements.append(Paragraph(title_text, styles['Title']))
-
-    elements.append(Spacer(1, 12))
-
-
-
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-
-
-
-    # Table style
-
-    table_style = TableStyle([
-
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#4A90E2")),
-
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-
-        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#cccccc")),
-
-    ])
-
-
-
-    # Row colors + today highlight + break letters
-
-    for i, row in enumerate(timetable_matrix):
-
-        bg_color = colors.HexColor("#f0f4f8") if i % 2 == 0 else colors.white
-
-        table_style.add('BACKGROUND', (0,i+1), (-1,i+1), bg_color)
-
-        if row[0] == today_name:
-
-            table_style.add('BACKGROUND', (0,i+1), (-1,i+1), colors.HexColor("#FFF4CC"))
-
-
-
-        for j, val in enumerate(row[1:], start=1):
-
-            text = val.getPlainText().strip()
-
-            if text in MORNING_LETTERS + LUNCH_LETTERS:
-
-                table_style.add('BACKGROUND', (j,i+1), (j,i+1), colors.HexColor("#FFD966"))
-
-                table_style.add('TEXTCOLOR', (j,i+1), (j,i+1), colors.HexColor("#222222"))
-
-                table_style.add('FONTNAME', (j,i+1), (j,i+1), 'Helvetica-Bold')
-
-
-
-    table.setStyle(table_style)
-
-    elements.append(table)
-
-
-
-    elements.append(Spacer(1, 12))
-
-    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%d %b %Y %I:%M %p')}", styles['Normal']))
-
-
-
-    doc.build(elements)
-
-    buffer.seek(0)
-
-
-
-    # TERTIARY FILENAME FORMAT
-
-    filename = f"{programme_name}_Level{programme_level}_timetable.pdf"
-
-    return send_file(
-
-        buffer,
-
-        as_attachment=True,
-
-        download_name=filename,
-
-        mimetype='application/pdf'
-
-    )
-
-
-
-# Appointment Booking System
-
-from collections import defaultdict
-
-
-
-@student_bp.route('/book-appointment', methods=['GET', 'POST'])
-
-@login_required
-
-def book_appointment():
-
-    # Only fetch unbooked slots
-
-    available_slots = AppointmentSlot.query.filter_by(is_booked=False).all()
-
-
-
-    # Pass slots directly to template
-
-    slots = []
-
-    for slot in available_slots:
-
-        teacher_user = slot.teacher.user  # Get the related User
-
-        slots.append({
-
-            'id': slot.id,
-
-            'date': slot.date,
-
-            'start_time': slot.start_time,
-
-            'end_time': slot.end_time,
-
-            'teacher_name': f"{teacher_user.first_name} {teacher_user.last_name}"
-
-        })
-
-
-
-    if request.method == 'POST':
-
-        slot_id = request.form['slot_id']
-
-        note = request.form.get('note', '')
-
-        slot = AppointmentSlot.query.get_or_404(slot_id)
-
-
-
-        if slot.is_booked:
-
-            flash('Slot already booked.', 'danger')
-
-            return redirect(url_for('student.book_appointment'))
-
-
-
-        student_profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
-
-        if not student_profile:
-
-            flash('Student profile not found.', 'danger')
-
-            return redirect(url_for('student.book_appointment'))
-
-
-
-        booking = AppointmentBooking(
-
-            student_id=student_profile.id,
-
-            slot_id=slot.id,
-
-            note=note
+        description = request.form.get('description') or "School Fees"
 
+        txn = StudentFeeTransaction(
+            student_id=student.id,
+            academic_year=year,
+            semester=semester,
+            amount=amount,
+            description=description,
+            is_approved=False,
+            timestamp=datetime.utcnow()
         )
-
-        slot.is_booked = True
-
-        db.session.add(booking)
-
-        db.session.add(booking)
-
+        db.session.add(txn)
         db.session.commit()
 
+        flash(f"✓ Payment of GHS {amount:.2f} submitted", "success")
+        return redirect(url_for('student.pay_fees', year=year, semester=semester))
 
+    # Available years
+    years = db.session.query(ProgrammeFeeStructure.academic_year).filter_by(
+        programme_name=programme,
+        programme_level=level,
+        study_format=study_format
+    ).distinct().order_by(ProgrammeFeeStructure.academic_year.desc()).all()
+    available_years = [y[0] for y in years]
 
-        flash('Appointment booked successfully.', 'success')
-
-        return redirect(url_for('student.my_appointments'))
-
-
-
-    return render_template('student/book_appointment.html', slots=slots)
-
-
-
-from sqlalchemy.orm import joinedload
-
-
-
-@student_bp.route('/my-appointments')
-
-@login_required
-
-def my_appointments():
-
-    student_profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
-
-    if not student_profile:
-
-        flash('Student profile not found.', 'danger')
-
-        return redirect(url_for('student.book_appointment'))
-
-    bookings = AppointmentBooking.query \
-        .filter_by(student_id=student_profile.id) \
-        .options(joinedload(AppointmentBooking.slot).joinedload(AppointmentSlot.teacher)) \
-        .all()
-
-    return render_template('student/my_appointments.html', bookings=bookings)
-
-
-
-# Fees Management
-
-@student_bp.route('/fees')
-
-@login_required
-
-def student_fees():
-
-    # Restrict to students
-
-    if current_user.role != 'student':
-
-        abort(403)
-
-
-
-    fees = StudentFeeBalance.query.filter_by(
-
-        student_id=current_user.id
-
-    ).order_by(StudentFeeBalance.id.desc()).all()
-
-
-
-    transactions = StudentFeeTransaction.query.filter_by(
-
-        student_id=current_user.id
-
-    ).order_by(StudentFeeTransaction.timestamp.desc()).all()
-
-
-
-    return render_template(
-
-        'student/fees.html',
-
-        fees=fees,
-
-        transactions=transactions
-
-    )
-
-
-@student_bp.route('/pay-fees', methods=['GET', 'POST'])
-@login_required
-def pay_fees():
-    if current_user.role != 'student':
-        abort(403)
-
-    student = current_user
-    profile = StudentProfile.query.filter_by(user_id=student.user_id).first()
-
-    if not profile:
-        flash("Student profile not found.", "danger")
-        return redirect(url_for('main.index'))
-
-    programme = profile.current_programme
-    level = str(int(profile.programme_level)) if profile.programme_level else '100'
-    study_format = profile.study_format or 'Regular'
-
-    year = request.args.get('year') or str(datetime.now().year)
-    semester = request.args.get('semester') or 'First'
-
-    # Get fees
-    fee_structures = ProgrammeFeeStructure.query.filter_by(
-        programme_name=programme,
-        programme_level=level,
-        study_format=study_format,
-        academic_year=year,
-        semester=semester
-    ).all()
-
-    total_fee = sum(f.amount for f in fee_structures) if fee_structures else 0.0
-    
-    # Get fee percentage settings
-    from models import FeePercentageSettings
-    fee_settings = FeePercentageSettings.get_active_settings(year)
-    
-    # Calculate base payment requirement
-    if fee_settings:
-        base_payment_required = (fee_settings.base_payment_percentage / 100.0) * total_fee
-        base_payment_deadline = fee_settings.base_payment_deadline
-        allow_installments = fee_settings.allow_installments_after_base
-    else:
-        base_payment_required = total_fee  # Default to full payment if no settings
-        base_payment_deadline = None
-        allow_installments = True
-
-    # Get approved payments
-    approved_txns = StudentFeeTransaction.query.filter_by(
-        student_id=student.id,
-        academic_year=year,
-        semester=semester,
-        is_approved=True
-    ).all()
-    current_balance = sum(txn.amount for txn in approved_txns)
-    remaining = max(0, total_fee - current_balance)
-    
-    # Check if base payment has been made
-    base_payment_made = current_balance >= base_payment_required
-    
-    # POST: Submit payment
-    if request.method == 'POST':
-        amount = float(request.form.get('amount', 0))
-        
-        # VALIDATION: Base payment requirement
-        if not base_payment_made and amount < base_payment_required:
-            flash(f"Base payment of GHS {base_payment_required:.2f} is required before installments. Current payment: GHS {amount:.2f}", "danger")
-            return redirect(url_for('student.pay_fees', year=year, semester=semester))
-        
-        # VALIDATION: Cannot pay more than remaining
-        if amount > remaining:
-            flash(f"Cannot pay more than GHS {remaining:.2f}", "danger")
-            return redirect(url_for('student.pay_fees', year=year, semester=semester))
-
-        if amount <= 0:
-            flash("Amount must be greater than 0", "danger")
-            return redirect(url_for('student.pay_fees', year=year, semester=semester))
-
-        description = request.form.get('description') or "School Fees"
-
-        txn = StudentFeeTransaction(
-            student_id=student.id,
-            academic_year=year,
-            semester=semester,
-            amount=amount,
-            description=description,
-            is_approved=False,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(txn)
-        db.session.commit()
-
-        flash(f"✓ Payment of GHS {amount:.2f} submitted", "success")
-        return redirect(url_for('student.pay_fees', year=year, semester=semester))
-
-    # Available years
-    years = db.session.query(ProgrammeFeeStructure.academic_year).filter_by(
-        programme_name=programme,
-        programme_level=level,
-        study_format=study_format
-    ).distinct().order_by(ProgrammeFeeStructure.academic_year.desc()).all()
-    available_years = [y[0] for y in years]
-
-    # Determine if installments are allowed based on level
-    # Level 100 (freshers): Full payment only
-    # Level 200+: Installments allowed
-    allow_installments = int(level) >= 200
-
-    return render_template(
-        'student/pay_fees.html',
-        assigned_fees=fee_structures,
-        total_fee=total_fee,
-        current_balance=current_balance,
-        remaining=remaining,
-        max_allowed_amount=remaining,
-        year=year,
-        semester=semester,
-        available_years=available_years,
-        transactions=approved_txns,
-        programme=programme,
-        level=level,
-        allow_installments=allow_installments,
-        student_level=int(level),
-        base_payment_required=base_payment_required if fee_settings else total_fee,
-        base_payment_deadline=base_payment_deadline,
-        fee_settings=fee_settings
-    )
-
-
-@student_bp.route('/download-receipt/<int:txn_id>')
-
-@login_required
-
-def download_receipt(txn_id):
-
-    txn = StudentFeeTransaction.query.get_or_404(txn_id)
-
-
-
-    # Allow only the student
-
-    if current_user.id != txn.student_id:
-
-        abort(403)
-
-
-
-    if not txn.is_approved:
-
-        abort(403)
-
-
-
-    filename = f"receipt_{txn.id}.pdf"
-
-    filepath = os.path.join(current_app.config['RECEIPT_FOLDER'], filename)
-
-
-
-    if not os.path.exists(filepath):
-
-        flash("Receipt not found. Please contact admin.", "danger")
-
-        return redirect(url_for('student.student_fees'))
-
-
-
-    return send_file(filepath, as_attachment=True)
-
-
-
-
-
-@student_bp.route('/profile')
-
-@login_required
-
-def profile():
-
-    if not current_user.is_student:
-
-        abort(403)
-
-
-
-    profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
-
-    return render_template('student/profile.html', profile=profile, user=current_user)
-
-
-
-@student_bp.route('/id-card')
-
-@login_required
-
-def view_id_card():
-
-    if not current_user.is_student:
-
-        abort(403)
-
-    
-
-    id_card_url = generate_student_id_card_pdf(current_user)
-
-    return render_template(
-
-        'student/view_id_card.html',
-
-        id_card_url=id_card_url,
-
-        student=current_user  # <-- pass the student here
-
-    )
-
-
-
-@student_bp.route('/profile/edit', methods=['GET', 'POST'])
-
-@login_required
-
-def edit_profile():
-
-    if not current_user.is_student:
-
-        abort(403)
-
-
-
-    profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
-
-
-
-    if request.method == 'POST':
-
-        profile.phone = request.form.get('phone')
-
-        profile.email = request.form.get('email')
-
-        profile.address = request.form.get('address')
-
-        profile.city = request.form.get('city')
-
-        profile.postal_code = request.form.get('postal_code')
-
-
-
-        profile.blood_group = request.form.get('blood_group')
-
-        profile.medical_conditions = request.form.get('medical_conditions')
-
-
-
-        profile.emergency_contact_name = request.form.get('emergency_contact_name')
-
-        profile.emergency_contact_number = request.form.get('emergency_contact_number')
-
-
-
-        db.session.commit()
-
-        flash('Profile updated successfully.', 'success')
-
-        return redirect(url_for('student.profile'))
-
-
-
-    return render_template('student/edit_profile.html', profile=profile)
-
-
-
-@student_bp.route('/change_password', methods=['GET', 'POST'])
-
-@login_required
-
-def change_password():
-
-    form = ChangePasswordForm()
-
-    if form.validate_on_submit():
-
-        if current_user.check_password(form.current_password.data):
-
-            current_user.set_password(form.new_password.data)
-
-            db.session.commit()
-
-            flash('Password updated successfully!', 'success')
-
-            return redirect(url_for('student.profile'))
-
-        else:
-
-            flash('Current password is incorrect.', 'danger')
-
-    return render_template('student/change_password.html', form=form)
-
-
-
-from collections import defaultdict
-
-
-
-@student_bp.route('/notifications')
-
-@login_required
-
-def student_notifications():
-
-    """
-
-    Show grouped notifications by title/category.
-
-    """
-
-    recipients = (
-
-        NotificationRecipient.query
-
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-
-        .filter(NotificationRecipient.user_id == current_user.user_id)
-
-        .order_by(Notification.created_at.desc())
-
-        .all()
-
-    )
-
-
-
-    grouped = defaultdict(list)
-
-    for r in recipients:
-
-        grouped[r.notification.title].append(r)
-
-
-
-    # sort groups by most recent notification
-
-    grouped_notifications = sorted(
-
-        grouped.items(),
-
-        key=lambda g: g[1][0].notification.created_at,
-
-        reverse=True
-
-    )
-
-
-
-    return render_template(
-
-        'student/notifications.html',
-
-        grouped_notifications=grouped_notifications
-
-    )
-
-
-
-@student_bp.route('/notifications/group/<string:title>')
-
-@login_required
-
-def view_notification_group(title):
-
-    """
-
-    Show all notifications under a single title group.
-
-    """
-
-    recipients = (
-
-        NotificationRecipient.query
-
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-
-        .filter(NotificationRecipient.user_id == current_user.user_id,
-
-                Notification.title == title)
-
-        .order_by(Notification.created_at.desc())
-
-        .all()
-
-    )
-
-
-
-    # mark all as read
-
-    for r in recipients:
-
-        if not r.is_read:
-
-            r.is_read = True
-
-            r.read_at = datetime.utcnow()
-
-    db.session.commit()
-
-
-
-    return render_template('student/notification_detail.html', title=title, recipients=recipients)
-
-
-
-
-
-@student_bp.route('/notifications/mark_read/<int:recipient_id>', methods=['POST'])
-
-@login_required
-
-def mark_notification_read(recipient_id):
-
-    recipient = NotificationRecipient.query.filter_by(
-
-        id=recipient_id, user_id=current_user.user_id
-
-    ).first_or_404()
-
-
-
-    if not recipient.is_read:
-
-        recipient.is_read = True
-
-        recipient.read_at = datetime.utcnow()
-
-        db.session.commit()
-
-
-
-    return jsonify({"success": True, "id": recipient_id})
-
-
-
-@student_bp.route('/notifications/delete/<int:recipient_id>', methods=['POST'])
-
-@login_required
-
-def delete_notification(recipient_id):
-
-    """
-
-    Delete a single notification for the logged-in student.
-
-    """
-
-    recipient = NotificationRecipient.query.filter_by(
-
-        id=recipient_id, user_id=current_user.user_id
-
-    ).first_or_404()
-
-
-
-    db.session.delete(recipient)
-
-    db.session.commit()
-
-
-
-    return jsonify({"success": True, "id": recipient_id})
-
-
-
-@student_bp.route('/notifications/delete_group/<string:title>', methods=['POST'])
-
-@login_required
-
-def delete_notification_group(title):
-
-    """
-
-    Delete all notifications under a given title for the current user.
-
-    """
-
-    recipients = (
-
-        NotificationRecipient.query
-
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-
-        .filter(
-
-            NotificationRecipient.user_id == current_user.user_id,
-
-            Notification.title == title
-
-        )
-
-        .all()
-
-    )
-
-
-
-    if not recipients:
-
-        return jsonify({'success': False, 'message': 'No notifications found'}), 404
-
-
-
-    # Delete each recipient entry
-
-    for r in recipients:
-
-        db.session.delete(r)
-
-    db.session.commit()
-
-
-
-    return jsonify({'success': True})
-
-
-
-
-
-def format_time(t):
-
-    # expects time object
-
-    return t.strftime('%I:%M%p').lstrip('0').replace('AM','AM').replace('PM','PM')
+    # Determine if installments are allowed based on level
+    # Level 100 (freshers): Full payment only
+    # Level 200+: Installments allowed
+    allow_installments = int(level) >= 200
 
+    return render_template(
+        'student/pay_fees.html',
+        assigned_fees=fee_structures,
+        total_fee=total_fee,
+        current_balance=current_balance,
+        remaining=remaining,
+        max_allowed_amount=remaining,
+        year=year,
+        semester=semester,
+        available_years=available_years,
+        transactions=approved_txns,
+        programme=programme,
+        level=level,
+        allow_installments=allow_installments,
+        student_level=int(level),
+        base_payment_required=base_payment_required if fee_settings else total_fee,
+        base_payment_deadline=base_payment_deadline,
+        fee_settings=fee_settings
+    )
 
 
-@student_bp.route('/exam-timetable', methods=['GET', 'POST'])
+@student_bp.route('/download-receipt/<int:txn_id>')
 
 @login_required
 
-def exam_timetable_page():
-
-    return render_template('student/exam_timetable_input.html')
-
-
-
-def generate_logo_qr(data: str,
-
-                     logo_path: str = None,
+def download_receipt(txn_id):
 
-                     final_size: int = 300,
+    txn = StudentFeeTransaction.query.get_or_404(txn_id)
 
-                     logo_fraction: float = 0.45,
 
-                     box_size: int = 10,
 
-                     border: int = 2) -> Image.Image:
+    # Allow only the student
 
-    """Generate QR code with optional logo overlay."""
+    if current_user.id != txn.student_id:
 
-    qr = qrcode.QRCode(
+        abort(403)
 
-        version=None,
 
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
 
-        box_size=box_size,
+    if not txn.is_approved:
 
-        border=border
+        abort(403)
 
-    )
 
-    qr.add_data(data)
 
-    qr.make(fit=True)
+    # The receipt stored at approval; re-issued only if the file is missing (services/receipt_service.py)
 
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    filename, filepath = ReceiptService.receipt_file(txn)
 
-    
+    return send_file(filepath, as_attachment=True, download_name=filename, mimetype='application/pdf')
 
-    # Resize to final size if needed
 
-    if final_size and qr_img.size[0] != final_size:
 
-        qr_img = qr_img.resize((final_size, final_size), Image.Resampling.LANCZOS)
 
-    
 
-    # Add logo if provided
+@student_bp.route('/profile')
 
-    if logo_path:
+@login_required
 
-        try:
+def profile():
 
-            logo = Image.open(logo_path).convert("RGBA")
+    if not current_user.is_student:
 
-            
+        abort(403)
 
-            # Calculate logo size based on fraction
 
-            logo_size = int(qr_img.size[0] * logo_fraction)
 
-            logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
+    profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
 
-            
+    return render_template('student/profile.html', profile=profile, user=current_user)
 
-            # Create white background for logo
 
-            logo_bg = Image.new("RGB", (logo_size + 10, logo_size + 10), "white")
 
-            logo_bg.paste(logo, (5, 5), logo if logo.mode == "RGBA" else None)
+@student_bp.route('/id-card')
 
-            
+@login_required
 
-            # Paste logo in center
+def view_id_card():
 
-            logo_pos = (qr_img.size[0] // 2 - logo_bg.size[0] // 2,
+    if not current_user.is_student:
 
-                       qr_img.size[1] // 2 - logo_bg.size[1] // 2)
+        abort(403)
 
-            qr_img.paste(logo_bg, logo_pos)
+    
 
-        except Exception as e:
+    from utils.id_card import generate_student_id_card_pdf
 
-            # If logo loading fails, just return QR code without logo
+    id_card_url = generate_student_id_card_pdf(current_user)
 
-            pass
+    return render_template(
 
-    
+        'student/view_id_card.html',
 
-    return qr_img
+        id_card_url=id_card_url,
 
+        student=current_user  # <-- pass the student here
 
+    )
 
 
 
-@student_bp.route('/exam-timetable/download', methods=['POST'])
+@student_bp.route('/profile/edit', methods=['GET', 'POST'])
 
 @login_required
 
-def download_student_exam_timetable():
-
-    """Download exam timetable for tertiary student (by index number)"""
+def edit_profile():
 
-    index_number = request.form.get("index_number")
+    if not current_user.is_student:
 
-    if not index_number:
+        abort(403)
 
-        flash("Please enter a valid index number.", "danger")
 
-        return redirect(url_for('student.exam_timetable_page'))
 
+    profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
 
 
-    # Find student by index number (tertiary identifier)
 
-    profile = StudentProfile.query.filter_by(index_number=index_number).first()
+    if request.method == 'POST':
 
-    if not profile:
+        profile.phone = request.form.get('phone')
 
-        flash("Index number not found.", "danger")
+        profile.email = request.form.get('email')
 
-        return redirect(url_for('student.exam_timetable_page'))
+        profile.address = request.form.get('address')
 
+        profile.city = request.form.get('city')
 
+        profile.postal_code = request.form.get('postal_code')
 
-    user = profile.user
 
-    if not user:
 
-        flash("Student profile incomplete.", "danger")
+        profile.blood_group = request.form.get('blood_group')
 
-        return redirect(url_for('student.exam_timetable_page'))
+        profile.medical_conditions = request.form.get('medical_conditions')
 
 
 
-    # Get exam timetable entries for this programme level
+        profile.emergency_contact_name = request.form.get('emergency_contact_name')
 
-    entries = ExamTimetableEntry.query.filter(
+        profile.emergency_contact_number = request.form.get('emergency_contact_number')
 
-        ((ExamTimetableEntry.student_index == index_number) |
 
-         (ExamTimetableEntry.programme_level == str(profile.programme_level)))
 
-    ).order_by(
+        db.session.commit()
 
-        ExamTimetableEntry.date,
+        flash('Profile updated successfully.', 'success')
 
-        ExamTimetableEntry.start_time
+        return redirect(url_for('student.profile'))
 
-    ).all()
 
 
+    return render_template('student/edit_profile.html', profile=profile)
 
-    if not entries:
 
-        flash("No exam timetable found for this index number.", "warning")
 
-        return redirect(url_for('student.exam_timetable_page'))
+@student_bp.route('/change_password', methods=['GET', 'POST'])
 
+@login_required
 
+def change_password():
 
-    # Layout constants
+    form = ChangePasswordForm()
 
-    margin = 40
+    if form.validate_on_submit():
 
-    block_spacing = 22
+        if current_user.check_password(form.current_password.data):
 
-    block_corner_radius = 8
+            current_user.set_password(form.new_password.data)
 
-    page_width, page_height = letter
+            db.session.commit()
 
-    content_width = page_width - 2 * margin
+            flash('Password updated successfully!', 'success')
 
+            return redirect(url_for('student.profile'))
 
+        else:
 
-    qr_display_size = 120
+            flash('Current password is incorrect.', 'danger')
 
-    qr_generate_size = qr_display_size * 2
+    return render_template('student/change_password.html', form=form)
 
-    qr_right_margin = 20
 
 
+from collections import defaultdict
 
-    buffer = BytesIO()
 
-    p = canvas.Canvas(buffer, pagesize=letter)
 
-    width, height = letter
+@student_bp.route('/notifications')
 
+@login_required
 
+def student_notifications():
 
-    # -------- Header --------
+    """
 
-    p.setFillColor(colors.HexColor("#1f77b4"))
+    Show grouped notifications by title/category.
 
-    p.rect(0, height-80, width, 80, fill=True, stroke=False)
+    """
 
-    p.setFillColor(colors.white)
+    recipients = (
 
-    p.setFont("Helvetica-Bold", 18)
+        NotificationRecipient.query
 
-    p.drawCentredString(width/2, height-48, "END OF SEMESTER EXAMINATION TIMETABLE")
+        .join(Notification, Notification.id == NotificationRecipient.notification_id)
 
-    p.setFont("Helvetica", 11)
+        .filter(NotificationRecipient.user_id == current_user.user_id)
 
-    p.drawCentredString(width/2, height-68, f"{profile.academic_year or 'Academic Year'}")
+        .order_by(Notification.created_at.desc())
 
+        .all()
 
+    )
 
-    y_top = height - 100
 
 
+    grouped = defaultdict(list)
 
-    for e in entries:
+    for r in recipients:
 
-        # 3-COLUMN LAYOUT
+        grouped[r.notification.title].append(r)
 
-        col1_fields = [
 
-            ("Name:", f"{user.first_name} {user.last_name}"),
 
-            ("Index #:", index_number),
+    # sort groups by most recent notification
 
-            ("Programme:", profile.current_programme or ""),
+    grouped_notifications = sorted(
 
-            ("Course:", e.course or ""),
+        grouped.items(),
 
-            ("Level:", f"Level {profile.programme_level}")
+        key=lambda g: g[1][0].notification.created_at,
 
-        ]
+        reverse=True
 
-        
+    )
 
-        col2_fields = [
 
-            ("Time:", f"{e.start_time.strftime('%H:%M')} - {e.end_time.strftime('%H:%M')}"),
 
-            ("Date:", e.date.strftime('%A, %d %B %Y')),
+    return render_template(
 
-            ("Room:", e.room or ""),
+        'student/notifications.html',
 
-            ("Building:", e.building or ""),
+        grouped_notifications=grouped_notifications
 
-            ("Floor:", e.floor or "")
+    )
 
-        ]
 
 
+@student_bp.route('/notifications/group/<string:title>')
 
-        # Wrap long course name
+@login_required
 
-        wrapped_course = textwrap.wrap(col1_fields[3][1], width=20)
+def view_notification_group(title):
 
-        col1_fields[3] = ("Course:", "\n".join(wrapped_course))
+    """
 
-        
+    Show all notifications under a single title group.
 
-        # Wrap long date
+    """
 
-        wrapped_date = textwrap.wrap(col2_fields[1][1], width=20)
+    recipients = (
 
-        col2_fields[1] = ("Date:", "\n".join(wrapped_date))
+        NotificationRecipient.query
 
+        .join(Notification, Notification.id == NotificationRecipient.notification_id)
 
+        .filter(NotificationRecipient.user_id == current_user.user_id,
 
-        # Layout constants - INCREASED SPACING
+                Notification.title == title)
 
-        line_height = 16
+        .order_by(Notification.created_at.desc())
 
-        top_padding = 20
+        .all()
 
-        bottom_padding = 16
+    )
 
-        left_margin_col = 14
 
-        value_offset = 65
 
-        col_width = (content_width - 4 * left_margin_col - qr_display_size) / 2
+    # mark all as read
 
+    for r in recipients:
 
+        if not r.is_read:
 
-        # Calculate block height
+            r.is_read = True
 
-        col1_lines = sum(v.count("\n") + 1 for _, v in col1_fields)
+            r.read_at = datetime.utcnow()
 
-        col2_lines = sum(v.count("\n") + 1 for _, v in col2_fields)
+    db.session.commit()
 
-        text_lines = max(col1_lines, col2_lines)
 
-        text_block_height = text_lines * line_height + top_padding + bottom_padding
 
-        block_height = max(text_block_height, qr_display_size + top_padding + bottom_padding)
+    return render_template('student/notification_detail.html', title=title, recipients=recipients)
 
-        block_bottom = y_top - block_height
 
 
 
-        # New page check - MORE SPACE AT BOTTOM
 
-        if block_bottom < 60:
+@student_bp.route('/notifications/mark_read/<int:recipient_id>', methods=['POST'])
 
-            p.showPage()
+@login_required
 
-            p.setFillColor(colors.HexColor("#1f77b4"))
+def mark_notification_read(recipient_id):
 
-            p.rect(0, height-80, width, 80, fill=True, stroke=False)
+    recipient = NotificationRecipient.query.filter_by(
 
-            p.setFillColor(colors.white)
+        id=recipient_id, user_id=current_user.user_id
 
-            p.setFont("Helvetica-Bold", 18)
+    ).first_or_404()
 
-            p.drawCentredString(width/2, height-48, "END OF SEMESTER EXAMINATION TIMETABLE")
 
-            p.setFont("Helvetica", 11)
 
-            p.drawCentredString(width/2, height-68, f"{profile.academic_year or 'Academic Year'}")
+    if not recipient.is_read:
 
-            y_top = height - 100
+        recipient.is_read = True
 
-            block_bottom = y_top - block_height
+        recipient.read_at = datetime.utcnow()
 
+        db.session.commit()
 
 
-        # Draw block background with border
 
-        p.setFillColor(colors.HexColor("#f8f9fa"))
+    return jsonify({"success": True, "id": recipient_id})
 
-        p.roundRect(margin, block_bottom, content_width, block_height, block_corner_radius, fill=True, stroke=False)
 
-        
 
-        # Left accent bar - THICKER
+@student_bp.route('/notifications/delete/<int:recipient_id>', methods=['POST'])
 
-        p.setFillColor(colors.HexColor("#1f77b4"))
+@login_required
 
-        p.roundRect(margin+10, block_bottom+10, 8, block_height-20, 4, fill=True, stroke=False)
+def delete_notification(recipient_id):
 
-        
+    """
 
-        # Border around box
+    Delete a single notification for the logged-in student.
 
-        p.setStrokeColor(colors.HexColor("#d0d0d0"))
+    """
 
-        p.setLineWidth(1)
+    recipient = NotificationRecipient.query.filter_by(
 
-        p.roundRect(margin, block_bottom, content_width, block_height, block_corner_radius, fill=False, stroke=True)
+        id=recipient_id, user_id=current_user.user_id
 
+    ).first_or_404()
 
 
-        # VERTICALLY CENTERED START Y POSITION (aligned with QR code middle)
 
-        qr_x = margin + content_width - left_margin_col - qr_display_size - 8
+    db.session.delete(recipient)
 
-        qr_y = block_bottom + (block_height - qr_display_size) / 2
+    db.session.commit()
 
-        qr_center_y = qr_y + qr_display_size / 2
 
-        
 
-        # Start text from center of QR code, going upward
+    return jsonify({"success": True, "id": recipient_id})
 
-        centered_start_y = qr_center_y + (text_lines * line_height / 2)
 
 
+@student_bp.route('/notifications/delete_group/<string:title>', methods=['POST'])
 
-        # Column 1 (Left) - VERTICALLY ALIGNED WITH QR CODE
+@login_required
 
-        col1_x = margin + left_margin_col + 8
+def delete_notification_group(title):
 
-        cur_y = centered_start_y
+    """
 
-        p.setFont("Helvetica-Bold", 11)
+    Delete all notifications under a given title for the current user.
 
-        p.setFillColor(colors.HexColor("#1f77b4"))
+    """
 
-        
+    recipients = (
 
-        for label, value in col1_fields:
+        NotificationRecipient.query
 
-            p.drawString(col1_x, cur_y, label)
+        .join(Notification, Notification.id == NotificationRecipient.notification_id)
 
-            p.setFont("Helvetica", 10)
+        .filter(
 
-            p.setFillColor(colors.black)
+            NotificationRecipient.user_id == current_user.user_id,
 
-            for subline in value.split("\n"):
+            Notification.title == title
 
-                p.drawString(col1_x + value_offset, cur_y, subline)
+        )
 
-                cur_y -= line_height
+        .all()
 
-            p.setFont("Helvetica-Bold", 11)
+    )
 
-            p.setFillColor(colors.HexColor("#1f77b4"))
 
 
+    if not recipients:
 
-        # Column 2 (Middle) - VERTICALLY ALIGNED WITH QR CODE
+        return jsonify({'success': False, 'message': 'No notifications found'}), 404
 
-        col2_x = margin + left_margin_col + col_width + left_margin_col + 8
 
-        cur_y = centered_start_y
 
-        p.setFont("Helvetica-Bold", 11)
+    # Delete each recipient entry
 
-        p.setFillColor(colors.HexColor("#1f77b4"))
+    for r in recipients:
 
-        
+        db.session.delete(r)
 
-        for label, value in col2_fields:
+    db.session.commit()
 
-            p.drawString(col2_x, cur_y, label)
 
-            p.setFont("Helvetica", 10)
 
-            p.setFillColor(colors.black)
+    return jsonify({'success': True})
 
-            for subline in value.split("\n"):
 
-                p.drawString(col2_x + value_offset, cur_y, subline)
 
-                cur_y -= line_height
 
-            p.setFont("Helvetica-Bold", 11)
 
-            p.setFillColor(colors.HexColor("#1f77b4"))
+def format_time(t):
 
+    # expects time object
 
+    return t.strftime('%I:%M%p').lstrip('0').replace('AM','AM').replace('PM','PM')
 
-        # Column 3 (QR Code - Right) - VERTICALLY CENTERED
 
-        qr_data = (
 
-            f"Student: {user.first_name} {user.last_name}\n"
+@student_bp.route('/exam-timetable', methods=['GET', 'POST'])
 
-            f"Matric: {index_number}\n"
+@login_required
 
-            f"Programme: {profile.current_programme}\n"
+def exam_timetable_page():
 
-            f"Level: {profile.programme_level}\n"
+    return render_template('student/exam_timetable_input.html')
 
-            f"Course: {e.course}\n"
 
-            f"Date: {e.date.strftime('%A, %d %B %Y')}\n"
 
-            f"Time: {e.start_time.strftime('%H:%M')} - {e.end_time.strftime('%H:%M')}\n"
+@student_bp.route('/exam-timetable/download', methods=['POST'])
 
-            f"Building: {e.building}\nRoom: {e.room}"
+@login_required
 
-        )
+def download_student_exam_timetable():
 
-        qr_img = generate_logo_qr(qr_data,
+    """Download exam timetable for tertiary student (by index number)"""
 
-                                  logo_path='static/VTIU-LOGO.png',
+    index_number = request.form.get("index_number")
 
-                                  final_size=qr_generate_size,
+    if not index_number:
 
-                                  box_size=10,
+        flash("Please enter a valid index number.", "danger")
 
-                                  border=2)
+        return redirect(url_for('student.exam_timetable_page'))
 
-        qr_buffer = BytesIO()
 
-        qr_img.save(qr_buffer, format='PNG')
 
-        qr_buffer.seek(0)
+    # Find student by index number (tertiary identifier)
 
-        qr_reader = ImageReader(qr_buffer)
+    profile = StudentProfile.query.filter_by(index_number=index_number).first()
 
-        p.drawImage(qr_reader, qr_x, qr_y, qr_display_size, qr_display_size, 
+    if not profile:
 
-                   preserveAspectRatio=True, mask='auto')
+        flash("Index number not found.", "danger")
 
-        
+        return redirect(url_for('student.exam_timetable_page'))
 
-        # QR Code label
 
-        p.setFont("Helvetica", 8)
 
-        p.setFillColor(colors.HexColor("#666666"))
+    user = profile.user
 
-        p.drawCentredString(qr_x + qr_display_size/2, qr_y - 8, "Scan for details")
+    if not user:
 
+        flash("Student profile incomplete.", "danger")
 
+        return redirect(url_for('student.exam_timetable_page'))
 
-        y_top = block_bottom - block_spacing
 
 
+    pdf = TimetableRenderService.exam_timetable_pdf(profile, user, index_number)
 
-    p.showPage()
+    if pdf is None:
 
-    p.save()
+        flash("No exam timetable found for this index number.", "warning")
 
-    buffer.seek(0)
+        return redirect(url_for('student.exam_timetable_page'))
 
 
 
     filename = f"exam_timetable_{index_number}.pdf"
 
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return send_file(BytesIO(pdf), as_attachment=True, download_name=filename, mimetype='application/pdf')
+
 
 
 
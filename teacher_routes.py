@@ -1,13 +1,14 @@
 import csv
+import io
 import json
 import re
 import tempfile
 from zipfile import ZipFile
-from flask import Blueprint, render_template, abort, flash, redirect, url_for, request, jsonify, current_app
+from flask import Blueprint, Response, render_template, abort, flash, redirect, url_for, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user, login_user
 import requests
 from wtforms import SelectField
-from models import CourseAssessmentScheme, CourseMaterial, ExamOption, ExamQuestion, ExamSet, ExamSetQuestion, Meeting, Option, Question, SemesterResultRelease, db, TeacherProfile, Course, StudentCourseRegistration, TeacherCourseAssignment, AttendanceRecord, User, StudentProfile, AcademicCalendar, AcademicYear, AppointmentBooking, AppointmentSlot, Assignment, Quiz, StudentQuizSubmission, Exam, ExamSubmission, AssignmentSubmission, GradingScale, ExamTimetableEntry, TeacherAssessment, TeacherAssessmentAnswer, TeacherAssessmentPeriod
+from models import CourseAssessmentScheme, CourseMaterial, ExamOption, ExamQuestion, ExamSet, ExamSetQuestion, Meeting, Option, Question, SemesterResultRelease, db, TeacherProfile, Course, StudentCourseRegistration, TeacherCourseAssignment, AttendanceRecord, User, StudentProfile, AcademicCalendar, AcademicYear, AppointmentBooking, AppointmentSlot, Assignment, Quiz, Exam, AssignmentSubmission, GradingScale, ExamTimetableEntry, TeacherAssessment, TeacherAssessmentAnswer, TeacherAssessmentPeriod
 from forms import AssignmentForm, ChangePasswordForm, ExamForm, ExamQuestionForm, ExamSetForm, MaterialForm, MeetingForm, QuizForm, TeacherLoginForm
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta, date
@@ -20,6 +21,10 @@ import os, uuid
 from utils.helpers import get_programme_choices, get_level_choices, get_course_choices
 from wtforms.validators import DataRequired 
 from services.semester_grading_service import SemesterGradingService
+from services.teacher_results_service import CSV_HEADER, TeacherResultsService
+from services.attendance_engine import AttendanceEngine
+from services.video_pipeline import VideoPipeline
+from services.quiz_interchange import QuizImportError, QuizInterchange
 import logging
 
 
@@ -369,6 +374,7 @@ def add_material():
                 return render_template('teacher/add_materials.html', form=form)
 
         saved_count = 0
+        new_materials = []
         
         for file in form.files.data:
             if not file or not file.filename:
@@ -405,15 +411,19 @@ def add_material():
                                     with open(save_path, 'wb') as out:
                                         out.write(data)
 
-                                    db.session.add(CourseMaterial(
+                                    file_type = orig_name.rsplit('.', 1)[-1].lower()
+                                    material = CourseMaterial(
                                         title=title,
                                         course_name=course.name if course else None,
                                         programme_name=programme_name,
                                         programme_level=programme_level,
                                         filename=unique_name,
                                         original_name=orig_name,
-                                        file_type=orig_name.rsplit('.', 1)[-1].lower()
-                                    ))
+                                        file_type=file_type,
+                                        video_status=VideoPipeline.initial_status(current_app, file_type)
+                                    )
+                                    db.session.add(material)
+                                    new_materials.append(material)
                                     saved_count += 1
                     except ZipFile.BadZipFile:
                         flash(f"Invalid ZIP file: {filename}", "warning")
@@ -429,19 +439,28 @@ def add_material():
                     os.makedirs(current_app.config['MATERIALS_FOLDER'], exist_ok=True)
                     file.save(save_path)
 
-                    db.session.add(CourseMaterial(
+                    file_type = orig_name.rsplit('.', 1)[-1].lower()
+                    material = CourseMaterial(
                         title=title,
                         course_name=course.name if course else None,
                         programme_name=programme_name,
                         programme_level=programme_level,
                         filename=unique_name,
                         original_name=orig_name,
-                        file_type=orig_name.rsplit('.', 1)[-1].lower()
-                    ))
+                        file_type=file_type,
+                        video_status=VideoPipeline.initial_status(current_app, file_type)
+                    )
+                    db.session.add(material)
+                    new_materials.append(material)
                     saved_count += 1
 
         if saved_count > 0:
             db.session.commit()
+            # Faststart remux, renditions and poster are prepared in the background
+            VideoPipeline.enqueue(
+                current_app._get_current_object(),
+                [m.id for m in new_materials if m.video_status == 'pending']
+            )
             print(f"{saved_count} material(s) uploaded successfully")
             flash(f"✓ {saved_count} material(s) uploaded successfully!", "success")
             return redirect(url_for("teacher.manage_materials"))
@@ -477,6 +496,7 @@ def delete_material(material_id):
     path = os.path.join(current_app.config['MATERIALS_FOLDER'], material.filename)
     if os.path.exists(path):
         os.remove(path)
+    VideoPipeline.remove_outputs(current_app, material)
     db.session.delete(material)
     db.session.commit()
     flash('Material deleted.', 'info')
@@ -800,27 +820,6 @@ def edit_record(model, record_id):
     return render_template('teacher/edit_record.html', record=record, classes=classes, model=model)
 
 
-def generate_quiz_backup_file(quiz_data, questions_data, backup_dir='quiz_backups'):
-    os.makedirs(backup_dir, exist_ok=True)
-
-    filename_base = f"{quiz_data['title'].replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-
-    json_path = os.path.join(backup_dir, f"{filename_base}.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump({'quiz': quiz_data, 'questions': questions_data}, f, indent=4)
-
-    csv_path = os.path.join(backup_dir, f"{filename_base}.csv")
-    with open(csv_path, mode='w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['Question', 'Option', 'Is Correct'])
-
-        for question in questions_data:
-            q_text = question['text']
-            for opt in question['options']:
-                writer.writerow([q_text, opt['text'], 'TRUE' if opt['is_correct'] else 'FALSE'])
-
-    return json_path  # or return both paths if needed
-
 def get_course_choices(programme_name):
     courses = Course.query.filter_by(programme_name=programme_name).all()
     return [(c.name, c.name) for c in courses]
@@ -1337,59 +1336,62 @@ def delete_quiz(quiz_id):
 @teacher_bp.route('/restore_quiz', methods=['GET', 'POST'])
 @login_required
 def restore_quiz():
+    """Import a quiz (or a question bank into an existing quiz) from a .json/.csv quiz file."""
+    if current_user.role != 'teacher':
+        abort(403)
+
+    quizzes = Quiz.query.order_by(Quiz.start_datetime.desc()).all()
+    report = None
+
     if request.method == 'POST':
         file = request.files.get('backup_file')
-        if not file or not file.filename.endswith('.json'):
-            flash("Please upload a valid JSON backup file.", "danger")
+        if not file or not file.filename:
+            flash("Please choose a quiz file to upload.", "danger")
             return redirect(request.url)
 
-        try:
-            data = json.load(file)
-            quiz_data = data.get('quiz')
-            questions_data = data.get('questions', [])
+        quiz_id = request.form.get('quiz_id', type=int)
+        target = Quiz.query.get_or_404(quiz_id) if quiz_id else None
+        dry_run = bool(request.form.get('dry_run'))
 
-            # Prevent duplicate
-            if Quiz.query.filter_by(title=quiz_data['title'], assigned_class=quiz_data['assigned_class']).first():
-                flash("A quiz with this title already exists.", "danger")
-                return redirect(request.url)
+        try:
+            document = QuizInterchange.load(file.filename, file.stream)
+            report = QuizInterchange.import_document(document, quiz=target, dry_run=dry_run)
+        except QuizImportError as e:
+            flash(str(e), "danger")
+            return render_template("teacher/restore_quiz.html", quizzes=quizzes, errors=e.errors), 400
+        except Exception as e:
+            current_app.logger.exception(f"Error restoring quiz: {e}")
+            flash(f"Error restoring quiz: {e}", "danger")
+            return redirect(request.url)
 
-            course = Course.query.filter_by(name=quiz_data['course_name']).first()
-            if not course:
-                flash("Course from backup does not exist.", "danger")
-                return redirect(request.url)
+        if not dry_run:
+            flash(f"Imported {report['questions']} questions into '{report['title']}'.", "success")
+            return redirect(url_for('teacher.manage_quizzes'))
+        flash("Dry run passed: the file is valid and nothing was saved.", "info")
 
-            quiz = Quiz(
-                course_id=course.id,
-                course_name=quiz_data['course_name'],
-                title=quiz_data['title'],
-                assigned_class=quiz_data['assigned_class'],
-                start_datetime=datetime.fromisoformat(quiz_data['start_datetime']),
-                end_datetime=datetime.fromisoformat(quiz_data['end_datetime']),
-                duration_minutes=int(quiz_data['duration_minutes']),
-                content_file=quiz_data.get('content_file')
-            )
-            db.session.add(quiz)
-            db.session.flush()
+    return render_template("teacher/restore_quiz.html", quizzes=quizzes, report=report)
 
-            for q in questions_data:
-                blanks = re.findall(r'_{3,}', q['text'])
-                q_type = 'fill_in' if blanks else q.get('question_type', 'mcq')
-                question = Question(quiz_id=quiz.id, text=q['text'], question_type=q_type)
-                db.session.add(question)
-                db.session.flush()
-                for opt in q.get('options', []):
-                    db.session.add(Option(question_id=question.id, text=opt['text'], is_correct=opt['is_correct']))
 
-            db.session.commit()
-            flash("Quiz restored successfully from backup.", "success")
-            return redirect(url_for('teacher.manage_quizzes'))
+@teacher_bp.route('/quizzes/<int:quiz_id>/export')
+@login_required
+def export_quiz(quiz_id):
+    """Download a quiz in the interchange format (?format=json|csv)."""
+    if current_user.role != 'teacher':
+        abort(403)
 
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Error restoring quiz: {e}", "danger")
-            return redirect(request.url)
+    quiz = Quiz.query.get_or_404(quiz_id)
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'csv'):
+        abort(400)
+
+    document = QuizInterchange.export_quiz(quiz)
+    body = QuizInterchange.to_json(document) if fmt == 'json' else QuizInterchange.to_csv(document)
+    return Response(
+        body,
+        mimetype='application/json' if fmt == 'json' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{QuizInterchange.filename(document, fmt)}"'}
+    )
 
-    return render_template("teacher/restore_quiz.html")
 
 @teacher_bp.route('/attendance', methods=['GET', 'POST'])
 @login_required
@@ -1420,8 +1422,8 @@ def attendance():
 
     # 4️⃣ Existing attendance
     existing_records = {
-        r.student_id
-        for r in AttendanceRecord.query.filter(AttendanceRecord.teacher_id == teacher.id, AttendanceRecord.date == selected_date)}
+        student_id
+        for (student_id,) in db.session.query(AttendanceRecord.student_id).filter(AttendanceRecord.teacher_id == teacher.id, AttendanceRecord.date == selected_date)}
 
     # 5️⃣ Disabled dates from calendar
     cal_entries = AcademicCalendar.query.with_entities(
@@ -1433,15 +1435,17 @@ def attendance():
     # 6️⃣ Save attendance
     if request.method == 'POST' and request.form.get('action') == 'submit_attendance':
         inserted = duplicates = 0
+        marked_ids = [s.id for s in students if s.id not in existing_records]
+        before = AttendanceEngine.percentages(marked_ids)
 
         for student in students:
-            if student.user_id in existing_records:
+            if student.id in existing_records:
                 duplicates += 1
                 continue
 
-            present = bool(request.form.get(f'attend_{student.user_id}'))
+            present = bool(request.form.get(f'attend_{student.id}'))
             db.session.add(AttendanceRecord(
-                student_id=student.user_id,
+                student_id=student.id,
                 teacher_id=teacher.id,
                 date=selected_date,
                 is_present=present
@@ -1450,6 +1454,9 @@ def attendance():
 
         db.session.commit()
 
+        if inserted:
+            AttendanceEngine.warn_low_attendance(marked_ids, before)
+
         if inserted:
             flash(f"{inserted} new record(s) saved.", "success")
         if duplicates:
@@ -1480,82 +1487,9 @@ def view_attendance():
         except ValueError:
             selected_date = None
 
-    # Get all distinct dates for the selected programme/level
-    date_query = db.session.query(AttendanceRecord.date).filter(
-        AttendanceRecord.teacher_id == teacher.id
-    )
-    if selected_level:
-        date_query = date_query.join(User, User.id == AttendanceRecord.student_id) \
-                               .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                               .filter(StudentProfile.programme_level == int(selected_level))
-    if selected_programme:
-        date_query = date_query.join(User, User.id == AttendanceRecord.student_id) \
-                               .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                               .filter(StudentProfile.current_programme == selected_programme)
-    
-    date_list = [d[0] for d in date_query.distinct().order_by(AttendanceRecord.date).all()]
-
-    # Get students for the selected programme/level
-    student_query = db.session.query(
-        User.id, User.first_name, User.middle_name, User.last_name,
-        StudentProfile.current_programme, StudentProfile.programme_level
-    ).join(StudentProfile, StudentProfile.user_id == User.user_id) \
-     .join(AttendanceRecord, AttendanceRecord.student_id == User.id) \
-     .filter(AttendanceRecord.teacher_id == teacher.id)
-    
-    if selected_level:
-        student_query = student_query.filter(StudentProfile.programme_level == int(selected_level))
-    if selected_programme:
-        student_query = student_query.filter(StudentProfile.current_programme == selected_programme)
-    
-    students = student_query.distinct().order_by(User.last_name, User.first_name).all()
-
-    # Get attendance records filtered by date and/or programme/level
-    attendance_query = db.session.query(
-        AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.is_present
-    ).filter(AttendanceRecord.teacher_id == teacher.id)
-    
-    if selected_level:
-        attendance_query = attendance_query.join(User, User.id == AttendanceRecord.student_id) \
-                                           .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                                           .filter(StudentProfile.programme_level == int(selected_level))
-    if selected_programme:
-        attendance_query = attendance_query.join(User, User.id == AttendanceRecord.student_id) \
-                                           .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                                           .filter(StudentProfile.current_programme == selected_programme)
-    if selected_date:
-        attendance_query = attendance_query.filter(AttendanceRecord.date == selected_date)
-    
-    attendance_records = attendance_query.all()
-
-    # Attendance map for Excel-style table
-    attendance_map = defaultdict(lambda: 0)
-    for student_id, date, is_present in attendance_records:
-        attendance_map[(student_id, date)] = 1 if is_present else 0
-
-    # Records list for standard table
-    records_query = db.session.query(
-        AttendanceRecord.date, StudentProfile.current_programme, StudentProfile.programme_level,
-        User.first_name, User.middle_name, User.last_name, AttendanceRecord.is_present
-    ).join(User, User.id == AttendanceRecord.student_id) \
-     .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-     .filter(AttendanceRecord.teacher_id == teacher.id)
-    
-    if selected_level:
-        records_query = records_query.filter(StudentProfile.programme_level == int(selected_level))
-    if selected_programme:
-        records_query = records_query.filter(StudentProfile.current_programme == selected_programme)
-    if selected_date:
-        records_query = records_query.filter(AttendanceRecord.date == selected_date)
-    
-    records_query = records_query.order_by(AttendanceRecord.date)
-    formatted_records = [{
-        'date': r.date,
-        'programme': r.current_programme,
-        'level': r.programme_level,
-        'full_name': " ".join(filter(None, [r.first_name, r.middle_name, r.last_name])),
-        'is_present': r.is_present
-    } for r in records_query.all()]
+    matrix = AttendanceEngine.matrix(teacher.id, programme=selected_programme, level=selected_level)
+    formatted_records = list(matrix.records(on_date=selected_date))
+    threshold = current_app.config.get('ATTENDANCE_WARNING_THRESHOLD', 75)
 
     # Get programme and level options for filters
     programme_options = db.session.query(StudentProfile.current_programme).distinct() \
@@ -1566,19 +1500,13 @@ def view_attendance():
         .order_by(StudentProfile.programme_level).all()
     level_list = sorted([l[0] for l in level_options if l[0]])
 
-    # Student list for Excel view
-    student_list = [{
-        'id': s[0],
-        'full_name': " ".join(filter(None, [s[1], s[2], s[3]])),
-        'programme': s[4],
-        'level': s[5]
-    } for s in students]
-
     return render_template(
         'teacher/view_attendance.html',
-        students=student_list,
-        dates=date_list,
-        attendance_map=attendance_map,
+        matrix=matrix,
+        students=matrix.students,
+        dates=matrix.dates,
+        low_attendance=matrix.below(threshold),
+        threshold=threshold,
         programmes=programme_list,
         levels=level_list,
         selected_programme=selected_programme,
@@ -1586,6 +1514,37 @@ def view_attendance():
         selected_date=selected_date,
         records=formatted_records
     )
+
+
+@teacher_bp.route('/view-attendance/export')
+@login_required
+def export_attendance():
+    """Download the attendance matrix as CSV"""
+    if current_user.role != 'teacher':
+        abort(403)
+
+    teacher = TeacherProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
+    matrix = AttendanceEngine.matrix(
+        teacher.id,
+        programme=request.args.get('programmeSelect', '', type=str),
+        level=request.args.get('levelSelect', '', type=str)
+    )
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in matrix.csv_rows():
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    filename = f"attendance_{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    return Response(
+        generate(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
     
 @teacher_bp.route('/calendar')
 @login_required
@@ -1752,154 +1711,23 @@ def view_results_combined():
     if not teacher_profile:
         return render_template('teacher/view_results_combined.html', results=[], courses=[], message="No teacher profile found.")
 
-    assignments = TeacherCourseAssignment.query.filter_by(teacher_id=teacher_profile.id).all()
-    course_ids = [a.course_id for a in assignments]
+    courses = TeacherResultsService.teacher_courses(teacher_profile.id)
+    course_ids = [c.id for c in courses]
     if not course_ids:
         return render_template('teacher/view_results_combined.html', results=[], courses=[], message="No courses assigned.")
 
-    courses = Course.query.filter(Course.id.in_(course_ids)).all()
-    course_names = [c.name for c in courses]
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    course_filter = request.args.get('course', type=int)
+    if course_filter not in course_ids:
+        course_filter = None
+    search = request.args.get('q', '').strip()
 
-    combined = []
-
-    for course in courses:
-        scheme = CourseAssessmentScheme.query.filter_by(course_id=course.id, teacher_id=teacher_profile.id).first()
-
-        # ===== AGGREGATE QUIZZES BY STUDENT =====
-        quiz_subs = (
-            db.session.query(StudentQuizSubmission, Quiz, User)
-            .join(Quiz, Quiz.id == StudentQuizSubmission.quiz_id)
-            .join(User, User.id == StudentQuizSubmission.student_id)
-            .filter(Quiz.course_id == course.id)
-            .all()
-        )
-
-        # Group quizzes by student
-        student_quizzes = {}
-        for sub, quiz, user in quiz_subs:
-            key = (user.id, user.first_name, user.last_name)
-            if key not in student_quizzes:
-                student_quizzes[key] = {'scores': [], 'max_scores': [], 'dates': []}
-            student_quizzes[key]['scores'].append(float(getattr(sub, "score", 0) or 0))
-            student_quizzes[key]['max_scores'].append(float(getattr(quiz, 'max_score', 0) or 0))
-            student_quizzes[key]['dates'].append(getattr(sub, "submitted_at", None))
-
-        # Create aggregated quiz entry per student
-        for (user_id, first_name, last_name), data in student_quizzes.items():
-            total_score = sum(data['scores'])
-            total_max = sum(data['max_scores'])
-            latest_date = max(data['dates']) if data['dates'] else None
-            
-            if scheme and total_max:
-                weighted_score = (total_score / total_max) * scheme.quiz_weight
-            else:
-                weighted_score = None
-
-            combined.append({
-                "type": "Quiz",
-                "course": course.name,
-                "student": f"{first_name} {last_name}",
-                "score": total_score,
-                "date": latest_date,
-                "raw_score": total_score,
-                "weight_percent": scheme.quiz_weight if scheme else None,
-                "weighted_score": weighted_score
-            })
-
-        # ===== AGGREGATE EXAMS BY STUDENT =====
-        exam_subs = (
-            db.session.query(ExamSubmission, Exam, User)
-            .join(Exam, Exam.id == ExamSubmission.exam_id)
-            .join(User, User.id == ExamSubmission.student_id)
-            .filter(Exam.course_id == course.id)
-            .all()
-        )
-        
-        # Group exams by student
-        student_exams = {}
-        for sub, exam, user in exam_subs:
-            key = (user.id, user.first_name, user.last_name)
-            if key not in student_exams:
-                student_exams[key] = {'scores': [], 'max_scores': [], 'dates': []}
-            student_exams[key]['scores'].append(float(getattr(sub, "score", 0) or 0))
-            student_exams[key]['max_scores'].append(float(getattr(exam, 'max_score', 0) or 0))
-            student_exams[key]['dates'].append(getattr(sub, "submitted_at", None))
-
-        # Create aggregated exam entry per student
-        for (user_id, first_name, last_name), data in student_exams.items():
-            total_score = sum(data['scores'])
-            total_max = sum(data['max_scores'])
-            latest_date = max(data['dates']) if data['dates'] else None
-            
-            exam_weight = scheme.exam_weight if scheme else 0.0
-            if scheme and total_max and exam_weight > 0:
-                weighted_score = (total_score / total_max) * exam_weight
-            else:
-                weighted_score = None
-            combined.append({
-                "type": "Exam",
-                "course": course.name,
-                "student": f"{first_name} {last_name}",
-                "score": total_score,
-                "date": latest_date,
-                "raw_score": total_score,
-                "weight_percent": exam_weight,
-                "weighted_score": weighted_score
-            })
-
-        # ===== AGGREGATE ASSIGNMENTS BY STUDENT =====
-        assignment_subs = (
-            db.session.query(AssignmentSubmission, Assignment, User)
-            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
-            .join(User, User.id == AssignmentSubmission.student_id)
-            .filter(Assignment.course_id == course.id)
-            .filter(AssignmentSubmission.score != None)  # Only include scored assignments
-            .all()
-        )
-        
-        # Group assignments by student
-        student_assignments = {}
-        for sub, assignment, user in assignment_subs:
-            key = (user.id, user.first_name, user.last_name)
-            if key not in student_assignments:
-                student_assignments[key] = {'scores': [], 'max_scores': [], 'dates': []}
-            student_assignments[key]['scores'].append(float(getattr(sub, "score", 0) or 0))
-            student_assignments[key]['max_scores'].append(float(getattr(assignment, 'max_score', 0) or 0))
-            student_assignments[key]['dates'].append(getattr(sub, "submitted_at", None))
-
-        # Create aggregated assignment entry per student
-        for (user_id, first_name, last_name), data in student_assignments.items():
-            total_score = sum(data['scores'])
-            total_max = sum(data['max_scores'])
-            latest_date = max(data['dates']) if data['dates'] else None
-            
-            assignment_weight = scheme.assignment_weight if scheme else 0.0
-            if scheme and total_max and assignment_weight > 0:
-                weighted_score = (total_score / total_max) * assignment_weight
-            else:
-                weighted_score = None
-            combined.append({
-                "type": "Assignment",
-                "course": course.name,
-                "student": f"{first_name} {last_name}",
-                "score": total_score,
-                "date": latest_date,
-                "raw_score": total_score,
-                "weight_percent": assignment_weight,
-                "weighted_score": weighted_score
-            })
-
-    # Format dates
-    for r in combined:
-        if r["date"]:
-            try:
-                r["date"] = r["date"].strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                r["date"] = str(r["date"])
-        else:
-            r["date"] = ""
-
-    combined.sort(key=lambda r: r.get("date") or "", reverse=True)
+    pagination = TeacherResultsService.page(
+        teacher_profile.id, course_ids,
+        page=page, per_page=per_page, course_id=course_filter, search=search
+    )
+    combined = pagination['results']
 
     # Determine current academic year and whether semester has ended
     today = date.today()
@@ -1940,9 +1768,45 @@ def view_results_combined():
         # Allow submission for vetting only if semester ended and not already locked
         can_submit_vetting = sem_ended and not semester_status.get('is_locked', False)
 
-    return render_template('teacher/view_results_combined.html', results=combined, courses=course_names, message=None,
+    return render_template('teacher/view_results_combined.html', results=combined, courses=courses, message=None,
                            can_submit_vetting=can_submit_vetting, academic_year=academic_year_str, semester=semester_for_check,
-                           semester_status=semester_status)
+                           semester_status=semester_status, pagination=pagination,
+                           selected_course=course_filter, search=search)
+
+
+@teacher_bp.route('/results/combined/export')
+@login_required
+def export_results_combined():
+    """Stream the combined results table as CSV"""
+    teacher_profile = TeacherProfile.query.filter_by(user_id=current_user.user_id).first()
+    if not teacher_profile:
+        abort(404)
+
+    course_ids = [c.id for c in TeacherResultsService.teacher_courses(teacher_profile.id)]
+    course_filter = request.args.get('course', type=int)
+    if course_filter not in course_ids:
+        course_filter = None
+    search = request.args.get('q', '').strip()
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        for i, result in enumerate(TeacherResultsService.iter_results(
+                teacher_profile.id, course_ids, course_id=course_filter, search=search), 1):
+            writer.writerow(TeacherResultsService.csv_row(result))
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    filename = f"assessment_results_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 
 @teacher_bp.route('/results/submit-for-vetting', methods=['POST'])
@@ -3,198 +3,693 @@
 # =====================================================================
 
 # utils/backup.py
+"""
+Streaming, compressed backups.
+
+Rows are read with explicit joins and `yield_per`, so memory stays flat
+and no relationship is lazy-loaded per row. They are written straight into
+gzip (or zstd, when the optional `zstandard` package is installed)
+compressed CSV or JSONL.
+
+Two kinds of output:
+
+  * report exports (`backup_students_to_csv`, `backup_exam_results_to_csv`,
+    `backup_quiz_submissions_to_csv`): human-readable, denormalised rows
+    for download
+  * table backups (`create_backup` / `restore_backup`): every column of
+    the chosen tables, one file per table plus a manifest.json with row
+    counts and SHA-256 checksums. With `since`, only rows whose change
+    column is at or after that time are exported. A change column is an
+    updated_at / last_updated column the ORM stamps on every update;
+    insert-time columns (created_at, timestamp, submitted_at) miss later
+    edits such as a payment approval, so tables without a change column
+    are exported in full. The manifest's `until` is the `since` of the
+    next incremental run.
+
+Table backups of the whole database take longer than a web request may,
+so the admin endpoint queues them for the job worker (`run_backup_job`);
+`flask backup` runs one directly.
+
+`restore_backup` verifies every checksum before writing anything, then
+upserts the rows table by table in foreign-key order, in chunks, inside one
+transaction.
+"""
 import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
 import os
-from datetime import datetime
-from models import StudentProfile, User, Quiz, ExamSubmission
+from datetime import date, datetime, time
+from decimal import Decimal
 
-def generate_quiz_csv_backup(quiz_data, questions_data, backup_dir='backups'):
-    """Backup quiz questions and metadata"""
+from flask import current_app, has_app_context
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, String, Time, func, insert, select, text
+from sqlalchemy.types import JSON
+
+from models import Exam, ExamQuestion, ExamSubmission, Question, Quiz, StudentProfile, StudentQuizSubmission, User
+from utils.extensions import db
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+FORMATS = ('csv', 'jsonl')
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+
+# Columns incremental backups filter on, when they are stamped on update
+CHANGE_COLUMNS = ('updated_at', 'last_updated')
+
+
+class BackupError(Exception):
+    """Invalid backup request, or a backup set that fails verification."""
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def backup_dir_default():
+    return _setting('BACKUP_FOLDER', 'backups')
+
+
+# ============================================================
+# COMPRESSED STREAMS
+# ============================================================
+
+class _HashingWriter(io.RawIOBase):
+    """Pass-through writer that hashes and counts the bytes reaching the file."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+
+def _compressor(raw, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=_setting('BACKUP_GZIP_LEVEL', 6))
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise BackupError("zstd compression needs the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=_setting('BACKUP_ZSTD_LEVEL', 3)).stream_writer(raw, closefd=False)
+    return raw
+
+
+def _open_compressed(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise BackupError("zstd compression needs the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def _check_options(fmt, compression):
+    if fmt not in FORMATS:
+        raise BackupError(f"Unknown backup format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise BackupError(f"Unknown compression: {compression}")
+
+
+def _plain(value):
+    """A JSON/CSV-friendly form of a column value."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def write_rows(path, columns, rows, fmt='csv', compression='gzip'):
+    """
+    Stream `rows` (tuples in `columns` order) to a compressed CSV or JSONL file.
+
+    CSV cells hold '' for NULL and JSON text for dict/list values.
+
+    Returns:
+        dict: {'rows', 'bytes', 'sha256'} of the file as written
+    """
+    _check_options(fmt, compression)
+    count = 0
+    with open(path, 'wb') as raw:
+        hashing = _HashingWriter(raw)
+        buffered = io.BufferedWriter(hashing, buffer_size=1 << 16)
+        stream = _compressor(buffered, compression)
+        out = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(columns)
+                for row in rows:
+                    writer.writerow([
+                        '' if v is None else json.dumps(v) if isinstance(v, (dict, list)) else _plain(v)
+                        for v in row
+                    ])
+                    count += 1
+            else:
+                for row in rows:
+                    out.write(json.dumps(dict(zip(columns, (_plain(v) for v in row))), default=str))
+                    out.write('\n')
+                    count += 1
+            out.flush()
+        finally:
+            out.detach()
+            if stream is not buffered:
+                stream.close()  # writes the compression trailer; leaves `buffered` open
+            buffered.flush()
+    return {'rows': count, 'bytes': hashing.size, 'sha256': hashing.sha256.hexdigest()}
+
+
+def read_rows(path, fmt='csv', compression='gzip'):
+    """Yield dicts from a file written by `write_rows` (CSV values stay strings)."""
+    _check_options(fmt, compression)
+    with _open_compressed(path, compression) as stream:
+        text_stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        if fmt == 'csv':
+            for row in csv.DictReader(text_stream):
+                yield row
+        else:
+            for line in text_stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stream(statement, chunk_size):
+    """Execute a select and yield its rows, fetched `chunk_size` at a time."""
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    for row in result:
+        yield tuple(row)
+
+
+def _report_path(backup_dir, stem, fmt, compression):
+    backup_dir = backup_dir or backup_dir_default()
     os.makedirs(backup_dir, exist_ok=True)
     timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    csv_filename = f"quiz_backup_{quiz_data['title'].replace(' ', '_')}_{timestamp}.csv"
-    csv_path = os.path.join(backup_dir, csv_filename)
+    filename = f"{stem}_{timestamp}.{fmt}{COMPRESSIONS[compression]}"
+    return filename, os.path.join(backup_dir, filename)
+
+
+def _report_options(compression):
+    return compression or _setting('BACKUP_COMPRESSION', 'gzip'), _setting('BACKUP_CHUNK_SIZE', 1000)
+
+
+def generate_quiz_csv_backup(quiz_data, questions_data, backup_dir='backups'):
+    """
+    Backup quiz questions and metadata as an interchange-format CSV, which
+    keeps question types and points and can be imported again (see
+    services/quiz_interchange.py).
+    """
+    from services.quiz_interchange import QuizInterchange
+
+    os.makedirs(backup_dir, exist_ok=True)
+    document = QuizInterchange.document(quiz_data, questions_data)
+    csv_path = os.path.join(backup_dir, f"quiz_backup_{QuizInterchange.filename(document, 'csv')}")
 
     with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        # Write metadata
-        writer.writerow(['Title', 'Course', 'Programme', 'Level', 'Start', 'End', 'Duration', 'Attempts', 'Content File'])
-        writer.writerow([
-            quiz_data['title'],
-            quiz_data.get('course_name', 'N/A'),
-            quiz_data.get('programme_name', 'N/A'),
-            quiz_data.get('programme_level', 'N/A'),
-            quiz_data.get('start_datetime', ''),
-            quiz_data.get('end_datetime', ''),
-            quiz_data.get('duration_minutes', ''),
-            quiz_data.get('content_file', '')
-        ])
-        writer.writerow([])  # Blank line
-        writer.writerow(['Question', 'Option Text', 'Is Correct'])
-
-        # Write each question and its options
-        for q in questions_data:
-            for opt in q.get('options', []):
-                writer.writerow([q.get('text', ''), opt.get('text', ''), 'Yes' if opt.get('is_correct') else 'No'])
+        csvfile.write(QuizInterchange.to_csv(document))
 
     return csv_path
 
 
-def backup_students_to_csv(backup_dir='backups', programme=None, level=None):
+# ============================================================
+# REPORT EXPORTS
+# ============================================================
+
+def _fmt_date(value, pattern):
+    return value.strftime(pattern) if value else ''
+
+
+def backup_students_to_csv(backup_dir=None, programme=None, level=None, since=None,
+                           fmt='csv', compression=None):
     """
     Backup student data to CSV (tertiary version).
-    Can filter by programme/level if provided.
+    Can filter by programme/level if provided, and by admission date with `since`.
+
+    Returns the filename inside `backup_dir` (default BACKUP_FOLDER).
     """
-    os.makedirs(backup_dir, exist_ok=True)
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    
-    # Build filename
-    if programme and level:
-        filename = f'student_backup_{programme}_Level{level}_{timestamp}.csv'
-    else:
-        filename = f'student_backup_{timestamp}.csv'
-    
-    path = os.path.join(backup_dir, filename)
+    compression, chunk_size = _report_options(compression)
+    stem = f'student_backup_{programme}_Level{level}' if programme and level else 'student_backup'
+    filename, path = _report_path(backup_dir, stem, fmt, compression)
 
-    # Build query
-    query = StudentProfile.query
+    statement = (
+        select(
+            StudentProfile.user_id,
+            User.first_name, User.middle_name, User.last_name, User.email,
+            StudentProfile.index_number, StudentProfile.current_programme, StudentProfile.programme_level,
+            StudentProfile.study_format, StudentProfile.gender, StudentProfile.dob,
+            StudentProfile.admission_date, StudentProfile.academic_status,
+        )
+        .select_from(StudentProfile)
+        .outerjoin(User, User.user_id == StudentProfile.user_id)
+        .order_by(StudentProfile.id)
+    )
     if programme and level:
-        query = query.filter(
+        statement = statement.where(
             StudentProfile.current_programme == programme,
             StudentProfile.programme_level == int(level)
         )
-    
-    students = query.all()
-
-    with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        # TERTIARY HEADERS
-        writer.writerow([
-            'User ID', 'Full Name', 'Email', 'Index Number', 'Programme', 'Level',
-            'Study Format', 'Gender', 'Date of Birth', 'Admission Date', 'Academic Status'
-        ])
-
-        for s in students:
-            writer.writerow([
-                s.user_id,
-                s.user.full_name if hasattr(s, 'user') else '',
-                s.user.email if hasattr(s, 'user') else '',
-                s.index_number or '',
-                s.current_programme or '',
-                s.programme_level or '',
-                s.study_format or 'Regular',
-                s.gender or '',
-                s.dob.strftime('%Y-%m-%d') if s.dob else '',
-                s.admission_date.strftime('%Y-%m-%d') if s.admission_date else '',
-                s.academic_status or 'Active',
-            ])
+    if since:
+        statement = statement.where(StudentProfile.admission_date >= since)
 
+    def rows():
+        for (user_id, first, middle, last, email, index_number, programme_name, programme_level,
+             study_format, gender, dob, admission_date, status) in _stream(statement, chunk_size):
+            full_name = ' '.join(part for part in (first, middle, last) if part)
+            yield (
+                user_id, full_name, email or '', index_number or '', programme_name or '',
+                programme_level or '', study_format or 'Regular', gender or '',
+                _fmt_date(dob, '%Y-%m-%d'), _fmt_date(admission_date, '%Y-%m-%d'), status or 'Active',
+            )
+
+    # TERTIARY HEADERS
+    stats = write_rows(path, [
+        'User ID', 'Full Name', 'Email', 'Index Number', 'Programme', 'Level',
+        'Study Format', 'Gender', 'Date of Birth', 'Admission Date', 'Academic Status'
+    ], rows(), fmt, compression)
+    logger.info(f"💾 Student backup {filename}: {stats['rows']} row(s), {stats['bytes']} bytes")
     return filename
 
 
-def backup_exam_results_to_csv(backup_dir='backups', programme=None, level=None):
+def backup_exam_results_to_csv(backup_dir=None, programme=None, level=None, since=None,
+                               fmt='csv', compression=None):
     """
     Backup exam results to CSV (tertiary version).
-    Can filter by programme/level if provided.
+    Can filter by programme/level if provided, and by submission time with `since`.
+
+    Returns the filename inside `backup_dir` (default BACKUP_FOLDER).
     """
-    os.makedirs(backup_dir, exist_ok=True)
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    
-    if programme and level:
-        filename = f'exam_results_{programme}_Level{level}_{timestamp}.csv'
-    else:
-        filename = f'exam_results_{timestamp}.csv'
-    
-    path = os.path.join(backup_dir, filename)
-
-    # Build query
-    query = ExamSubmission.query.join(User, ExamSubmission.student_id == User.id) \
-                               .join(StudentProfile, StudentProfile.user_id == User.user_id)
-    
+    compression, chunk_size = _report_options(compression)
+    stem = f'exam_results_{programme}_Level{level}' if programme and level else 'exam_results'
+    filename, path = _report_path(backup_dir, stem, fmt, compression)
+
+    # Exam max score (sum of question marks) once per exam, not per row
+    max_scores = (
+        select(ExamQuestion.exam_id, func.sum(ExamQuestion.marks).label('max_score'))
+        .group_by(ExamQuestion.exam_id)
+        .subquery()
+    )
+    statement = (
+        select(
+            User.user_id, StudentProfile.index_number, StudentProfile.current_programme,
+            StudentProfile.programme_level, Exam.title, ExamSubmission.score,
+            max_scores.c.max_score, ExamSubmission.submitted_at,
+        )
+        .select_from(ExamSubmission)
+        .join(User, ExamSubmission.student_id == User.id)
+        .join(StudentProfile, StudentProfile.user_id == User.user_id)
+        .outerjoin(Exam, Exam.id == ExamSubmission.exam_id)
+        .outerjoin(max_scores, max_scores.c.exam_id == ExamSubmission.exam_id)
+        .order_by(ExamSubmission.id)
+    )
     if programme and level:
-        query = query.filter(
+        statement = statement.where(
             StudentProfile.current_programme == programme,
             StudentProfile.programme_level == int(level)
         )
-    
-    submissions = query.all()
-
-    with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            'Student ID', 'Index Number', 'Programme', 'Level',
-            'Exam Title', 'Score', 'Max Score', 'Submitted At'
-        ])
-
-        for sub in submissions:
-            user = sub.student if hasattr(sub, 'student') else User.query.get(sub.student_id)
-            profile = user.student_profile if user and hasattr(user, 'student_profile') else None
-            exam = sub.exam if hasattr(sub, 'exam') else None
-            
-            writer.writerow([
-                user.user_id if user else '',
-                profile.index_number if profile else '',
-                profile.current_programme if profile else '',
-                profile.programme_level if profile else '',
-                exam.title if exam else '',
-                sub.score or '',
-                exam.max_score if exam else '',
-                sub.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if sub.submitted_at else '',
-            ])
+    if since:
+        statement = statement.where(ExamSubmission.submitted_at >= since)
+
+    def rows():
+        for user_id, index_number, programme_name, programme_level, title, score, max_score, submitted_at \
+                in _stream(statement, chunk_size):
+            yield (
+                user_id or '', index_number or '', programme_name or '', programme_level or '',
+                title or '', score or '', max_score or 0, _fmt_date(submitted_at, '%Y-%m-%d %H:%M:%S'),
+            )
 
+    stats = write_rows(path, [
+        'Student ID', 'Index Number', 'Programme', 'Level',
+        'Exam Title', 'Score', 'Max Score', 'Submitted At'
+    ], rows(), fmt, compression)
+    logger.info(f"💾 Exam results backup {filename}: {stats['rows']} row(s), {stats['bytes']} bytes")
     return filename
 
 
-def backup_quiz_submissions_to_csv(backup_dir='backups', programme=None, level=None):
+def backup_quiz_submissions_to_csv(backup_dir=None, programme=None, level=None, since=None,
+                                   fmt='csv', compression=None):
     """
     Backup quiz submissions to CSV (tertiary version).
-    Can filter by programme/level if provided.
+    Can filter by programme/level if provided, and by submission time with `since`.
+
+    Returns the filename inside `backup_dir` (default BACKUP_FOLDER).
     """
-    os.makedirs(backup_dir, exist_ok=True)
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    
-    if programme and level:
-        filename = f'quiz_submissions_{programme}_Level{level}_{timestamp}.csv'
-    else:
-        filename = f'quiz_submissions_{timestamp}.csv'
-    
-    path = os.path.join(backup_dir, filename)
-
-    # Import here to avoid circular imports
-    from models import StudentQuizSubmission
-    
-    query = StudentQuizSubmission.query.join(User, StudentQuizSubmission.student_id == User.id) \
-                                       .join(StudentProfile, StudentProfile.user_id == User.user_id)
-    
+    compression, chunk_size = _report_options(compression)
+    stem = f'quiz_submissions_{programme}_Level{level}' if programme and level else 'quiz_submissions'
+    filename, path = _report_path(backup_dir, stem, fmt, compression)
+
+    # Quiz max score (sum of question points) once per quiz, not per row
+    max_scores = (
+        select(Question.quiz_id, func.sum(Question.points).label('max_score'))
+        .group_by(Question.quiz_id)
+        .subquery()
+    )
+    statement = (
+        select(
+            User.user_id, StudentProfile.index_number, StudentProfile.current_programme,
+            StudentProfile.programme_level, Quiz.title, StudentQuizSubmission.score,
+            max_scores.c.max_score, StudentQuizSubmission.submitted_at,
+        )
+        .select_from(StudentQuizSubmission)
+        .join(User, StudentQuizSubmission.student_id == User.id)
+        .join(StudentProfile, StudentProfile.user_id == User.user_id)
+        .outerjoin(Quiz, Quiz.id == StudentQuizSubmission.quiz_id)
+        .outerjoin(max_scores, max_scores.c.quiz_id == StudentQuizSubmission.quiz_id)
+        .order_by(StudentQuizSubmission.id)
+    )
     if programme and level:
-        query = query.filter(
+        statement = statement.where(
             StudentProfile.current_programme == programme,
             StudentProfile.programme_level == int(level)
         )
-    
-    submissions = query.all()
-
-    with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            'Student ID', 'Index Number', 'Programme', 'Level',
-            'Quiz Title', 'Score', 'Max Score', 'Submitted At'
-        ])
-
-        for sub in submissions:
-            user = User.query.get(sub.student_id)
-            profile = user.student_profile if user and hasattr(user, 'student_profile') else None
-            quiz = sub.quiz if hasattr(sub, 'quiz') else None
-            
-            writer.writerow([
-                user.user_id if user else '',
-                profile.index_number if profile else '',
-                profile.current_programme if profile else '',
-                profile.programme_level if profile else '',
-                quiz.title if quiz else '',
-                sub.score or '',
-                quiz.max_score if quiz else '',
-                sub.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if sub.submitted_at else '',
-            ])
-
-    return filename
\ No newline at end of file
+    if since:
+        statement = statement.where(StudentQuizSubmission.submitted_at >= since)
+
+    def rows():
+        for user_id, index_number, programme_name, programme_level, title, score, max_score, submitted_at \
+                in _stream(statement, chunk_size):
+            yield (
+                user_id or '', index_number or '', programme_name or '', programme_level or '',
+                title or '', score or '', max_score or 0, _fmt_date(submitted_at, '%Y-%m-%d %H:%M:%S'),
+            )
+
+    stats = write_rows(path, [
+        'Student ID', 'Index Number', 'Programme', 'Level',
+        'Quiz Title', 'Score', 'Max Score', 'Submitted At'
+    ], rows(), fmt, compression)
+    logger.info(f"💾 Quiz submissions backup {filename}: {stats['rows']} row(s), {stats['bytes']} bytes")
+    return filename
+
+
+# ============================================================
+# TABLE BACKUPS
+# ============================================================
+
+def _tables(names=None):
+    """Tables to back up, in foreign-key order (parents first)."""
+    tables = db.metadata.sorted_tables
+    if not names:
+        return tables
+    known = {t.name for t in tables}
+    unknown = sorted(set(names) - known)
+    if unknown:
+        raise BackupError(f"Unknown table(s): {', '.join(unknown)}")
+    return [t for t in tables if t.name in names]
+
+
+def change_column(table):
+    """The column incremental backups filter on, or None (back up the table in full)."""
+    for name in CHANGE_COLUMNS:
+        column = table.c.get(name)
+        if (column is not None and isinstance(column.type, (DateTime, Date))
+                and (column.onupdate is not None or column.server_onupdate is not None)):
+            return column
+    return None
+
+
+def check_backup_options(tables=None, fmt='jsonl', compression=None):
+    """
+    Raises:
+        BackupError: On an unknown table, format or compression
+    """
+    _check_options(fmt, compression or _setting('BACKUP_COMPRESSION', 'gzip'))
+    _tables(tables)
+
+
+def create_backup(backup_dir=None, tables=None, since=None, fmt='jsonl', compression=None,
+                  on_progress=None):
+    """
+    Write a backup set: one compressed file per table plus manifest.json.
+
+    Args:
+        backup_dir: Parent directory; the set goes into backup_<timestamp>/
+        tables: Table names (default: every table)
+        since: datetime; export only rows changed at or after it
+        fmt: 'jsonl' (keeps types) or 'csv'
+        compression: 'gzip', 'zstd' or 'none' (default BACKUP_COMPRESSION)
+        on_progress: Called with (tables done, table count) after each table
+
+    Returns:
+        (set directory, manifest dict)
+    """
+    compression = compression or _setting('BACKUP_COMPRESSION', 'gzip')
+    _check_options(fmt, compression)
+    chunk_size = _setting('BACKUP_CHUNK_SIZE', 1000)
+    selected = _tables(tables)
+
+    # Rows changed after this instant belong to the next incremental backup
+    until = datetime.utcnow()
+    set_name = f"backup_{until.strftime('%Y%m%d%H%M%S')}" + ('_incr' if since else '')
+    set_dir = os.path.join(backup_dir or backup_dir_default(), set_name)
+    os.makedirs(set_dir, exist_ok=True)
+
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'created_at': until.isoformat(),
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat(),
+        'format': fmt,
+        'compression': compression,
+        'dialect': db.engine.dialect.name,
+        'files': [],
+    }
+
+    for table in selected:
+        columns = [c.name for c in table.columns]
+        statement = select(*table.columns)
+        tracked = change_column(table)
+        incremental = bool(since and tracked is not None)
+        if incremental:
+            statement = statement.where(tracked >= since, tracked < until)
+        if table.primary_key.columns:
+            statement = statement.order_by(*table.primary_key.columns)
+
+        filename = f"{table.name}.{fmt}{COMPRESSIONS[compression]}"
+        stats = write_rows(os.path.join(set_dir, filename), columns, _stream(statement, chunk_size), fmt, compression)
+        manifest['files'].append({
+            'table': table.name,
+            'file': filename,
+            'columns': columns,
+            'incremental': incremental,
+            **stats,
+        })
+        logger.debug(f"💾 {table.name}: {stats['rows']} row(s)")
+        if on_progress:
+            on_progress(len(manifest['files']), len(selected))
+
+    with open(os.path.join(set_dir, MANIFEST_NAME), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+
+    total = sum(f['rows'] for f in manifest['files'])
+    logger.info(f"💾 Backup {set_name}: {len(manifest['files'])} table(s), {total} row(s)")
+    return set_dir, manifest
+
+
+def run_backup_job(app, job):
+    """Job worker handler for a backup queued from the admin endpoint (see services/job_queue.py)."""
+    from services.job_queue import JobQueue
+
+    params = job['params']
+    report = JobQueue.reporter(job['id'])
+    set_dir, manifest = create_backup(
+        backup_dir=app.config['BACKUP_FOLDER'],
+        tables=params.get('tables'),
+        since=datetime.fromisoformat(params['since']) if params.get('since') else None,
+        fmt=params.get('format', 'jsonl'),
+        compression=params.get('compression'),
+        on_progress=lambda done, total: report(done=done, total=total)
+    )
+    return {
+        'done': len(manifest['files']),
+        'total': len(manifest['files']),
+        'progress': {'set': os.path.basename(set_dir), 'manifest': manifest},
+    }
+
+
+def read_manifest(set_dir):
+    path = os.path.join(set_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise BackupError(f"No {MANIFEST_NAME} in {set_dir}")
+    with open(path, encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        raise BackupError(f"Unsupported manifest version: {manifest.get('manifest_version')}")
+    return manifest
+
+
+def verify_backup(set_dir):
+    """
+    Check every file of a backup set against its manifest checksum.
+
+    Returns:
+        list[str]: Problems found (empty when the set is intact)
+    """
+    manifest = read_manifest(set_dir)
+    problems = []
+    for entry in manifest['files']:
+        path = os.path.join(set_dir, entry['file'])
+        if not os.path.exists(path):
+            problems.append(f"{entry['file']}: missing")
+        elif file_sha256(path) != entry['sha256']:
+            problems.append(f"{entry['file']}: checksum mismatch")
+    return problems
+
+
+def _converter(column, fmt):
+    """Turn a value read back from a backup file into the column's Python type."""
+    kind = column.type
+    # CSV writes NULL as ''; read '' back as NULL only where an empty string
+    # cannot be the real value (NOT NULL text columns keep their '')
+    empty_is_null = column.nullable or not isinstance(kind, String)
+
+    def convert(value):
+        if value is None:
+            return None
+        if fmt == 'csv' and value == '':
+            return None if empty_is_null else value
+        if isinstance(kind, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(kind, Date):
+            return date.fromisoformat(value)
+        if isinstance(kind, Time):
+            return time.fromisoformat(value)
+        if fmt == 'jsonl':
+            return value
+        # CSV: everything arrived as text
+        if isinstance(kind, Boolean):
+            return value in ('True', 'true', '1')
+        if isinstance(kind, Integer):
+            return int(value)
+        if isinstance(kind, (Float, Numeric)):
+            return float(value)
+        if isinstance(kind, JSON):
+            return json.loads(value)
+        return value
+
+    return convert
+
+
+def _upsert(table, rows):
+    """Insert rows, replacing existing ones with the same primary key where the dialect allows."""
+    dialect = db.engine.dialect.name
+    keys = [c.name for c in table.primary_key.columns]
+    if keys and dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(table)
+        updates = {c.name: statement.excluded[c.name] for c in table.columns if c.name not in keys}
+        if updates:
+            statement = statement.on_conflict_do_update(index_elements=keys, set_=updates)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=keys)
+    else:
+        statement = insert(table)
+    db.session.execute(statement, rows)
+
+
+def _reset_sequences(table):
+    """After inserting explicit ids, move PostgreSQL serial sequences past them."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for column in table.primary_key.columns:
+        if isinstance(column.type, Integer):
+            db.session.execute(text(
+                "SELECT setval(pg_get_serial_sequence(:table, :column), "
+                f"COALESCE((SELECT MAX(\"{column.name}\") FROM \"{table.name}\"), 1))"
+            ), {'table': f'"{table.name}"', 'column': column.name})
+
+
+def restore_backup(set_dir, tables=None, chunk_size=None, dry_run=False):
+    """
+    Load a backup set (full or incremental) into the database.
+
+    Checksums are verified before anything is written. Rows are upserted
+    in chunks of `chunk_size` with one executemany per chunk, tables in
+    foreign-key order, in a single transaction.
+
+    Args:
+        set_dir: Directory holding manifest.json
+        tables: Restore only these tables (default: every table in the set)
+        dry_run: Verify and parse every row, write nothing
+
+    Returns:
+        dict: table name -> rows restored (or parsed, on a dry run)
+
+    Raises:
+        BackupError: Missing/corrupt files or unknown tables
+    """
+    manifest = read_manifest(set_dir)
+    problems = verify_backup(set_dir)
+    if problems:
+        raise BackupError("Backup set failed verification: " + '; '.join(problems))
+
+    chunk_size = chunk_size or _setting('BACKUP_RESTORE_CHUNK_SIZE', 1000)
+    fmt, compression = manifest['format'], manifest['compression']
+    entries = {e['table']: e for e in manifest['files']}
+    wanted = set(tables) if tables else set(entries)
+    missing = sorted(wanted - set(entries))
+    if missing:
+        raise BackupError(f"Not in this backup: {', '.join(missing)}")
+
+    restored = {}
+    try:
+        for table in _tables(wanted):
+            entry = entries[table.name]
+            converters = {
+                name: _converter(table.c[name], fmt)
+                for name in entry['columns'] if name in table.c
+            }
+            count, chunk = 0, []
+            for record in read_rows(os.path.join(set_dir, entry['file']), fmt, compression):
+                chunk.append({name: convert(record.get(name)) for name, convert in converters.items()})
+                if len(chunk) >= chunk_size:
+                    if not dry_run:
+                        _upsert(table, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                if not dry_run:
+                    _upsert(table, chunk)
+                count += len(chunk)
+            if count != entry['rows']:
+                raise BackupError(f"{entry['file']}: manifest lists {entry['rows']} row(s), file has {count}")
+            if count and not dry_run:
+                _reset_sequences(table)
+            restored[table.name] = count
+            logger.info(f"♻️ {'Checked' if dry_run else 'Restored'} {table.name}: {count} row(s)")
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return restored
@@ -0,0 +1,175 @@
+"""
+Course catalog cache.
+
+The registration page, the vclass calendar and the timetable views all read
+the same slow-changing data: the courses of a class for a term, the
+registration window (MIN/MAX over every course), the list of academic years
+and the per-class CourseLimit. Rather than querying it on every request, one
+snapshot of the catalog is built with two queries and shared by every
+request in the process.
+
+The snapshot carries a version number (utils/versioned_cache.py). Any
+committed or rolled-back change to Course or CourseLimit (ORM edits, bulk
+updates such as set_registration_window, deletes) bumps the version, and a
+snapshot whose version is behind is rebuilt on next use; a snapshot read
+while a change was committing, or inside a transaction that changed the
+catalog, is never published. Changes to Course.seats_taken alone do not
+count: seat counters are live data and are not part of the snapshot.
+CATALOG_CACHE_TTL bounds staleness for writes made by other processes.
+
+Courses are returned as read-only CourseEntry tuples, not ORM instances, so
+the snapshot can be shared across threads and sessions.
+"""
+
+import logging
+from collections import namedtuple
+
+from sqlalchemy import inspect, select
+
+from utils.extensions import db
+from utils.versioned_cache import ChangeVersion, VersionedStore
+
+logger = logging.getLogger(__name__)
+
+
+CourseEntry = namedtuple('CourseEntry', [
+    'id', 'code', 'name', 'programme_name', 'programme_level', 'semester',
+    'academic_year', 'credit_hours', 'is_mandatory', 'capacity',
+    'registration_start', 'registration_end',
+])
+
+# Columns that change on every registration and stay out of the snapshot
+LIVE_COLUMNS = frozenset({'seats_taken'})
+
+
+class CatalogSnapshot:
+    """One immutable build of the catalog."""
+
+    def __init__(self, version, courses, limits):
+        self.version = version
+        self.courses = {c.id: c for c in courses}
+
+        by_class = {}
+        for course in sorted(courses, key=lambda c: c.code):
+            key = (course.programme_name, str(course.programme_level), course.semester, course.academic_year)
+            by_class.setdefault(key, []).append(course)
+        self.by_class = {key: tuple(entries) for key, entries in by_class.items()}
+
+        starts = [c.registration_start for c in courses if c.registration_start]
+        ends = [c.registration_end for c in courses if c.registration_end]
+        self.registration_window = (min(starts) if starts else None, max(ends) if ends else None)
+
+        self.academic_years = tuple(sorted({c.academic_year for c in courses if c.academic_year}))
+        self.limits = limits
+
+
+def _catalog_models():
+    from models import Course, CourseLimit
+    return Course, CourseLimit
+
+
+def _is_catalog_edit(obj):
+    from models import Course
+
+    if not isinstance(obj, Course):
+        return True
+    # A seat recount alone is not a catalog change
+    return any(attr.history.has_changes() for attr in inspect(obj).attrs if attr.key not in LIVE_COLUMNS)
+
+
+def _is_catalog_bulk_change(state):
+    from models import Course
+
+    if state.is_delete or state.bind_mapper.class_ is not Course:
+        return True
+    # RegistrationService updates only the seat counter
+    values = getattr(state.statement, '_values', None) or {}
+    columns = {getattr(key, 'key', key) for key in values}
+    return not columns or not columns <= LIVE_COLUMNS
+
+
+_changes = ChangeVersion(
+    'catalog', _catalog_models,
+    dirty_filter=_is_catalog_edit, bulk_filter=_is_catalog_bulk_change,
+)
+_snapshots = VersionedStore(_changes, 'CATALOG_CACHE_TTL', 300)
+
+
+def _build(version):
+    from models import Course, CourseLimit
+
+    columns = [getattr(Course, name) for name in CourseEntry._fields]
+    courses = [CourseEntry(*row) for row in db.session.execute(select(*columns).order_by(Course.id))]
+    limits = {
+        (programme, str(level), year, semester): optional_limit
+        for programme, level, year, semester, optional_limit in db.session.execute(
+            select(CourseLimit.programme_name, CourseLimit.programme_level,
+                   CourseLimit.academic_year, CourseLimit.semester, CourseLimit.optional_limit)
+        )
+    }
+    return CatalogSnapshot(version, courses, limits)
+
+
+def catalog():
+    """The current CatalogSnapshot, rebuilt if a change committed or the TTL ran out."""
+    return _snapshots.get(None, _build)
+
+
+def catalog_changes():
+    """The catalog's ChangeVersion (for caches that depend on the catalog)."""
+    return _changes
+
+
+def catalog_version():
+    """Version tuple (e.g. for ETags); changes on every catalog change."""
+    return _changes.current()
+
+
+def invalidate_catalog():
+    _changes.bump()
+
+
+# ============================================================
+# LOOKUPS
+# ============================================================
+
+def courses_for(programme_name, programme_level, semester, academic_year):
+    """Courses of a class for a term (tuple of CourseEntry, ordered by code)."""
+    key = (programme_name, str(programme_level), semester, academic_year)
+    return catalog().by_class.get(key, ())
+
+
+def all_courses():
+    """Every course (tuple of CourseEntry, ordered by id)."""
+    return tuple(catalog().courses.values())
+
+
+def get_course(course_id):
+    """CourseEntry by id, or None."""
+    return catalog().courses.get(course_id)
+
+
+def registration_window():
+    """(start, end) of the global registration window; either may be None."""
+    return catalog().registration_window
+
+
+def academic_years(descending=False):
+    years = catalog().academic_years
+    return tuple(reversed(years)) if descending else years
+
+
+def optional_limit(programme_name, programme_level, academic_year, semester):
+    """CourseLimit.optional_limit for the class and term, or None."""
+    key = (programme_name, str(programme_level), academic_year, semester)
+    return catalog().limits.get(key)
+
+
+# ============================================================
+# INVALIDATION HOOKS
+# ============================================================
+
+def init_catalog_cache(app):
+    """Register the invalidation hooks (call once at startup)."""
+    _changes.register()
+    logger.info(f"📚 Course catalog cache enabled (TTL {app.config.get('CATALOG_CACHE_TTL', 300)}s)")
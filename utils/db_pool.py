@@ -0,0 +1,297 @@
+"""
+Connection pool profiles and pool metrics.
+
+SQLALCHEMY_ENGINE_OPTIONS is built from a named profile instead of being
+hard-coded, so the same code can run as a web worker, a background/worker
+process or a one-off CLI command with a pool sized for each:
+
+  * web     gunicorn workers: request threads share one pool. Fails fast
+            (DB_POOL_TIMEOUT) instead of queueing for 30s under bursts.
+  * worker  long-running job processes (`flask jobs-worker`, see
+            services/job_queue.py): few connections, long timeout.
+  * cli     flask commands and scripts: one connection, no pre-ping.
+
+DB_POOL_PROFILE selects the profile (default: cli under the flask CLI, web
+otherwise); DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT /
+DB_POOL_RECYCLE override single values, and keys set explicitly in
+SQLALCHEMY_ENGINE_OPTIONS win over both.
+
+DB_PGBOUNCER switches to a PgBouncer-compatible setup (transaction
+pooling): no app-side pool (NullPool, PgBouncer does the pooling) and
+driver-side prepared statement caches disabled, since a prepared statement
+may not exist on the next server connection.
+
+PoolMetrics records how long each checkout waited, timeouts, new
+connections and the checked-out high-water mark. Numbers are per process
+(each gunicorn worker has its own pool); they are exposed at
+/admin/system/db-pool.
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+
+POOL_PROFILES = {
+    'web': {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'pool_reset_on_return': 'commit',
+    },
+    'worker': {
+        'pool_size': 2,
+        'max_overflow': 2,
+        'pool_timeout': 60,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'pool_reset_on_return': 'commit',
+    },
+    'cli': {
+        'pool_size': 1,
+        'max_overflow': 1,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'pool_reset_on_return': 'commit',
+    },
+}
+
+# config key -> engine option
+POOL_OVERRIDES = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+}
+
+# Options NullPool does not accept
+QUEUE_POOL_ONLY = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_pre_ping')
+
+# Checkout wait bucket upper bounds in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float('inf'))
+
+
+def pgbouncer_connect_args(database_uri):
+    """Driver arguments that turn off server-side prepared statement caches."""
+    driver = make_url(database_uri).get_driver_name()
+    if driver == 'psycopg':
+        return {'prepare_threshold': None}
+    if driver == 'asyncpg':
+        return {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+    # psycopg2 / pg8000 never prepare server-side
+    return {}
+
+
+def engine_options(config, profile=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for `profile` (or config['DB_POOL_PROFILE']).
+
+    Returns (profile_name, options).
+    """
+    name = (profile or config.get('DB_POOL_PROFILE') or 'web').lower()
+    if name not in POOL_PROFILES:
+        logger.warning(f"⚠️ Unknown DB_POOL_PROFILE {name!r}; using 'web'")
+        name = 'web'
+
+    options = dict(POOL_PROFILES[name])
+    for key, option in POOL_OVERRIDES.items():
+        value = config.get(key)
+        if value not in (None, ''):
+            options[option] = int(value)
+
+    if config.get('DB_PGBOUNCER'):
+        for option in QUEUE_POOL_ONLY:
+            options.pop(option, None)
+        options['poolclass'] = NullPool
+        connect_args = pgbouncer_connect_args(config['SQLALCHEMY_DATABASE_URI'])
+        if connect_args:
+            options['connect_args'] = connect_args
+
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return name, options
+
+
+def apply_pool_profile(app, cli=False):
+    """Set app.config['SQLALCHEMY_ENGINE_OPTIONS'] before db.init_app(app)."""
+    profile = app.config.get('DB_POOL_PROFILE') or ('cli' if cli else 'web')
+    name, options = engine_options(app.config, profile)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_POOL_PROFILE'] = name
+
+    if 'poolclass' in options:
+        logger.info(f"🏊 DB pool profile '{name}': NullPool (PgBouncer mode)")
+    else:
+        logger.info(
+            f"🏊 DB pool profile '{name}': size={options.get('pool_size')} "
+            f"overflow={options.get('max_overflow')} timeout={options.get('pool_timeout')}s"
+        )
+    return options
+
+
+class PoolMetrics:
+    """
+    Checkout wait times and pool occupancy for the app's engine.
+
+    One instance lives on the app as app.extensions['pool_metrics'].
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.profile = None
+        self.slow_checkout_ms = 500
+        self._lock = threading.Lock()
+        self.reset()
+
+    def init_app(self, app):
+        app.extensions['pool_metrics'] = self
+        self.profile = app.config.get('DB_POOL_PROFILE')
+        self.slow_checkout_ms = float(app.config.get('DB_POOL_SLOW_CHECKOUT_MS', 500))
+
+        with app.app_context():
+            from utils.extensions import db
+            self.engine = db.engine
+
+        # Pool listeners survive engine.dispose() (the new pool copies them)
+        event.listen(self.engine.pool, 'checkout', self._on_checkout)
+        event.listen(self.engine.pool, 'connect', self._on_connect)
+        event.listen(self.engine.pool, 'invalidate', self._on_invalidate)
+
+        # The wait happens inside pool.connect(); time it at the engine so
+        # the wrapper also survives dispose()
+        raw_connection = self.engine.raw_connection
+
+        def timed_raw_connection(*args, **kwargs):
+            started = time.perf_counter()
+            timed_out = False
+            try:
+                return raw_connection(*args, **kwargs)
+            except exc.TimeoutError:
+                timed_out = True
+                raise
+            finally:
+                self._record_wait(time.perf_counter() - started, timed_out)
+
+        self.engine.raw_connection = timed_raw_connection
+
+    # ---------------------------------------------------------------
+    # Hooks
+    # ---------------------------------------------------------------
+    def _record_wait(self, seconds, timed_out=False):
+        wait_ms = seconds * 1000
+        with self._lock:
+            self.waits += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            if timed_out:
+                self.timeouts += 1
+        if timed_out:
+            logger.error(f"⏳ DB pool checkout timed out after {wait_ms:.0f}ms ({self.engine.pool.status()})")
+        elif wait_ms > self.slow_checkout_ms:
+            logger.warning(f"⏳ Slow DB pool checkout: {wait_ms:.0f}ms ({self.engine.pool.status()})")
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checked_out = self._checked_out()
+        with self._lock:
+            self.checkouts += 1
+            if checked_out is not None and checked_out > self.peak_checked_out:
+                self.peak_checked_out = checked_out
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidated += 1
+
+    def _checked_out(self):
+        pool = self.engine.pool
+        return pool.checkedout() if hasattr(pool, 'checkedout') else None
+
+    # ---------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------
+    def wait_percentile(self, pct):
+        """Upper bucket bound containing the pct-th percentile wait."""
+        target = self.waits * pct / 100
+        seen = 0
+        for bound, n in zip(WAIT_BUCKETS_MS, self.wait_buckets):
+            seen += n
+            if seen >= target:
+                return bound if bound != float('inf') else round(self.wait_max_ms, 1)
+        return round(self.wait_max_ms, 1)
+
+    def snapshot(self):
+        """Current pool state and counters as a JSON-serialisable dict."""
+        if self.engine is None:
+            return {'enabled': False}
+
+        pool = self.engine.pool
+        state = {'pool_class': type(pool).__name__, 'status': pool.status()}
+        if hasattr(pool, 'checkedout'):
+            state.update({
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'timeout_seconds': pool.timeout(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+            })
+
+        with self._lock:
+            waits = self.waits or 1
+            counters = {
+                'checkouts': self.checkouts,
+                'peak_checked_out': self.peak_checked_out,
+                'connections_opened': self.connections_opened,
+                'invalidated': self.invalidated,
+                'timeouts': self.timeouts,
+                'wait': {
+                    'count': self.waits,
+                    'avg_ms': round(self.wait_total_ms / waits, 2),
+                    'max_ms': round(self.wait_max_ms, 2),
+                    'p95_ms': self.wait_percentile(95),
+                    'p99_ms': self.wait_percentile(99),
+                    'histogram': [
+                        {'le_ms': '+Inf' if b == float('inf') else b, 'count': n}
+                        for b, n in zip(WAIT_BUCKETS_MS, self.wait_buckets)
+                    ],
+                },
+            }
+
+        return {
+            'enabled': True,
+            'profile': self.profile,
+            'uptime_seconds': round(time.time() - self.started_at),
+            **state,
+            **counters,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.checkouts = 0
+            self.peak_checked_out = 0
+            self.connections_opened = 0
+            self.invalidated = 0
+            self.timeouts = 0
+            self.waits = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+
+
+pool_metrics = PoolMetrics()
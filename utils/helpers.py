@@ -94,3 +94,38 @@ def get_class_choices():
         ('SHS 2', 'SHS 2'),
         ('SHS 3', 'SHS 3'),
     ]
+
+
+USERNAME_DOMAINS = {
+    'student': 'st.vtiu.edu.gh',
+    'teacher': 'tch.vtiu.edu.gh',
+    'finance_admin': 'finance.vtiu.edu.gh',
+    'academic_admin': 'academic.vtiu.edu.gh',
+    'admissions_admin': 'admissions.vtiu.edu.gh',
+    'superadmin': 'admin.vtiu.edu.gh',  # Only superadmin uses admin.vtiu.edu.gh
+}
+
+
+def username_base(first_name, middle_name, last_name, role):
+    """
+    Return (base, domain) for a username: [F initial][M initial]lastname, domain.
+
+    Uniqueness suffixes (base1@domain, ...) are added by the caller.
+    Raises ValueError if first or last name is missing.
+    """
+    import re
+
+    def clean(n):
+        return re.sub(r'[^a-zA-Z]', '', (n or '')).lower().strip()
+
+    first, middle, last = clean(first_name), clean(middle_name), clean(last_name)
+
+    # If first name is missing, shift the middle name up
+    if not first and middle:
+        first, middle = middle, ''
+
+    if not first or not last:
+        raise ValueError("First name and last name are required")
+
+    base = first[0] + (middle[0] if middle else '') + last
+    return base, USERNAME_DOMAINS.get(role.lower(), 'vtiu.edu.gh')
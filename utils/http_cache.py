@@ -0,0 +1,164 @@
+"""
+Compression and conditional GET for JSON responses.
+
+Polling front-ends (chat, notifications, finance dashboards) re-fetch the
+same JSON every few seconds. Two layers cut that cost:
+
+  * ResponseOptimizer (after_request): every 200 JSON response to a GET
+    gets a weak ETag computed from the body, an If-None-Match hit is
+    turned into an empty 304, and bodies above
+    RESPONSE_COMPRESSION_MIN_SIZE are gzip- (or brotli-) compressed when
+    the client accepts it. This saves bandwidth, but the view still runs.
+
+  * @versioned(token_func): the endpoint supplies a cheap version token
+    (e.g. a count and max id/timestamp from one aggregate query). The
+    ETag is derived from the token, so an unchanged resource is answered
+    with 304 before the view queries or serialises anything.
+
+Token functions must change whenever the response would: include every
+table the view reads that can change between polls.
+"""
+
+import gzip
+import hashlib
+import logging
+from functools import wraps
+
+from flask import current_app, request
+from flask_login import current_user
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=10)
+    for part in parts:
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def _not_modified(response, etag):
+    """Turn `response` into an empty 304 carrying the validator."""
+    response.status_code = 304
+    response.set_data(b'')
+    response.set_etag(etag, weak=True)
+    for header in ('Content-Length', 'Content-Type', 'Content-Encoding'):
+        response.headers.pop(header, None)
+    return response
+
+
+class ResponseOptimizer:
+    """
+    Weak ETags, 304s and compression for JSON responses.
+
+    One instance lives on the app as app.extensions['response_optimizer'].
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.mimetypes = ('application/json',)
+
+    def init_app(self, app):
+        app.extensions['response_optimizer'] = self
+        self.enabled = bool(app.config.get('RESPONSE_COMPRESSION_ENABLED', True))
+        if not self.enabled:
+            return
+
+        self.min_size = int(app.config.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+        self.gzip_level = int(app.config.get('RESPONSE_COMPRESSION_LEVEL', 6))
+        self.brotli_quality = int(app.config.get('RESPONSE_BROTLI_QUALITY', 5))
+        self.mimetypes = tuple(app.config.get('RESPONSE_COMPRESSION_MIMETYPES') or self.mimetypes)
+
+        app.after_request(self._after_request)
+        logger.info(f"🗜️ JSON compression/ETags enabled (min {self.min_size} bytes)")
+
+    def _after_request(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.mimetype not in self.mimetypes
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            etag, weak = response.get_etag()
+            if not etag:
+                etag = _digest(response.get_data())
+                response.set_etag(etag, weak=True)
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(response, etag)
+            # Let the browser cache keep the body but always revalidate
+            if not response.cache_control.max_age:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+
+        if response.status_code != 200 and response.status_code < 400:
+            return response
+        return self.compress(response)
+
+    def compress(self, response):
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            packed, encoding = brotli.compress(data, quality=self.brotli_quality), 'br'
+        elif accepted['gzip']:
+            packed, encoding = gzip.compress(data, compresslevel=self.gzip_level), 'gzip'
+        else:
+            return response
+
+        response.set_data(packed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+response_optimizer = ResponseOptimizer()
+
+
+def versioned(token_func):
+    """
+    Answer If-None-Match with 304 when `token_func` reports no change.
+
+    `token_func` receives the view's arguments and returns any repr-able
+    value (or None to skip). The ETag also covers the endpoint, query
+    string and the logged-in identity, so tokens only need to describe
+    the data.
+
+    Usage:
+        @chat_bp.route('/conversations')
+        @login_required
+        @versioned(_conversations_version)
+        def get_conversations(): ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return f(*args, **kwargs)
+
+            token = token_func(*args, **kwargs)
+            if token is None:
+                return f(*args, **kwargs)
+
+            identity = current_user.get_id() if current_user.is_authenticated else None
+            etag = 'v-' + _digest(request.endpoint, request.query_string, identity, token)
+
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(current_app.response_class(), etag)
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
@@ -5,6 +5,7 @@ import qrcode
 import base64
 from flask import current_app, url_for
 from utils.image_generator import generate_image_from_html
+from services.image_pipeline import ImagePipeline
 
 from models import StudentProfile
 
@@ -52,11 +53,15 @@ def generate_student_id_card_pdf(student):
     # Profile picture - FIXED: Extract filename if full path is stored
     profile_pic_filename = student.profile_picture or 'default_avatar.png'
     
-    # Strip any path components (in case full path is stored)
-    if profile_pic_filename and '/' in profile_pic_filename:
-        profile_pic_filename = os.path.basename(profile_pic_filename)
-    if profile_pic_filename and '\\' in profile_pic_filename:
-        profile_pic_filename = os.path.basename(profile_pic_filename)
+    if ImagePipeline.is_managed(profile_pic_filename):
+        # Card-sized JPEG derivative: small to embed, renders everywhere
+        profile_pic_filename = ImagePipeline.variant(profile_pic_filename, 'card', 'jpg')
+    else:
+        # Strip any path components (in case full path is stored)
+        if profile_pic_filename and '/' in profile_pic_filename:
+            profile_pic_filename = os.path.basename(profile_pic_filename)
+        if profile_pic_filename and '\\' in profile_pic_filename:
+            profile_pic_filename = os.path.basename(profile_pic_filename)
     
     # Now construct the correct path
     profile_pic_path = os.path.join(
@@ -0,0 +1,228 @@
+"""
+Identity cache for Flask-Login.
+
+load_user runs on every authenticated request. Instead of querying Admin or
+User by public_id each time, the row's column values are kept in a short-TTL
+process cache and re-attached to the request's session with
+merge(load=False), which issues no SQL. Anything that writes the principal
+(profile or permission edits, password changes, bulk updates) drops its
+entry through session events - when the write is flushed and again after
+the transaction commits or rolls back, so a row cached by a concurrent
+request in between does not survive - and logout drops it explicitly.
+Staleness is bounded by IDENTITY_CACHE_TTL only for writes made by other
+processes.
+
+The unread-notification badge count gets the same treatment, and is also
+memoised per request so several render_template calls share one lookup.
+"""
+
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+from flask_login import user_logged_out
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from utils.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+_lock = threading.Lock()
+_identities = {}     # (model name, public_id) -> (expires_at, column values)
+_unread_counts = {}  # user_id or '*' -> (expires_at, count)
+
+
+def _ttl():
+    if has_app_context():
+        return current_app.config.get('IDENTITY_CACHE_TTL', 60)
+    return 60
+
+
+def _get(cache, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        with _lock:
+            cache.pop(key, None)
+        return None
+    return entry[1]
+
+
+def _put(cache, key, value):
+    ttl = _ttl()
+    if ttl <= 0:
+        return
+    with _lock:
+        cache[key] = (time.monotonic() + ttl, value)
+
+
+# ============================================================
+# IDENTITIES
+# ============================================================
+
+def load_identity(model, public_id):
+    """
+    Admin/User by public_id, from the cache when possible.
+
+    Returns an instance attached to the current session (so relationships
+    lazy-load and changes flush as usual), or None.
+    """
+    key = (model.__name__, public_id)
+    values = _get(_identities, key)
+
+    if values is None:
+        obj = model.query.filter_by(public_id=public_id).first()
+        if obj is not None:
+            mapper = inspect(model)
+            _put(_identities, key, {
+                attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs
+            })
+        return obj
+
+    obj = inspect(model).class_manager.new_instance()
+    for name, value in values.items():
+        set_committed_value(obj, name, value)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def invalidate_identity(obj=None, model=None, public_id=None):
+    """Drop a cached principal (pass the instance, or model + public_id)."""
+    if obj is not None:
+        model, public_id = type(obj), getattr(obj, 'public_id', None)
+    if model is None or public_id is None:
+        return
+    with _lock:
+        _identities.pop((model.__name__, public_id), None)
+
+
+def clear_identity_cache():
+    with _lock:
+        _identities.clear()
+        _unread_counts.clear()
+
+
+# ============================================================
+# UNREAD NOTIFICATION COUNT
+# ============================================================
+
+def unread_notification_count(user_id=None):
+    """
+    Unread notification count for a user (user_id=None counts all unread,
+    as shown to admins). Cached per request and for IDENTITY_CACHE_TTL.
+    """
+    from models import NotificationRecipient
+
+    key = user_id or '*'
+    memo = g.setdefault('_unread_counts', {})
+    if key in memo:
+        return memo[key]
+
+    count = _get(_unread_counts, key)
+    if count is None:
+        query = db.session.query(func.count(NotificationRecipient.id)).filter(
+            NotificationRecipient.is_read == False
+        )
+        if user_id:
+            query = query.filter(NotificationRecipient.user_id == user_id)
+        count = query.scalar() or 0
+        _put(_unread_counts, key, count)
+
+    memo[key] = count
+    return count
+
+
+def _invalidate_unread(user_ids=None):
+    with _lock:
+        if user_ids is None:
+            _unread_counts.clear()
+            return
+        _unread_counts.pop('*', None)
+        for user_id in user_ids:
+            _unread_counts.pop(user_id, None)
+
+
+# ============================================================
+# INVALIDATION HOOKS
+# ============================================================
+
+def _pending(session):
+    """Keys written in the session's open transaction: (identity keys, recipient ids, bulk flags)."""
+    return session.info.setdefault('_identity_cache_pending', {
+        'identities': set(), 'recipients': set(), 'all_identities': set(), 'all_unread': False,
+    })
+
+
+def _invalidate_pending(pending):
+    with _lock:
+        for key in pending['identities']:
+            _identities.pop(key, None)
+        for key in [k for k in _identities if k[0] in pending['all_identities']]:
+            _identities.pop(key, None)
+    if pending['all_unread']:
+        _invalidate_unread()
+    elif pending['recipients']:
+        _invalidate_unread(pending['recipients'])
+
+
+def _after_flush(session, flush_context):
+    from models import Admin, NotificationRecipient, User
+
+    pending = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Admin, User)):
+            if getattr(obj, 'public_id', None) is not None:
+                pending['identities'].add((type(obj).__name__, obj.public_id))
+        elif isinstance(obj, NotificationRecipient):
+            pending['recipients'].add(obj.user_id)
+    # Drop now so this transaction re-reads its own writes...
+    _invalidate_pending(pending)
+
+
+def _after_end(session, *args):
+    # ...and again once it ends: another request may have cached the
+    # pre-commit row in between, and a rollback makes what this
+    # transaction read stale
+    pending = session.info.pop('_identity_cache_pending', None)
+    if pending is not None:
+        _invalidate_pending(pending)
+
+
+def _do_orm_execute(state):
+    """Bulk query.update()/delete() bypass flush events; clear by model."""
+    if not (state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    if mapper is None:
+        return
+
+    from models import Admin, NotificationRecipient, User
+
+    cls = mapper.class_
+    pending = _pending(state.session)
+    if cls in (Admin, User):
+        pending['all_identities'].add(cls.__name__)
+    elif cls is NotificationRecipient:
+        pending['all_unread'] = True
+    else:
+        return
+    _invalidate_pending(pending)
+
+
+def _on_logout(sender, user=None, **extra):
+    invalidate_identity(user)
+
+
+def init_identity_cache(app):
+    """Register the invalidation hooks (call once at startup)."""
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_end)
+    event.listen(Session, 'after_rollback', _after_end)
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
+    user_logged_out.connect(_on_logout, app)
+    logger.info(f"🪪 Identity cache enabled (TTL {app.config.get('IDENTITY_CACHE_TTL', 60)}s)")
@@ -9,8 +9,9 @@ Example: 0126001 = Early Childhood (01), 2026 (26), 1st student (001)
 """
 
 from datetime import datetime
-from sqlalchemy import func
-from models import StudentProfile, db
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from models import StudentProfile, IndexNumberSequence, db
 
 # =====================================================
 # PROGRAMME CODES (2 DIGITS EACH)
@@ -83,6 +84,107 @@ def get_admission_year(admission_date=None):
     return year_str
 
 
+MAX_SERIAL = 999
+
+
+def _existing_max_serial(programme_code, year):
+    """
+    Highest serial already used in StudentProfile for a prefix.
+
+    Serials are zero-padded, so MAX() over the 3-digit suffix is computed by
+    the database instead of loading every profile.
+    """
+    prefix = f"{programme_code}{year}"
+    result = db.session.query(
+        func.max(func.substr(StudentProfile.index_number, 5, 3))
+    ).filter(
+        StudentProfile.index_number.like(f"{prefix}%"),
+        func.length(StudentProfile.index_number) == 7
+    ).scalar()
+
+    try:
+        return int(result) if result else 0
+    except ValueError:
+        return 0
+
+
+def _ensure_sequence(programme_code, year):
+    """
+    Create the counter row for a prefix, seeded from existing index numbers.
+
+    A concurrent creator may win the insert; the unique primary key makes
+    the loser's insert fail inside a savepoint, which is then ignored.
+    """
+    if db.session.get(IndexNumberSequence, (programme_code, year)) is not None:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(IndexNumberSequence(
+                programme_code=programme_code,
+                year=year,
+                last_serial=_existing_max_serial(programme_code, year)
+            ))
+    except IntegrityError:
+        pass
+
+
+def reserve_serial_block(programme_code, year, count=1):
+    """
+    Atomically reserve `count` consecutive serial numbers for a prefix.
+
+    The counter row stays locked until the caller's transaction commits or
+    rolls back; a rollback releases the numbers again.
+
+    Args:
+        programme_code: 2-digit code (e.g., '01')
+        year: 2-digit year (e.g., '26')
+        count: How many serials to reserve
+
+    Returns:
+        list[str]: 3-digit serial numbers (e.g., ['042', '043'])
+
+    Raises:
+        ValueError: If the block would exceed 999
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    _ensure_sequence(programme_code, year)
+
+    table = IndexNumberSequence.__table__
+    condition = (
+        (table.c.programme_code == programme_code)
+        & (table.c.year == year)
+        & (table.c.last_serial + count <= MAX_SERIAL)
+    )
+
+    if db.engine.dialect.update_returning:
+        last = db.session.execute(
+            update(table)
+            .where(condition)
+            .values(last_serial=table.c.last_serial + count, updated_at=datetime.utcnow())
+            .returning(table.c.last_serial)
+        ).scalar()
+    else:
+        current = db.session.execute(
+            select(table.c.last_serial).where(condition).with_for_update()
+        ).scalar()
+        last = None
+        if current is not None:
+            last = current + count
+            db.session.execute(
+                update(table)
+                .where(table.c.programme_code == programme_code, table.c.year == year)
+                .values(last_serial=last, updated_at=datetime.utcnow())
+            )
+
+    if last is None:
+        raise ValueError(f"Maximum index numbers reached for {programme_code}{year}xxx")
+
+    return [f"{serial:03d}" for serial in range(last - count + 1, last + 1)]
+
+
 def get_next_serial_number(programme_code, year):
     """
     Get the next available serial number for a programme and year.
@@ -94,36 +196,44 @@ def get_next_serial_number(programme_code, year):
     Returns:
         str: 3-digit serial number (e.g., '001', '042', '999')
     """
-    # Build index number prefix to search for
-    prefix = f"{programme_code}{year}"
-    
-    # Find all students with this prefix
-    existing = StudentProfile.query.filter(
-        StudentProfile.index_number.like(f"{prefix}%")
+    return reserve_serial_block(programme_code, year, 1)[0]
+
+
+def backfill_index_sequences():
+    """
+    Seed or raise every counter from index numbers already issued.
+
+    Safe to run repeatedly; counters only move forward.
+
+    Returns:
+        dict: {(programme_code, year): last_serial} after backfill
+    """
+    rows = db.session.query(
+        func.substr(StudentProfile.index_number, 1, 2),
+        func.substr(StudentProfile.index_number, 3, 2),
+        func.max(func.substr(StudentProfile.index_number, 5, 3))
+    ).filter(
+        func.length(StudentProfile.index_number) == 7
+    ).group_by(
+        func.substr(StudentProfile.index_number, 1, 2),
+        func.substr(StudentProfile.index_number, 3, 2)
     ).all()
-    
-    # Get serial numbers from existing indices
-    serials = []
-    for student in existing:
-        if student.index_number and len(student.index_number) == 7:
-            try:
-                serial = int(student.index_number[4:7])  # Get last 3 digits
-                serials.append(serial)
-            except (ValueError, IndexError):
-                pass
-    
-    # Find next available serial
-    if serials:
-        next_serial = max(serials) + 1
-    else:
-        next_serial = 1
-    
-    # Ensure we don't exceed 999
-    if next_serial > 999:
-        raise ValueError(f"Maximum index numbers reached for {prefix}xxx")
-    
-    # Format as 3-digit with leading zeros
-    return f"{next_serial:03d}"
+
+    result = {}
+    for programme_code, year, max_serial in rows:
+        if not (programme_code.isdigit() and year.isdigit() and max_serial.isdigit()):
+            continue
+        sequence = db.session.get(
+            IndexNumberSequence, (programme_code, year), populate_existing=True
+        )
+        if sequence is None:
+            sequence = IndexNumberSequence(programme_code=programme_code, year=year, last_serial=0)
+            db.session.add(sequence)
+        sequence.last_serial = max(sequence.last_serial or 0, int(max_serial))
+        result[(programme_code, year)] = sequence.last_serial
+
+    db.session.commit()
+    return result
 
 
 def generate_index_number(programme_name, admission_date=None):
@@ -163,6 +273,35 @@ def generate_index_number(programme_name, admission_date=None):
     return index_number
 
 
+def generate_index_numbers(programme_name, count, admission_date=None):
+    """
+    Generate `count` index numbers at once for bulk registration.
+    
+    Reserves one consecutive block under a single counter update.
+    
+    Args:
+        programme_name: Full programme name
+        count: Number of index numbers needed
+        admission_date: datetime.date object (default: today)
+    
+    Returns:
+        list[str]: 7-digit index numbers in ascending order
+    
+    Raises:
+        ValueError: If programme name missing or max serials exceeded
+    """
+    if not programme_name:
+        raise ValueError("Programme name required")
+    
+    programme_code = get_programme_code(programme_name)
+    year = get_admission_year(admission_date)
+    
+    return [
+        f"{programme_code}{year}{serial}"
+        for serial in reserve_serial_block(programme_code, year, count)
+    ]
+
+
 def parse_index_number(index_number):
     """
     Parse a 7-digit index number into its components.
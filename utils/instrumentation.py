@@ -0,0 +1,231 @@
+"""
+Request instrumentation - sampled timing, per-endpoint histograms and SQL stats.
+
+Nothing is registered unless INSTRUMENTATION_ENABLED is set, so a disabled
+install pays nothing beyond the slow-request check in app.py. When enabled,
+only INSTRUMENTATION_SAMPLE_RATE of requests are timed; for a sampled request
+the SQLAlchemy cursor events add the statement count and time.
+
+Memory snapshots are never taken per request. Use
+`memory_snapshot()` (exposed at /admin/system/memory-snapshot) or send the
+process SIGUSR1: the first call starts tracemalloc, later calls report the
+top allocations.
+"""
+
+import logging
+import random
+import signal
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+# Request duration bucket upper bounds in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class _EndpointStats:
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets', 'sql_count', 'sql_ms', 'errors')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.errors = 0
+
+    def add(self, duration_ms, sql_count, sql_ms, status_code):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                break
+        self.sql_count += sql_count
+        self.sql_ms += sql_ms
+        if status_code >= 500:
+            self.errors += 1
+
+    def percentile(self, pct):
+        """Upper bucket bound containing the pct-th percentile."""
+        target = self.count * pct / 100
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return bound if bound != float('inf') else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def to_dict(self):
+        count = self.count or 1
+        return {
+            'sampled_requests': self.count,
+            'avg_ms': round(self.total_ms / count, 2),
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'histogram': [
+                {'le_ms': '+Inf' if b == float('inf') else b, 'count': n}
+                for b, n in zip(BUCKETS_MS, self.buckets)
+            ],
+            'sql_queries_avg': round(self.sql_count / count, 2),
+            'sql_ms_avg': round(self.sql_ms / count, 2),
+            'errors': self.errors,
+        }
+
+
+class RequestInstrumentation:
+    """
+    Collects sampled per-endpoint timings and SQL statistics.
+
+    One instance lives on the app as app.extensions['instrumentation'].
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.started_at = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        self.enabled = bool(app.config.get('INSTRUMENTATION_ENABLED'))
+        self.sample_rate = float(app.config.get('INSTRUMENTATION_SAMPLE_RATE', 0.1))
+
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        with app.app_context():
+            from utils.extensions import db
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        self.install_signal_handler()
+        logger.info(f"📈 Request instrumentation enabled (sample rate {self.sample_rate:.0%})")
+
+    # ---------------------------------------------------------------
+    # Request hooks
+    # ---------------------------------------------------------------
+    def _before_request(self):
+        if random.random() >= self.sample_rate:
+            return
+        # [start, sql_count, sql_seconds, current statement start]
+        self._local.sample = [time.perf_counter(), 0, 0.0, 0.0]
+
+    def _after_request(self, response):
+        sample = getattr(self._local, 'sample', None)
+        if sample is None:
+            return response
+        self._local.sample = None
+
+        duration_ms = (time.perf_counter() - sample[0]) * 1000
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = _EndpointStats()
+            stats.add(duration_ms, sample[1], sample[2] * 1000, response.status_code)
+        return response
+
+    def _teardown_request(self, exc=None):
+        # after_request is skipped on unhandled errors
+        self._local.sample = None
+
+    # ---------------------------------------------------------------
+    # SQLAlchemy hooks
+    # ---------------------------------------------------------------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sample = getattr(self._local, 'sample', None)
+        if sample is not None:
+            sample[3] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sample = getattr(self._local, 'sample', None)
+        if sample is not None:
+            sample[1] += 1
+            sample[2] += time.perf_counter() - sample[3]
+
+    # ---------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------
+    def snapshot(self):
+        """Current metrics as a JSON-serialisable dict."""
+        with self._lock:
+            endpoints = {name: s.to_dict() for name, s in self._stats.items()}
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'uptime_seconds': round(time.time() - self.started_at),
+            'endpoints': dict(sorted(
+                endpoints.items(), key=lambda kv: kv[1]['avg_ms'], reverse=True
+            )),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.started_at = time.time()
+
+    def install_signal_handler(self):
+        """Log a memory snapshot on SIGUSR1 (main thread only)."""
+        if not hasattr(signal, 'SIGUSR1'):
+            return
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: memory_snapshot(log=True))
+        except ValueError:
+            # Not in the main thread (e.g. imported by a worker thread)
+            pass
+
+
+instrumentation = RequestInstrumentation()
+
+
+def memory_snapshot(limit=10, stop=False, log=False):
+    """
+    Process memory and, once tracing, the top allocation sites.
+
+    The first call starts tracemalloc (it slows allocation, so it only runs
+    between an operator asking for it and stop=True).
+    """
+    import tracemalloc
+
+    result = {'tracing': tracemalloc.is_tracing()}
+    try:
+        import psutil
+        result['rss_mb'] = round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+    except ImportError:
+        result['rss_mb'] = None
+
+    if stop:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        result['tracing'] = False
+    elif not tracemalloc.is_tracing():
+        tracemalloc.start()
+        result['tracing'] = True
+        result['message'] = 'tracemalloc started; request another snapshot to see allocations'
+    else:
+        current, peak = tracemalloc.get_traced_memory()
+        result['traced_mb'] = round(current / 1024 / 1024, 1)
+        result['traced_peak_mb'] = round(peak / 1024 / 1024, 1)
+        result['top_allocations'] = [
+            str(stat) for stat in tracemalloc.take_snapshot().statistics('lineno')[:limit]
+        ]
+
+    if log:
+        logger.warning(f"🔍 Memory snapshot: {result}")
+    return result
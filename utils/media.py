@@ -0,0 +1,159 @@
+"""
+Media delivery for course materials and lecture videos.
+
+send_file() pushes every byte through a Python thread, and for Range
+requests (video scrubbing) it copies each slice through a Python iterator.
+With one gunicorn worker, a handful of students seeking through videos is
+enough to starve everyone else. send_media() avoids that:
+
+  * MEDIA_ACCEL_MODE = "x-accel": the app only authorises the request and
+    answers with an X-Accel-Redirect header; nginx streams the file and
+    handles ranges itself. Example nginx config:
+
+        location /protected-media/ {
+            internal;
+            alias /app/uploads/;
+        }
+
+  * MEDIA_ACCEL_MODE = "x-sendfile": same idea for Apache (mod_xsendfile)
+    or lighttpd, using the absolute path.
+
+  * otherwise the app answers itself: conditional requests get a 304, a
+    single byte range gets a 206, and the body is handed to the server's
+    wsgi.file_wrapper positioned at the range start. gunicorn transmits
+    that with os.sendfile (no copy into Python); other servers read it in
+    bounded chunks.
+
+Every response carries Accept-Ranges, a strong ETag, Last-Modified and a
+private Cache-Control so browsers re-use what they already have.
+"""
+
+import logging
+import mimetypes
+import os
+
+from flask import Response, abort, current_app, request
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _FileRange:
+    """
+    File object limited to `length` bytes from `start`.
+
+    fileno() and the seek position let sendfile-capable servers transmit the
+    range zero-copy (bounded by Content-Length); read() keeps chunked
+    fallbacks from running past the end of the range.
+    """
+
+    def __init__(self, path, start, length):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def _etag(stat):
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def _range_is_current(etag, mtime):
+    """If-Range: honour the Range header only if the file is unchanged."""
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return int(mtime) <= if_range.date.timestamp()
+    return True
+
+
+def _accel_headers(path):
+    mode = current_app.config.get('MEDIA_ACCEL_MODE')
+    if mode == 'x-sendfile':
+        return {'X-Sendfile': path}
+    if mode == 'x-accel':
+        root = os.path.abspath(current_app.config.get('MEDIA_ACCEL_ROOT') or '')
+        relative = os.path.relpath(path, root)
+        if relative.startswith('..'):
+            logger.warning(f"⚠️ {path} is outside MEDIA_ACCEL_ROOT; serving from the app")
+            return None
+        prefix = current_app.config.get('MEDIA_ACCEL_PREFIX', '/protected-media/').rstrip('/')
+        return {'X-Accel-Redirect': f"{prefix}/{relative.replace(os.sep, '/')}"}
+    return None
+
+
+def send_media(directory, filename, mimetype=None, as_attachment=False, download_name=None):
+    """
+    Serve `filename` from `directory` with range, validator and cache support.
+
+    Aborts with 404 if the file does not exist (or escapes `directory`).
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    path = os.path.abspath(path)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = _etag(stat)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    disposition = 'attachment' if as_attachment else 'inline'
+    name = (download_name or os.path.basename(path)).replace('"', '')
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f"private, max-age={current_app.config.get('MEDIA_CACHE_MAX_AGE', 0)}",
+        'Content-Disposition': f'{disposition}; filename="{name}"',
+    }
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=http_date(stat.st_mtime)):
+        return Response(status=304, headers=headers)
+
+    accel = _accel_headers(path)
+    if accel:
+        headers.update(accel)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    start, length, status = 0, size, 200
+    byte_range = request.range
+    if byte_range is not None and len(byte_range.ranges) == 1 and _range_is_current(etag, stat.st_mtime):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers['Content-Range'] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        length, status = stop - start, 206
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+
+    body = wrap_file(request.environ, _FileRange(path, start, length), CHUNK_SIZE)
+    response = Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = length
+    return response
@@ -9,6 +9,8 @@ from flask_login import login_required, current_user
 from models import db, Notification, NotificationRecipient, NotificationPreference
 from utils.notification_engine import mark_notification_read, mark_all_notifications_read, get_unread_notification_count
 from datetime import datetime
+from sqlalchemy import case, func
+from utils.http_cache import versioned
 import json
 
 notification_bp = Blueprint('notifications', __name__, url_prefix='/notifications')
@@ -223,8 +225,17 @@ def api_unread_count():
     count = get_unread_notification_count(current_user.user_id)
     return jsonify({'count': count})
 
+def _recipient_version():
+    """Version token for the current user's notification feed (one aggregate query)."""
+    return db.session.query(
+        func.count(NotificationRecipient.id),
+        func.max(NotificationRecipient.id),
+        func.sum(case((NotificationRecipient.is_read == True, 1), else_=0)),
+    ).filter(NotificationRecipient.user_id == current_user.user_id).one()
+
 @notification_bp.route('/api/recent')
 @login_required
+@versioned(_recipient_version)
 def api_recent_notifications():
     """Get recent unread notifications (for dropdown)"""
     limit = request.args.get('limit', 5, type=int)
@@ -251,6 +262,7 @@ def api_recent_notifications():
 
 @notification_bp.route('/api/filter')
 @login_required
+@versioned(_recipient_version)
 def api_filter_notifications():
     """Filter notifications by type"""
     notif_type = request.args.get('type')
@@ -0,0 +1,230 @@
+"""
+Per-request SQL query budgets and N+1 detection (development / tests).
+
+When QUERY_BUDGET_ENABLED is set, every statement issued while handling a
+request is counted through SQLAlchemy's before_cursor_execute event and
+fingerprinted (literals and whitespace normalised). At the end of the
+request:
+
+  * a fingerprint repeated QUERY_NPLUSONE_THRESHOLD times or more is
+    reported as a likely N+1, with the application call site that issued it
+  * the total is checked against QUERY_BUDGETS[endpoint] (falling back to
+    QUERY_BUDGET_DEFAULT); with QUERY_BUDGET_STRICT the request fails with
+    QueryBudgetExceeded instead of just logging
+
+Tests can use `count_queries()` directly, or load this module as a pytest
+plugin (pytest_plugins = ['utils.query_budget']) for the `query_counter`
+fixture:
+
+    def test_inbox(client, query_counter):
+        with query_counter(max_queries=8):
+            client.get('/chat/conversations')
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])"
+# Commas are mandatory between items, so a list can only be split one way
+# (an optional comma made unterminated lists backtrack exponentially)
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (in strict mode) when a request issues more queries than its budget."""
+
+
+def fingerprint(statement):
+    """Normalise a SQL statement so repeated shapes compare equal."""
+    s = _STRING.sub("'?'", statement)
+    s = _NUMBER.sub("?", s)
+    s = _PARAM_LIST.sub("(?)", s)
+    return _SPACE.sub(" ", s).strip()
+
+
+def call_site():
+    """First stack frame inside the application (not SQLAlchemy, not this module)."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith('<'):
+            filename = os.path.abspath(filename)
+        if (filename.startswith(_PACKAGE_ROOT) and filename != _THIS_FILE
+                and 'site-packages' not in filename):
+            return f"{os.path.relpath(filename, _PACKAGE_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryLog:
+    """Statements seen during one request (or one count_queries block)."""
+
+    __slots__ = ('count', 'fingerprints', 'sites', 'threshold')
+
+    def __init__(self, threshold=5):
+        self.count = 0
+        self.fingerprints = Counter()
+        self.sites = {}
+        self.threshold = threshold
+
+    def record(self, statement):
+        self.count += 1
+        fp = fingerprint(statement)
+        self.fingerprints[fp] += 1
+        # Walk the stack only once a shape starts repeating
+        if self.fingerprints[fp] == self.threshold:
+            self.sites[fp] = call_site()
+
+    def repeated(self):
+        """[(fingerprint, count, call_site)] for shapes at or over the threshold."""
+        return [
+            (fp, n, self.sites.get(fp, 'unknown'))
+            for fp, n in self.fingerprints.most_common()
+            if n >= self.threshold
+        ]
+
+
+class QueryBudget:
+    """
+    Counts queries per request and enforces per-endpoint budgets.
+
+    One instance lives on the app as app.extensions['query_budget'].
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.strict = False
+        self.default_budget = None
+        self.budgets = {}
+        self.threshold = 5
+        self._local = threading.local()
+
+    def init_app(self, app):
+        app.extensions['query_budget'] = self
+        self.enabled = bool(app.config.get('QUERY_BUDGET_ENABLED'))
+        if not self.enabled:
+            return
+
+        self.strict = bool(app.config.get('QUERY_BUDGET_STRICT'))
+        self.default_budget = app.config.get('QUERY_BUDGET_DEFAULT')
+        self.budgets = dict(app.config.get('QUERY_BUDGETS') or {})
+        self.threshold = int(app.config.get('QUERY_NPLUSONE_THRESHOLD', 5))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        with app.app_context():
+            from utils.extensions import db
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+        logger.info(f"🧮 Query budgets enabled (default {self.default_budget}, strict={self.strict})")
+
+    def _before_request(self):
+        self._local.log = QueryLog(self.threshold)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        log = getattr(self._local, 'log', None)
+        if log is not None:
+            log.record(statement)
+
+    def _teardown_request(self, exc=None):
+        self._local.log = None
+
+    def _after_request(self, response):
+        log = self._local.log
+        self._local.log = None
+        if log is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        response.headers['X-Query-Count'] = str(log.count)
+
+        for fp, n, site in log.repeated():
+            logger.warning(f"🔁 Possible N+1 on {endpoint}: {n}x from {site}: {fp[:200]}")
+
+        budget = self.budgets.get(endpoint, self.default_budget)
+        if budget is not None and log.count > budget:
+            message = f"{endpoint} issued {log.count} queries (budget {budget})"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(f"💸 Query budget exceeded: {message}")
+
+        return response
+
+
+query_budget = QueryBudget()
+
+
+@contextmanager
+def count_queries(max_queries=None, threshold=5):
+    """
+    Count statements issued inside the block on this thread.
+
+    Yields a QueryLog; raises QueryBudgetExceeded on exit if max_queries is
+    exceeded. Needs an app context.
+    """
+    from utils.extensions import db
+
+    log = QueryLog(threshold)
+    thread_id = threading.get_ident()
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            log.record(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield log
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    if max_queries is not None and log.count > max_queries:
+        details = "; ".join(f"{n}x {site}" for _, n, site in log.repeated())
+        raise QueryBudgetExceeded(
+            f"{log.count} queries issued (max {max_queries})" + (f" - repeated: {details}" if details else "")
+        )
+
+
+# Only define the fixture when running under pytest, so the app itself
+# never imports it.
+if 'pytest' in sys.modules:
+    import pytest
+
+    @pytest.fixture
+    def app():
+        """
+        The application under test. An `app` fixture in conftest.py (e.g.
+        one configured with a throwaway database) takes precedence.
+        """
+        from app import app as flask_app
+
+        flask_app.config['TESTING'] = True
+        return flask_app
+
+    @pytest.fixture
+    def query_counter(app):
+        """Fixture returning count_queries bound to the test app's context."""
+        @contextmanager
+        def _counter(max_queries=None, threshold=5):
+            with app.app_context():
+                with count_queries(max_queries, threshold) as log:
+                    yield log
+        return _counter
@@ -1,125 +1,319 @@
 # utils/receipts.py
+"""
+Payment receipt rendering.
+
+Receipts are drawn with ReportLab on A4. The DejaVu faces are parsed and
+registered once per process (ReportLab subsets registered TTF fonts per
+document), so issuing a receipt no longer re-reads three font files.
+
+A receipt is rendered from a plain-dict payload (see `load_payloads`), so
+the same code serves the receipt issued at approval, a re-issue and a
+multi-page batch PDF. The fee summary on a receipt is as of its own
+transaction (approved payments up to and including it), so rendering a
+receipt again later prints the same figures as the original.
+"""
+import logging
 import os
+import threading
+from io import BytesIO
+
 from flask import current_app
-from fpdf import FPDF
-from models import ProgrammeFeeStructure, StudentFeeTransaction
 from sqlalchemy import func
 
+from models import ProgrammeFeeStructure, StudentFeeTransaction
+
+logger = logging.getLogger(__name__)
+
 FONT_DIR = os.path.join("static", "fonts")
+LOGO_PATH = os.path.join("static", "NEDO_GLOBAL.png")
 
-class ReceiptPDF(FPDF):
-    def header(self):
-        logo_path = os.path.join("static", "NEDO_GLOBAL.png")
-        if os.path.exists(logo_path):
-            self.image(logo_path, x=10, y=8, w=25)
+FONT_FILES = {
+    "DejaVu": "DejaVuSans.ttf",
+    "DejaVu-Bold": "DejaVuSans-Bold.ttf",
+    "DejaVu-Italic": "DejaVuSans-Oblique.ttf",
+}
+FALLBACK_FONTS = {
+    "DejaVu": "Helvetica",
+    "DejaVu-Bold": "Helvetica-Bold",
+    "DejaVu-Italic": "Helvetica-Oblique",
+}
 
-        self.set_xy(40, 10)
-        self.set_font("DejaVu-Bold", size=18)
-        self.set_text_color(34, 34, 34)
-        self.cell(0, 10, "Institution Name", ln=True, align="C")
+_fonts_lock = threading.Lock()
+_fonts = None
 
-        self.set_font("DejaVu", size=12)
-        self.set_text_color(80, 80, 80)
-        self.cell(0, 10, "Official Payment Receipt", ln=True, align="C")
-        self.ln(10)
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font("DejaVu", size=8)
-        self.set_text_color(160)
-        self.cell(0, 10, f"Generated by Institution LMS - Page {self.page_no()}", align="C")
+def receipt_fonts():
+    """
+    Register the receipt fonts with ReportLab (once per process).
 
-def generate_receipt(transaction, student):
-    """Generate payment receipt for tertiary student"""
+    Returns:
+        dict: Logical name ('DejaVu', 'DejaVu-Bold', 'DejaVu-Italic') ->
+        registered ReportLab font name (Helvetica faces if the TTFs are missing)
+    """
+    global _fonts
+    if _fonts is not None:
+        return _fonts
+
+    with _fonts_lock:
+        if _fonts is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            fonts = {}
+            for name, filename in FONT_FILES.items():
+                path = os.path.join(FONT_DIR, filename)
+                try:
+                    pdfmetrics.registerFont(TTFont(name, path))
+                    fonts[name] = name
+                except Exception as e:
+                    logger.warning(f"⚠️ Receipt font {path} unavailable ({e}); using {FALLBACK_FONTS[name]}")
+                    fonts[name] = FALLBACK_FONTS[name]
+            _fonts = fonts
+    return _fonts
+
+
+# ============================================================
+# PAYLOADS
+# ============================================================
+
+def load_payloads(transactions):
+    """
+    Build receipt payloads for transactions (with .student and its profile loaded).
+
+    Fee totals and approved payments are read with two queries for the
+    whole list instead of two queries per receipt.
+    """
+    return _payloads([(t, t.student) for t in transactions if t.student is not None])
+
+
+def _payloads(pairs):
+    """Payloads for [(transaction, student)]."""
     from utils.extensions import db
 
-    pdf = ReceiptPDF()
-    pdf.add_font("DejaVu", "", os.path.join(FONT_DIR, "DejaVuSans.ttf"), uni=True)
-    pdf.add_font("DejaVu-Bold", "", os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"), uni=True)
-    pdf.add_font("DejaVu-Italic", "", os.path.join(FONT_DIR, "DejaVuSans-Oblique.ttf"), uni=True)
+    if not pairs:
+        return []
+    transactions = [t for t, _ in pairs]
+
+    years = {t.academic_year for t in transactions}
+    fee_totals = {
+        (programme, str(level), year, semester): total or 0
+        for programme, level, year, semester, total in db.session.query(
+            ProgrammeFeeStructure.programme_name,
+            ProgrammeFeeStructure.programme_level,
+            ProgrammeFeeStructure.academic_year,
+            ProgrammeFeeStructure.semester,
+            func.sum(ProgrammeFeeStructure.amount)
+        ).filter(
+            ProgrammeFeeStructure.academic_year.in_(years)
+        ).group_by(
+            ProgrammeFeeStructure.programme_name,
+            ProgrammeFeeStructure.programme_level,
+            ProgrammeFeeStructure.academic_year,
+            ProgrammeFeeStructure.semester
+        )
+    }
+
+    # Approved payments up to each transaction: running totals per
+    # (student, year, semester) in id order, read in one query
+    wanted = {t.id for t in transactions}
+    running, paid_to_date = {}, {}
+    for txn_id, student_id, year, semester, amount in db.session.query(
+        StudentFeeTransaction.id,
+        StudentFeeTransaction.student_id,
+        StudentFeeTransaction.academic_year,
+        StudentFeeTransaction.semester,
+        StudentFeeTransaction.amount
+    ).filter(
+        StudentFeeTransaction.student_id.in_({t.student_id for t in transactions}),
+        StudentFeeTransaction.academic_year.in_(years),
+        StudentFeeTransaction.is_approved == True,
+        StudentFeeTransaction.id <= max(wanted)
+    ).order_by(StudentFeeTransaction.id):
+        key = (student_id, year, semester)
+        running[key] = running.get(key, 0) + (amount or 0)
+        if txn_id in wanted:
+            paid_to_date[txn_id] = running[key]
+
+    payloads = []
+    for txn, student in pairs:
+        profile = student.student_profile
+        programme_name = profile.current_programme if profile else "N/A"
+        programme_level = profile.programme_level if profile else "N/A"
+        payloads.append(receipt_payload(
+            txn, student,
+            total_fee=fee_totals.get((programme_name, str(programme_level), txn.academic_year, txn.semester), 0),
+            approved_payments=paid_to_date.get(txn.id, 0),
+        ))
+    return payloads
 
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_fill_color(248, 248, 248)
-    pdf.set_draw_color(200, 200, 200)
 
-    # === TERTIARY CALCULATIONS ===
+def receipt_payload(transaction, student, total_fee, approved_payments):
+    """Everything printed on one receipt, as plain values."""
     profile = student.student_profile
-    programme_name = profile.current_programme if profile else "N/A"
-    programme_level = profile.programme_level if profile else "N/A"
-    index_number = profile.index_number if profile else "N/A"
-    
     year = transaction.academic_year
     semester = transaction.semester
-
-    # Total Fee for programme/level/year/semester
-    total_fee = db.session.query(func.sum(ProgrammeFeeStructure.amount)).filter_by(
-        programme_name=programme_name,
-        programme_level=str(programme_level),
-        academic_year=year,
-        semester=semester
-    ).scalar() or 0
-
-    # Total Approved Payments by student
-    approved_payments = db.session.query(func.sum(StudentFeeTransaction.amount)).filter_by(
-        student_id=student.id,
-        academic_year=year,
-        semester=semester,
-        is_approved=True
-    ).scalar() or 0
-
-    outstanding = total_fee - approved_payments
-
-    # === Receipt Header ===
-    pdf.set_font("DejaVu-Bold", "", 11)
     semester_code = '1' if semester == '1' else '2'
-    receipt_number = f"RCT-TER-{year[:4]}S{semester_code}-{student.user_id}-TX{transaction.id:04d}"
-    pdf.cell(0, 10, f"Receipt #: {receipt_number}", ln=True)
-    pdf.ln(3)
+
+    payload = {
+        'transaction_id': transaction.id,
+        'receipt_number': f"RCT-TER-{year[:4]}S{semester_code}-{student.user_id}-TX{transaction.id:04d}",
+        'student_name': student.full_name,
+        'student_id': student.user_id,
+        'index_number': profile.index_number if profile else "N/A",
+        'programme': profile.current_programme if profile else "N/A",
+        'level': profile.programme_level if profile else "N/A",
+        'academic_year': year,
+        'semester': semester,
+        'amount': float(transaction.amount or 0),
+        'description': transaction.description,
+        'payment_date': transaction.timestamp.strftime('%Y-%m-%d %I:%M %p') if transaction.timestamp else "",
+        'total_fee': float(total_fee),
+        'approved_payments': float(approved_payments),
+    }
+    return payload
+
+
+# ============================================================
+# RENDERING
+# ============================================================
+
+def _draw_receipt(c, payload, fonts):
+    """Draw one receipt on the current page of canvas `c` (layout in mm from the top-left)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import simpleSplit
+
+    page_width, page_height = A4
+    regular, bold, italic = fonts["DejaVu"], fonts["DejaVu-Bold"], fonts["DejaVu-Italic"]
+
+    def text(x, top, height, value, font, size, gray=34, align='left', right=200):
+        # Baseline of a line of `height` mm starting `top` mm from the page top, text vertically centred
+        y = page_height - (top + height / 2) * mm - size * 0.35
+        c.setFont(font, size)
+        c.setFillGray(gray / 255)
+        if align == 'center':
+            c.drawCentredString((x + right) / 2 * mm, y, str(value))
+        else:
+            c.drawString(x * mm, y, str(value))
+
+    if os.path.exists(LOGO_PATH):
+        logo = _logo_reader(LOGO_PATH)
+        logo_w, logo_h = logo.getSize()
+        width = 25 * mm
+        height = width * logo_h / logo_w
+        c.drawImage(logo, 10 * mm, page_height - 8 * mm - height, width, height, mask='auto')
+
+    text(40, 10, 10, "Institution Name", bold, 18, align='center')
+    text(40, 20, 10, "Official Payment Receipt", regular, 12, gray=80, align='center')
+
+    y = 40
+    text(10, y, 10, f"Receipt #: {payload['receipt_number']}", bold, 11)
+    y += 13
 
     def info_row(label, value):
-        pdf.set_font("DejaVu-Bold", "", 10)
-        pdf.cell(60, 8, label, border=0)
-        pdf.set_font("DejaVu", "", 10)
-        pdf.cell(0, 8, str(value), ln=True)
-
-    # === Payment Info Section (TERTIARY) ===
-    info_row("Student Name:", student.full_name)
-    info_row("Student ID:", student.user_id)
-    info_row("Index Number:", index_number)
-    info_row("Programme:", programme_name)
-    info_row("Level:", f"Level {programme_level}")
-    info_row("Academic Year:", year)
-    info_row("Semester:", semester)
-    info_row("Amount Paid (This Txn):", f"GHS {transaction.amount:.2f}")
-    info_row("Description:", transaction.description)
-    info_row("Payment Date:", transaction.timestamp.strftime('%Y-%m-%d %I:%M %p'))
-    info_row("Payment Status:", "✅ Approved")
-
-    pdf.ln(5)
-    pdf.set_draw_color(180, 180, 180)
-    pdf.set_line_width(0.2)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(6)
-
-    # === Summary Section ===
-    pdf.set_font("DejaVu-Bold", "", 11)
-    pdf.cell(0, 10, "Fee Summary", ln=True)
-
-    info_row("Total Fee:", f"GHS {total_fee:.2f}")
-    info_row("Approved Payments:", f"GHS {approved_payments:.2f}")
+        nonlocal y
+        text(10, y, 8, label, bold, 10)
+        text(70, y, 8, value, regular, 10)
+        y += 8
+
+    info_row("Student Name:", payload['student_name'])
+    info_row("Student ID:", payload['student_id'])
+    info_row("Index Number:", payload['index_number'])
+    info_row("Programme:", payload['programme'])
+    info_row("Level:", f"Level {payload['level']}")
+    info_row("Academic Year:", payload['academic_year'])
+    info_row("Semester:", payload['semester'])
+    info_row("Amount Paid (This Txn):", f"GHS {payload['amount']:.2f}")
+    info_row("Description:", payload['description'])
+    info_row("Payment Date:", payload['payment_date'])
+    info_row("Payment Status:", "✔ Approved")
+
+    y += 5
+    c.setStrokeGray(180 / 255)
+    c.setLineWidth(0.2 * mm)
+    c.line(10 * mm, page_height - y * mm, 200 * mm, page_height - y * mm)
+    y += 6
+
+    text(10, y, 10, "Fee Summary", bold, 11)
+    y += 10
+    outstanding = payload['total_fee'] - payload['approved_payments']
+    info_row("Total Fee:", f"GHS {payload['total_fee']:.2f}")
+    info_row("Approved Payments:", f"GHS {payload['approved_payments']:.2f}")
     info_row("Outstanding Balance:", f"GHS {outstanding:.2f}")
 
-    pdf.ln(10)
-    pdf.set_font("DejaVu-Italic", "", 9)
-    pdf.set_text_color(90)
-    pdf.multi_cell(0, 8, "This is a system-generated receipt. Contact the institution's accounts office with the receipt number above for any concerns.")
+    y += 10
+    note = ("This is a system-generated receipt. Contact the institution's accounts office "
+            "with the receipt number above for any concerns.")
+    for line in simpleSplit(note, italic, 9, 190 * mm):
+        text(10, y, 8, line, italic, 9, gray=90)
+        y += 8
+
+    # Footer (a receipt is always one page, also inside a batch PDF)
+    text(10, 297 - 15, 10, "Generated by Institution LMS", regular, 8, gray=160, align='center')
+
+
+_logo_lock = threading.Lock()
+_logo = {}
+
+
+def _logo_reader(path):
+    """ImageReader for the logo, decoded once per process."""
+    from reportlab.lib.utils import ImageReader
+
+    with _logo_lock:
+        if path not in _logo:
+            _logo[path] = ImageReader(path)
+        return _logo[path]
 
-    # === Save ===
+
+def render_receipts(payloads, out=None):
+    """
+    Render receipts into one PDF, a page each.
+
+    Args:
+        payloads: Iterable of receipt payloads
+        out: File-like object to write to; a BytesIO is used when omitted
+
+    Returns:
+        The PDF bytes when `out` is omitted, else the number of receipts written
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    fonts = receipt_fonts()
+    target = out if out is not None else BytesIO()
+    c = canvas.Canvas(target, pagesize=A4)
+    c.setTitle("Payment Receipts")
+    count = 0
+    for payload in payloads:
+        _draw_receipt(c, payload, fonts)
+        c.showPage()
+        count += 1
+    c.save()
+    return target.getvalue() if out is None else count
+
+
+def render_receipt(payload):
+    """Render a single receipt; returns (filename, pdf_bytes)."""
+    return f"receipt_{payload['transaction_id']}.pdf", render_receipts([payload])
+
+
+def receipt_path(transaction_id):
+    """Where the receipt issued for a transaction is stored."""
     folder = current_app.config.get('RECEIPT_FOLDER', os.path.join("static", "receipts"))
-    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"receipt_{transaction_id}.pdf")
+
+
+def generate_receipt(transaction, student):
+    """Generate payment receipt for tertiary student"""
+    payload = _payloads([(transaction, student)])[0]
+    filename, pdf_bytes = render_receipt(payload)
 
-    filename = f"receipt_{transaction.id}.pdf"
-    filepath = os.path.join(folder, filename)
-    pdf.output(filepath)
+    # === Save === (renamed into place, so a concurrent download never sees half a file)
+    filepath = receipt_path(transaction.id)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    partial = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(partial, 'wb') as fh:
+        fh.write(pdf_bytes)
+    os.replace(partial, filepath)
     return filename
@@ -0,0 +1,218 @@
+# utils/result_documents.py
+"""
+ReportLab renderers for result slips and transcripts.
+
+These functions take plain dictionaries (no ORM objects, no Flask context)
+so they can run inside worker processes during batch exports.
+"""
+
+from io import BytesIO
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+HEADER_COLOR = colors.HexColor("#1f77b4")
+STRIPE_COLOR = colors.HexColor("#f0f0f0")
+SUMMARY_COLOR = colors.HexColor("#e6e6e6")
+
+
+def _styles():
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=14,
+        textColor=HEADER_COLOR,
+        alignment=1,
+        spaceAfter=12
+    )
+    info_style = ParagraphStyle(
+        'Info',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=6
+    )
+    return styles, title_style, info_style
+
+
+def _table_style():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, STRIPE_COLOR]),
+        ('BACKGROUND', (0, -1), (-1, -1), SUMMARY_COLOR),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ])
+
+
+def _student_block(student, info_style):
+    elements = [
+        Paragraph(f"<b>Student Name:</b> {student['name']}", info_style),
+        Paragraph(f"<b>Student ID:</b> {student['student_id']}", info_style),
+        Paragraph(f"<b>Programme:</b> {student['programme']}", info_style),
+        Paragraph(f"<b>Level:</b> {student['level']}", info_style),
+    ]
+    if student.get('index_number'):
+        elements.append(Paragraph(f"<b>Index Number:</b> {student['index_number']}", info_style))
+    return elements
+
+
+def _safe_name(value):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(value))
+
+
+def render_result_slip_pdf(payload):
+    """
+    Render a semester result slip.
+
+    Args:
+        payload: dict with 'student' (name, student_id, programme, level,
+            index_number) and 'result' (output of ResultBuilder.build_semester)
+
+    Returns:
+        tuple: (filename, pdf_bytes)
+    """
+    student = payload['student']
+    data = payload['result']
+    styles, title_style, info_style = _styles()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = [
+        Paragraph(f"SEMESTER RESULTS - {data['academic_year']} {data['semester']}", title_style),
+        Spacer(1, 12),
+    ]
+    elements.extend(_student_block(student, info_style))
+    elements.append(Spacer(1, 12))
+
+    table_data = [
+        ["Course Code", "Course Name", "Credits", "Quiz", "Assignment", "Exam", "Score", "Grade"]
+    ]
+    for result in data['results']:
+        score = result['score']
+        table_data.append([
+            result['course_code'],
+            result['course_name'],
+            str(result['credit_hours']),
+            f"{result['quiz_score']}/{result['quiz_max']}",
+            f"{result['assignment_score']}/{result['assignment_max']}",
+            f"{result['exam_score']}/{result['exam_max']}",
+            f"{score:.2f}" if isinstance(score, (int, float)) else str(score),
+            result['grade'] or "-"
+        ])
+    table_data.append([
+        "", "", "", "", "", "",
+        f"GPA: {data['semester_gpa']}", f"Credits: {data['credit_hours']}"
+    ])
+
+    table = Table(table_data, colWidths=[0.8*inch, 1.5*inch, 0.6*inch, 0.7*inch,
+                                         0.8*inch, 0.7*inch, 0.7*inch, 0.6*inch])
+    table.setStyle(_table_style())
+    elements.append(table)
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(
+        f"Generated on: {datetime.now().strftime('%d %B %Y %H:%M')}",
+        styles['Normal']
+    ))
+
+    doc.build(elements)
+
+    filename = (
+        f"Results_{_safe_name(student['index_number'] or student['student_id'])}_"
+        f"{_safe_name(data['academic_year'])}_{_safe_name(data['semester'])}.pdf"
+    )
+    return filename, buffer.getvalue()
+
+
+def render_transcript_pdf(payload):
+    """
+    Render a full academic transcript.
+
+    Args:
+        payload: dict with 'student' (see render_result_slip_pdf) and
+            'transcript' containing 'semesters' (list of dicts with
+            academic_year, semester, gpa, courses), 'cumulative_gpa',
+            'cumulative_weighted_gpa', 'total_credit_hours_attempted' and
+            'total_credit_hours_earned'
+
+    Returns:
+        tuple: (filename, pdf_bytes)
+    """
+    student = payload['student']
+    data = payload['transcript']
+    styles, title_style, info_style = _styles()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = [Paragraph("ACADEMIC TRANSCRIPT", title_style), Spacer(1, 12)]
+    elements.extend(_student_block(student, info_style))
+    elements.append(Spacer(1, 12))
+
+    for sem in data['semesters']:
+        elements.append(Paragraph(
+            f"<b>{sem['academic_year']} - Semester {sem['semester']}</b>",
+            styles['Heading3']
+        ))
+        table_data = [["Course Code", "Course Name", "Credits", "Score", "Grade"]]
+        semester_credits = 0
+        for course in sem['courses']:
+            score = course['final_score']
+            table_data.append([
+                course['course_code'],
+                course['course_name'],
+                str(course['credit_hours']),
+                f"{score:.2f}" if isinstance(score, (int, float)) else "-",
+                course['grade_letter'] or "-"
+            ])
+            semester_credits += course['credit_hours'] or 0
+        table_data.append(["", "", str(semester_credits), f"GPA: {sem['gpa']:.2f}", ""])
+
+        table = Table(table_data, colWidths=[0.9*inch, 2.6*inch, 0.7*inch, 1.0*inch, 0.6*inch])
+        table.setStyle(_table_style())
+        elements.append(table)
+        elements.append(Spacer(1, 12))
+
+    elements.append(Paragraph("<b>Overall Academic Summary</b>", styles['Heading3']))
+    summary_table = Table([
+        ["Cumulative GPA:", f"{data['cumulative_gpa']:.2f}"],
+        ["Weighted GPA:", f"{data['cumulative_weighted_gpa']:.2f}"],
+        ["Credits Attempted:", str(data['total_credit_hours_attempted'])],
+        ["Credits Earned:", str(data['total_credit_hours_earned'])],
+    ], colWidths=[2*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), STRIPE_COLOR),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(
+        f"Generated on: {datetime.now().strftime('%d %B %Y %H:%M')}",
+        styles['Normal']
+    ))
+
+    doc.build(elements)
+
+    filename = f"Transcript_{_safe_name(student['index_number'] or student['student_id'])}.pdf"
+    return filename, buffer.getvalue()
+
+
+RENDERERS = {
+    'result_slip': render_result_slip_pdf,
+    'transcript': render_transcript_pdf,
+}
+
+
+def render_document(kind, payload):
+    """Dispatch to the renderer for `kind` (picklable entry point for worker pools)."""
+    return RENDERERS[kind](payload)
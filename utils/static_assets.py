@@ -0,0 +1,208 @@
+"""
+Build-free static asset fingerprinting and far-future caching.
+
+At startup every file under the static folder (except user uploads) is
+hashed into a manifest. `url_for('static', filename='css/app.css')` then
+builds `/static/css/app.<hash>.css`, and those fingerprinted URLs are
+served with `Cache-Control: public, max-age=31536000, immutable`, so
+browsers never revalidate them: a repeat page load makes no static
+requests at all. Editing a file changes its hash (after a restart), which
+changes the URL.
+
+Text-like assets (CSS, JS, fonts, icons, SVG) are served precompressed
+when the client accepts it: a `.br`/`.gz` file next to the asset is used
+if one exists, otherwise the variant is built on first request and kept in
+STATIC_COMPRESSED_FOLDER. Brotli is only produced when the optional
+`brotli` package is installed.
+
+Paths that are not in the manifest (uploads, files added at runtime) are
+served as before, with a short revalidating cache.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import abort, request, send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html',
+    '.ttf', '.otf', '.eot', '.ico',
+}
+
+# Don't bother compressing tiny files
+MIN_COMPRESS_SIZE = 1024
+
+
+class StaticAssets:
+    """
+    Asset manifest, url_for rewriting and the /static view.
+
+    One instance lives on the app as app.extensions['static_assets'].
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.static_folder = None
+        self.cache_folder = None
+        self.default_max_age = 0
+        self.manifest = {}   # logical path -> fingerprinted path
+        self.reverse = {}    # fingerprinted path -> logical path
+        self._incompressible = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['static_assets'] = self
+        self.static_folder = app.static_folder
+        self.default_max_age = int(app.config.get('STATIC_DEFAULT_MAX_AGE', 0))
+        self.cache_folder = app.config.get('STATIC_COMPRESSED_FOLDER') or os.path.join(
+            app.instance_path, 'static-compressed'
+        )
+        # In debug, files change without restarts; keep plain URLs there
+        self.enabled = bool(app.config.get('STATIC_FINGERPRINT', True)) and not app.debug
+
+        if self.enabled:
+            excluded = tuple(
+                p.strip('/') + '/' for p in app.config.get('STATIC_FINGERPRINT_EXCLUDE', ('uploads',))
+            )
+            self.build_manifest(excluded)
+            app.url_defaults(self._url_defaults)
+            logger.info(f"🧾 Static manifest: {len(self.manifest)} fingerprinted assets")
+
+        # Serve both the built-in endpoint and app.py's static_files route
+        app.view_functions['static'] = self.serve
+
+    # ---------------------------------------------------------------
+    # Manifest
+    # ---------------------------------------------------------------
+    @staticmethod
+    def fingerprinted_name(path, digest):
+        base, ext = os.path.splitext(path)
+        return f"{base}.{digest}{ext}"
+
+    @staticmethod
+    def file_digest(full_path):
+        h = hashlib.blake2b(digest_size=6)
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def build_manifest(self, excluded=()):
+        manifest, reverse = {}, {}
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                logical = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                if logical.startswith(excluded) or logical.endswith(('.gz', '.br')):
+                    continue
+                try:
+                    fingerprinted = self.fingerprinted_name(logical, self.file_digest(full_path))
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not hash static file {logical}: {e}")
+                    continue
+                manifest[logical] = fingerprinted
+                reverse[fingerprinted] = logical
+        self.manifest, self.reverse = manifest, reverse
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint in ('static', 'static_files'):
+            filename = values.get('filename')
+            if filename:
+                values['filename'] = self.manifest.get(filename.lstrip('/'), filename)
+
+    # ---------------------------------------------------------------
+    # Serving
+    # ---------------------------------------------------------------
+    def serve(self, filename):
+        logical = self.reverse.get(filename)
+        if logical is None:
+            try:
+                return send_from_directory(self.static_folder, filename, max_age=self.default_max_age)
+            except Exception as e:
+                logger.error(f"Static file error: {e}")
+                abort(404)
+
+        full_path = os.path.join(self.static_folder, logical)
+        if not os.path.isfile(full_path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+        path, encoding = self._encoded_variant(logical, full_path)
+
+        response = send_file(path, mimetype=mimetype, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if os.path.splitext(logical)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _encoded_variant(self, logical, full_path):
+        """(path, content-encoding) of the best variant the client accepts."""
+        if os.path.splitext(logical)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return full_path, None
+
+        accepted = request.accept_encodings
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if not accepted[encoding]:
+                continue
+            variant = self._compressed(logical, full_path, encoding, suffix)
+            if variant:
+                return variant, encoding
+        return full_path, None
+
+    def _compressed(self, logical, full_path, encoding, suffix):
+        # Precompressed next to the asset (e.g. produced by a build step)
+        if os.path.isfile(full_path + suffix):
+            return full_path + suffix
+        if encoding == 'br' and brotli is None:
+            return None
+        if os.path.getsize(full_path) < MIN_COMPRESS_SIZE:
+            return None
+
+        target = os.path.join(self.cache_folder, self.manifest[logical] + suffix)
+        if os.path.isfile(target):
+            return target
+        if target in self._incompressible:
+            return None
+
+        with self._lock:
+            if os.path.isfile(target):
+                return target
+            try:
+                with open(full_path, 'rb') as f:
+                    data = f.read()
+                if encoding == 'br':
+                    packed = brotli.compress(data, quality=11)
+                else:
+                    packed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(packed) >= len(data):
+                    self._incompressible.add(target)
+                    return None
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp = f"{target}.{os.getpid()}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(packed)
+                os.replace(tmp, target)
+                return target
+            except OSError as e:
+                logger.warning(f"⚠️ Could not precompress {logical}: {e}")
+                return None
+
+
+static_assets = StaticAssets()
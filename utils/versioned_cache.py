@@ -0,0 +1,173 @@
+"""
+Process-local caches invalidated by committed database writes.
+
+Several read paths (course catalog, calendar feeds, timetable renders)
+keep values built from slow-changing tables in process memory. They share
+the same rules, implemented here once:
+
+  * a ChangeVersion watches some models. A flush that writes one of them
+    (or a bulk update()/delete() on one) marks the session; when that
+    session commits or rolls back, the version is bumped and every store
+    attached to it is cleared.
+  * a VersionedStore keeps built values per key together with the version
+    they were built at. A value is reused while the version is unchanged
+    and it is younger than the store's TTL (a TTL of 0 disables caching);
+    the TTL bounds staleness for writes made by other processes.
+  * a value is only published if the version did not move while it was
+    being built, and not from a session with uncommitted writes to the
+    watched models (it would have read rows a rollback can take back).
+
+A ChangeVersion may depend on others (e.g. the calendar feed on the course
+catalog); its version is then the tuple of all of them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from utils.extensions import db
+
+
+class ChangeVersion:
+    """Version number bumped by committed (or rolled back) writes to `models`."""
+
+    def __init__(self, name, models, depends_on=(), dirty_filter=None, bulk_filter=None):
+        """
+        Args:
+            name: Used for the session.info flag
+            models: Model classes (or a callable returning them, so modules
+                can be imported before the models are)
+            depends_on: Other ChangeVersions folded into this version
+            dirty_filter: obj -> bool; whether an updated instance counts
+                as a change (new and deleted instances always do)
+            bulk_filter: ORMExecuteState -> bool; whether a bulk
+                update()/delete() counts as a change
+        """
+        self.name = name
+        self._models = models
+        self.depends_on = tuple(depends_on)
+        self.dirty_filter = dirty_filter
+        self.bulk_filter = bulk_filter
+        self.flag = f'{name}_changed'
+        self.lock = threading.Lock()
+        self.stores = []
+        self._counter = 0
+
+    @property
+    def models(self):
+        models = self._models() if callable(self._models) else self._models
+        return tuple(models)
+
+    def current(self):
+        """Tuple of this counter and those of every dependency."""
+        version = (self._counter,)
+        for dependency in self.depends_on:
+            version += dependency.current()
+        return version
+
+    def bump(self):
+        with self.lock:
+            self._counter += 1
+            for store in self.stores:
+                store.clear()
+
+    def may_publish(self, version):
+        """Whether a value built at `version` may be cached now."""
+        return version == self.current() and not self._written_in_session()
+
+    def _written_in_session(self):
+        """Whether the current session has uncommitted writes to watched models."""
+        if not has_app_context():
+            return False
+        return bool(db.session.info.get(self.flag)) or any(
+            dependency._written_in_session() for dependency in self.depends_on
+        )
+
+    # ------------------------------------------------------------------
+    # SESSION HOOKS
+    # ------------------------------------------------------------------
+
+    def _after_flush(self, session, flush_context):
+        models = self.models
+        for obj in list(session.new) + list(session.deleted):
+            if isinstance(obj, models):
+                session.info[self.flag] = True
+                return
+        for obj in session.dirty:
+            if isinstance(obj, models) and (self.dirty_filter is None or self.dirty_filter(obj)):
+                session.info[self.flag] = True
+                return
+
+    def _do_orm_execute(self, state):
+        """Bulk update()/delete() bypass flush events; check the statement's model."""
+        if not (state.is_update or state.is_delete):
+            return
+        mapper = state.bind_mapper
+        if mapper is None or mapper.class_ not in self.models:
+            return
+        if self.bulk_filter is None or self.bulk_filter(state):
+            state.session.info[self.flag] = True
+
+    def _after_end(self, session):
+        if session.info.pop(self.flag, False):
+            self.bump()
+
+    def register(self):
+        """Listen for writes on every Session (call once at startup)."""
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'do_orm_execute', self._do_orm_execute)
+        event.listen(Session, 'after_commit', self._after_end)
+        # A rollback bumps too, dropping anything read inside the transaction
+        event.listen(Session, 'after_rollback', self._after_end)
+
+
+class VersionedStore:
+    """Values keyed by anything, valid for one ChangeVersion and a TTL."""
+
+    def __init__(self, changes, ttl_setting, ttl_default, size_setting=None, size_default=None):
+        self.changes = changes
+        self.ttl_setting = ttl_setting
+        self.ttl_default = ttl_default
+        self.size_setting = size_setting
+        self.size_default = size_default
+        self._entries = OrderedDict()  # key -> (version, built_at, value)
+        changes.stores.append(self)
+
+    def _config(self, name, default):
+        if name and has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def get(self, key, build):
+        """
+        The cached value for `key`, or `build(version)` (published if allowed).
+        """
+        version = self.changes.current()
+        entry = self._entries.get(key)
+        ttl = self._config(self.ttl_setting, self.ttl_default)
+        if (entry is not None and entry[0] == version
+                and ttl > 0 and time.monotonic() - entry[1] < ttl):
+            if self.size_setting:
+                with self.changes.lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            return entry[2]
+
+        value = build(version)
+        with self.changes.lock:
+            # Only publish if nothing committed while we were reading
+            if ttl > 0 and self.changes.may_publish(version):
+                self._entries[key] = (version, time.monotonic(), value)
+                if self.size_setting:
+                    self._entries.move_to_end(key)
+                    limit = self._config(self.size_setting, self.size_default)
+                    while len(self._entries) > limit:
+                        self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
@@ -1,19 +1,18 @@
-from flask import Blueprint, current_app, render_template, abort, redirect, url_for, flash, jsonify, session, send_from_directory, send_file
-import json, os, mimetypes
+from flask import Blueprint, current_app, render_template, abort, redirect, url_for, flash, jsonify, session, send_from_directory, make_response, g
+import json, os
 from flask import request
 from flask_login import login_required, current_user, login_user, logout_user
 from sqlalchemy import func, text, inspect
 from werkzeug.utils import safe_join, secure_filename
-from models import QuizAttempt, db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ProgrammeFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Meeting, StudentAnswer, Recording, PasswordResetRequest, PasswordResetToken, AssignmentSubmission
-from datetime import date, datetime, timedelta, time
+from models import QuizAttempt, db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ProgrammeFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Meeting, StudentAnswer, Recording, PasswordResetRequest, PasswordResetToken, AssignmentSubmission
+from datetime import date, datetime, timedelta, time, timezone
 from forms import StudentLoginForm, ForgotPasswordForm, ResetPasswordForm
 from io import BytesIO
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
 from utils.email import send_password_reset_email
+from utils.media import send_media
+from services.video_pipeline import VideoPipeline
+from services.calendar_feed_service import CalendarFeedService
+from utils.http_cache import versioned
 from sqlalchemy.orm import joinedload
 from flask_wtf.csrf import generate_csrf
 
@@ -22,28 +21,12 @@ vclass_bp = Blueprint('vclass', __name__, url_prefix='/vclass')
 ALLOWED_EXTENSIONS = {'.doc', '.docx', '.xls', '.xlsx', '.pdf', '.ppt', '.txt'}
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads", "assignments")
 
+# Hints the player uses to choose a video rendition
+VIDEO_CLIENT_HINTS = 'Save-Data, ECT, Downlink, Sec-CH-Viewport-Width, Sec-CH-DPR'
+
 def allowed_file(filename):
     return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
 
-# Utility to split multi-day events into single-day all-day events
-def split_event_into_days(title, start, end, color, extended_props):
-    """Split a multi-day event into separate all-day blocks, one per day."""
-    events = []
-    current = start.date()
-    final = end.date()
-    while current <= final:
-        next_day = current + timedelta(days=1)
-        events.append({
-            'title': title,
-            'start': current.isoformat(),   # Date only for all-day events
-            'end': next_day.isoformat(),    # Next day (non-inclusive end)
-            'color': color,
-            'allDay': True,
-            'extendedProps': extended_props
-        })
-        current = next_day
-    return events
-
 
 @vclass_bp.route('/login', methods=['GET', 'POST'])
 def vclass_login():
@@ -180,45 +163,9 @@ def dashboard():
     student_level = str(profile.programme_level)
     now = datetime.utcnow()
 
-    # --- Quizzes ---
-    quizzes = Quiz.query.filter(
-        Quiz.programme_name == student_programme,
-        Quiz.programme_level == student_level
-    ).all()
-    
-    quiz_list = []
-    for q in quizzes:
-        status = 'Upcoming'
-        if q.start_datetime <= now <= q.end_datetime:
-            status = 'Ongoing'
-        elif now > q.end_datetime:
-            status = 'Due'
-        quiz_list.append({
-            'id': q.id,
-            'title': q.title,
-            'course_name': q.course_name,
-            'start_datetime': q.start_datetime.isoformat(),
-            'end_datetime': q.end_datetime.isoformat(),
-            'duration': q.duration_minutes,
-            'is_active': q.start_datetime <= now <= q.end_datetime
-        })
-
-    # --- Assignments ---
-    assignments = Assignment.query.filter(
-        Assignment.programme_name == student_programme,
-        Assignment.programme_level == student_level
-    ).all()
-    
-    assignment_list = [{
-        'id': a.id,
-        'title': a.title,
-        'course_name': a.course_name,
-        'description': a.description,
-        'instructions': a.instructions,
-        'due_date': a.due_date.isoformat(),
-        'filename': a.filename,
-        'original_name': a.original_name
-    } for a in assignments]
+    # --- Quizzes, assignments and calendar events (cached per class) ---
+    feed = CalendarFeedService.feed(student_programme, student_level)
+    quiz_list, assignment_list = CalendarFeedService.dashboard_lists(feed, now)
 
     # --- Course Materials ---
     materials = CourseMaterial.query.filter(
@@ -236,107 +183,6 @@ def dashboard():
         'upload_date': m.upload_date.isoformat() if m.upload_date else None
     } for m in materials]
 
-    # --- Combined Calendar Events ---
-    events = []
-
-    # Quizzes → Calendar
-    for q in quizzes:
-        status = 'Upcoming'
-        color = '#0d6efd'
-        if q.start_datetime <= now <= q.end_datetime:
-            status = 'Ongoing'
-            color = '#ffc107'
-        elif now > q.end_datetime:
-            status = 'Due'
-            color = '#dc3545'
-
-        events.append({
-            'title': f"{q.title} [{status}]",
-            'start': q.start_datetime.isoformat(),
-            'end': q.end_datetime.isoformat(),
-            'url': url_for('vclass.quiz_instructions', quiz_id=q.id),
-            'color': color,
-            'extendedProps': {
-                'type': 'Quiz',
-                'status': status,
-                'course': q.course_name,
-                'description': ''
-            }
-        })
-
-    # Assignments → Calendar
-    for a in assignments:
-        events.append({
-            'title': f"{a.title} [Due]",
-            'start': a.due_date.isoformat(),
-            'end': a.due_date.isoformat(),
-            'url': url_for('vclass.download_assignment', filename=a.filename),
-            'color': '#198754',
-            'extendedProps': {
-                'type': 'Assignment',
-                'status': 'Due',
-                'course': a.course_name,
-                'description': a.instructions or ''
-            }
-        })
-
-    # Course Registration Period
-    registration_start, registration_end = Course.get_registration_window()
-    if registration_start and registration_end:
-        events += split_event_into_days(
-            title='Course Registration Period',
-            start=registration_start,
-            end=registration_end,
-            color='#dc3545',
-            extended_props={
-                'type': 'Deadline',
-                'status': 'Open',
-                'course': '',
-                'description': 'Course registration is available during this window.'
-            }
-        )
-
-    # Academic Calendar Events
-    ac_events = AcademicCalendar.query.order_by(AcademicCalendar.date).all()
-    color_map = {
-        'Vacation': '#e67e22',
-        'Midterm': '#9b59b6',
-        'Exam': '#2980b9',
-        'Holiday': '#c0392b',
-        'Other': '#95a5a6'
-    }
-
-    for ev in ac_events:
-        events.append({
-            'title': ev.label,
-            'start': ev.date.isoformat(),
-            'color': color_map.get(ev.break_type, '#7f8c8d'),
-            'extendedProps': {
-                'type': ev.break_type,
-                'status': 'Academic',
-                'course': '',
-                'description': ''
-            }
-        })
-
-    # Semester background
-    academic_year = AcademicYear.query.first()
-    if academic_year:
-        events.append({
-            'start': academic_year.semester_1_start.isoformat(),
-            'end': (academic_year.semester_1_end + timedelta(days=1)).isoformat(),
-            'display': 'background',
-            'color': '#d1e7dd',
-            'title': 'Semester 1'
-        })
-        events.append({
-            'start': academic_year.semester_2_start.isoformat(),
-            'end': (academic_year.semester_2_end + timedelta(days=1)).isoformat(),
-            'display': 'background',
-            'color': '#f8d7da',
-            'title': 'Semester 2'
-        })
-
     return render_template(
         'vclass/dashboard.html',
         programme=student_programme,
@@ -344,9 +190,102 @@ def dashboard():
         quizzes=quiz_list,
         assignments=assignment_list,
         materials=material_list,
-        events=events
+        event_count=len(feed.events)
     )
 
+
+def _student_class():
+    """(programme, level) of the logged-in student, once per request."""
+    if 'student_class' not in g:
+        profile = None
+        if current_user.is_authenticated and current_user.role == 'student':
+            profile = StudentProfile.query.filter_by(user_id=current_user.user_id).first()
+        g.student_class = (profile.current_programme, str(profile.programme_level)) if profile else None
+    return g.student_class
+
+
+def _calendar_version():
+    """
+    The student's class, its feed version and how far the clock has moved
+    through quiz windows. The class is part of the token: a student moved
+    to another class keeps their identity, and the two feeds' versions can
+    coincide.
+    """
+    student_class = _student_class()
+    if student_class is None:
+        return None
+    feed = CalendarFeedService.feed(*student_class)
+    return (student_class, feed.version, feed.quiz_phase(datetime.utcnow()))
+
+
+def _ics_version():
+    student_class = _student_class()
+    if student_class is None:
+        return None
+    return (student_class, CalendarFeedService.feed(*student_class).version)
+
+
+def _parse_range_bound(value):
+    """FullCalendar start/end parameter (ISO date or datetime) as naive UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00').replace(' ', '+'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@vclass_bp.route('/calendar/events')
+@login_required
+@versioned(_calendar_version)
+def calendar_events():
+    """Calendar events of the student's class overlapping ?start=&end="""
+    student_class = _student_class()
+    if student_class is None:
+        abort(403)
+
+    try:
+        start = _parse_range_bound(request.args.get('start'))
+        end = _parse_range_bound(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 dates'}), 400
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if start is None:
+        start = today - timedelta(days=31)
+    if end is None:
+        end = start + timedelta(days=current_app.config.get('CALENDAR_FEED_DEFAULT_DAYS', 220))
+    max_days = current_app.config.get('CALENDAR_FEED_MAX_DAYS', 400)
+    if end <= start or (end - start).days > max_days:
+        return jsonify({'error': f"Date range must be positive and at most {max_days} days"}), 400
+
+    feed = CalendarFeedService.feed(*student_class)
+    now = datetime.utcnow()
+    return jsonify([
+        CalendarFeedService.to_fullcalendar(ev, now)
+        for ev in CalendarFeedService.window(feed, start, end)
+    ])
+
+
+@vclass_bp.route('/calendar.ics')
+@login_required
+@versioned(_ics_version)
+def calendar_ics():
+    """Download the class calendar as an iCalendar file"""
+    student_class = _student_class()
+    if student_class is None:
+        abort(403)
+
+    programme, level = student_class
+    feed = CalendarFeedService.feed(programme, level)
+    body = CalendarFeedService.to_ics(feed, f"{programme} Level {level}", request.host_url)
+
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/calendar; charset=utf-8'
+    response.headers['Content-Disposition'] = 'attachment; filename="vclass-calendar.ics"'
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 # Utility functions
 def is_quiz_active(quiz):
     now = datetime.utcnow()
@@ -966,11 +905,7 @@ def preview_material(filename):
     if not os.path.exists(filepath):
         abort(404)
 
-    mimetype, _ = mimetypes.guess_type(filename)
-    response = send_from_directory(materials_dir, filename, as_attachment=False)
-    if mimetype in ("application/pdf",) or (mimetype and mimetype.startswith("image/")):
-        response.headers["Content-Disposition"] = f'inline; filename="{os.path.basename(filename)}"'
-    return response
+    return send_media(materials_dir, filename, as_attachment=False)
 
 
 @vclass_bp.route('/download/materials/<path:filename>')
@@ -980,7 +915,7 @@ def download_material(filename):
     filepath = os.path.join(materials_dir, filename)
     if not os.path.exists(filepath):
         abort(404)
-    return send_from_directory(materials_dir, filename, as_attachment=True)
+    return send_media(materials_dir, filename, as_attachment=True)
 
 @vclass_bp.route('/assignments')
 @login_required
@@ -1005,30 +940,40 @@ def assignments():
 def play_video(filename):
     material = CourseMaterial.query.filter_by(filename=filename).first_or_404()
 
-    if material.file_type.lower() not in ['mp4', 'webm', 'ogg']:
+    renditions = material.renditions if material.video_status == 'ready' else []
+    if not renditions and material.file_type.lower() not in ['mp4', 'webm', 'ogg']:
         flash('Unsupported video format.', 'warning')
         return redirect(url_for('vclass.virtual_class'))
 
+    # Rendition from ?quality= or client hints (Save-Data, ECT, Downlink, viewport)
+    selected = VideoPipeline.choose_rendition(renditions, request.headers, request.args.get('quality'))
+    if selected:
+        sources = [selected] + [r for r in renditions if r is not selected]
+    else:
+        sources = [{'label': 'original', 'filename': material.filename}]
+
     # Fetch related videos
     related_videos = CourseMaterial.query.filter(
         CourseMaterial.id != material.id,
         CourseMaterial.file_type.in_(['mp4', 'webm', 'ogg'])
     ).order_by(CourseMaterial.upload_date.desc()).limit(10).all()
 
-    return render_template('vclass/play_video.html', material=material, related_videos=related_videos)
+    response = make_response(render_template(
+        'vclass/play_video.html', material=material, related_videos=related_videos,
+        sources=sources, renditions=renditions, selected=selected
+    ))
+    response.headers['Accept-CH'] = VIDEO_CLIENT_HINTS
+    response.vary.update(h.strip() for h in VIDEO_CLIENT_HINTS.split(','))
+    return response
 
 @vclass_bp.route('/stream/materials/<filename>')
 @login_required
 def stream_material_video(filename):
-    video_path = os.path.join(current_app.root_path, 'uploads', 'materials', filename)
-    if not os.path.isfile(video_path):
-        abort(404)
+    materials_dir = current_app.config.get("MATERIALS_FOLDER") or os.path.join(current_app.root_path, "uploads", "materials")
     mime_type = f'video/{filename.rsplit(".", 1)[-1]}'
 
-    # send_file with headers forcing inline content (stream)
-    response = send_file(video_path, mimetype=mime_type, conditional=True)
-    response.headers["Content-Disposition"] = f'inline; filename="{filename}"'
-    return response
+    # Inline, range-aware (seeking), handed to the front proxy when configured
+    return send_media(materials_dir, filename, mimetype=mime_type)
 
 # Profile Page
 @vclass_bp.route('/profile')